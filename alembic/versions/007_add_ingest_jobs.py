@@ -0,0 +1,56 @@
+"""添加 Webhook 消息持久化队列表
+
+Revision ID: 007_add_ingest_jobs
+Revises: 006_add_performance_indexes
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_add_ingest_jobs'
+down_revision = '006_add_performance_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ingest_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(length=20), nullable=False),
+        sa.Column('message_id', sa.String(length=200), nullable=True),
+        sa.Column('sender_id', sa.String(length=100), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column(
+            'status',
+            sa.Enum('PENDING', 'PROCESSING', 'DONE', 'FAILED', name='ingeststatus'),
+            nullable=False
+        ),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('available_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text("timezone('utc', now())")),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ingest_jobs_id', 'ingest_jobs', ['id'], unique=False)
+    op.create_index('ix_ingest_jobs_message_id', 'ingest_jobs', ['message_id'], unique=False)
+    op.create_index(
+        'idx_ingest_jobs_status_available',
+        'ingest_jobs',
+        ['status', 'available_at'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('idx_ingest_jobs_status_available', table_name='ingest_jobs')
+    op.drop_index('ix_ingest_jobs_message_id', table_name='ingest_jobs')
+    op.drop_index('ix_ingest_jobs_id', table_name='ingest_jobs')
+    op.drop_table('ingest_jobs')
+    sa.Enum(name='ingeststatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,60 @@
+"""添加消息去重唯一约束
+
+Revision ID: 008_add_message_dedupe_constraints
+Revises: 007_add_ingest_jobs
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '008_add_message_dedupe_constraints'
+down_revision = '007_add_ingest_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 历史重复记录：保留最早的一条，其余记录清空平台消息ID（保留对话内容和关联数据）
+    op.execute(
+        """
+        UPDATE conversations SET platform_message_id = NULL
+        WHERE platform_message_id IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM conversations
+              WHERE platform_message_id IS NOT NULL
+              GROUP BY platform, platform_message_id
+          )
+        """
+    )
+    op.create_index(
+        'uq_conversations_platform_message',
+        'conversations',
+        ['platform', 'platform_message_id'],
+        unique=True
+    )
+
+    # 队列中的重复任务直接删除
+    op.execute(
+        """
+        DELETE FROM ingest_jobs
+        WHERE message_id IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM ingest_jobs
+              WHERE message_id IS NOT NULL
+              GROUP BY platform, message_id
+          )
+        """
+    )
+    op.create_index(
+        'uq_ingest_jobs_platform_message',
+        'ingest_jobs',
+        ['platform', 'message_id'],
+        unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('uq_ingest_jobs_platform_message', table_name='ingest_jobs')
+    op.drop_index('uq_conversations_platform_message', table_name='conversations')
@@ -0,0 +1,40 @@
+"""添加消息处理链路记录表
+
+Revision ID: 009_add_pipeline_traces
+Revises: 008_add_message_dedupe_constraints
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009_add_pipeline_traces'
+down_revision = '008_add_message_dedupe_constraints'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'pipeline_traces',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(length=20), nullable=False),
+        sa.Column('message_id', sa.String(length=200), nullable=True),
+        sa.Column('customer_id', sa.Integer(), nullable=True),
+        sa.Column('total_ms', sa.Float(), nullable=False),
+        sa.Column('stages', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text("timezone('utc', now())")),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_pipeline_traces_id', 'pipeline_traces', ['id'], unique=False)
+    op.create_index('ix_pipeline_traces_message_id', 'pipeline_traces', ['message_id'], unique=False)
+    op.create_index('idx_pipeline_traces_total_ms', 'pipeline_traces', ['total_ms'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_pipeline_traces_total_ms', table_name='pipeline_traces')
+    op.drop_index('ix_pipeline_traces_message_id', table_name='pipeline_traces')
+    op.drop_index('ix_pipeline_traces_id', table_name='pipeline_traces')
+    op.drop_table('pipeline_traces')
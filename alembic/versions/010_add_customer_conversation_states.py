@@ -0,0 +1,37 @@
+"""添加客户对话状态表
+
+Revision ID: 010_add_customer_conversation_states
+Revises: 009_add_pipeline_traces
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010_add_customer_conversation_states'
+down_revision = '009_add_pipeline_traces'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 已有客户的状态在首次读取时由对话历史重建（见 src/ai/conversation_state.py）
+    op.create_table(
+        'customer_conversation_states',
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('ai_reply_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('telegram_link_sent', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('stage', sa.Enum('NEW', 'EARLY', 'ONGOING', name='conversationstage'), nullable=False, server_default='NEW'),
+        sa.Column('last_inbound_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_outbound_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text("timezone('utc', now())")),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id'], ),
+        sa.PrimaryKeyConstraint('customer_id')
+    )
+
+
+def downgrade():
+    op.drop_table('customer_conversation_states')
+    sa.Enum(name='conversationstage').drop(op.get_bind(), checkfirst=True)
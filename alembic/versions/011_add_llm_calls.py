@@ -0,0 +1,43 @@
+"""添加 LLM 调用记录表
+
+Revision ID: 011_add_llm_calls
+Revises: 010_add_customer_conversation_states
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011_add_llm_calls'
+down_revision = '010_add_customer_conversation_states'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'llm_calls',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('page_id', sa.String(length=100), nullable=True),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('prompt_version', sa.String(length=32), nullable=True),
+        sa.Column('outcome', sa.String(length=20), nullable=False),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=True),
+        sa.Column('completion_tokens', sa.Integer(), nullable=True),
+        sa.Column('latency_ms', sa.Float(), nullable=False),
+        sa.Column('cost_usd', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text("timezone('utc', now())")),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_llm_calls_id', 'llm_calls', ['id'], unique=False)
+    op.create_index('idx_llm_calls_created_at', 'llm_calls', ['created_at'], unique=False)
+    op.create_index('idx_llm_calls_page_created_at', 'llm_calls', ['page_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_llm_calls_page_created_at', table_name='llm_calls')
+    op.drop_index('idx_llm_calls_created_at', table_name='llm_calls')
+    op.drop_index('ix_llm_calls_id', table_name='llm_calls')
+    op.drop_table('llm_calls')
@@ -0,0 +1,24 @@
+"""LLM 调用记录增加模型路由档位
+
+Revision ID: 012_add_llm_call_tier
+Revises: 011_add_llm_calls
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012_add_llm_call_tier'
+down_revision = '011_add_llm_calls'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('llm_calls', sa.Column('tier', sa.String(length=50), nullable=True))
+
+
+def downgrade():
+    op.drop_column('llm_calls', 'tier')
@@ -0,0 +1,247 @@
+"""
+过滤引擎基准测试
+
+对比旧实现（编译过滤规则之前的 FilterEngine 原样复制到本脚本：每条消息创建一次，读取 filtering 配置，
+逐条比较优先级规则的条件字符串）与编译后的过滤规则（src/collector/filter_engine.py 的 FilterRules +
+filter_many）的每秒处理消息数，并校验两者结果一致。关键词匹配结果预先计算（两种实现共用同一个关键词自动机，
+旧实现当时已使用共享的匹配结果），只比较过滤规则本身；--with-matching 时计入每条消息的关键词扫描。
+
+用法：
+    python scripts/benchmarks/filter_engine.py --count 50000 --priority-rules 20
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from sqlalchemy.orm import Session  # noqa: E402
+from src.collector.filter_engine import FilterEngine, FilterRules  # noqa: E402
+from src.collector.sentiment_scorer import SentimentScorer  # noqa: E402
+from src.config import yaml_config  # noqa: E402
+from src.database.models import Conversation, Priority  # noqa: E402
+from src.utils.keyword_engine import (  # noqa: E402
+    KeywordEngine, KeywordMatches, keyword_engine, FILTER_BLOCK, FILTER_SPAM,
+    PRIORITY_RULE_PREFIX, SENTIMENT_NEGATIVE, SENTIMENT_POSITIVE
+)
+
+SAMPLE_TEXTS = [
+    "hi", "hello", "iphone 13 price?", "how much per month?", "紧急！我需要帮助",
+    "我想购买", "价格多少", "投诉！一直没有回复", "收到了，谢谢，服务很好", "加微信领取",
+    "这是诈骗吗", "urgent please call me", "I want to buy a phone", "ok",
+]
+
+
+def build_config(extra_rules: int) -> Dict[str, Any]:
+    """示例 filtering 配置，extra_rules 模拟运营添加的大量优先级规则（都排在默认规则之前）"""
+    rules = [
+        {"condition": "包含购买意向", "keywords": [f"rulekeyword{i}"], "priority": "medium"}
+        for i in range(extra_rules)
+    ]
+    rules += [
+        {"condition": "包含紧急关键词", "keywords": ["紧急", "urgent", "马上", "asap"], "priority": "high"},
+        {"condition": "包含购买意向", "keywords": ["购买", "买", "价格", "buy", "price"], "priority": "medium"},
+        {"condition": "默认", "priority": "low"},
+    ]
+    return {
+        "filtering": {
+            "keyword_filter": {
+                "enabled": True,
+                "block_keywords": ["诈骗", "骗子", "scam"],
+                "spam_keywords": ["加微信", "免费领取", "click here"],
+            },
+            "sentiment_filter": {"enabled": True, "priority_negative": True},
+            "priority_rules": rules,
+        }
+    }
+
+
+class LegacyFilterEngine:
+    """
+    旧实现：编译过滤规则之前的 src/collector/filter_engine.py 中的 FilterEngine（原样复制，
+    只去掉了写数据库的 apply_filter_to_conversation）。FilterHandler 为每条消息构造一次，
+    构造时读取全局 yaml_config，按条件字符串逐条判断优先级规则，情感分析按情感关键词计数。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.filter_config = yaml_config.get("filtering", {})
+        self.keyword_config = self.filter_config.get("keyword_filter", {})
+        self.sentiment_config = self.filter_config.get("sentiment_filter", {})
+        self.priority_config = self.filter_config.get("priority_rules", [])
+
+    def filter_message(
+        self,
+        conversation: Conversation,
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches] = None
+    ) -> Dict[str, Any]:
+        if keyword_matches is None:
+            keyword_matches = keyword_engine.match(message_content)
+
+        result = {
+            "filtered": False,
+            "filter_reason": None,
+            "priority": Priority.LOW,
+            "should_review": True
+        }
+
+        # 关键词过滤
+        if self.keyword_config.get("enabled", True):
+            keyword_result = self._check_keywords(keyword_matches)
+            if keyword_result["blocked"]:
+                result["filtered"] = True
+                result["filter_reason"] = f"包含屏蔽关键词: {keyword_result['matched_keywords']}"
+                result["should_review"] = False
+                return result
+            elif keyword_result["spam"]:
+                result["filtered"] = True
+                result["filter_reason"] = f"疑似垃圾信息: {keyword_result['matched_keywords']}"
+                result["should_review"] = False
+                return result
+
+        # 优先级判断
+        priority = self._determine_priority(keyword_matches)
+        result["priority"] = priority
+
+        # 情感分析过滤（简化版，实际可以使用 AI）
+        if self.sentiment_config.get("enabled", True):
+            sentiment_result = self._analyze_sentiment(keyword_matches)
+            if sentiment_result["is_negative"] and self.sentiment_config.get("priority_negative", True):
+                result["priority"] = Priority.HIGH
+
+        return result
+
+    def _check_keywords(self, keyword_matches: KeywordMatches) -> Dict[str, Any]:
+        # 检查屏蔽关键词
+        matched_block = keyword_matches.keywords(FILTER_BLOCK)
+        if matched_block:
+            return {
+                "blocked": True,
+                "spam": False,
+                "matched_keywords": matched_block
+            }
+
+        # 检查垃圾信息关键词
+        matched_spam = keyword_matches.keywords(FILTER_SPAM)
+        if matched_spam:
+            return {
+                "blocked": False,
+                "spam": True,
+                "matched_keywords": matched_spam
+            }
+
+        return {
+            "blocked": False,
+            "spam": False,
+            "matched_keywords": []
+        }
+
+    def _determine_priority(self, keyword_matches: KeywordMatches) -> Priority:
+        # 按配置的优先级规则检查
+        for index, rule in enumerate(self.priority_config):
+            condition = rule.get("condition", "")
+            priority_str = rule.get("priority", "low")
+            matched = keyword_matches.has(f"{PRIORITY_RULE_PREFIX}{index}")
+
+            # 检查是否匹配条件
+            if condition == "包含紧急关键词":
+                if matched:
+                    return Priority.URGENT if priority_str == "high" else Priority.HIGH
+
+            elif condition == "包含购买意向":
+                if matched:
+                    return Priority.MEDIUM if priority_str == "medium" else Priority.LOW
+
+            elif condition == "默认":
+                priority_map = {
+                    "low": Priority.LOW,
+                    "medium": Priority.MEDIUM,
+                    "high": Priority.HIGH,
+                    "urgent": Priority.URGENT
+                }
+                return priority_map.get(priority_str, Priority.LOW)
+
+        return Priority.LOW
+
+    def _analyze_sentiment(self, keyword_matches: KeywordMatches) -> Dict[str, Any]:
+        negative_count = len(keyword_matches.keywords(SENTIMENT_NEGATIVE))
+        positive_count = len(keyword_matches.keywords(SENTIMENT_POSITIVE))
+
+        return {
+            "is_negative": negative_count > positive_count,
+            "is_positive": positive_count > negative_count,
+            "negative_score": negative_count,
+            "positive_score": positive_count
+        }
+
+
+def run(count: int, priority_rules: int, with_matching: bool, seed: int) -> Dict[str, Any]:
+    config = build_config(priority_rules)
+    engine_for_config = KeywordEngine(config)
+    rng = random.Random(seed)
+    messages: List[str] = [rng.choice(SAMPLE_TEXTS) for _ in range(count)]
+    precomputed = [engine_for_config.match(text) for text in messages]
+
+    def matches_for(index: int) -> KeywordMatches:
+        return engine_for_config.match(messages[index]) if with_matching else precomputed[index]
+
+    # 旧实现构造时读取全局 yaml_config，计时期间替换为基准配置
+    original_filtering = yaml_config.get("filtering")
+    yaml_config["filtering"] = config["filtering"]
+    try:
+        # 与 timeit 一样在计时期间关闭 GC，避免批量保留匹配结果时的回收开销影响对比
+        gc.disable()
+        start = time.perf_counter()
+        legacy_results = [
+            LegacyFilterEngine(None).filter_message(None, messages[i], matches_for(i)) for i in range(count)
+        ]
+        legacy_seconds = time.perf_counter() - start
+
+        rules = FilterRules.compile(
+            config["filtering"], keywords=engine_for_config.compiled, lexicon=SentimentScorer(config).lexicon
+        )
+        engine = FilterEngine(rules=rules)
+        start = time.perf_counter()
+        if with_matching:
+            batch = [engine_for_config.match(text) for text in messages]
+            compiled_results = engine.filter_many(messages, keyword_matches=batch)
+        else:
+            compiled_results = engine.filter_many(messages, keyword_matches=precomputed)
+        compiled_seconds = time.perf_counter() - start
+    finally:
+        gc.enable()
+        yaml_config["filtering"] = original_filtering
+
+    mismatches = sum(1 for a, b in zip(legacy_results, compiled_results) if a != b)
+    return {
+        "messages": count,
+        "priority_rules": len(config["filtering"]["priority_rules"]),
+        "legacy_messages_per_second": round(count / legacy_seconds),
+        "compiled_messages_per_second": round(count / compiled_seconds),
+        "speedup": round(legacy_seconds / compiled_seconds, 2) if compiled_seconds else None,
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="过滤引擎基准测试")
+    parser.add_argument("--count", type=int, default=50000, help="消息数量")
+    parser.add_argument("--priority-rules", type=int, default=0, help="额外添加的优先级规则数量")
+    parser.add_argument("--with-matching", action="store_true", help="计入每条消息的关键词扫描")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    result = run(args.count, args.priority_rules, args.with_matching, args.seed)
+    for key, value in result.items():
+        print(f"{key:>30}: {value}")
+    if result["mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+关键词分类基准测试
+
+对比逐个分类循环 `keyword in message` 的旧实现与共享 Aho-Corasick 自动机（src/utils/keyword_engine.py）
+对同一批消息做完整分类（产品、买卖意图、业务意图、过滤、优先级、情感、问题分类、需求类型、预设回复）的耗时，
+并校验两者结果一致。
+
+用法：
+    python scripts/benchmarks/keyword_classification.py --count 20000 --extra-keywords 500
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.keyword_engine import KeywordEngine  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "hi", "hello", "iphone 13", "iphone 15 pro max 256gb", "how much?",
+    "how much per month?", "is this legit?", "what do I need to apply?",
+    "can I use my id card?", "price for iphone 14?", "interest rate?",
+    "I want to apply", "ok", "thanks", "where are you located?",
+    "我想买手机", "贷款怎么办理？", "利息多少", "这个靠谱吗", "客服在吗",
+    "收到了，谢谢，服务很好", "投诉！一直没有回复", "I want to sell iphone",
+    "Looking for a loan of 5000, what is the interest rate and how long does approval take?",
+]
+
+
+def build_config(extra_keywords: int) -> Dict[str, Any]:
+    """示例配置（与 config.yaml 结构一致），extra_keywords 模拟运营添加的大量屏蔽词"""
+    block = ["诈骗", "骗子", "scam"] + [f"blockword{i}" for i in range(extra_keywords)]
+    return {
+        "filtering": {
+            "keyword_filter": {
+                "enabled": True,
+                "block_keywords": block,
+                "spam_keywords": ["加微信", "免费领取", "click here", "free money"],
+            },
+            "priority_rules": [
+                {"condition": "包含紧急关键词", "keywords": ["紧急", "urgent", "马上", "asap"], "priority": "high"},
+                {"condition": "包含购买意向", "keywords": ["购买", "买", "价格", "buy", "price"], "priority": "medium"},
+                {"condition": "默认", "priority": "low"},
+            ],
+        },
+        "ai_templates": {
+            "preset_replies": {
+                "question_model": {"keywords": ["型号", "model", "iphone"], "reply": "model"},
+                "question_amount": {"keywords": ["多少钱", "how much", "amount"], "reply": "amount"},
+                "question_storage": {"keywords": ["容量", "storage", "gb"], "reply": "storage"},
+                "greeting_first": {"keywords": ["hi", "hello", "你好"], "reply": "greeting"},
+            }
+        },
+    }
+
+
+def legacy_classify(text: str, categories: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """旧实现：每个分类各自转小写并逐个关键词做子串查找"""
+    result = {}
+    for category, keywords in categories.items():
+        lower = text.lower()
+        matched = [keyword for keyword in keywords if str(keyword).lower() in lower]
+        if matched:
+            result[category] = matched
+    return result
+
+
+def run(count: int, extra_keywords: int, seed: int) -> Dict[str, Any]:
+    config = build_config(extra_keywords)
+    engine = KeywordEngine(config)
+    categories = KeywordEngine._collect_categories(config)
+
+    rng = random.Random(seed)
+    messages = [rng.choice(SAMPLE_TEXTS) for _ in range(count)]
+
+    start = time.perf_counter()
+    legacy_results = [legacy_classify(text, categories) for text in messages]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine_results = [engine.match(text).by_category for text in messages]
+    engine_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(legacy_results, engine_results) if a != b)
+
+    return {
+        "messages": count,
+        "patterns": engine.get_metrics()["patterns"],
+        "categories": engine.get_metrics()["categories"],
+        "legacy_us_per_message": round(legacy_seconds / count * 1e6, 2),
+        "automaton_us_per_message": round(engine_seconds / count * 1e6, 2),
+        "speedup": round(legacy_seconds / engine_seconds, 2) if engine_seconds else None,
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词分类基准测试")
+    parser.add_argument("--count", type=int, default=20000, help="消息数量")
+    parser.add_argument("--extra-keywords", type=int, default=0, help="额外添加的屏蔽关键词数量")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    result = run(args.count, args.extra_keywords, args.seed)
+    for key, value in result.items():
+        print(f"{key:>26}: {value}")
+    if result["mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
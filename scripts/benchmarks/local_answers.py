@@ -0,0 +1,82 @@
+"""
+本地检索回复基准测试
+
+向 LocalAnswerIndex（src/ai/local_answers.py）增量加入合成的问答对，测量索引构建耗时
+和查询延迟（p50/p95/p99），用于确认兜底检索在大索引下仍远低于 OpenAI 的时限。
+
+用法：
+    python scripts/benchmarks/local_answers.py --pairs 100000 --queries 2000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.ai.local_answers import LocalAnswerIndex  # noqa: E402
+
+SUBJECTS = [
+    "iphone 11", "iphone 12", "iphone 13", "iphone 14 pro", "iphone 15 pro max", "apple id",
+    "loan", "interest", "利息", "贷款", "借款", "身份证", "id card", "payment", "还款", "押金",
+]
+TEMPLATES = [
+    "how much can I borrow with my {s}", "what is the {s} rate", "{s} 多少钱", "{s} 怎么办理",
+    "can I apply with {s}", "is {s} required", "{s} 需要什么资料", "where do I pay the {s}",
+    "how long does {s} approval take", "{s} 可以分期吗", "do you accept {s}", "{s} 利率是多少",
+]
+NOISE = ["", " po", " please", " 谢谢", " asap", " sir", " 呢", " ok", " thanks"]
+
+
+def _question(rng: random.Random, index: int) -> str:
+    template = rng.choice(TEMPLATES)
+    return f"{template.format(s=rng.choice(SUBJECTS))}{rng.choice(NOISE)} #{index}"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def run(pairs: int, queries: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    index = LocalAnswerIndex(max_pairs=pairs, min_score=0.0)
+
+    started = time.perf_counter()
+    for i in range(pairs):
+        index.add(_question(rng, i), f"answer {i}")
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(queries):
+        query = rng.choice(TEMPLATES).format(s=rng.choice(SUBJECTS)) + rng.choice(NOISE)
+        started = time.perf_counter()
+        index.search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "pairs": len(index),
+        "ngrams": index.get_metrics()["ngrams"],
+        "build_seconds": round(build_seconds, 2),
+        "add_us_per_pair": round(build_seconds / pairs * 1e6, 1),
+        "query_p50_ms": round(_percentile(latencies, 0.50), 3),
+        "query_p95_ms": round(_percentile(latencies, 0.95), 3),
+        "query_p99_ms": round(_percentile(latencies, 0.99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地检索回复基准测试")
+    parser.add_argument("--pairs", type=int, default=100000, help="索引的问答对数量")
+    parser.add_argument("--queries", type=int, default=2000, help="查询次数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for key, value in run(args.pairs, args.queries, args.seed).items():
+        print(f"{key:>16}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+电话号码提取基准测试
+
+对比旧实现（依次尝试三个正则，国际格式正则在数字密集的消息上逐个位置尝试各种分组）与单遍扫描器
+（src/collector/phone_scanner.py）在普通消息和对抗性输入上的耗时，并检查扫描器耗时
+随消息长度线性增长（长度翻倍时耗时约翻倍）。对抗性输入中没有电话号码，同时统计两者的误识别数量。
+
+用法：
+    python scripts/benchmarks/phone_extraction.py --repeat 200 --sizes 1000 2000 4000 8000
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.collector.phone_scanner import PhoneScanner  # noqa: E402
+
+LEGACY_PHONE_PATTERNS = [
+    r'1[3-9]\d{9}',  # 中国手机号
+    r'\d{3}-\d{3}-\d{4}',  # 美国格式
+    r'\+?\d{1,3}[-.\s]?\(?\d{1,4}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,9}',  # 国际格式
+]
+
+SAMPLE_TEXTS = [
+    "我的电话是 13812345678，请联系我",
+    "联系我：+86 138-1234-5678",
+    "电话：010-12345678",
+    "call me at +1 (415) 555-2671 after 6pm",
+    "I want a loan of 5000, interest rate 3.5% per month?",
+    "iphone 15 pro max 256gb how much?",
+]
+
+# 对抗性输入：数字密集但不含电话号码的片段
+ADVERSARIAL_UNITS = {
+    "separated_digits": "1 2-3.4 (5) ",
+    "dates_and_amounts": "2024-01-15 $5000 12.50元 ",
+    "long_digit_runs": "1234567890123456789012345 ",
+}
+
+
+def legacy_extract(text: str):
+    """旧实现：依次尝试三个正则"""
+    for pattern in LEGACY_PHONE_PATTERNS:
+        match = re.search(pattern, text)
+        if match:
+            return match.group(0)
+    return None
+
+
+def legacy_scan_all(text: str) -> List[str]:
+    """旧实现找出所有号码（国际格式正则 finditer，回填历史消息时的用法）"""
+    return [match.group(0) for match in re.finditer(LEGACY_PHONE_PATTERNS[2], text)]
+
+
+def _time(fn: Callable[[str], Any], text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def run(repeat: int, sizes: List[int]) -> Dict[str, Any]:
+    scanner = PhoneScanner(default_regions=["CN", "US"])
+    result: Dict[str, Any] = {}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in SAMPLE_TEXTS:
+            legacy_extract(text)
+    result["legacy_us_per_sample"] = round((time.perf_counter() - start) / repeat / len(SAMPLE_TEXTS) * 1e6, 2)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in SAMPLE_TEXTS:
+            scanner.extract(text)
+    result["scanner_us_per_sample"] = round((time.perf_counter() - start) / repeat / len(SAMPLE_TEXTS) * 1e6, 2)
+
+    # 各长度下的耗时，以及相邻长度的耗时比（线性时约等于长度比）
+    worst_ratio = 0.0
+    for name, unit in ADVERSARIAL_UNITS.items():
+        previous = None
+        for size in sizes:
+            text = (unit * (size // len(unit) + 1))[:size]
+            legacy = _time(legacy_scan_all, text, repeat)
+            scanner_seconds = _time(scanner.scan, text, repeat)
+            result[f"{name}[{size}] legacy_us"] = round(legacy * 1e6, 1)
+            result[f"{name}[{size}] scanner_us"] = round(scanner_seconds * 1e6, 1)
+            if previous is None:
+                # 对抗性输入中没有电话号码：旧实现的匹配全部是误识别（日期、金额、数字片段）
+                result[f"{name} legacy_false_positives"] = len(legacy_scan_all(text))
+                result[f"{name} scanner_false_positives"] = len(scanner.scan(text))
+            else:
+                previous_size, previous_seconds = previous
+                ratio = (scanner_seconds / previous_seconds) / (size / previous_size)
+                worst_ratio = max(worst_ratio, ratio)
+            previous = (size, scanner_seconds)
+    result["worst_scaling_ratio"] = round(worst_ratio, 2)
+
+    # 回填：批量接口一次处理所有样本
+    texts = SAMPLE_TEXTS * 1000
+    start = time.perf_counter()
+    matches = scanner.extract_many(texts)
+    result["extract_many_us_per_text"] = round((time.perf_counter() - start) / len(texts) * 1e6, 2)
+    result["extract_many_phones"] = sum(len(found) for found in matches)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="电话号码提取基准测试")
+    parser.add_argument("--repeat", type=int, default=200, help="每个输入的重复次数")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000], help="对抗性输入长度")
+    parser.add_argument("--max-scaling-ratio", type=float, default=1.5,
+                        help="长度翻倍时耗时增长倍数 / 长度增长倍数 的上限，超过时退出码为 1")
+    args = parser.parse_args()
+
+    result = run(args.repeat, sorted(args.sizes))
+    for key, value in result.items():
+        print(f"{key:>40}: {value}")
+    if result["worst_scaling_ratio"] > args.max_scaling_ratio:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
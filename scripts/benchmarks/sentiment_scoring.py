@@ -0,0 +1,86 @@
+"""
+情感评分基准测试
+
+对比逐条评分（共享关键词引擎扫描每条消息，再按情感关键词计数，即原来的重新评估方式）
+与批量评分（src/collector/sentiment_scorer.py 的 score_many：词典自动机扫描每条不同的消息一次，
+numpy 按稀疏出现矩阵累加权重）在历史对话规模上的吞吐量，并校验两者的负面判断一致。
+
+用法：
+    python scripts/benchmarks/sentiment_scoring.py --count 200000 --distinct 20000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.collector.sentiment_scorer import SentimentScorer  # noqa: E402
+from src.utils.keyword_engine import KeywordEngine, SENTIMENT_NEGATIVE, SENTIMENT_POSITIVE  # noqa: E402
+
+FRAGMENTS = [
+    "hi", "hello po", "how much is the loan", "iphone 13 price?", "我想了解一下贷款", "利息多少",
+    "投诉！一直没有回复", "太糟糕了", "problem with my payment", "谢谢，服务很好", "great service, thanks",
+    "still waiting", "满意", "bad experience", "ok", "什么时候到账", "error when I apply",
+]
+
+
+def build_messages(count: int, distinct: int, seed: int) -> List[str]:
+    """生成历史对话：distinct 条不同的消息按长尾分布重复（历史数据中常见问候语重复很多）"""
+    rng = random.Random(seed)
+    unique = [
+        " ".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 4))) + f" #{i}" * (i % 3 == 0)
+        for i in range(distinct)
+    ]
+    weights = [1.0 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(unique, weights=weights, k=count)
+
+
+def run(count: int, distinct: int, seed: int) -> Dict[str, Any]:
+    config = {"filtering": {}}
+    engine = KeywordEngine(config)
+    scorer = SentimentScorer(config)
+    messages = build_messages(count, distinct, seed)
+
+    start = time.perf_counter()
+    legacy_negative = []
+    for message in messages:
+        matches = engine.match(message)
+        negative = len(matches.keywords(SENTIMENT_NEGATIVE))
+        positive = len(matches.keywords(SENTIMENT_POSITIVE))
+        legacy_negative.append(negative > positive)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = scorer.score_many(messages)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "messages": count,
+        "distinct_messages": len(set(messages)),
+        "legacy_messages_per_second": round(count / legacy_seconds),
+        "batch_messages_per_second": round(count / batch_seconds),
+        "speedup": round(legacy_seconds / batch_seconds, 2),
+        "negative_messages": int(batch.is_negative.sum()),
+        "mismatches": int((batch.is_negative != legacy_negative).sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="情感评分基准测试")
+    parser.add_argument("--count", type=int, default=200000, help="消息数量")
+    parser.add_argument("--distinct", type=int, default=20000, help="不同消息的数量")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    result = run(args.count, args.distinct, args.seed)
+    for key, value in result.items():
+        print(f"{key:>30}: {value}")
+    if result["mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
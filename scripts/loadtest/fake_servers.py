@@ -0,0 +1,259 @@
+"""
+压测用本地模拟服务 - Facebook Graph / OpenAI / Telegram
+
+一个进程内同时提供三类接口（按路径前缀区分），每类接口的延迟和错误率可单独配置：
+    /graph/v18.0/...            Graph 发送消息、获取用户资料、评论
+    /openai/v1/chat/completions OpenAI 对话补全
+    /telegram/bot<token>/sendMessage
+
+应用指向模拟服务（见 README.md）：
+    FACEBOOK_GRAPH_API_URL=http://127.0.0.1:9100/graph/v18.0
+    INSTAGRAM_GRAPH_API_URL=http://127.0.0.1:9100/graph/v18.0
+    OPENAI_BASE_URL=http://127.0.0.1:9100/openai/v1
+    TELEGRAM_API_URL=http://127.0.0.1:9100/telegram
+
+用法：
+    python scripts/loadtest/fake_servers.py --port 9100 \\
+        --graph "latency=120,jitter=40,dist=lognormal,error_rate=0.01" \\
+        --openai "latency=900,jitter=300,dist=lognormal"
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class ServiceProfile:
+    """
+    单个模拟服务的延迟和错误分布
+
+    dist:
+        fixed      固定延迟 latency
+        normal     正态分布（均值 latency，标准差 jitter，截断为非负）
+        lognormal  对数正态分布（均值 latency，标准差 jitter，长尾更接近真实 API）
+    """
+    latency_ms: float = 50.0
+    jitter_ms: float = 0.0
+    dist: str = "normal"
+    error_rate: float = 0.0
+    error_status: int = 500
+    timeout_rate: float = 0.0  # 以该概率挂起 timeout_ms 后才响应（模拟超时）
+    timeout_ms: float = 30000.0
+
+    @classmethod
+    def parse(cls, spec: Optional[str], default: "ServiceProfile") -> "ServiceProfile":
+        """解析 "latency=80,jitter=20,dist=lognormal,error_rate=0.01" 形式的配置"""
+        if not spec:
+            return default
+        aliases = {"latency": "latency_ms", "jitter": "jitter_ms", "timeout": "timeout_ms"}
+        values = dict(default.__dict__)
+        for item in spec.split(","):
+            key, _, value = item.partition("=")
+            key = aliases.get(key.strip(), key.strip())
+            if key not in values:
+                raise ValueError(f"Unknown profile option: {key}")
+            values[key] = value.strip() if key == "dist" else type(values[key])(float(value))
+        return cls(**values)
+
+    def sample_latency_ms(self) -> float:
+        """按分布采样一次延迟"""
+        if self.dist == "fixed" or self.jitter_ms <= 0:
+            return self.latency_ms
+        if self.dist == "lognormal" and self.latency_ms > 0:
+            sigma2 = math.log(1 + (self.jitter_ms / self.latency_ms) ** 2)
+            mu = math.log(self.latency_ms) - sigma2 / 2
+            return random.lognormvariate(mu, math.sqrt(sigma2))
+        return max(0.0, random.gauss(self.latency_ms, self.jitter_ms))
+
+    async def apply(self) -> Optional[JSONResponse]:
+        """等待模拟延迟；命中错误率时返回错误响应"""
+        if self.timeout_rate and random.random() < self.timeout_rate:
+            await asyncio.sleep(self.timeout_ms / 1000)
+        else:
+            await asyncio.sleep(self.sample_latency_ms() / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            return JSONResponse(
+                status_code=self.error_status,
+                content={"error": {"message": "Simulated failure", "code": 2, "type": "FakeServerError"}}
+            )
+        return None
+
+
+@dataclass
+class FakeServerState:
+    """请求计数和已发送消息记录（供压测驱动关联端到端延迟）"""
+    counters: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    _ids: Any = field(default_factory=lambda: itertools.count(1))
+
+    def count(self, name: str, failed: bool = False):
+        target = self.errors if failed else self.counters
+        target[name] = target.get(name, 0) + 1
+
+    def record_event(self, kind: str, **data) -> int:
+        event_id = next(self._ids)
+        self.events.append({"id": event_id, "kind": kind, "time": time.time(), **data})
+        return event_id
+
+
+DEFAULT_PROFILES = {
+    "graph": ServiceProfile(latency_ms=120, jitter_ms=40, dist="lognormal"),
+    "openai": ServiceProfile(latency_ms=900, jitter_ms=300, dist="lognormal"),
+    "telegram": ServiceProfile(latency_ms=150, jitter_ms=50, dist="lognormal"),
+}
+
+FAKE_REPLY = (
+    "Thanks for your message! Our iPhone plans start from a low monthly payment. "
+    "Which model and storage are you interested in?"
+)
+
+
+def create_fake_app(
+    profiles: Optional[Dict[str, ServiceProfile]] = None,
+    state: Optional[FakeServerState] = None
+) -> FastAPI:
+    """
+    创建模拟服务应用
+
+    Args:
+        profiles: 各服务的延迟/错误配置（graph、openai、telegram）
+        state: 共享状态（同进程运行压测驱动时传入）
+    """
+    profiles = {**DEFAULT_PROFILES, **(profiles or {})}
+    state = state or FakeServerState()
+    app = FastAPI(title="Load test fake APIs")
+    app.state.fake = state
+
+    async def simulate(service: str, name: str) -> Optional[JSONResponse]:
+        error = await profiles[service].apply()
+        state.count(name, failed=error is not None)
+        return error
+
+    @app.post("/graph/{version}/{node}/messages")
+    async def graph_send_message(version: str, node: str, request: Request):
+        body = await request.json()
+        error = await simulate("graph", "graph.send_message")
+        if error:
+            return error
+        recipient_id = body.get("recipient", {}).get("id")
+        event_id = state.record_event(
+            "graph.send_message",
+            recipient_id=recipient_id,
+            text=body.get("message", {}).get("text", "")
+        )
+        return {"recipient_id": recipient_id, "message_id": f"m_fake_{event_id}"}
+
+    @app.post("/graph/{version}/{node}/comments")
+    async def graph_comment(version: str, node: str, request: Request):
+        body = await request.json()
+        error = await simulate("graph", "graph.comment")
+        if error:
+            return error
+        event_id = state.record_event("graph.comment", post_id=node, text=body.get("message", ""))
+        return {"id": f"{node}_fake_{event_id}"}
+
+    @app.get("/graph/{version}/{node}")
+    async def graph_profile(version: str, node: str):
+        error = await simulate("graph", "graph.profile")
+        if error:
+            return error
+        return {
+            "id": node,
+            "name": f"Load Test {node[-4:]}",
+            "first_name": "Load",
+            "last_name": f"Test {node[-4:]}",
+            "username": f"loadtest_{node[-6:]}",
+            "profile_pic": ""
+        }
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat_completions(request: Request):
+        body = await request.json()
+        error = await simulate("openai", "openai.chat_completions")
+        if error:
+            return error
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        completion_tokens = len(FAKE_REPLY) // 4
+        return {
+            "id": f"chatcmpl-fake-{state.record_event('openai.chat_completions')}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": FAKE_REPLY},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    @app.post("/telegram/bot{token}/sendMessage")
+    async def telegram_send_message(token: str, request: Request):
+        body = await request.json()
+        error = await simulate("telegram", "telegram.send_message")
+        if error:
+            return error
+        event_id = state.record_event("telegram.send_message", chat_id=body.get("chat_id"))
+        return {"ok": True, "result": {"message_id": event_id, "chat": {"id": body.get("chat_id")}}}
+
+    @app.get("/_stats")
+    async def stats():
+        return {"requests": state.counters, "errors": state.errors, "events": len(state.events)}
+
+    @app.get("/_events")
+    async def events(after: int = 0, kind: Optional[str] = None):
+        """返回 id 大于 after 的事件（压测驱动轮询）"""
+        selected = [
+            event for event in state.events
+            if event["id"] > after and (kind is None or event["kind"] == kind)
+        ]
+        return {"events": selected}
+
+    return app
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """添加各服务的延迟/错误配置参数"""
+    for service in DEFAULT_PROFILES:
+        parser.add_argument(
+            f"--{service}",
+            default=None,
+            help=f"{service} profile, e.g. \"latency=80,jitter=20,dist=lognormal,error_rate=0.01\""
+        )
+
+
+def profiles_from_args(args: argparse.Namespace) -> Dict[str, ServiceProfile]:
+    return {
+        service: ServiceProfile.parse(getattr(args, service), default)
+        for service, default in DEFAULT_PROFILES.items()
+    }
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local stand-ins for Graph, OpenAI and Telegram APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_fake_app(profiles_from_args(args))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Webhook 回放压测驱动
+
+按目标速率向应用的 /webhook 发送录制的或合成的 Webhook 请求，并报告：
+- 吞吐量（Webhook 确认速率、回复速率）
+- Webhook 确认延迟和端到端延迟（请求发出 → 模拟 Graph 服务收到回复）的 p50/p95/p99
+- 各处理器耗时（来自应用 /metrics 的 pipeline_latency）
+- 每条消息的数据库查询数（来自应用 /metrics 的 database）
+
+用法（模拟服务在同一进程中启动）：
+    python scripts/loadtest/replay.py --target http://127.0.0.1:8000 --with-fakes \\
+        --rate 20 --count 1000 --senders 200 --output reports/release-x.json
+
+录制的 Webhook 请求体为 JSONL 文件（每行一个请求体），通过 --payloads 指定；
+默认会改写其中的消息ID，避免被去重逻辑丢弃（--keep-ids 保留原ID）。
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent))
+from fake_servers import FakeServerState, add_profile_arguments, create_fake_app, profiles_from_args  # noqa: E402
+
+SYNTHETIC_TEXTS = [
+    "hi", "hello", "iphone 13", "iphone 15 pro max 256gb", "how much?",
+    "how much per month?", "is this legit?", "what do I need to apply?",
+    "can I use my id card?", "price for iphone 14?", "interest rate?",
+    "I want to apply", "ok", "thanks", "where are you located?"
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "avg_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p95_ms": round(percentile(values, 0.95), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(max(values), 2) if values else 0.0
+    }
+
+
+def synthetic_payload(page_id: str, sender_id: str, text: str) -> Dict[str, Any]:
+    """生成 Messenger 私信 Webhook 请求体"""
+    now_ms = int(time.time() * 1000)
+    return {
+        "object": "page",
+        "entry": [{
+            "id": page_id,
+            "time": now_ms,
+            "messaging": [{
+                "sender": {"id": sender_id},
+                "recipient": {"id": page_id},
+                "timestamp": now_ms,
+                "message": {"mid": f"m_loadtest_{uuid.uuid4().hex}", "text": text}
+            }]
+        }]
+    }
+
+
+def load_payloads(path: Path, keep_ids: bool) -> List[Dict[str, Any]]:
+    """读取录制的 Webhook 请求体（JSONL）"""
+    payloads = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                payloads.append(json.loads(line))
+    if not keep_ids:
+        for payload in payloads:
+            for entry in payload.get("entry", []):
+                for event in entry.get("messaging", []):
+                    if "message" in event and "mid" in event["message"]:
+                        event["message"]["mid"] = f"{event['message']['mid']}_{uuid.uuid4().hex[:8]}"
+    return payloads
+
+
+def payload_senders(payload: Dict[str, Any]) -> List[str]:
+    """提取请求体中所有私信的发送者（用于关联回复）"""
+    senders = []
+    for entry in payload.get("entry", []):
+        for event in entry.get("messaging", []):
+            sender_id = event.get("sender", {}).get("id")
+            if sender_id and "message" in event and not event["message"].get("is_echo"):
+                senders.append(sender_id)
+    return senders
+
+
+class ReplayDriver:
+    """按目标速率发送 Webhook，并根据模拟 Graph 服务收到的回复计算端到端延迟"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.pending: Dict[str, List[float]] = {}  # sender_id -> 尚未收到回复的消息发送时间
+        self.ack_latencies: List[float] = []
+        self.e2e_latencies: List[float] = []
+        self.status_counts: Dict[str, int] = {}
+        self.sent_messages = 0
+        self.replies = 0
+        self.last_event_id = 0
+
+    def build_payloads(self) -> List[Dict[str, Any]]:
+        args = self.args
+        if args.payloads:
+            recorded = load_payloads(Path(args.payloads), args.keep_ids)
+            return [recorded[i % len(recorded)] for i in range(args.count)]
+
+        senders = [f"loadtest_{args.page_id}_{i}" for i in range(args.senders)]
+        return [
+            synthetic_payload(args.page_id, random.choice(senders), random.choice(SYNTHETIC_TEXTS))
+            for _ in range(args.count)
+        ]
+
+    async def post_one(self, client: httpx.AsyncClient, payload: Dict[str, Any]):
+        senders = payload_senders(payload)
+        posted_at = time.time()
+        for sender_id in senders:
+            self.pending.setdefault(sender_id, []).append(posted_at)
+        self.sent_messages += len(senders)
+
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"{self.args.target}{self.args.path}", json=payload)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.ack_latencies.append((time.perf_counter() - started) * 1000)
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    async def poll_replies(self, client: httpx.AsyncClient):
+        """拉取模拟 Graph 服务收到的新回复，关联到对应发送者的未回复消息"""
+        response = await client.get(
+            f"{self.args.fake_url}/_events",
+            params={"after": self.last_event_id, "kind": "graph.send_message"}
+        )
+        response.raise_for_status()
+        for event in response.json()["events"]:
+            self.last_event_id = max(self.last_event_id, event["id"])
+            self.replies += 1
+            waiting = self.pending.get(event.get("recipient_id"), [])
+            # 一次回复可能对应合并窗口中的多条消息
+            answered = [posted_at for posted_at in waiting if posted_at <= event["time"]]
+            for posted_at in answered:
+                self.e2e_latencies.append((event["time"] - posted_at) * 1000)
+            self.pending[event.get("recipient_id")] = [p for p in waiting if p > event["time"]]
+
+    async def fetch_app_metrics(self, client: httpx.AsyncClient) -> Dict[str, Any]:
+        try:
+            response = await client.get(f"{self.args.target}/metrics")
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"warning: failed to read {self.args.target}/metrics: {e}", file=sys.stderr)
+            return {}
+
+    async def run(self) -> Dict[str, Any]:
+        args = self.args
+        payloads = self.build_payloads()
+        limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            await self.poll_replies(client)  # 跳过压测前已有的事件
+            before = await self.fetch_app_metrics(client)
+
+            started = time.perf_counter()
+            tasks = []
+            for index, payload in enumerate(payloads):
+                # 开环发送：按计划时间发出，不等待前一个请求完成
+                delay = started + index / args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.post_one(client, payload)))
+                if index % 50 == 0:
+                    await self.poll_replies(client)
+            await asyncio.gather(*tasks)
+            send_seconds = time.perf_counter() - started
+
+            # 等待管道处理完剩余消息
+            drain_deadline = time.perf_counter() + args.drain_timeout
+            while time.perf_counter() < drain_deadline:
+                await self.poll_replies(client)
+                if not any(self.pending.values()):
+                    break
+                await asyncio.sleep(0.5)
+            total_seconds = time.perf_counter() - started
+
+            after = await self.fetch_app_metrics(client)
+
+        return self.build_report(send_seconds, total_seconds, before, after)
+
+    def build_report(
+        self,
+        send_seconds: float,
+        total_seconds: float,
+        before: Dict[str, Any],
+        after: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        messages = max(self.sent_messages, 1)
+        db_before = before.get("database", {})
+        db_after = after.get("database", {})
+        query_types = set(db_before.get("by_type", {})) | set(db_after.get("by_type", {}))
+
+        return {
+            "config": {
+                "target": self.args.target,
+                "rate": self.args.rate,
+                "requests": len(self.ack_latencies),
+                "messages": self.sent_messages,
+                "payloads": self.args.payloads or "synthetic"
+            },
+            "throughput": {
+                "webhook_requests_per_second": round(len(self.ack_latencies) / send_seconds, 2) if send_seconds else 0,
+                "replies_per_second": round(self.replies / total_seconds, 2) if total_seconds else 0,
+                "replies": self.replies,
+                "unanswered_messages": sum(len(waiting) for waiting in self.pending.values())
+            },
+            "http_status": self.status_counts,
+            "webhook_ack_latency": latency_summary(self.ack_latencies),
+            "end_to_end_latency": latency_summary(self.e2e_latencies),
+            "stages": stage_deltas(before, after),
+            "database": {
+                "queries": db_after.get("queries", 0) - db_before.get("queries", 0),
+                "queries_per_message": round(
+                    (db_after.get("queries", 0) - db_before.get("queries", 0)) / messages, 2
+                ),
+                "by_type": {
+                    name: db_after.get("by_type", {}).get(name, 0) - db_before.get("by_type", {}).get(name, 0)
+                    for name in sorted(query_types)
+                }
+            }
+        }
+
+
+def stage_deltas(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """由压测前后的 pipeline_latency 直方图计算本次压测中各处理器的调用次数和平均耗时"""
+    def totals(metrics: Dict[str, Any]) -> Dict[str, Tuple[int, float]]:
+        result: Dict[str, Tuple[int, float]] = {}
+        for processor, platforms in metrics.get("pipeline_latency", {}).get("processors", {}).items():
+            count, total = 0, 0.0
+            for statuses in platforms.values():
+                for histogram in statuses.values():
+                    count += histogram["count"]
+                    total += histogram["sum_ms"]
+            result[processor] = (count, total)
+        return result
+
+    before_totals, after_totals = totals(before), totals(after)
+    processors = after.get("pipeline_latency", {}).get("processors", {})
+    stages = {}
+    for processor, (count, total) in after_totals.items():
+        prev_count, prev_total = before_totals.get(processor, (0, 0.0))
+        calls = count - prev_count
+        if calls <= 0:
+            continue
+        p95 = max(
+            (histogram["p95_ms"] for statuses in processors[processor].values() for histogram in statuses.values()),
+            default=0
+        )
+        stages[processor] = {
+            "calls": calls,
+            "avg_ms": round((total - prev_total) / calls, 2),
+            "p95_ms_cumulative": p95
+        }
+    return stages
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    """打印报告（提供基线报告时显示变化）"""
+    def line(label: str, value: float, path: Tuple[str, ...], unit: str = ""):
+        text = f"  {label:<32}{value:>12}{unit}"
+        if baseline is not None:
+            base = baseline
+            for key in path:
+                base = base.get(key, {}) if isinstance(base, dict) else {}
+            if isinstance(base, (int, float)) and base:
+                text += f"   ({(value - base) / base * 100:+.1f}% vs baseline {base})"
+        print(text)
+
+    throughput = report["throughput"]
+    print("Throughput")
+    line("webhook requests/s", throughput["webhook_requests_per_second"], ("throughput", "webhook_requests_per_second"))
+    line("replies/s", throughput["replies_per_second"], ("throughput", "replies_per_second"))
+    line("unanswered messages", throughput["unanswered_messages"], ("throughput", "unanswered_messages"))
+    print(f"  HTTP status: {report['http_status']}")
+
+    for section, title in (("webhook_ack_latency", "Webhook ack latency"), ("end_to_end_latency", "End-to-end latency")):
+        print(title)
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            line(key, report[section][key], (section, key), " ms")
+
+    print("Per-stage time (this run)")
+    for processor, stage in sorted(report["stages"].items(), key=lambda item: -item[1]["avg_ms"]):
+        line(f"{processor} avg ({stage['calls']} calls)", stage["avg_ms"], ("stages", processor, "avg_ms"), " ms")
+
+    print("Database")
+    line("queries per message", report["database"]["queries_per_message"], ("database", "queries_per_message"))
+    print(f"  by type: {report['database']['by_type']}")
+
+
+async def start_fakes(args: argparse.Namespace):
+    """在当前进程中启动模拟服务"""
+    import uvicorn
+
+    app = create_fake_app(profiles_from_args(args), FakeServerState())
+    host, _, port = args.fake_url.replace("http://", "").partition(":")
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=int(port or 80), log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def main_async(args: argparse.Namespace):
+    fakes = await start_fakes(args) if args.with_fakes else None
+    try:
+        report = await ReplayDriver(args).run()
+    finally:
+        if fakes:
+            server, task = fakes
+            server.should_exit = True
+            await task
+
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    print_report(report, baseline)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Report written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay webhook traffic against the app at a target rate")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="App base URL")
+    parser.add_argument("--path", default="/webhook", help="Webhook path")
+    parser.add_argument("--rate", type=float, default=10.0, help="Webhook requests per second")
+    parser.add_argument("--count", type=int, default=500, help="Number of webhook requests")
+    parser.add_argument("--senders", type=int, default=100, help="Distinct synthetic senders")
+    parser.add_argument("--page-id", default="loadtest_page", help="Page ID for synthetic payloads")
+    parser.add_argument("--payloads", help="JSONL file with recorded webhook bodies")
+    parser.add_argument("--keep-ids", action="store_true", help="Do not rewrite message IDs of recorded payloads")
+    parser.add_argument("--connections", type=int, default=100, help="Max concurrent HTTP connections")
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP timeout (seconds)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="Seconds to wait for outstanding replies")
+    parser.add_argument("--fake-url", default="http://127.0.0.1:9100", help="Fake API server URL")
+    parser.add_argument("--with-fakes", action="store_true", help="Start the fake API server in this process")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    add_profile_arguments(parser)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
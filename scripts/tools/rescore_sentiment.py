@@ -0,0 +1,108 @@
+"""
+按当前情感词典重新评估历史对话
+
+分批读取对话内容，用 sentiment_scorer.score_many 批量评分（numpy 矩阵运算），
+统计负面/正面消息数量；--apply 时把负面情绪、未被过滤、优先级低于 high 的对话提升为 high
+（与 FilterEngine 中 sentiment_filter.priority_negative 的规则一致）。
+
+用法：
+    python scripts/tools/rescore_sentiment.py --days 90
+    python scripts/tools/rescore_sentiment.py --days 90 --apply
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.database.database import SessionLocal
+from src.database.models import Conversation, Priority
+from src.collector.filter_engine import filter_rules
+from src.collector.sentiment_scorer import sentiment_scorer
+
+# 负面情绪时可以提升为 high 的优先级
+RAISABLE_PRIORITIES = [Priority.LOW.value, Priority.MEDIUM.value]
+
+
+def rescore(db, since: Optional[datetime], batch_size: int = 50000, apply: bool = False) -> Dict[str, Any]:
+    """
+    重新评估对话情感
+
+    Args:
+        db: 数据库会话
+        since: 只处理该时间之后收到的对话（为空时处理全部）
+        batch_size: 每批读取的对话数
+        apply: 是否写回提升后的优先级
+
+    Returns:
+        统计结果
+    """
+    rules = filter_rules.rules
+    raise_negative = rules.sentiment_filter_enabled and rules.priority_negative
+    stats = {"scanned": 0, "negative": 0, "positive": 0, "raised": 0, "seconds": 0.0}
+    start = time.perf_counter()
+
+    last_id = 0
+    while True:
+        query = db.query(
+            Conversation.id, Conversation.content, Conversation.priority, Conversation.filtered
+        ).filter(Conversation.id > last_id)
+        if since is not None:
+            query = query.filter(Conversation.received_at >= since)
+        batch = query.order_by(Conversation.id).limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        ids = np.fromiter((row.id for row in batch), dtype=np.int64, count=len(batch))
+        priorities = np.array([row.priority.value if row.priority else Priority.LOW.value for row in batch])
+        filtered = np.fromiter((bool(row.filtered) for row in batch), dtype=bool, count=len(batch))
+
+        scores = sentiment_scorer.score_many([row.content for row in batch])
+        negative = scores.is_negative
+        stats["scanned"] += len(batch)
+        stats["negative"] += int(negative.sum())
+        stats["positive"] += int(scores.is_positive.sum())
+
+        if raise_negative:
+            raise_ids = ids[negative & ~filtered & np.isin(priorities, RAISABLE_PRIORITIES)].tolist()
+            stats["raised"] += len(raise_ids)
+            if apply and raise_ids:
+                db.query(Conversation).filter(Conversation.id.in_(raise_ids)).update(
+                    {Conversation.priority: Priority.HIGH}, synchronize_session=False
+                )
+                db.commit()
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按当前情感词典重新评估历史对话")
+    parser.add_argument("--days", type=int, default=90, help="处理最近多少天的对话（0 表示全部）")
+    parser.add_argument("--batch-size", type=int, default=50000, help="每批读取的对话数")
+    parser.add_argument("--apply", action="store_true", help="写回提升后的优先级（默认只统计）")
+    args = parser.parse_args()
+
+    since = datetime.now(timezone.utc) - timedelta(days=args.days) if args.days > 0 else None
+    db = SessionLocal()
+    try:
+        stats = rescore(db, since, batch_size=args.batch_size, apply=args.apply)
+    finally:
+        db.close()
+
+    for key, value in stats.items():
+        print(f"{key:>10}: {value}")
+    if not args.apply and stats["raised"]:
+        print(f"加 --apply 把 {stats['raised']} 条负面对话的优先级提升为 high")
+
+
+if __name__ == "__main__":
+    main()
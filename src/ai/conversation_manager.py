@@ -1,8 +1,11 @@
 """对话上下文管理"""
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from src.database.models import Conversation, Customer, Platform
-from src.database.database import get_db
+from src.database.database import get_db, insert_or_ignore
+from src.ai.conversation_state import ConversationState, conversation_states
+from src.ai.history_buffer import BufferedTurn, history_buffer, turns_to_history
 
 
 class ConversationManager:
@@ -26,39 +29,48 @@ class ConversationManager:
         Returns:
             对话历史列表
         """
+        # 稳定状态下直接从进程内缓冲读取
+        history = history_buffer.get(customer_id, limit)
+        if history is not None:
+            return history
+        
+        # 首次读取：按缓冲容量加载最近的对话（limit 超过缓冲容量时只查询不缓冲）
+        load_limit = max(limit, history_buffer.turns_per_customer)
         conversations = self.db.query(Conversation)\
             .filter(Conversation.customer_id == customer_id)\
             .order_by(Conversation.created_at.desc())\
-            .limit(limit)\
+            .limit(load_limit)\
             .all()
         
-        from datetime import timezone
+        turns = [self._buffered_turn(conv) for conv in reversed(conversations)]  # 按时间正序
+        if load_limit == history_buffer.turns_per_customer:
+            history_buffer.load(customer_id, turns)
         
-        history = []
-        for conv in reversed(conversations):  # 按时间正序
-            # 确保时间有时区信息
-            received_at = conv.received_at
-            if received_at and received_at.tzinfo is None:
-                received_at = received_at.replace(tzinfo=timezone.utc)
-            
-            history.append({
-                "role": "user",
-                "content": conv.content,
-                "timestamp": received_at.isoformat() if received_at else None
-            })
-            
-            if conv.ai_replied and conv.ai_reply_content:
-                ai_reply_at = conv.ai_reply_at
-                if ai_reply_at and ai_reply_at.tzinfo is None:
-                    ai_reply_at = ai_reply_at.replace(tzinfo=timezone.utc)
-                
-                history.append({
-                    "role": "assistant",
-                    "content": conv.ai_reply_content,
-                    "timestamp": ai_reply_at.isoformat() if ai_reply_at else None
-                })
-        
-        return history
+        return turns_to_history(turns[-limit:] if limit > 0 else [])
+    
+    @staticmethod
+    def _buffered_turn(conv: Conversation) -> BufferedTurn:
+        """对话记录转换为缓冲中的一轮对话"""
+        replied = conv.ai_replied and conv.ai_reply_content
+        return BufferedTurn(
+            conversation_id=conv.id,
+            content=conv.content,
+            received_at=conv.received_at,
+            ai_reply_content=conv.ai_reply_content if replied else None,
+            ai_reply_at=conv.ai_reply_at if replied else None
+        )
+    
+    def get_conversation_state(self, customer_id: int) -> ConversationState:
+        """
+        获取客户对话状态（AI回复数、是否已发送 Telegram 链接、对话阶段等）
+        
+        Args:
+            customer_id: 客户 ID
+        
+        Returns:
+            对话状态快照
+        """
+        return conversation_states.get(self.db, customer_id)
     
     def save_conversation(
         self,
@@ -85,6 +97,80 @@ class ConversationManager:
         Returns:
             创建的对话记录
         """
+        conversation = Conversation(**self._conversation_values(
+            customer_id, platform_message_id, facebook_message_id,
+            platform, message_type, content, raw_data
+        ))
+        
+        self.db.add(conversation)
+        self.db.commit()
+        self.db.refresh(conversation)
+        
+        conversation_states.record_inbound(self.db, customer_id, conversation.received_at)
+        history_buffer.append(customer_id, self._buffered_turn(conversation))
+        
+        return conversation
+    
+    def save_conversation_if_new(
+        self,
+        customer_id: int,
+        platform_message_id: str = None,
+        facebook_message_id: str = None,
+        platform: str = "facebook",
+        message_type: str = None,
+        content: str = None,
+        raw_data: Dict[str, Any] = None,
+        received_at: datetime = None
+    ) -> Tuple[Conversation, bool]:
+        """
+        保存对话记录，同一平台消息已保存过时返回已有记录
+        
+        依赖 (platform, platform_message_id) 唯一约束做 INSERT ... ON CONFLICT DO NOTHING，
+        并发重投或扫描同步时也只会保存一次。
+        
+        Args:
+            同 save_conversation
+            received_at: 消息的实际接收时间（扫描同步历史消息时传入，默认为当前时间）
+        
+        Returns:
+            (对话记录, 是否为新保存)
+        """
+        values = self._conversation_values(
+            customer_id, platform_message_id, facebook_message_id,
+            platform, message_type, content, raw_data
+        )
+        if received_at is not None:
+            values["received_at"] = received_at
+        inserted_ids = insert_or_ignore(
+            self.db, Conversation, [values], ["platform", "platform_message_id"]
+        )
+        self.db.commit()
+        
+        if inserted_ids:
+            conversation = self.db.get(Conversation, inserted_ids[0])
+            conversation_states.record_inbound(self.db, customer_id, conversation.received_at)
+            history_buffer.append(customer_id, self._buffered_turn(conversation))
+            return conversation, True
+        
+        existing = self.db.query(Conversation)\
+            .filter(
+                Conversation.platform == values["platform"],
+                Conversation.platform_message_id == values["platform_message_id"]
+            )\
+            .first()
+        return existing, False
+    
+    @staticmethod
+    def _conversation_values(
+        customer_id: int,
+        platform_message_id: Optional[str],
+        facebook_message_id: Optional[str],
+        platform: Optional[str],
+        message_type: Optional[str],
+        content: Optional[str],
+        raw_data: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """构建对话记录字段"""
         # 使用platform_message_id或facebook_message_id
         msg_id = platform_message_id or facebook_message_id
         
@@ -95,21 +181,15 @@ class ConversationManager:
         except (KeyError, AttributeError):
             platform_enum = Platform.FACEBOOK  # 默认值
         
-        conversation = Conversation(
-            customer_id=customer_id,
-            platform_message_id=msg_id,
-            facebook_message_id=facebook_message_id or msg_id,  # 兼容字段
-            platform=platform_enum,
-            message_type=message_type,
-            content=content,
-            raw_data=raw_data
-        )
-        
-        self.db.add(conversation)
-        self.db.commit()
-        self.db.refresh(conversation)
-        
-        return conversation
+        return {
+            "customer_id": customer_id,
+            "platform_message_id": msg_id,
+            "facebook_message_id": facebook_message_id or msg_id,  # 兼容字段
+            "platform": platform_enum,
+            "message_type": message_type,
+            "content": content,
+            "raw_data": raw_data
+        }
     
     def update_ai_reply(
         self,
@@ -131,13 +211,23 @@ class ConversationManager:
             .first()
         
         if conversation:
+            already_replied = bool(conversation.ai_replied and conversation.ai_reply_content)
             conversation.ai_replied = True
             conversation.ai_reply_content = reply_content
-            from datetime import datetime, timezone
             conversation.ai_reply_at = datetime.now(timezone.utc)  # 使用UTC时区
             
             self.db.commit()
             self.db.refresh(conversation)
+            
+            history_buffer.set_reply(
+                conversation.customer_id, conversation.id, reply_content, conversation.ai_reply_at
+            )
+            
+            # 同一条消息重复更新回复时不重复计数
+            if not already_replied:
+                conversation_states.record_outbound(
+                    self.db, conversation.customer_id, reply_content, conversation.ai_reply_at
+                )
         
         return conversation
     
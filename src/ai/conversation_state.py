@@ -0,0 +1,298 @@
+"""客户对话状态 - 增量维护的AI回复数、Telegram链接发送情况和对话阶段"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from sqlalchemy import case, func, literal
+from sqlalchemy.orm import Session
+from src.config import settings
+from src.database.database import insert_or_ignore
+from src.database.models import Conversation, ConversationStage, CustomerConversationState
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 前几轮（AI回复数少于该值）使用预设回复
+PRESET_REPLY_LIMIT = 3
+
+
+@dataclass(frozen=True)
+class ConversationState:
+    """客户对话状态快照"""
+    customer_id: int
+    ai_reply_count: int = 0
+    telegram_link_sent: bool = False
+    stage: ConversationStage = ConversationStage.NEW
+    last_inbound_at: Optional[datetime] = None
+    last_outbound_at: Optional[datetime] = None
+
+    @classmethod
+    def from_row(cls, row: CustomerConversationState) -> "ConversationState":
+        return cls(
+            customer_id=row.customer_id,
+            ai_reply_count=row.ai_reply_count or 0,
+            telegram_link_sent=bool(row.telegram_link_sent),
+            stage=row.stage or stage_for(row.ai_reply_count or 0),
+            last_inbound_at=_as_utc(row.last_inbound_at),
+            last_outbound_at=_as_utc(row.last_outbound_at)
+        )
+
+
+def stage_for(ai_reply_count: int) -> ConversationStage:
+    """按AI回复数确定对话阶段"""
+    if ai_reply_count <= 0:
+        return ConversationStage.NEW
+    if ai_reply_count < PRESET_REPLY_LIMIT:
+        return ConversationStage.EARLY
+    return ConversationStage.ONGOING
+
+
+def telegram_link_keywords() -> List[str]:
+    """
+    判断回复中包含 Telegram 群组链接的关键词
+
+    除通用关键词外，还包含配置的群组链接/名称及其中的群组标识
+    （如 https://t.me/+abc123 中的 +abc123 和 abc123）。
+    """
+    from src.config import yaml_config
+    telegram_config = yaml_config.get("telegram_groups", {})
+    main_group = telegram_config.get("main_group", "@your_group")
+
+    keywords = ["t.me", "telegram", "telegram group", "telegram群组", "join our telegram"]
+    if main_group and main_group != "@your_group":
+        keywords.append(main_group.lower())
+        if "t.me" in main_group.lower():
+            if "/" in main_group:
+                group_id = main_group.split("/")[-1].lower()
+                keywords.append(group_id)
+                if group_id.startswith("+"):
+                    keywords.append(group_id[1:])
+        elif "@" in main_group:
+            keywords.append(main_group.replace("@", "").lower())
+    return [keyword for keyword in keywords if keyword]
+
+
+def contains_telegram_link(reply: Optional[str]) -> bool:
+    """回复中是否包含 Telegram 群组链接"""
+    if not reply:
+        return False
+    reply_lower = reply.lower()
+    return any(keyword in reply_lower for keyword in telegram_link_keywords())
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class ConversationStateStore:
+    """
+    客户对话状态存储（数据库表 + 进程内 LRU 缓存）
+
+    ConversationManager 保存消息和AI回复时增量更新状态，生成回复时读取状态是 O(1)，
+    不再扫描对话历史。计数用 UPDATE ... SET x = x + 1 在数据库中累加，多个进程同时
+    写入也不会丢失；进程内缓存只在本进程写入时同步，其他进程的写入在缓存淘汰后可见。
+    还没有状态记录的老客户在首次读取时由对话历史重建一次。
+    """
+
+    def __init__(self, capacity: Optional[int] = None):
+        """
+        初始化状态存储
+
+        Args:
+            capacity: 进程内最多缓存的客户数
+        """
+        self.capacity = max(1, capacity or settings.conversation_state_cache_size)
+        self._cache: "OrderedDict[int, ConversationState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 指标
+        self.hit_count = 0
+        self.miss_count = 0
+        self.rebuild_count = 0
+
+    def get(self, db: Session, customer_id: int) -> ConversationState:
+        """
+        获取客户对话状态
+
+        Args:
+            db: 数据库会话
+            customer_id: 客户ID
+
+        Returns:
+            对话状态快照
+        """
+        with self._lock:
+            state = self._cache.get(customer_id)
+            if state is not None:
+                self._cache.move_to_end(customer_id)
+                self.hit_count += 1
+                return state
+            self.miss_count += 1
+
+        row = db.get(CustomerConversationState, customer_id)
+        state = ConversationState.from_row(row) if row else self._rebuild(db, customer_id)
+        self._remember(state)
+        return state
+
+    def record_inbound(self, db: Session, customer_id: int, received_at: Optional[datetime] = None):
+        """
+        记录客户发来的消息（在消息保存并提交后调用）
+
+        Args:
+            db: 数据库会话
+            customer_id: 客户ID
+            received_at: 消息接收时间
+        """
+        received_at = _as_utc(received_at) or datetime.now(timezone.utc)
+        model = CustomerConversationState
+        updated = db.query(model)\
+            .filter(model.customer_id == customer_id)\
+            .update({
+                model.last_inbound_at: case(
+                    (model.last_inbound_at.is_(None) | (model.last_inbound_at < received_at), received_at),
+                    else_=model.last_inbound_at
+                )
+            }, synchronize_session=False)
+
+        if not updated:
+            # 还没有状态记录：由对话历史重建（已包含刚保存的消息）
+            self._remember(self._rebuild(db, customer_id))
+            return
+
+        db.commit()
+        self._update_cached(customer_id, lambda state: replace(
+            state,
+            last_inbound_at=max(filter(None, [_as_utc(state.last_inbound_at), received_at]))
+        ))
+
+    def record_outbound(
+        self,
+        db: Session,
+        customer_id: int,
+        reply_content: str,
+        replied_at: Optional[datetime] = None
+    ):
+        """
+        记录发送给客户的AI回复（在回复保存并提交后调用）
+
+        Args:
+            db: 数据库会话
+            customer_id: 客户ID
+            reply_content: 回复内容
+            replied_at: 回复时间
+        """
+        replied_at = _as_utc(replied_at) or datetime.now(timezone.utc)
+        link_sent = contains_telegram_link(reply_content)
+        model = CustomerConversationState
+
+        values = {
+            model.ai_reply_count: model.ai_reply_count + 1,
+            model.stage: case(
+                (model.ai_reply_count + 1 >= PRESET_REPLY_LIMIT,
+                 literal(ConversationStage.ONGOING, model.stage.type)),
+                else_=literal(ConversationStage.EARLY, model.stage.type)
+            ),
+            model.last_outbound_at: replied_at
+        }
+        if link_sent:
+            values[model.telegram_link_sent] = True
+
+        updated = db.query(model)\
+            .filter(model.customer_id == customer_id)\
+            .update(values, synchronize_session=False)
+
+        if not updated:
+            self._remember(self._rebuild(db, customer_id))
+            return
+
+        db.commit()
+        self._update_cached(customer_id, lambda state: replace(
+            state,
+            ai_reply_count=state.ai_reply_count + 1,
+            stage=stage_for(state.ai_reply_count + 1),
+            telegram_link_sent=state.telegram_link_sent or link_sent,
+            last_outbound_at=replied_at
+        ))
+
+    def _rebuild(self, db: Session, customer_id: int) -> ConversationState:
+        """由对话历史重建状态并保存（每个客户只发生一次）"""
+        self.rebuild_count += 1
+
+        last_inbound_at, last_outbound_at = db.query(
+            func.max(Conversation.received_at),
+            func.max(Conversation.ai_reply_at)
+        ).filter(Conversation.customer_id == customer_id).one()
+
+        replies = [
+            content for (content,) in db.query(Conversation.ai_reply_content)
+            .filter(
+                Conversation.customer_id == customer_id,
+                Conversation.ai_replied == True,
+                Conversation.ai_reply_content.isnot(None)
+            )
+        ]
+        keywords = telegram_link_keywords()
+        ai_reply_count = len(replies)
+        state = ConversationState(
+            customer_id=customer_id,
+            ai_reply_count=ai_reply_count,
+            telegram_link_sent=any(
+                keyword in reply.lower() for reply in replies for keyword in keywords
+            ),
+            stage=stage_for(ai_reply_count),
+            last_inbound_at=_as_utc(last_inbound_at),
+            last_outbound_at=_as_utc(last_outbound_at)
+        )
+
+        # 并发重建时只保留先写入的记录
+        insert_or_ignore(db, CustomerConversationState, [{
+            "customer_id": customer_id,
+            "ai_reply_count": state.ai_reply_count,
+            "telegram_link_sent": state.telegram_link_sent,
+            "stage": state.stage,
+            "last_inbound_at": state.last_inbound_at,
+            "last_outbound_at": state.last_outbound_at
+        }], ["customer_id"])
+        db.commit()
+        return state
+
+    def _remember(self, state: ConversationState):
+        with self._lock:
+            self._cache[state.customer_id] = state
+            self._cache.move_to_end(state.customer_id)
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+
+    def _update_cached(self, customer_id: int, update):
+        """更新已缓存的状态（未缓存时下次读取会从数据库加载）"""
+        with self._lock:
+            state = self._cache.get(customer_id)
+            if state is not None:
+                self._cache[customer_id] = update(state)
+
+    def invalidate(self, customer_id: Optional[int] = None):
+        """清除缓存（customer_id 为空时清除全部）"""
+        with self._lock:
+            if customer_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(customer_id, None)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取缓存指标"""
+        lookups = self.hit_count + self.miss_count
+        return {
+            "cached_customers": len(self._cache),
+            "capacity": self.capacity,
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "hit_rate": round(self.hit_count / lookups, 4) if lookups else 0,
+            "rebuild_count": self.rebuild_count
+        }
+
+
+# 全局对话状态存储实例
+conversation_states = ConversationStateStore()
@@ -0,0 +1,203 @@
+"""对话历史缓冲 - 每个客户最近几轮对话的进程内环形缓冲（写穿）"""
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Deque, Dict, Any, List, Optional
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 每轮对话除文本外的估算内存开销（字节）
+TURN_OVERHEAD_BYTES = 200
+
+
+@dataclass
+class BufferedTurn:
+    """一轮对话（客户消息及其AI回复）"""
+    conversation_id: int
+    content: str
+    received_at: Optional[datetime]
+    ai_reply_content: Optional[str] = None
+    ai_reply_at: Optional[datetime] = None
+
+    @property
+    def size(self) -> int:
+        """估算占用的内存（字节）"""
+        return len(self.content or "") + len(self.ai_reply_content or "") + TURN_OVERHEAD_BYTES
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def turns_to_history(turns: List[BufferedTurn]) -> List[Dict[str, Any]]:
+    """对话轮次转换为历史消息列表（客户消息及其AI回复按时间正序）"""
+    history = []
+    for turn in turns:
+        history.append({
+            "role": "user",
+            "content": turn.content,
+            "timestamp": _isoformat(turn.received_at)
+        })
+        if turn.ai_reply_content:
+            history.append({
+                "role": "assistant",
+                "content": turn.ai_reply_content,
+                "timestamp": _isoformat(turn.ai_reply_at)
+            })
+    return history
+
+
+class ConversationHistoryBuffer:
+    """
+    客户对话历史的环形缓冲（跨客户 LRU，总内存有上限）
+
+    每个客户保留最近 turns_per_customer 轮对话。首次读取时从数据库加载，
+    之后由 ConversationManager 保存消息和AI回复时同步更新，稳定状态下读取历史不访问数据库。
+    进程内缓冲只反映本进程的写入；多进程部署时其他进程写入的消息在该客户被淘汰后可见。
+    """
+
+    def __init__(self, turns_per_customer: Optional[int] = None, max_bytes: Optional[int] = None):
+        """
+        初始化缓冲
+
+        Args:
+            turns_per_customer: 每个客户保留的对话轮数
+            max_bytes: 所有客户缓冲的总内存上限（估算，字节）
+        """
+        self.turns_per_customer = max(1, turns_per_customer or settings.history_buffer_turns)
+        self.max_bytes = max(1, max_bytes or settings.history_buffer_max_bytes)
+        self._buffers: "OrderedDict[int, Deque[BufferedTurn]]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        # 指标
+        self.hit_count = 0
+        self.miss_count = 0
+        self.eviction_count = 0
+
+    def get(self, customer_id: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取客户最近 limit 轮对话的历史
+
+        Args:
+            customer_id: 客户ID
+            limit: 对话轮数
+
+        Returns:
+            对话历史列表（格式同 ConversationManager.get_conversation_history），
+            未缓冲或 limit 超过缓冲容量时返回 None
+        """
+        if limit > self.turns_per_customer:
+            return None
+
+        with self._lock:
+            turns = self._buffers.get(customer_id)
+            if turns is None:
+                self.miss_count += 1
+                return None
+            self._buffers.move_to_end(customer_id)
+            self.hit_count += 1
+            selected = list(turns)[-limit:] if limit > 0 else []
+
+        return turns_to_history(selected)
+
+    def load(self, customer_id: int, turns: List[BufferedTurn]):
+        """
+        用数据库中最近的对话初始化客户的缓冲
+
+        Args:
+            customer_id: 客户ID
+            turns: 按时间正序的最近对话（最多 turns_per_customer 轮）
+        """
+        with self._lock:
+            self._drop(customer_id)
+            buffer: Deque[BufferedTurn] = deque(maxlen=self.turns_per_customer)
+            buffer.extend(turns)
+            self._buffers[customer_id] = buffer
+            self._sizes[customer_id] = sum(turn.size for turn in buffer)
+            self._total_bytes += self._sizes[customer_id]
+            self._evict()
+
+    def append(self, customer_id: int, turn: BufferedTurn):
+        """追加一轮新对话（客户未缓冲时忽略，下次读取时从数据库加载）"""
+        with self._lock:
+            buffer = self._buffers.get(customer_id)
+            if buffer is None:
+                return
+            if len(buffer) == buffer.maxlen:
+                self._resize(customer_id, -buffer[0].size)
+            buffer.append(turn)
+            self._resize(customer_id, turn.size)
+            self._evict()
+
+    def set_reply(
+        self,
+        customer_id: int,
+        conversation_id: int,
+        reply_content: str,
+        replied_at: Optional[datetime]
+    ):
+        """更新缓冲中某轮对话的AI回复（不在缓冲中时忽略）"""
+        with self._lock:
+            buffer = self._buffers.get(customer_id)
+            if buffer is None:
+                return
+            for turn in reversed(buffer):
+                if turn.conversation_id == conversation_id:
+                    old_size = turn.size
+                    turn.ai_reply_content = reply_content
+                    turn.ai_reply_at = replied_at
+                    self._resize(customer_id, turn.size - old_size)
+                    self._evict()
+                    return
+
+    def invalidate(self, customer_id: Optional[int] = None):
+        """清除缓冲（customer_id 为空时清除全部）"""
+        with self._lock:
+            if customer_id is None:
+                self._buffers.clear()
+                self._sizes.clear()
+                self._total_bytes = 0
+            else:
+                self._drop(customer_id)
+
+    def _resize(self, customer_id: int, delta: int):
+        self._sizes[customer_id] = self._sizes.get(customer_id, 0) + delta
+        self._total_bytes += delta
+
+    def _drop(self, customer_id: int):
+        if self._buffers.pop(customer_id, None) is not None:
+            self._total_bytes -= self._sizes.pop(customer_id, 0)
+
+    def _evict(self):
+        """超出内存上限时淘汰最久未使用的客户（至少保留最近使用的一个）"""
+        while self._total_bytes > self.max_bytes and len(self._buffers) > 1:
+            customer_id = next(iter(self._buffers))
+            self._drop(customer_id)
+            self.eviction_count += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取缓冲指标"""
+        lookups = self.hit_count + self.miss_count
+        return {
+            "customers": len(self._buffers),
+            "turns_per_customer": self.turns_per_customer,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "hit_rate": round(self.hit_count / lookups, 4) if lookups else 0,
+            "eviction_count": self.eviction_count
+        }
+
+
+# 全局对话历史缓冲实例
+history_buffer = ConversationHistoryBuffer()
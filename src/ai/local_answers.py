@@ -0,0 +1,358 @@
+"""本地检索回复 - OpenAI 超时或出错时，用历史上相似问题的AI回复作为兜底"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from src.config import settings
+from src.ai.reply_cache import normalize_question
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 字符 n-gram 长度（单字覆盖中文短问题，2-3 字覆盖词语和英文片段）
+NGRAM_SIZES = (1, 2, 3)
+
+# 出现在超过该比例文档中的 n-gram 不参与召回（区分度低，倒排表又最长）
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+# 粗排只使用文档频率最低（区分度最高）的若干个 n-gram
+MAX_RECALL_TERMS = 24
+
+# 粗排后精排的候选数
+RERANK_CANDIDATES = 20
+
+# 倒排表数组的初始容量
+INITIAL_POSTINGS_CAPACITY = 16
+
+
+def char_ngrams(text: str) -> Dict[str, int]:
+    """
+    提取规范化文本的字符 n-gram 及词频
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        n-gram -> 出现次数
+    """
+    normalized = normalize_question(text)
+    if not normalized:
+        return {}
+    padded = f" {normalized} "
+    counts: Dict[str, int] = {}
+    for size in NGRAM_SIZES:
+        for start in range(len(padded) - size + 1):
+            gram = padded[start:start + size]
+            if gram.strip():
+                counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+@dataclass
+class LocalAnswer:
+    """本地检索结果"""
+    question: str
+    answer: str
+    score: float
+
+
+class _Postings:
+    """
+    单个 n-gram 的倒排表
+
+    新文档先追加到 Python 列表（加入索引时开销最小），查询用到该 n-gram 时
+    再批量写入按倍数扩容的 numpy 数组。
+    """
+    __slots__ = ("doc_ids", "weights", "size", "pending_ids", "pending_weights")
+
+    def __init__(self):
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.weights = np.empty(0, dtype=np.float32)
+        self.size = 0
+        self.pending_ids: List[int] = []
+        self.pending_weights: List[float] = []
+
+    def append(self, doc_id: int, weight: float):
+        self.pending_ids.append(doc_id)
+        self.pending_weights.append(weight)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (文档ID, 词频权重) 数组视图"""
+        if self.pending_ids:
+            count = len(self.pending_ids)
+            needed = self.size + count
+            if needed > len(self.doc_ids):
+                capacity = max(needed, len(self.doc_ids) * 2, INITIAL_POSTINGS_CAPACITY)
+                self.doc_ids = np.resize(self.doc_ids, capacity)
+                self.weights = np.resize(self.weights, capacity)
+            self.doc_ids[self.size:needed] = self.pending_ids
+            self.weights[self.size:needed] = self.pending_weights
+            self.size = needed
+            self.pending_ids = []
+            self.pending_weights = []
+        return self.doc_ids[:self.size], self.weights[:self.size]
+
+
+class LocalAnswerIndex:
+    """
+    问题 → AI回复 的本地检索索引（字符 n-gram TF-IDF，余弦相似度）
+
+    - 新的问答对随时增量加入（倒排表追加，不重建索引）
+    - IDF 在查询时按当前文档频率计算，索引增长后权重自动更新
+    - 查询先用倒排表对所有文档粗排（np.bincount），再对前若干候选按完整 TF-IDF 余弦精排
+    - 同一规范化问题只保留最新的回复
+    """
+
+    def __init__(self, max_pairs: Optional[int] = None, min_score: Optional[float] = None):
+        """
+        初始化索引
+
+        Args:
+            max_pairs: 最多索引的问答对数量（超出后不再加入新问题）
+            min_score: 作为兜底回复的最低相似度（0-1）
+        """
+        self.max_pairs = max_pairs or settings.local_answers_max_pairs
+        self.min_score = settings.local_answers_min_score if min_score is None else min_score
+        self._lock = threading.RLock()
+        self._vocabulary: Dict[str, int] = {}
+        self._postings: List[_Postings] = []
+        self._document_frequency = np.zeros(0, dtype=np.int32)
+        self._doc_terms: List[Tuple[np.ndarray, np.ndarray]] = []  # 文档 -> (n-gram id, 词频权重)
+        self._questions: List[str] = []
+        self._answers: List[str] = []
+        self._doc_by_question: Dict[str, int] = {}
+        self.loaded = False
+
+        # 指标
+        self.query_count = 0
+        self.hit_count = 0
+        self.query_latencies: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def add(self, question: str, answer: str) -> bool:
+        """
+        加入一个问答对
+
+        Args:
+            question: 客户问题
+            answer: AI回复
+
+        Returns:
+            是否加入或更新了索引
+        """
+        key = normalize_question(question)
+        answer = (answer or "").strip()
+        if not key or not answer:
+            return False
+
+        with self._lock:
+            doc_id = self._doc_by_question.get(key)
+            if doc_id is not None:
+                self._answers[doc_id] = answer
+                return True
+            if len(self._answers) >= self.max_pairs:
+                return False
+
+            grams = char_ngrams(question)
+            if not grams:
+                return False
+
+            doc_id = len(self._answers)
+            term_ids = []
+            for gram in grams:
+                term_id = self._vocabulary.get(gram)
+                if term_id is None:
+                    term_id = self._vocabulary[gram] = len(self._postings)
+                    self._postings.append(_Postings())
+                term_ids.append(term_id)
+            weights = [1 + math.log(count) for count in grams.values()]
+            norm = math.sqrt(sum(weight * weight for weight in weights))
+            weights = [weight / norm for weight in weights]
+
+            for term_id, weight in zip(term_ids, weights):
+                self._postings[term_id].append(doc_id, weight)
+            self._count_documents(term_ids)
+
+            self._doc_terms.append((np.array(term_ids, dtype=np.int32), np.array(weights, dtype=np.float32)))
+            self._questions.append(question)
+            self._answers.append(answer)
+            self._doc_by_question[key] = doc_id
+            return True
+
+    def _count_documents(self, term_ids: List[int]):
+        """更新文档频率（数组按倍数扩容）"""
+        if len(self._postings) > len(self._document_frequency):
+            capacity = max(len(self._postings), len(self._document_frequency) * 2, 1024)
+            grown = np.zeros(capacity, dtype=np.int32)
+            grown[:len(self._document_frequency)] = self._document_frequency
+            self._document_frequency = grown
+        self._document_frequency[term_ids] += 1
+
+    def _idf(self, term_ids: np.ndarray, doc_count: int) -> np.ndarray:
+        return np.log((1 + doc_count) / (1 + self._document_frequency[term_ids])) + 1
+
+    def search(self, question: str) -> Optional[LocalAnswer]:
+        """
+        查找最相似的历史问题
+
+        Args:
+            question: 客户问题
+
+        Returns:
+            最相似的问答对（含相似度），索引为空或没有共同 n-gram 时返回 None
+        """
+        started = time.perf_counter()
+        try:
+            return self._search(question)
+        finally:
+            self.query_count += 1
+            self.query_latencies.append((time.perf_counter() - started) * 1000)
+            if len(self.query_latencies) > 1000:
+                self.query_latencies = self.query_latencies[-1000:]
+
+    def _search(self, question: str) -> Optional[LocalAnswer]:
+        grams = char_ngrams(question)
+        with self._lock:
+            doc_count = len(self._answers)
+            if not grams or not doc_count:
+                return None
+
+            known = sorted(
+                (self._vocabulary[gram], count) for gram, count in grams.items() if gram in self._vocabulary
+            )
+            if not known:
+                return None
+            term_ids = np.array([term_id for term_id, _ in known], dtype=np.int32)
+            query_tf = np.array([1 + math.log(count) for _, count in known], dtype=np.float32)
+            idf = self._idf(term_ids, doc_count)
+            query_weights = query_tf * idf
+            query_norm = float(np.linalg.norm(query_weights))
+
+            # 粗排：用区分度最高的若干 n-gram 的倒排表累加 (查询权重 × IDF × 文档词频权重)
+            frequencies = self._document_frequency[term_ids]
+            max_df = max(1, int(doc_count * MAX_DOCUMENT_FREQUENCY))
+            selective = [
+                i for i in np.argsort(frequencies, kind="stable")[:MAX_RECALL_TERMS].tolist()
+                if frequencies[i] <= max_df or doc_count == 1
+            ]
+            if not selective:
+                return None
+
+            doc_parts, weight_parts = [], []
+            for i in selective:
+                doc_ids, doc_weights = self._postings[int(term_ids[i])].arrays()
+                doc_parts.append(doc_ids)
+                weight_parts.append(doc_weights * float(query_weights[i] * idf[i]))
+            scores = np.bincount(
+                np.concatenate(doc_parts),
+                weights=np.concatenate(weight_parts),
+                minlength=doc_count
+            )
+            count = min(RERANK_CANDIDATES, doc_count)
+            candidates = np.argpartition(-scores, count - 1)[:count]
+            candidates = candidates[scores[candidates] > 0]
+
+            # 精排：完整 TF-IDF 余弦相似度（term_ids 已排序，用 searchsorted 对齐）
+            best_doc, best_score = -1, 0.0
+            for doc_id in candidates.tolist():
+                doc_term_ids, doc_tf = self._doc_terms[doc_id]
+                doc_weights = doc_tf * self._idf(doc_term_ids, doc_count)
+                positions = np.minimum(np.searchsorted(term_ids, doc_term_ids), len(term_ids) - 1)
+                shared = term_ids[positions] == doc_term_ids
+                dot = float(np.dot(query_weights[positions[shared]], doc_weights[shared]))
+                score = dot / (query_norm * float(np.linalg.norm(doc_weights)))
+                if score > best_score:
+                    best_doc, best_score = doc_id, score
+
+            if best_doc < 0:
+                return None
+            return LocalAnswer(
+                question=self._questions[best_doc],
+                answer=self._answers[best_doc],
+                score=round(min(best_score, 1.0), 4)
+            )
+
+    def answer(self, question: str) -> Optional[LocalAnswer]:
+        """
+        获取兜底回复（相似度不低于 min_score 时）
+
+        Args:
+            question: 客户问题
+
+        Returns:
+            检索结果，没有足够相似的历史问题时返回 None
+        """
+        result = self.search(question)
+        if result is None or result.score < self.min_score:
+            return None
+        self.hit_count += 1
+        return result
+
+    def load_from_db(self, db) -> int:
+        """
+        从数据库加载历史问答对（已回复的对话和高频问题的示例回复）
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            加入索引的问答对数量
+        """
+        from src.database.models import Conversation
+        from src.database.statistics_models import FrequentQuestion
+
+        added = 0
+        rows = db.query(Conversation.content, Conversation.ai_reply_content)\
+            .filter(Conversation.ai_replied == True, Conversation.ai_reply_content.isnot(None))\
+            .order_by(Conversation.id.desc())\
+            .limit(self.max_pairs)\
+            .all()
+        # 从旧到新加入，同一问题保留最新的回复
+        for question, answer in reversed(rows):
+            added += self.add(question, answer)
+
+        for question in db.query(FrequentQuestion).yield_per(1000):
+            samples = [s.get("response") for s in (question.sample_responses or []) if s.get("response")]
+            if samples and normalize_question(question.question_text) not in self._doc_by_question:
+                added += self.add(question.question_text, samples[-1])
+
+        self.loaded = True
+        logger.info(f"Local answer index loaded {added} question/answer pairs ({len(self)} total)")
+        return added
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._vocabulary.clear()
+            self._postings.clear()
+            self._document_frequency = np.zeros(0, dtype=np.int32)
+            self._doc_terms.clear()
+            self._questions.clear()
+            self._answers.clear()
+            self._doc_by_question.clear()
+            self.loaded = False
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取索引指标"""
+        if self.query_latencies:
+            latencies = sorted(self.query_latencies)
+            p95_ms = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        else:
+            p95_ms = 0
+        return {
+            "loaded": self.loaded,
+            "pairs": len(self),
+            "ngrams": len(self._vocabulary),
+            "min_score": self.min_score,
+            "query_count": self.query_count,
+            "hit_count": self.hit_count,
+            "p95_query_ms": round(p95_ms, 3)
+        }
+
+
+# 全局本地检索索引实例（启动时从数据库加载，AI回复生成后增量更新）
+local_answers = LocalAnswerIndex()
@@ -0,0 +1,234 @@
+"""模型路由 - 按消息的本地特征为每次回复选择模型档位（模型和 max_tokens）"""
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+from src.config import settings, yaml_config
+from src.config.page_settings import page_settings
+from src.ai.prompt_builder import estimate_tokens
+from src.ai.reply_cache import fingerprint
+from src.utils.keyword_engine import KeywordMatches
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 未配置 ai_routing 时唯一的档位（OPENAI_MODEL，回复长度与原来一致）
+DEFAULT_TIER = "default"
+DEFAULT_MAX_TOKENS = 45
+
+# 编译结果缓存的最大条目数（配置频繁变化时清空重建）
+MAX_COMPILED_TABLES = 256
+
+# 句子分隔：英文标点后须跟空白或结尾（不拆分 3.5% 之类的数字），中文标点和换行直接分隔
+_SENTENCE_SPLIT = re.compile(r"[.!?]+(?=\s|$)|[。！？\n]+")
+
+
+def count_sentences(text: str) -> int:
+    """粗略统计句子数（最后一句没有结束符时也计入）"""
+    return sum(1 for piece in _SENTENCE_SPLIT.split(text or "") if piece.strip())
+
+
+@dataclass(frozen=True)
+class RouteFeatures:
+    """路由使用的本地特征（不访问网络）"""
+    message_tokens: int
+    sentences: int
+    stage: Optional[str]
+    history_length: int
+    categories: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """模型档位"""
+    name: str
+    model: str
+    max_tokens: int
+    temperature: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """路由结果"""
+    tier: str
+    model: str
+    max_tokens: int
+    temperature: float
+    rule: Optional[int] = None  # 命中的规则序号，使用默认档位时为 None
+
+
+@dataclass
+class _Rule:
+    """一条路由规则（所有配置的条件都满足时命中）"""
+    tier: str
+    max_message_tokens: Optional[int] = None
+    min_message_tokens: Optional[int] = None
+    max_sentences: Optional[int] = None
+    min_sentences: Optional[int] = None
+    max_history: Optional[int] = None
+    min_history: Optional[int] = None
+    stages: Optional[frozenset] = None
+    categories_any: Tuple[str, ...] = ()
+    categories_none: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "_Rule":
+        stages = config.get("stages")
+        return cls(
+            tier=config["tier"],
+            max_message_tokens=config.get("max_message_tokens"),
+            min_message_tokens=config.get("min_message_tokens"),
+            max_sentences=config.get("max_sentences"),
+            min_sentences=config.get("min_sentences"),
+            max_history=config.get("max_history"),
+            min_history=config.get("min_history"),
+            stages=frozenset(str(stage).lower() for stage in stages) if stages else None,
+            categories_any=tuple(config.get("categories_any") or ()),
+            categories_none=tuple(config.get("categories_none") or ())
+        )
+
+    def matches(self, features: RouteFeatures) -> bool:
+        if self.max_message_tokens is not None and features.message_tokens > self.max_message_tokens:
+            return False
+        if self.min_message_tokens is not None and features.message_tokens < self.min_message_tokens:
+            return False
+        if self.max_sentences is not None and features.sentences > self.max_sentences:
+            return False
+        if self.min_sentences is not None and features.sentences < self.min_sentences:
+            return False
+        if self.max_history is not None and features.history_length > self.max_history:
+            return False
+        if self.min_history is not None and features.history_length < self.min_history:
+            return False
+        if self.stages is not None and features.stage not in self.stages:
+            return False
+        if self.categories_any and not any(category in features.categories for category in self.categories_any):
+            return False
+        if any(category in features.categories for category in self.categories_none):
+            return False
+        return True
+
+
+@dataclass
+class _RoutingTable:
+    """编译好的路由配置"""
+    tiers: Dict[str, ModelTier]
+    rules: List[_Rule] = field(default_factory=list)
+    default_tier: str = DEFAULT_TIER
+
+
+class ModelRouter:
+    """
+    模型路由器
+
+    全局 ai_routing 配置定义档位（tiers）和按顺序匹配的规则（rules），
+    page_settings 中的 ai_routing 可以覆盖单个档位或替换规则列表。
+    每个页面的配置编译一次（按配置内容哈希缓存，配置变化时自动重新编译）。
+    未配置 ai_routing 时所有消息使用 OPENAI_MODEL。
+    """
+
+    def __init__(self):
+        self._tables: Dict[str, _RoutingTable] = {}
+        self._lock = threading.Lock()
+
+    def _routing_config(self, page_id: Optional[str]) -> Dict[str, Any]:
+        """合并全局和页面的 ai_routing 配置"""
+        config = dict(yaml_config.get("ai_routing", {}) or {})
+        page_config = (page_settings.get_page_config(page_id) if page_id else {}).get("ai_routing") or {}
+        if page_config:
+            tiers = {**(config.get("tiers") or {})}
+            for name, tier in (page_config.get("tiers") or {}).items():
+                tiers[name] = {**(tiers.get(name) or {}), **(tier or {})}
+            config.update({key: value for key, value in page_config.items() if key != "tiers"})
+            config["tiers"] = tiers
+        return config
+
+    @staticmethod
+    def _compile(config: Dict[str, Any]) -> _RoutingTable:
+        """把 ai_routing 配置编译成路由表（引用了未定义档位的规则被忽略）"""
+        tiers = {
+            DEFAULT_TIER: ModelTier(DEFAULT_TIER, settings.openai_model, DEFAULT_MAX_TOKENS)
+        }
+        if not config or config.get("enabled", True) is False:
+            return _RoutingTable(tiers=tiers)
+
+        for name, tier in (config.get("tiers") or {}).items():
+            tier = tier or {}
+            tiers[name] = ModelTier(
+                name=name,
+                model=tier.get("model") or settings.openai_model,
+                max_tokens=int(tier.get("max_tokens") or DEFAULT_MAX_TOKENS),
+                temperature=tier.get("temperature")
+            )
+
+        rules = []
+        for index, rule in enumerate(config.get("rules") or []):
+            if not rule or rule.get("tier") not in tiers:
+                logger.warning(f"Ignoring ai_routing rule {index}: unknown tier {rule.get('tier') if rule else None}")
+                continue
+            rules.append(_Rule.from_config(rule))
+
+        default_tier = config.get("default_tier", DEFAULT_TIER)
+        if default_tier not in tiers:
+            logger.warning(f"Unknown ai_routing default_tier {default_tier}, using {DEFAULT_TIER}")
+            default_tier = DEFAULT_TIER
+        return _RoutingTable(tiers=tiers, rules=rules, default_tier=default_tier)
+
+    def _table(self, page_id: Optional[str]) -> _RoutingTable:
+        config = self._routing_config(page_id)
+        key = fingerprint(config, settings.openai_model)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._compile(config)
+            with self._lock:
+                if len(self._tables) >= MAX_COMPILED_TABLES:
+                    self._tables.clear()
+                table = self._tables.setdefault(key, table)
+        return table
+
+    @staticmethod
+    def features(
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches] = None,
+        stage: Optional[Any] = None,
+        history_length: int = 0
+    ) -> RouteFeatures:
+        """提取消息的路由特征"""
+        return RouteFeatures(
+            message_tokens=estimate_tokens(message_content),
+            sentences=count_sentences(message_content),
+            stage=str(getattr(stage, "value", stage)).lower() if stage is not None else None,
+            history_length=history_length,
+            categories=tuple(keyword_matches.categories) if keyword_matches is not None else ()
+        )
+
+    def route(self, page_id: Optional[str], features: RouteFeatures) -> RouteDecision:
+        """
+        选择模型档位
+
+        Args:
+            page_id: 页面ID（页面可覆盖路由配置）
+            features: 消息特征
+
+        Returns:
+            第一条命中规则的档位，都不命中时使用 default_tier
+        """
+        table = self._table(page_id)
+        tier_name, rule_index = table.default_tier, None
+        for index, rule in enumerate(table.rules):
+            if rule.matches(features):
+                tier_name, rule_index = rule.tier, index
+                break
+
+        tier = table.tiers[tier_name]
+        return RouteDecision(
+            tier=tier.name,
+            model=tier.model,
+            max_tokens=tier.max_tokens,
+            temperature=settings.openai_temperature if tier.temperature is None else tier.temperature,
+            rule=rule_index
+        )
+
+
+# 全局模型路由器实例
+model_router = ModelRouter()
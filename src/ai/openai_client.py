@@ -0,0 +1,393 @@
+"""共享的异步 OpenAI 客户端 - 并发控制、超时、对冲请求与取消"""
+import asyncio
+import time
+from typing import Dict, Any, List, Optional
+import openai
+from src.config import settings
+from src.ai.prompt_builder import estimate_tokens
+from src.utils.rate_limiter import RateLimiter
+from src.monitoring.llm_telemetry import (
+    llm_telemetry, OUTCOME_SUCCESS, OUTCOME_TIMEOUT, OUTCOME_ERROR, OUTCOME_CANCELLED, OUTCOME_HEDGE_LOST
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 自动对冲延迟（最近补全耗时的 p90）至少需要的样本数
+HEDGE_MIN_SAMPLES = 20
+
+# 对冲延迟下限（秒）：更快的请求不值得重复发送
+HEDGE_MIN_DELAY_SECONDS = 0.5
+
+# 对冲预算在限流器中的键
+HEDGE_BUDGET_KEY = "openai_hedge"
+
+
+class SharedOpenAIClient:
+    """
+    进程内共享的 AsyncOpenAI 客户端
+
+    - 所有 ReplyGenerator 共用一个客户端（复用 HTTP 连接池），不阻塞事件循环
+    - 全局信号量限制同时进行的补全请求数，单页面信号量避免一个页面的流量占满全局名额
+    - 每个请求有超时时间，超时或调用方被取消时底层请求会被取消
+    - 请求超过对冲延迟仍未返回时（在每分钟预算内）再发一个相同请求，取先成功返回的结果，另一个被取消
+    - 每个请求的 token 数、耗时和结果记录到 llm_telemetry（见 src/monitoring/llm_telemetry.py）；
+      对冲时未被采用的那个请求也单独记录（仍然计费）
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        per_page_concurrency: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        hedge_enabled: Optional[bool] = None,
+        hedge_delay_seconds: Optional[float] = None,
+        hedge_budget_per_minute: Optional[int] = None
+    ):
+        """
+        初始化共享客户端
+
+        Args:
+            max_concurrency: 全局同时进行的最大补全请求数
+            per_page_concurrency: 单个页面同时进行的最大补全请求数
+            timeout_seconds: 单次补全请求的超时时间（秒，包含排队等待后的请求时间）
+            max_retries: OpenAI SDK 的重试次数
+            hedge_enabled: 是否发送对冲请求
+            hedge_delay_seconds: 对冲延迟（秒），0 表示使用最近补全耗时的 p90
+            hedge_budget_per_minute: 每分钟最多发出的对冲请求数
+        """
+        self.max_concurrency = max(1, max_concurrency or settings.openai_max_concurrency)
+        self.per_page_concurrency = max(1, per_page_concurrency or settings.openai_per_page_concurrency)
+        self.timeout = timeout_seconds or settings.openai_timeout_seconds
+        self.max_retries = settings.openai_max_retries if max_retries is None else max_retries
+        self.hedge_enabled = settings.openai_hedge_enabled if hedge_enabled is None else hedge_enabled
+        self.hedge_delay = settings.openai_hedge_delay_seconds if hedge_delay_seconds is None else hedge_delay_seconds
+        self.hedge_budget_per_minute = (
+            settings.openai_hedge_budget_per_minute
+            if hedge_budget_per_minute is None
+            else hedge_budget_per_minute
+        )
+        self._hedge_budget = RateLimiter()
+        self._hedge_budget.set_limit(HEDGE_BUDGET_KEY, self.hedge_budget_per_minute, 60)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+        self._page_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # 指标
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed_count = 0
+        self.error_count = 0
+        self.timeout_count = 0
+        self.cancelled_count = 0
+        self.hedge_count = 0
+        self.hedge_win_count = 0
+        self.hedge_budget_exhausted_count = 0
+        self.hedge_lost_prompt_tokens = 0
+        self.latencies: List[float] = []
+
+    def _ensure_loop_state(self):
+        """客户端连接和信号量绑定事件循环，事件循环变化时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._client = None
+            self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._page_semaphores = {}
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """当前事件循环使用的 AsyncOpenAI 客户端"""
+        try:
+            self._ensure_loop_state()
+        except RuntimeError:
+            pass  # 不在事件循环中（例如同步代码中构造 ReplyGenerator）
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                timeout=self.timeout,
+                max_retries=self.max_retries
+            )
+        return self._client
+
+    def _page_semaphore(self, page_id: Optional[str]) -> asyncio.Semaphore:
+        key = page_id or ""
+        semaphore = self._page_semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._page_semaphores[key] = asyncio.Semaphore(self.per_page_concurrency)
+        return semaphore
+
+    async def chat_completion(
+        self,
+        page_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        prompt_version: Optional[str] = None,
+        tier: Optional[str] = None,
+        **kwargs
+    ) -> Any:
+        """
+        创建对话补全
+
+        先获取页面名额再获取全局名额，避免单个页面排队的请求占住全局名额。
+
+        Args:
+            page_id: 页面ID（用于单页面并发限制）
+            timeout: 超时时间（秒），默认使用 OPENAI_TIMEOUT_SECONDS
+            prompt_version: 系统提示词版本（只用于调用记录，不发给 OpenAI）
+            tier: 模型路由档位（只用于调用记录）
+            **kwargs: 传给 chat.completions.create 的参数
+
+        Returns:
+            OpenAI 补全响应
+
+        Raises:
+            asyncio.TimeoutError: 请求超时
+        """
+        self._ensure_loop_state()
+        timeout = timeout or self.timeout
+        client = self.client
+
+        self.waiting += 1
+        acquired = False
+        try:
+            async with self._page_semaphore(page_id):
+                async with self._global_semaphore:
+                    self.waiting -= 1
+                    acquired = True
+                    return await self._create(client, page_id, timeout, kwargs, prompt_version, tier)
+        finally:
+            if not acquired:
+                self.waiting -= 1
+
+    async def _create(
+        self,
+        client: openai.AsyncOpenAI,
+        page_id: Optional[str],
+        timeout: float,
+        kwargs: Dict[str, Any],
+        prompt_version: Optional[str] = None,
+        tier: Optional[str] = None
+    ) -> Any:
+        """在已获取名额的情况下发出请求并记录指标"""
+        self.in_flight += 1
+        started = time.monotonic()
+        outcome = OUTCOME_ERROR
+        response = None
+        try:
+            response = await asyncio.wait_for(
+                self._hedged_create(client, page_id, timeout, kwargs, prompt_version, tier),
+                timeout=timeout
+            )
+            outcome = OUTCOME_SUCCESS
+        except asyncio.TimeoutError:
+            outcome = OUTCOME_TIMEOUT
+            self.timeout_count += 1
+            logger.warning(f"OpenAI completion timed out after {timeout}s (page {page_id})")
+            raise
+        except asyncio.CancelledError:
+            outcome = OUTCOME_CANCELLED
+            self.cancelled_count += 1
+            raise
+        except Exception:
+            self.error_count += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            elapsed_ms = (time.monotonic() - started) * 1000
+            usage = getattr(response, "usage", None)
+            llm_telemetry.record(
+                model=kwargs.get("model"),
+                outcome=outcome,
+                latency_ms=elapsed_ms,
+                page_id=page_id,
+                prompt_version=prompt_version,
+                prompt_tokens=_usage_tokens(usage, "prompt_tokens"),
+                completion_tokens=_usage_tokens(usage, "completion_tokens"),
+                tier=tier
+            )
+
+        self.completed_count += 1
+        self._record_latency(elapsed_ms)
+        return response
+
+    def _hedge_delay_seconds(self, timeout: float) -> Optional[float]:
+        """
+        本次请求的对冲延迟
+
+        Returns:
+            延迟秒数，不对冲时（未开启、样本不足、延迟不短于超时时间）返回 None
+        """
+        if not self.hedge_enabled or self.hedge_budget_per_minute <= 0:
+            return None
+        delay = self.hedge_delay
+        if not delay:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+            delay = ordered[min(int(len(ordered) * 0.9), len(ordered) - 1)] / 1000
+        delay = max(delay, HEDGE_MIN_DELAY_SECONDS)
+        return delay if delay < timeout else None
+
+    async def _hedged_create(
+        self,
+        client: openai.AsyncOpenAI,
+        page_id: Optional[str],
+        timeout: float,
+        kwargs: Dict[str, Any],
+        prompt_version: Optional[str] = None,
+        tier: Optional[str] = None
+    ) -> Any:
+        """
+        发出补全请求，超过对冲延迟仍未返回时再发一个相同请求
+
+        对冲请求不占用额外的并发名额（数量由每分钟预算限制）。
+        返回先成功的结果；一个请求失败时继续等待另一个，都失败时抛出先失败的异常。
+        返回、失败或被取消（超时）时，未完成的请求都会被取消。
+        _create 记录返回（或失败）的请求，另一个请求由 _record_hedge_extra 单独记录。
+        """
+        hedge_delay = self._hedge_delay_seconds(timeout)
+        if hedge_delay is None:
+            return await client.chat.completions.create(timeout=timeout, **kwargs)
+
+        started = time.monotonic()
+        primary = asyncio.ensure_future(client.chat.completions.create(timeout=timeout, **kwargs))
+        tasks = [primary]
+        hedge: Optional[asyncio.Future] = None
+        hedge_started = started
+        winner: Optional[asyncio.Future] = None
+        first_error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                if self._hedge_budget.is_allowed(HEDGE_BUDGET_KEY):
+                    self.hedge_count += 1
+                    hedge_started = time.monotonic()
+                    hedge = asyncio.ensure_future(client.chat.completions.create(timeout=timeout, **kwargs))
+                    tasks.append(hedge)
+                    logger.debug(f"OpenAI completion hedged after {hedge_delay:.2f}s (page {page_id})")
+                else:
+                    self.hedge_budget_exhausted_count += 1
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        winner = task
+                        if task is hedge:
+                            self.hedge_win_count += 1
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hedge is not None:
+                if winner is hedge:
+                    extra, extra_started = primary, started
+                else:
+                    extra, extra_started = hedge, hedge_started
+                self._record_hedge_extra(extra, extra_started, winner, kwargs, page_id, prompt_version, tier)
+
+    def _record_hedge_extra(
+        self,
+        task: asyncio.Future,
+        started: float,
+        winner: Optional[asyncio.Future],
+        kwargs: Dict[str, Any],
+        page_id: Optional[str],
+        prompt_version: Optional[str],
+        tier: Optional[str]
+    ):
+        """
+        记录对冲中没有被返回的那个请求
+
+        已完成的请求使用响应的 usage；被取消的请求无法拿到 usage，但 OpenAI 已经按输入计费：
+        两个请求的提示词相同，输入 token 数取胜出请求的 usage，没有胜出请求时按消息内容估算。
+        """
+        prompt_tokens = completion_tokens = None
+        outcome = OUTCOME_HEDGE_LOST
+        if task.done() and not task.cancelled():
+            if task.exception() is not None:
+                outcome = OUTCOME_ERROR
+            else:
+                usage = getattr(task.result(), "usage", None)
+                prompt_tokens = _usage_tokens(usage, "prompt_tokens")
+                completion_tokens = _usage_tokens(usage, "completion_tokens")
+        if outcome == OUTCOME_HEDGE_LOST and prompt_tokens is None:
+            if winner is not None:
+                prompt_tokens = _usage_tokens(getattr(winner.result(), "usage", None), "prompt_tokens")
+            if prompt_tokens is None:
+                prompt_tokens = sum(
+                    estimate_tokens(message.get("content") if isinstance(message, dict) else None)
+                    for message in kwargs.get("messages") or []
+                )
+        self.hedge_lost_prompt_tokens += prompt_tokens or 0
+        llm_telemetry.record(
+            model=kwargs.get("model"),
+            outcome=outcome,
+            latency_ms=(time.monotonic() - started) * 1000,
+            page_id=page_id,
+            prompt_version=prompt_version,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            tier=tier
+        )
+
+    def _record_latency(self, elapsed_ms: float):
+        """记录请求耗时（只保留最近1000条）"""
+        self.latencies.append(elapsed_ms)
+        if len(self.latencies) > 1000:
+            self.latencies = self.latencies[-1000:]
+
+    async def close(self):
+        """关闭客户端连接（应用关闭时调用）"""
+        if self._client is not None:
+            try:
+                await self._client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close OpenAI client: {str(e)}")
+            self._client = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取补全请求指标"""
+        if self.latencies:
+            sorted_latencies = sorted(self.latencies)
+            avg_ms = sum(sorted_latencies) / len(sorted_latencies)
+            p95_ms = sorted_latencies[min(int(len(sorted_latencies) * 0.95), len(sorted_latencies) - 1)]
+        else:
+            avg_ms = p95_ms = 0
+        total = self.completed_count + self.error_count + self.timeout_count + self.cancelled_count
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "per_page_concurrency": self.per_page_concurrency,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed_count": self.completed_count,
+            "error_count": self.error_count,
+            "timeout_count": self.timeout_count,
+            "cancelled_count": self.cancelled_count,
+            "hedge_count": self.hedge_count,
+            "hedge_win_count": self.hedge_win_count,
+            "hedge_budget_exhausted_count": self.hedge_budget_exhausted_count,
+            "hedge_lost_prompt_tokens": self.hedge_lost_prompt_tokens,
+            "hedge_rate": round(self.hedge_count / total, 4) if total else 0,
+            "hedge_win_rate": round(self.hedge_win_count / self.hedge_count, 4) if self.hedge_count else 0,
+            "avg_latency_ms": round(avg_ms, 2),
+            "p95_latency_ms": round(p95_ms, 2)
+        }
+
+
+def _usage_tokens(usage: Any, name: str) -> Optional[int]:
+    """读取响应 usage 中的 token 数（缺失或不是整数时返回 None）"""
+    value = getattr(usage, name, None)
+    return value if isinstance(value, int) else None
+
+
+# 全局共享客户端实例
+openai_client = SharedOpenAIClient()
@@ -1,6 +1,38 @@
 """AI 回复模板和提示词管理"""
-from typing import Dict, Any, Optional
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
 from src.config import yaml_config
+from src.config.page_settings import page_settings
+from src.ai.reply_cache import fingerprint
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from src.ai.prompts.iphone_loan_telegram import IPHONE_LOAN_TELEGRAM_PROMPT
+except ImportError:
+    IPHONE_LOAN_TELEGRAM_PROMPT = None
+
+# 默认提示词
+DEFAULT_SYSTEM_PROMPT = """You are a professional AI customer service assistant. Your responsibilities are:
+1. Reply to customer inquiries in a friendly and professional manner
+2. Collect basic customer information (name, contact, needs, etc.)
+3. Understand customer intent and provide initial assistance
+4. If unable to resolve, guide customers to provide more information for manual processing
+
+Please reply in the same language as the customer, maintaining politeness and professionalism."""
+
+# 编译结果缓存的最大条目数（配置频繁变化时清空重建）
+MAX_COMPILED_PROMPTS = 256
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """编译好的系统提示词（不可变）"""
+    text: str
+    version: str
+    prompt_type: Optional[str] = None
 
 
 class PromptTemplates:
@@ -8,6 +40,8 @@ class PromptTemplates:
     
     def __init__(self):
         self.templates = yaml_config.get("ai_templates", {})
+        self._compiled: Dict[Tuple, CompiledPrompt] = {}
+        self._lock = threading.Lock()
     
     def get_greeting(self) -> str:
         """Get greeting template"""
@@ -37,49 +71,100 @@ class PromptTemplates:
             "I didn't fully understand your question. Could you please describe your needs in more detail?"
         )
     
-    def build_system_prompt(self, prompt_type: Optional[str] = None) -> str:
+    def get_timeout_reply(self) -> str:
+        """Get reply used when the AI reply deadline passes"""
+        return self.templates.get(
+            "timeout_reply",
+            "Thanks for your message! We have received it and will get back to you shortly."
+        )
+    
+    def _prompt_config(self, prompt_type: Optional[str], page_id: Optional[str]) -> Tuple:
         """
-        构建系统提示词
+        解析影响系统提示词的配置（页面配置中的 prompt_type / telegram_groups 覆盖全局配置）
         
-        Args:
-            prompt_type: 提示词类型，如果为 'iphone_loan_telegram' 则使用专用提示词
-            
         Returns:
-            系统提示词字符串
+            (提示词类型, Telegram群组, Telegram频道, 自定义提示词)
         """
+        page_config = page_settings.get_page_config(page_id) if page_id else {}
+        if prompt_type is None:
+            prompt_type = page_config.get("prompt_type", self.templates.get("prompt_type"))
+        
+        telegram_config = {
+            **(yaml_config.get("telegram_groups", {}) or {}),
+            **(page_config.get("telegram_groups", {}) or {})
+        }
+        return (
+            prompt_type,
+            telegram_config.get("main_group", "@your_group"),
+            telegram_config.get("main_channel", "@your_channel"),
+            self.templates.get("system_prompt")
+        )
+    
+    @staticmethod
+    def _render_system_prompt(
+        prompt_type: Optional[str],
+        main_group: str,
+        main_channel: str,
+        custom_prompt: Optional[str]
+    ) -> str:
+        """按配置生成系统提示词文本"""
         # 检查是否使用专用提示词
-        if prompt_type == "iphone_loan_telegram":
-            try:
-                from src.ai.prompts.iphone_loan_telegram import IPHONE_LOAN_TELEGRAM_PROMPT
-                prompt = IPHONE_LOAN_TELEGRAM_PROMPT
-                
-                # 从配置中读取Telegram群组/频道名称并替换
-                telegram_config = yaml_config.get("telegram_groups", {})
-                main_group = telegram_config.get("main_group", "@your_group")
-                main_channel = telegram_config.get("main_channel", "@your_channel")
-                
-                # 替换提示词中的占位符
-                prompt = prompt.replace("@your_group", main_group)
-                prompt = prompt.replace("@your_channel", main_channel)
-                
-                return prompt
-            except ImportError:
-                # 如果导入失败，使用默认提示词
-                pass
+        if prompt_type == "iphone_loan_telegram" and IPHONE_LOAN_TELEGRAM_PROMPT:
+            # 替换提示词中的Telegram群组/频道占位符
+            prompt = IPHONE_LOAN_TELEGRAM_PROMPT.replace("@your_group", main_group)
+            return prompt.replace("@your_channel", main_channel)
         
         # 检查配置文件中是否有自定义提示词
-        custom_prompt = self.templates.get("system_prompt")
         if custom_prompt:
             return custom_prompt
         
-        # 默认提示词
-        return """You are a professional AI customer service assistant. Your responsibilities are:
-1. Reply to customer inquiries in a friendly and professional manner
-2. Collect basic customer information (name, contact, needs, etc.)
-3. Understand customer intent and provide initial assistance
-4. If unable to resolve, guide customers to provide more information for manual processing
-
-Please reply in the same language as the customer, maintaining politeness and professionalism."""
+        return DEFAULT_SYSTEM_PROMPT
+    
+    def compile_system_prompt(
+        self,
+        prompt_type: Optional[str] = None,
+        page_id: Optional[str] = None
+    ) -> CompiledPrompt:
+        """
+        获取编译好的系统提示词
+        
+        同一配置（提示词类型、页面、Telegram群组配置）只编译一次，之后每次请求返回
+        同一个不可变字符串，保证发给模型的静态前缀逐字节相同（便于服务端提示词缓存命中）。
+        配置变化时自动按新配置重新编译。
+        
+        Args:
+            prompt_type: 提示词类型，为空时使用页面配置或 ai_templates.prompt_type
+            page_id: 页面ID（页面可覆盖提示词类型和Telegram群组）
+        
+        Returns:
+            编译好的系统提示词（含内容哈希版本号）
+        """
+        key = self._prompt_config(prompt_type, page_id)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+        
+        text = self._render_system_prompt(*key)
+        compiled = CompiledPrompt(text=text, version=fingerprint(text), prompt_type=key[0])
+        with self._lock:
+            if len(self._compiled) >= MAX_COMPILED_PROMPTS:
+                self._compiled.clear()
+            compiled = self._compiled.setdefault(key, compiled)
+        logger.info(f"Compiled system prompt {compiled.version} (type={key[0]}, page={page_id or 'default'})")
+        return compiled
+    
+    def build_system_prompt(self, prompt_type: Optional[str] = None, page_id: Optional[str] = None) -> str:
+        """
+        构建系统提示词
+        
+        Args:
+            prompt_type: 提示词类型，如果为 'iphone_loan_telegram' 则使用专用提示词
+            page_id: 页面ID
+            
+        Returns:
+            系统提示词字符串
+        """
+        return self.compile_system_prompt(prompt_type, page_id).text
     
     def build_conversation_context(
         self,
@@ -102,3 +187,5 @@ Please reply in the same language as the customer, maintaining politeness and pr
         return context
 
 
+# 全局提示词模板实例（编译好的系统提示词在所有 ReplyGenerator 之间共享）
+prompt_templates = PromptTemplates()
@@ -0,0 +1,169 @@
+"""AI 回复缓存 - 按规范化问题文本缓存常见问题的回复"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 去掉标点、符号和表情，只保留文字、数字和空白
+_NON_WORD_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """
+    规范化问题文本（用作缓存键）
+
+    "How much??"、"how much" 和 "ＨＯＷ ＭＵＣＨ！" 得到相同的结果。
+
+    Args:
+        text: 原始消息内容
+
+    Returns:
+        规范化后的文本（全角转半角、小写、去标点、合并空白）
+    """
+    if not text:
+        return ""
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    normalized = _NON_WORD_RE.sub(" ", normalized).replace("_", " ")
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+def fingerprint(*parts: Any) -> str:
+    """计算配置或提示词的短哈希（用作版本号）"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+class ReplyCache:
+    """
+    常见问题回复缓存（TTL + LRU）
+
+    缓存键为 (提示词版本, 对话阶段, 规范化问题文本)。只缓存模型返回的原始回复，
+    按客户追加的内容（如 Telegram 群组链接）在命中后再处理。
+    ai_templates 变化时整个缓存失效。
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最多缓存的回复数
+            ttl_seconds: 回复的有效期（秒）
+        """
+        self.max_size = max(1, max_size or settings.reply_cache_max_size)
+        self.ttl = ttl_seconds or settings.reply_cache_ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.templates_version: Optional[str] = None
+
+        # 指标
+        self.hit_count = 0
+        self.miss_count = 0
+        self.eviction_count = 0
+        self.expired_count = 0
+        self.flush_count = 0
+
+    @staticmethod
+    def make_key(prompt_version: str, stage: str, message_content: str) -> Optional[Tuple[str, str, str]]:
+        """生成缓存键；规范化后为空的消息不缓存"""
+        question = normalize_question(message_content)
+        if not question:
+            return None
+        return (prompt_version, stage, question)
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[str]:
+        """
+        获取缓存的回复
+
+        Returns:
+            回复内容，未命中或已过期返回 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.miss_count += 1
+                return None
+
+            expires_at, reply = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expired_count += 1
+                self.miss_count += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hit_count += 1
+            return reply
+
+    def set(self, key: Tuple[str, str, str], reply: str):
+        """缓存回复（超出容量时淘汰最久未使用的）"""
+        if not reply:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.eviction_count += 1
+
+    def clear(self, reason: str = "manual") -> int:
+        """
+        清空缓存
+
+        Returns:
+            清除的条目数
+        """
+        with self._lock:
+            cleared = len(self._entries)
+            self._entries.clear()
+            self.flush_count += 1
+        logger.info(f"Reply cache flushed ({reason}), {cleared} entries removed")
+        return cleared
+
+    def sync_templates(self, templates: Dict[str, Any]) -> str:
+        """
+        记录当前 ai_templates 的版本，版本变化时清空缓存
+
+        Args:
+            templates: ai_templates 配置
+
+        Returns:
+            模板版本号
+        """
+        version = fingerprint(templates)
+        if version != self.templates_version:
+            if self.templates_version is not None:
+                self.clear(reason=f"ai_templates changed {self.templates_version} -> {version}")
+            self.templates_version = version
+        return version
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取缓存指标"""
+        lookups = self.hit_count + self.miss_count
+        return {
+            "enabled": settings.reply_cache_enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "templates_version": self.templates_version,
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "hit_rate": round(self.hit_count / lookups, 4) if lookups else 0,
+            "eviction_count": self.eviction_count,
+            "expired_count": self.expired_count,
+            "flush_count": self.flush_count
+        }
+
+
+# 全局回复缓存实例
+reply_cache = ReplyCache()
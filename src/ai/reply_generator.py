@@ -1,12 +1,22 @@
 """AI 回复生成器"""
+import asyncio
 import openai
 import re
+import time
 from typing import List, Dict, Any, Optional
 from src.config import settings
-from src.ai.prompt_templates import PromptTemplates
+from src.ai.prompt_templates import PromptTemplates, prompt_templates
 from src.ai.conversation_manager import ConversationManager
+from src.ai.openai_client import openai_client
+from src.ai.reply_cache import reply_cache, fingerprint
+from src.ai.prompt_builder import prompt_builder
+from src.ai.model_router import RouteDecision, model_router
+from src.ai.local_answers import LocalAnswer, local_answers
+from src.ai.conversation_state import PRESET_REPLY_LIMIT
+from src.utils.keyword_engine import (
+    KeywordMatches, keyword_engine, BUYING_SELLING, BUSINESS_INTENT, PRESET_REPLY_PREFIX
+)
 from src.utils.exceptions import APIError, ProcessingError
-from src.database.models import Conversation
 from sqlalchemy.orm import Session
 import logging
 
@@ -18,11 +28,21 @@ class ReplyGenerator:
     
     def __init__(self, db: Session):
         self.db = db
-        self.client = openai.OpenAI(api_key=settings.openai_api_key)
-        self.templates = PromptTemplates()
+        self.templates: PromptTemplates = prompt_templates
         self.conversation_manager = ConversationManager(db)
+        # ai_templates 变化时清空回复缓存
+        self.templates_version = reply_cache.sync_templates(self.templates.templates)
     
-    def _is_spam_or_invalid(self, message_content: str) -> bool:
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """共享的 AsyncOpenAI 客户端（见 src/ai/openai_client.py）"""
+        return openai_client.client
+    
+    def _is_spam_or_invalid(
+        self,
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches] = None
+    ) -> bool:
         """
         Detect spam or invalid messages with intelligent intent detection
         
@@ -34,6 +54,7 @@ class ReplyGenerator:
         
         Args:
             message_content: Message content
+            keyword_matches: Precomputed keyword matches (scanned here when omitted)
         
         Returns:
             Whether the message is spam or invalid
@@ -73,46 +94,19 @@ class ReplyGenerator:
                 logger.info(f"Detected spam/invalid message (high repeat ratio): {message_content[:50]}")
                 return True
         
-        message_lower = content_stripped.lower()
+        if keyword_matches is None:
+            keyword_matches = keyword_engine.match(content_stripped)
         
         # Step 2: Buying/selling intent keywords (SPAM)
         # These indicate "buy/sell phone" intent, should be marked as spam
         # Even if they contain product keywords like "手机", they are spam
-        buying_selling_keywords = [
-            # Chinese
-            "买手机", "卖手机", "购买手机", "出售手机", "我要买", "我想买", 
-            "我要卖", "我想卖", "收购", "回收", "买iphone", "卖iphone",
-            # English
-            "buy phone", "sell phone", "purchase phone", "want to buy", 
-            "want to sell", "looking to buy", "looking to sell", "buy iphone", "sell iphone"
-        ]
-        
-        # Check for buying/selling intent
-        has_buying_selling_intent = any(keyword in message_lower for keyword in buying_selling_keywords)
-        if has_buying_selling_intent:
+        if keyword_matches.has(BUYING_SELLING):
             logger.info(f"Detected spam message (buying/selling intent): {message_content[:50]}")
             return True  # Mark as spam
         
         # Step 3: Business-related intent keywords (MUST REPLY)
         # These indicate "consult loan" intent, must reply
-        business_intent_keywords = [
-            # Loan related
-            "贷款", "借款", "借钱", "借", "贷", "loan", "borrow", "lend",
-            # Inquiry related
-            "咨询", "了解", "询问", "问", "help", "inquiry", "question", "想了解", "想咨询",
-            # Application related
-            "办理", "申请", "apply", "application", "怎么", "如何", "how",
-            # Price related
-            "价格", "费用", "价钱", "多少钱", "price", "cost", "interest", "利息", "利率",
-            # Legitimacy related
-            "legit", "legitimate", "真实", "真的", "可靠", "reliable", "可信",
-            # Question mark (indicates inquiry)
-            "?", "？"
-        ]
-        
-        # Check for business intent
-        has_business_intent = any(keyword in message_lower for keyword in business_intent_keywords)
-        if has_business_intent:
+        if keyword_matches.has(BUSINESS_INTENT):
             logger.info(f"Message contains business intent keyword, will reply: {message_content[:50]}")
             return False  # Not spam, must reply
         
@@ -122,13 +116,19 @@ class ReplyGenerator:
         logger.info(f"Message does not match any intent keywords, allowing reply: {message_content[:50]}")
         return False  # Allow reply
     
-    def _check_preset_reply(self, customer_id: int, message_content: str) -> Optional[str]:
+    def _check_preset_reply(
+        self,
+        customer_id: int,
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches] = None
+    ) -> Optional[str]:
         """
         检查是否应该使用预设回复（用于前三个标准问题）
         
         Args:
             customer_id: 客户 ID
             message_content: 消息内容
+            keyword_matches: 已计算的关键词匹配结果（为空时现场扫描）
         
         Returns:
             预设回复内容，如果不匹配则返回 None
@@ -137,35 +137,64 @@ class ReplyGenerator:
         if not preset_replies:
             return None
         
-        # 获取对话历史，统计已发送的AI回复数量
-        history = self.conversation_manager.get_conversation_history(customer_id, limit=10)
-        ai_reply_count = sum(1 for msg in history if msg.get("role") == "assistant")
+        # 已发送的AI回复数量（来自客户对话状态，不扫描历史）
+        ai_reply_count = self.conversation_manager.get_conversation_state(customer_id).ai_reply_count
         
         # 只在前三个问题中使用预设回复（即AI回复数量少于3条时）
-        if ai_reply_count >= 3:
+        if ai_reply_count >= PRESET_REPLY_LIMIT:
             return None
         
-        message_lower = message_content.lower()
+        if keyword_matches is None:
+            keyword_matches = keyword_engine.match(message_content)
         
         # 检查每个预设回复模板（按优先级顺序）
         # 优先匹配更具体的问题类型
-        preset_order = ["question_model", "question_amount", "question_storage", "greeting_first"]
-        
-        for key in preset_order:
-            if key not in preset_replies:
-                continue
-            
-            preset = preset_replies[key]
-            keywords = preset.get("keywords", [])
-            reply = preset.get("reply", "")
-            
-            # 检查是否匹配关键词
-            if any(keyword.lower() in message_lower for keyword in keywords):
-                logger.info(f"Using preset reply '{key}' for customer {customer_id} (AI reply count: {ai_reply_count}/3)")
-                return reply
+        preset_order = [
+            key for key in ["question_model", "question_amount", "question_storage", "greeting_first"]
+            if key in preset_replies
+        ]
+        key = keyword_matches.first_category(PRESET_REPLY_PREFIX, preset_order)
+        if key:
+            logger.info(f"Using preset reply '{key}' for customer {customer_id} (AI reply count: {ai_reply_count}/{PRESET_REPLY_LIMIT})")
+            return preset_replies[key].get("reply", "")
         
         return None
     
+    def _reply_cache_key(
+        self,
+        system_prompt_version: str,
+        route: RouteDecision,
+        customer_id: int,
+        message_content: str
+    ) -> Optional[tuple]:
+        """
+        生成回复缓存键
+        
+        只缓存对话早期（AI回复数不超过 REPLY_CACHE_MAX_STAGE）的回复，
+        之后的回复依赖具体的对话历史，不适合共享。
+        键包含路由选择的档位及其模型、温度和 max_tokens：不同档位生成的回复互不共用，
+        修改 ai_routing 的档位配置后旧的缓存回复不再命中。
+        
+        Returns:
+            缓存键，不应使用缓存时返回 None
+        """
+        if not settings.reply_cache_enabled:
+            return None
+        
+        ai_reply_count = self.conversation_manager.get_conversation_state(customer_id).ai_reply_count
+        if ai_reply_count > settings.reply_cache_max_stage:
+            return None
+        
+        prompt_version = fingerprint(
+            self.templates_version,
+            system_prompt_version,
+            route.tier,
+            route.model,
+            route.temperature,
+            route.max_tokens
+        )
+        return reply_cache.make_key(prompt_version, f"ai_replies:{ai_reply_count}", message_content)
+    
     def _has_received_telegram_link(self, customer_id: int) -> bool:
         """
         Check if customer has already received Telegram group link
@@ -176,56 +205,7 @@ class ReplyGenerator:
         Returns:
             True if customer has received Telegram link, False otherwise
         """
-        # Check all conversations for this customer
-        conversations = self.db.query(Conversation)\
-            .filter(
-                Conversation.customer_id == customer_id,
-                Conversation.ai_replied == True,
-                Conversation.ai_reply_content.isnot(None)
-            )\
-            .all()
-        
-        # Check if any reply contains Telegram group link
-        from src.config import yaml_config
-        telegram_config = yaml_config.get("telegram_groups", {})
-        main_group = telegram_config.get("main_group", "@your_group")
-        
-        # Keywords that indicate Telegram group link was sent
-        telegram_keywords = [
-            "t.me", "telegram", "telegram group", "telegram群组", "join our telegram"
-        ]
-        
-        # Add main_group to keywords if it's configured
-        if main_group and main_group != "@your_group":
-            # Add full group link/name
-            telegram_keywords.append(main_group.lower())
-            
-            # Extract different formats from the group link
-            # Handle formats like: https://t.me/+bNivsOGSM6ZlMGJl, @group_name, t.me/group_name
-            if "t.me" in main_group.lower():
-                # Extract the group identifier from URL
-                if "/" in main_group:
-                    parts = main_group.split("/")
-                    if len(parts) > 1:
-                        # Get the last part (group name or invite code)
-                        group_id = parts[-1].lower()
-                        telegram_keywords.append(group_id)
-                        # Also check without + prefix if present
-                        if group_id.startswith("+"):
-                            telegram_keywords.append(group_id[1:])
-            elif "@" in main_group:
-                # Handle @group_name format
-                telegram_keywords.append(main_group.replace("@", "").lower())
-                telegram_keywords.append(main_group.lower())
-        
-        for conv in conversations:
-            if conv.ai_reply_content:
-                reply_lower = conv.ai_reply_content.lower()
-                # Check if reply contains Telegram group link
-                if any(keyword in reply_lower for keyword in telegram_keywords):
-                    return True
-        
-        return False
+        return self.conversation_manager.get_conversation_state(customer_id).telegram_link_sent
     
     def _ensure_telegram_link_in_reply(self, reply: str, customer_id: int) -> str:
         """
@@ -278,7 +258,10 @@ class ReplyGenerator:
         self,
         customer_id: int,
         message_content: str,
-        customer_name: Optional[str] = None
+        customer_name: Optional[str] = None,
+        page_id: Optional[str] = None,
+        keyword_matches: Optional[KeywordMatches] = None,
+        deadline: Optional[float] = None
     ) -> Optional[str]:
         """
         生成 AI 回复
@@ -287,73 +270,114 @@ class ReplyGenerator:
             customer_id: 客户 ID
             message_content: 客户消息内容
             customer_name: 客户姓名
+            page_id: 页面ID（用于单页面并发限制）
+            keyword_matches: 处理管道中已计算的关键词匹配结果（为空时现场扫描一次）
+            deadline: 回复时限（time.monotonic() 时间点）；超过时限时取消 OpenAI 请求，
+                改用本地检索回复或预设回复
         
         Returns:
             AI 生成的回复内容，如果是垃圾信息则返回 None
         """
+        if keyword_matches is None:
+            keyword_matches = keyword_engine.match(message_content)
+        
         # 检测垃圾信息或无效沟通
-        if self._is_spam_or_invalid(message_content):
+        if self._is_spam_or_invalid(message_content, keyword_matches):
             logger.info(f"Skipping reply generation for spam/invalid message from customer {customer_id}")
             return None
         
         # 检查是否应该使用预设回复（前三个标准问题）
-        preset_reply = self._check_preset_reply(customer_id, message_content)
+        preset_reply = self._check_preset_reply(customer_id, message_content, keyword_matches)
         if preset_reply:
             # Ensure Telegram link is included in preset reply if needed
             preset_reply = self._ensure_telegram_link_in_reply(preset_reply, customer_id)
             return preset_reply
         
+        local_answer: Optional[LocalAnswer] = None
         try:
+            # 编译好的系统提示词（按提示词类型、页面和Telegram群组配置缓存）
+            system_prompt = self.templates.compile_system_prompt(page_id=page_id)
+            
             # 获取对话历史
             history = self.conversation_manager.get_conversation_history(
                 customer_id,
                 limit=10
             )
             
-            # 获取提示词类型（从配置中读取）
-            prompt_type = self.templates.templates.get("prompt_type")
+            # 按消息特征选择模型档位（简单消息走小模型，复杂对话走大模型）
+            route = self._route(page_id, customer_id, message_content, keyword_matches, len(history))
             
-            # 构建消息列表
-            messages = [
-                {
-                    "role": "system",
-                    "content": self.templates.build_system_prompt(prompt_type=prompt_type)
-                }
-            ]
+            # 常见问题命中缓存（同一提示词版本和档位）时不调用 OpenAI
+            cache_key = self._reply_cache_key(system_prompt.version, route, customer_id, message_content)
+            cached_reply = reply_cache.get(cache_key) if cache_key else None
+            if cached_reply:
+                reply = self._ensure_telegram_link_in_reply(cached_reply, customer_id)
+                logger.info(
+                    f"Reply cache hit for customer {customer_id} "
+                    f"(prompt {system_prompt.version}, tier {route.tier}/{route.model}): {reply[:100]}..."
+                )
+                return reply
             
-            # 添加历史对话
-            for msg in history:
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
+            # 按 token 预算构建消息列表（超出预算时截断或丢弃最早的历史消息）
+            prompt = prompt_builder.build(system_prompt.text, history, message_content)
             
-            # 添加当前消息
-            messages.append({
-                "role": "user",
-                "content": message_content
-            })
+            # 本地索引中有足够相似的历史问题时，超时或出错后使用它的回复
+            local_answer = self._lookup_local_answer(message_content)
             
-            # 调用 OpenAI API
-            # 严格限制回复长度：max_tokens=45 约等于30个中文字符或30个英文单词
-            response = self.client.chat.completions.create(
-                model=settings.openai_model,
-                messages=messages,
-                temperature=settings.openai_temperature,
-                max_tokens=45  # 严格控制为50字以内（留出buffer）
+            # 调用 OpenAI API（异步，受全局和单页面并发限制，慢请求会发出对冲请求）
+            # 回复长度由档位的 max_tokens 限制（默认45，约等于30个中文字符或30个英文单词）
+            # 有本地兜底回复可用或管道设置了回复时限时，超过时限即取消请求（包括排队等待）
+            timeout = self._completion_deadline(deadline, has_local_answer=local_answer is not None)
+            if timeout is not None and timeout <= 0:
+                raise asyncio.TimeoutError()
+            completion = openai_client.chat_completion(
+                page_id=page_id,
+                timeout=timeout,
+                prompt_version=system_prompt.version,
+                tier=route.tier,
+                model=route.model,
+                messages=prompt.messages,
+                temperature=route.temperature,
+                max_tokens=route.max_tokens
             )
+            response = await (asyncio.wait_for(completion, timeout) if timeout is not None else completion)
+            
+            usage = getattr(response, "usage", None)
+            prompt_builder.record_usage(prompt.prompt_tokens, getattr(usage, "prompt_tokens", None))
             
             reply = response.choices[0].message.content.strip()
+            if cache_key:
+                reply_cache.set(cache_key, reply)
+            if settings.local_answers_enabled:
+                local_answers.add(message_content, reply)
             
             # Ensure Telegram group link is included if customer hasn't received it
             reply = self._ensure_telegram_link_in_reply(reply, customer_id)
             
-            logger.info(f"Generated reply for customer {customer_id}: {reply[:100]}...")
+            logger.info(
+                f"Generated reply for customer {customer_id} "
+                f"(prompt {system_prompt.version}, tier {route.tier}/{route.model}, ~{prompt.prompt_tokens} tokens, {prompt.history_kept} history messages, "
+                f"{prompt.history_dropped} dropped): {reply[:100]}..."
+            )
             
             return reply
         
+        except asyncio.TimeoutError:
+            logger.error(f"OpenAI request timed out for customer {customer_id} (page {page_id})")
+            fallback = self._local_fallback(customer_id, local_answer)
+            if fallback:
+                return fallback
+            if deadline is not None:
+                return self._timeout_reply(customer_id)
+            raise APIError(
+                message="AI回复生成超时",
+                api_name="OpenAI"
+            )
         except openai.APIError as e:
             logger.error(f"OpenAI API error: {str(e)}", exc_info=True)
+            fallback = self._local_fallback(customer_id, local_answer)
+            if fallback:
+                return fallback
             raise APIError(
                 message=f"AI回复生成失败: {str(e)}",
                 api_name="OpenAI",
@@ -365,6 +389,77 @@ class ReplyGenerator:
                 f"生成回复时发生错误: {str(e)}"
             )
     
+    def _route(
+        self,
+        page_id: Optional[str],
+        customer_id: int,
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches],
+        history_length: int
+    ) -> RouteDecision:
+        """
+        选择模型档位（按消息长度、句子数、匹配的关键词分类、对话阶段和历史长度）
+        
+        路由规则见 config.yaml 的 ai_routing（页面可在 page_settings 中覆盖）。
+        """
+        stage = self.conversation_manager.get_conversation_state(customer_id).stage
+        features = model_router.features(message_content, keyword_matches, stage, history_length)
+        return model_router.route(page_id, features)
+    
+    @staticmethod
+    def _completion_deadline(deadline: Optional[float] = None, has_local_answer: bool = False) -> Optional[float]:
+        """
+        OpenAI 请求的等待时限（秒）
+        
+        本消息有可用的本地兜底回复时使用 LOCAL_ANSWERS_DEADLINE_SECONDS，
+        调用方传入回复时限时不超过剩余时间，都没有时返回 None（使用默认超时）。
+        """
+        timeout = None
+        if has_local_answer:
+            timeout = min(settings.local_answers_deadline_seconds, settings.openai_timeout_seconds)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            timeout = min(timeout or settings.openai_timeout_seconds, remaining)
+        return timeout
+    
+    def _timeout_reply(self, customer_id: int) -> str:
+        """回复时限已过且没有本地检索回复时使用的预设回复（ai_templates.timeout_reply）"""
+        reply = self._ensure_telegram_link_in_reply(self.templates.get_timeout_reply(), customer_id)
+        logger.warning(f"Reply deadline passed for customer {customer_id}, using preset timeout reply")
+        return reply
+    
+    @staticmethod
+    def _lookup_local_answer(message_content: str) -> Optional[LocalAnswer]:
+        """
+        在调用 OpenAI 之前查找本地兜底回复
+        
+        Returns:
+            最相似历史问题的问答对，索引为空或没有足够相似的历史问题时返回 None
+        """
+        if not settings.local_answers_enabled or not len(local_answers):
+            return None
+        try:
+            return local_answers.answer(message_content)
+        except Exception as e:
+            logger.warning(f"Local answer lookup failed: {str(e)}")
+            return None
+    
+    def _local_fallback(self, customer_id: int, local_answer: Optional[LocalAnswer]) -> Optional[str]:
+        """
+        OpenAI 超时或出错时，使用调用前查到的本地兜底回复
+        
+        Returns:
+            兜底回复，没有足够相似的历史问题时返回 None
+        """
+        if local_answer is None:
+            return None
+        
+        logger.warning(
+            f"Using local fallback reply for customer {customer_id} "
+            f"(score {local_answer.score}, matched: {local_answer.question[:50]})"
+        )
+        return self._ensure_telegram_link_in_reply(local_answer.answer, customer_id)
+    
     def generate_greeting(self) -> str:
         """生成问候语"""
         return self.templates.get_greeting()
@@ -1,46 +1,42 @@
 """Auto-reply scheduler - Periodically scan and reply to unreplied product-related messages"""
 import asyncio
 import logging
+import time
 import httpx
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 
 from src.database.database import SessionLocal
 from src.database.models import Conversation, Customer, Platform, MessageType
 from src.ai.reply_generator import ReplyGenerator
 from src.facebook.api_client import FacebookAPIClient
+from src.platforms.client_pool import client_pool
 from src.config import settings
 from src.config.page_token_manager import page_token_manager
 from src.config.page_settings import page_settings
 from src.ai.conversation_manager import ConversationManager
+from src.utils.keyword_engine import keyword_engine, PRODUCT
+from src.utils.rate_limiter import AsyncRateLimiter
 
 logger = logging.getLogger(__name__)
 
-# Product keywords list (consistent with reply_generator.py)
-PRODUCT_KEYWORDS = [
-    "iphone", "ip", "苹果", "apple", "loan", "borrow", "lend", "贷款", "借款",
-    "借", "贷", "price", "cost", "费用", "价格", "多少钱", "interest", "利息",
-    "model", "型号", "容量", "storage", "apple id", "id card", "身份证",
-    "咨询", "了解", "询问", "办理", "申请", "apply", "怎么", "如何", "how",
-    "服务", "service", "客服", "customer service", "legit", "legitimate",
-    "真实", "真的", "可靠", "reliable", "可信", "?", "？"
-]
-
 # Start date: December 13, 2025
 START_DATE = datetime(2025, 12, 13, 0, 0, 0, tzinfo=timezone.utc)
 
 # Unreplied time threshold: 5 minutes
 UNREPLIED_THRESHOLD_MINUTES = 5
 
+# Log backlog progress every N processed messages
+PROGRESS_LOG_EVERY = 10
+
 
 def contains_product_keyword(message_content: str) -> bool:
     """Check if message contains product keywords"""
     if not message_content:
         return False
 
-    message_lower = message_content.lower()
-    return any(keyword in message_lower for keyword in PRODUCT_KEYWORDS)
+    return keyword_engine.match(message_content).has(PRODUCT)
 
 
 class AutoReplyScheduler:
@@ -50,6 +46,12 @@ class AutoReplyScheduler:
         self.running = False
         self.task = None
         self.api_client = None
+        # Per-page pacing of Graph API sends
+        self.send_limiter = AsyncRateLimiter(
+            rate_per_second=settings.auto_reply_send_rate_per_second,
+            burst=settings.auto_reply_send_burst
+        )
+        self.last_scan: Dict[str, Any] = {}
 
     async def start(self):
         """Start auto-reply scheduler"""
@@ -104,6 +106,7 @@ class AutoReplyScheduler:
     async def _check_and_reply_unanswered_messages(self):
         """Check and reply to unreplied product-related messages from all enabled pages"""
         db = SessionLocal()
+        started = time.monotonic()
 
         try:
             # Get all enabled pages
@@ -137,12 +140,23 @@ class AutoReplyScheduler:
                     continue
 
             # Log summary
+            elapsed = time.monotonic() - started
+            self.last_scan = {
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "pages": total_scanned,
+                "unreplied_count": total_unreplied,
+                "replied_count": total_replied,
+                "error_count": total_errors,
+                "elapsed_seconds": round(elapsed, 2),
+                "replies_per_minute": round(total_replied / elapsed * 60, 1) if elapsed > 0 else 0
+            }
             logger.info(
-                f"Auto-reply scan completed: "
+                f"Auto-reply scan completed in {elapsed:.1f}s: "
                 f"scanned {total_scanned} pages, "
                 f"found {total_unreplied} unreplied messages, "
                 f"replied to {total_replied}, "
-                f"errors: {total_errors}"
+                f"errors: {total_errors}, "
+                f"throughput: {self.last_scan['replies_per_minute']} replies/min"
             )
 
         except Exception as e:
@@ -185,6 +199,17 @@ class AutoReplyScheduler:
         """
         Scan a single page for unreplied messages and reply
 
+        The backlog is processed in stages:
+        1. Prepare (sequential): spam check, sync to database, group by customer
+        2. Generate: up to AUTO_REPLY_GENERATION_CONCURRENCY customers at once
+           (further bounded by the shared OpenAI client's per-page limit)
+        3. Send: paced by a per-page token bucket instead of fixed sleeps
+
+        A customer's messages are handled in order so each reply sees the
+        conversation state left by the previous one. Each customer's replies are
+        generated and recorded with that customer's own database session, since
+        a Session must not be interleaved across concurrent coroutines.
+
         Returns:
             Statistics dictionary with counts
         """
@@ -193,10 +218,13 @@ class AutoReplyScheduler:
             "replied_count": 0,
             "error_count": 0
         }
+        started = time.monotonic()
 
         try:
-            # Create API client for this page
-            page_client = FacebookAPIClient(access_token=page_token)
+            # Pooled API client for this page (reuses keep-alive connections across scans)
+            page_client = client_pool.get("facebook", access_token=page_token, key=page_id)
+            if page_client is None:
+                raise RuntimeError("Failed to create Facebook API client")
 
             # Check for unreplied messages from API
             unreplied_messages = await page_client.check_unreplied_messages(
@@ -207,7 +235,6 @@ class AutoReplyScheduler:
             stats["unreplied_count"] = len(unreplied_messages)
 
             if not unreplied_messages:
-                await page_client.close()
                 return stats
 
             logger.info(
@@ -217,139 +244,234 @@ class AutoReplyScheduler:
             reply_generator = ReplyGenerator(db)
             conversation_manager = ConversationManager(db)
 
-            # Process each unreplied message
-            for idx, msg_data in enumerate(unreplied_messages):
-                try:
-                    # Add delay between API calls to avoid rate limiting
-                    # Delay: 0.5 seconds between messages, 1 second every 10 messages
-                    if idx > 0:
-                        if idx % 10 == 0:
-                            # Longer delay every 10 messages
-                            await asyncio.sleep(1.0)
-                        else:
-                            # Normal delay between messages
-                            await asyncio.sleep(0.5)
-
-                    message = msg_data["message"]
-                    message_content = message.get("message", "")
-
-                    if not message_content:
-                        continue
-
-                    # Check if message is spam (using intelligent detection)
-                    if reply_generator._is_spam_or_invalid(message_content):
-                        logger.debug(
-                            f"Skipping spam message: {message_content[:50]}")
-                        continue
-
-                    # Sync message to database if not exists
-                    conversation = await self._sync_message_to_database(
-                        db, message, msg_data["conversation_id"], page_id
-                    )
+            # Stage 1: prepare jobs grouped by customer
+            jobs_by_customer = await self._prepare_jobs(
+                db, conversation_manager, reply_generator, unreplied_messages, page_id, stats)
+            total_jobs = sum(len(jobs) for jobs in jobs_by_customer.values())
+            if not total_jobs:
+                return stats
 
-                    if not conversation:
-                        stats["error_count"] += 1
-                        continue
+            # Stages 2 and 3: concurrent generation, rate-limited sending
+            progress = {"done": 0, "total": total_jobs}
+            generation_slots = asyncio.Semaphore(settings.auto_reply_generation_concurrency)
+            await asyncio.gather(*(
+                self._reply_to_customer(
+                    page_client, page_id, jobs, generation_slots, stats, progress
+                )
+                for jobs in jobs_by_customer.values()
+            ))
 
-                    # Check if already replied
-                    if conversation.ai_replied:
-                        continue
+        except Exception as e:
+            logger.error(
+                f"Error scanning page {page_id}: {str(e)}", exc_info=True)
+            stats["error_count"] += 1
 
-                    # Get or create customer
-                    from_info = message.get("from", {})
-                    sender_id = from_info.get("id")
+        finally:
+            elapsed = time.monotonic() - started
+            stats["elapsed_seconds"] = round(elapsed, 2)
+            stats["replies_per_minute"] = round(stats["replied_count"] / elapsed * 60, 1) if elapsed > 0 else 0
+            if stats["unreplied_count"]:
+                logger.info(
+                    f"Page {page_id} scan finished in {elapsed:.1f}s: "
+                    f"replied {stats['replied_count']}/{stats['unreplied_count']}, "
+                    f"errors {stats['error_count']}, "
+                    f"throughput {stats['replies_per_minute']} replies/min"
+                )
 
-                    if not sender_id:
-                        stats["error_count"] += 1
-                        continue
+        return stats
 
-                    customer = conversation_manager.get_or_create_customer(
-                        platform=Platform.FACEBOOK,
-                        platform_user_id=sender_id,
-                        name=from_info.get("name")
-                    )
+    async def _prepare_jobs(
+        self,
+        db: Session,
+        conversation_manager: ConversationManager,
+        reply_generator: ReplyGenerator,
+        unreplied_messages: List[Dict[str, Any]],
+        page_id: str,
+        stats: Dict[str, int]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Filter spam, sync messages to the database and group reply jobs by customer
 
-                    # Generate AI reply
-                    ai_reply = await reply_generator.generate_reply(
-                        customer_id=customer.id,
-                        message_content=message_content,
-                        customer_name=customer.name
-                    )
+        Returns:
+            Mapping of sender_id to that customer's jobs in message order
+        """
+        jobs_by_customer: Dict[str, List[Dict[str, Any]]] = {}
 
-                    if not ai_reply:
-                        logger.debug(
-                            f"Message {conversation.id} did not generate reply (may be flagged as spam)")
-                        stats["error_count"] += 1
-                        continue
-
-                    # Send reply
-                    try:
-                        await page_client.send_message(
-                            recipient_id=sender_id,
-                            message=ai_reply,
-                            page_id=page_id
-                        )
+        for msg_data in unreplied_messages:
+            try:
+                message = msg_data["message"]
+                message_content = message.get("message", "")
 
-                        # Update conversation record
-                        conversation_manager.update_ai_reply(
-                            conversation.id, ai_reply)
+                if not message_content:
+                    continue
 
-                        stats["replied_count"] += 1
-                        logger.info(
-                            f"✅ Auto-replied to message {conversation.id} "
-                            f"(Customer: {customer.name or sender_id}): {message_content[:50]}..."
-                        )
-                    except Exception as e:
-                        # Check if it's a 24-hour window limit error
-                        from src.utils.exceptions import APIError
-                        is_24h_window_error = False
-
-                        if isinstance(e, APIError):
-                            # Check if it's 24-hour window limit
-                            error_subcode = e.details.get("error_subcode")
-                            if error_subcode in [2018001, 2018278] or "24小时" in e.message:
-                                is_24h_window_error = True
-                        elif isinstance(e, httpx.HTTPStatusError):
-                            # Check HTTP response for 24-hour window error
-                            if e.response.status_code == 400:
-                                try:
-                                    error_detail = e.response.json()
-                                    error_info = error_detail.get("error", {})
-                                    error_subcode = error_info.get(
-                                        "error_subcode")
-                                    if error_subcode in [2018001, 2018278]:
-                                        is_24h_window_error = True
-                                except:
-                                    pass
-
-                        if is_24h_window_error:
-                            logger.warning(
-                                f"⏰ 跳过消息 {conversation.id}: 超过24小时消息发送窗口限制。"
-                                f"用户需要先发送新消息才能回复。"
-                            )
-                            # Don't count as error, just skip
-                            continue
-
-                        # For other errors, log and count as error
-                        logger.error(
-                            f"Failed to send message to {sender_id}: {str(e)}", exc_info=True)
-                        stats["error_count"] += 1
-                        continue
+                # Check if message is spam (using intelligent detection)
+                if reply_generator._is_spam_or_invalid(message_content):
+                    logger.debug(
+                        f"Skipping spam message: {message_content[:50]}")
+                    continue
+
+                # Sync message to database if not exists
+                conversation = await self._sync_message_to_database(
+                    db, message, msg_data["conversation_id"], page_id
+                )
+
+                if not conversation:
+                    stats["error_count"] += 1
+                    continue
+
+                # Check if already replied
+                if conversation.ai_replied:
+                    continue
+
+                # Get or create customer
+                from_info = message.get("from", {})
+                sender_id = from_info.get("id")
+
+                if not sender_id:
+                    stats["error_count"] += 1
+                    continue
+
+                customer = conversation_manager.get_or_create_customer(
+                    platform=Platform.FACEBOOK,
+                    platform_user_id=sender_id,
+                    name=from_info.get("name")
+                )
+
+                jobs_by_customer.setdefault(sender_id, []).append({
+                    "conversation_id": conversation.id,
+                    "customer_id": customer.id,
+                    "customer_name": customer.name,
+                    "sender_id": sender_id,
+                    "message_content": message_content
+                })
+
+            except Exception as e:
+                logger.error(
+                    f"Failed to prepare unreplied message: {str(e)}", exc_info=True)
+                stats["error_count"] += 1
 
+        return jobs_by_customer
+
+    async def _reply_to_customer(
+        self,
+        page_client: Any,
+        page_id: str,
+        jobs: List[Dict[str, Any]],
+        generation_slots: asyncio.Semaphore,
+        stats: Dict[str, int],
+        progress: Dict[str, int]
+    ):
+        """
+        Generate and send replies for one customer's messages in order
+
+        Customers are handled concurrently, so each one uses its own session
+        (and the generator/manager bound to it) instead of the scan's session.
+        """
+        db = SessionLocal()
+        try:
+            reply_generator = ReplyGenerator(db)
+            conversation_manager = ConversationManager(db)
+            for job in jobs:
+                try:
+                    await self._reply_to_message(
+                        reply_generator, conversation_manager, page_client, page_id,
+                        job, generation_slots, stats
+                    )
                 except Exception as e:
                     logger.error(
                         f"Failed to process unreplied message: {str(e)}", exc_info=True)
                     stats["error_count"] += 1
-                    continue
+                    db.rollback()
+                finally:
+                    progress["done"] += 1
+                    if progress["done"] % PROGRESS_LOG_EVERY == 0 and progress["done"] < progress["total"]:
+                        logger.info(
+                            f"Page {page_id} auto-reply progress: {progress['done']}/{progress['total']} "
+                            f"(replied {stats['replied_count']}, errors {stats['error_count']})"
+                        )
+        finally:
+            db.close()
+
+    async def _reply_to_message(
+        self,
+        reply_generator: ReplyGenerator,
+        conversation_manager: ConversationManager,
+        page_client: Any,
+        page_id: str,
+        job: Dict[str, Any],
+        generation_slots: asyncio.Semaphore,
+        stats: Dict[str, int]
+    ):
+        """Generate one reply (bounded concurrency) and send it (rate limited)"""
+        conversation_id = job["conversation_id"]
+        sender_id = job["sender_id"]
+        message_content = job["message_content"]
+
+        # Generate AI reply
+        async with generation_slots:
+            ai_reply = await reply_generator.generate_reply(
+                customer_id=job["customer_id"],
+                message_content=message_content,
+                customer_name=job["customer_name"],
+                page_id=page_id
+            )
 
-            await page_client.close()
+        if not ai_reply:
+            logger.debug(
+                f"Message {conversation_id} did not generate reply (may be flagged as spam)")
+            stats["error_count"] += 1
+            return
 
+        # Send reply (paced per page)
+        await self.send_limiter.acquire(page_id)
+        try:
+            await page_client.send_message(
+                recipient_id=sender_id,
+                message=ai_reply,
+                page_id=page_id
+            )
         except Exception as e:
+            if self._is_24h_window_error(e):
+                logger.warning(
+                    f"⏰ 跳过消息 {conversation_id}: 超过24小时消息发送窗口限制。"
+                    f"用户需要先发送新消息才能回复。"
+                )
+                # Don't count as error, just skip
+                return
+
+            # For other errors, log and count as error
             logger.error(
-                f"Error scanning page {page_id}: {str(e)}", exc_info=True)
+                f"Failed to send message to {sender_id}: {str(e)}", exc_info=True)
             stats["error_count"] += 1
+            return
 
-        return stats
+        # Update conversation record
+        conversation_manager.update_ai_reply(conversation_id, ai_reply)
+
+        stats["replied_count"] += 1
+        logger.info(
+            f"✅ Auto-replied to message {conversation_id} "
+            f"(Customer: {job['customer_name'] or sender_id}): {message_content[:50]}..."
+        )
+
+    @staticmethod
+    def _is_24h_window_error(error: Exception) -> bool:
+        """Check whether a send failed because of the 24-hour messaging window"""
+        from src.utils.exceptions import APIError
+
+        if isinstance(error, APIError):
+            error_subcode = error.details.get("error_subcode")
+            return error_subcode in [2018001, 2018278] or "24小时" in error.message
+
+        if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 400:
+            try:
+                error_info = error.response.json().get("error", {})
+                return error_info.get("error_subcode") in [2018001, 2018278]
+            except Exception:
+                return False
+
+        return False
 
     async def _sync_message_to_database(
         self,
@@ -369,14 +491,6 @@ class AutoReplyScheduler:
             if not message_id:
                 return None
 
-            # Check if message already exists in database
-            existing = db.query(Conversation).filter(
-                Conversation.platform_message_id == message_id
-            ).first()
-
-            if existing:
-                return existing
-
             # Get sender info
             from_info = message.get("from", {})
             sender_id = from_info.get("id")
@@ -409,8 +523,9 @@ class AutoReplyScheduler:
             else:
                 created_time = datetime.now(timezone.utc)
 
-            # Create conversation record
-            conversation = conversation_manager.save_conversation(
+            # Create conversation record (insert-or-ignore: a message already saved by
+            # the webhook pipeline or an earlier scan returns the existing record)
+            conversation, created = conversation_manager.save_conversation_if_new(
                 customer_id=customer.id,
                 platform_message_id=message_id,
                 platform=Platform.FACEBOOK,
@@ -420,12 +535,12 @@ class AutoReplyScheduler:
                     "page_id": page_id,
                     "conversation_id": conversation_id,
                     "from": from_info
-                }
+                },
+                received_at=created_time
             )
 
-            # Set received_at to the actual message time
-            conversation.received_at = created_time
-            db.commit()
+            if not created:
+                return conversation
 
             logger.debug(f"Synced message {message_id} to database")
             return conversation
@@ -436,6 +551,15 @@ class AutoReplyScheduler:
             db.rollback()
             return None
 
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get scheduler metrics (last scan summary and send pacing)"""
+        return {
+            "running": self.running,
+            "generation_concurrency": settings.auto_reply_generation_concurrency,
+            "last_scan": self.last_scan,
+            "send_limiter": self.send_limiter.get_metrics()
+        }
+
 
 # Global scheduler instance
 auto_reply_scheduler = AutoReplyScheduler()
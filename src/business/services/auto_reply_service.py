@@ -9,6 +9,7 @@ from src.config.page_settings import page_settings
 from src.ai.reply_generator import ReplyGenerator
 from src.statistics.tracker import StatisticsTracker
 from src.facebook.message_parser import MessageType
+from src.utils.keyword_engine import keyword_engine, QUESTION_PREFIX, QUESTION_CATEGORY_KEYWORDS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,6 +34,7 @@ class AutoReplyService(BaseBusinessService):
                 - platform_client: 平台客户端
                 - message_summary: 消息摘要
                 - platform_name: 平台名称
+                - deadline: AI回复时限（time.monotonic() 时间点，可选）
         
         Returns:
             执行结果字典
@@ -63,7 +65,10 @@ class AutoReplyService(BaseBusinessService):
             ai_reply = await reply_generator.generate_reply(
                 customer_id=customer_id,
                 message_content=message_data.get("content", ""),
-                customer_name=customer.name if customer else None
+                customer_name=customer.name if customer else None,
+                page_id=page_id,
+                keyword_matches=context.get("keyword_matches"),
+                deadline=context.get("deadline")
             )
         except Exception as e:
             logger.error(f"AI回复生成失败: {str(e)}", exc_info=True)
@@ -193,18 +198,9 @@ class AutoReplyService(BaseBusinessService):
         Returns:
             问题分类
         """
-        question_lower = question_text.lower()
-        
-        if any(keyword in question_lower for keyword in ["价格", "价格", "price", "cost", "费用", "收费"]):
-            return "价格咨询"
-        elif any(keyword in question_lower for keyword in ["如何", "怎么", "how", "how to", "方法", "步骤"]):
-            return "使用指导"
-        elif any(keyword in question_lower for keyword in ["问题", "错误", "problem", "error", "bug", "故障"]):
-            return "问题反馈"
-        elif any(keyword in question_lower for keyword in ["功能", "feature", "功能", "特性"]):
-            return "功能介绍"
-        else:
-            return "一般咨询"
+        matches = keyword_engine.match(question_text)
+        category = matches.first_category(QUESTION_PREFIX, QUESTION_CATEGORY_KEYWORDS)
+        return category or "一般咨询"
     
     async def _send_error_notification(
         self,
@@ -1,10 +1,11 @@
 """资料收集模块"""
-import re
 from typing import Dict, Any, Optional, List
 from sqlalchemy.orm import Session
 from src.database.models import CollectedData, Conversation
 from src.collector.data_validator import DataValidator
-from src.config import yaml_config
+from src.collector.email_verification import email_verifier, apply_deliverability
+from src.collector.extraction_engine import extraction_engine
+from src.utils.keyword_engine import KeywordMatches
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,68 +17,33 @@ class DataCollector:
     def __init__(self, db: Session):
         self.db = db
         self.validator = DataValidator()
-        self.required_fields = yaml_config.get("data_collection", {}).get("required_fields", [])
-        self.optional_fields = yaml_config.get("data_collection", {}).get("optional_fields", [])
+        self.required_fields = extraction_engine.required_fields
+        self.optional_fields = extraction_engine.optional_fields
     
-    def extract_info_from_message(self, message_content: str) -> Dict[str, Any]:
+    def extract_info_from_message(
+        self,
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches] = None,
+        page_id: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        从消息中提取信息
+        从消息中提取信息（使用共享的 extraction_engine）
         
         Args:
             message_content: 消息内容
+            keyword_matches: 已计算的关键词匹配结果（为空时现场扫描）
+            page_id: 页面ID（电话号码按页面配置的地区规范化）
         
         Returns:
             提取的信息字典
         """
-        extracted = {}
-        
-        # 提取邮箱
-        email = self.validator.extract_email(message_content)
-        if email:
-            extracted["email"] = email
-        
-        # 提取电话
-        phone = self.validator.extract_phone(message_content)
-        if phone:
-            extracted["phone"] = phone
-        
-        # 提取姓名（简单规则：寻找"我是"、"姓名"等关键词后的内容）
-        name_patterns = [
-            r'我是[：:]\s*([^\s，,。.]+)',
-            r'姓名[：:]\s*([^\s，,。.]+)',
-            r'我叫[：:]\s*([^\s，,。.]+)',
-            r'name[：:]\s*([^\s，,。.]+)',
-        ]
-        
-        for pattern in name_patterns:
-            match = re.search(pattern, message_content, re.IGNORECASE)
-            if match:
-                extracted["name"] = match.group(1).strip()
-                break
-        
-        # 提取需求类型
-        inquiry_keywords = {
-            "咨询": ["咨询", "了解", "询问"],
-            "购买": ["购买", "买", "价格", "多少钱"],
-            "投诉": ["投诉", "不满", "问题"],
-            "合作": ["合作", "代理", "加盟"],
-        }
-        
-        message_lower = message_content.lower()
-        for inquiry_type, keywords in inquiry_keywords.items():
-            if any(keyword in message_content or keyword.lower() in message_lower for keyword in keywords):
-                extracted["inquiry_type"] = inquiry_type
-                break
-        
-        # 保存原始消息内容
-        extracted["message_content"] = message_content
-        
-        return extracted
+        return extraction_engine.extract(message_content, keyword_matches, page_id)
     
     def collect_from_conversation(
         self,
         conversation_id: int,
-        message_content: str
+        message_content: str,
+        page_id: Optional[str] = None
     ) -> CollectedData:
         """
         从对话中收集资料并保存
@@ -85,12 +51,13 @@ class DataCollector:
         Args:
             conversation_id: 对话 ID
             message_content: 消息内容
+            page_id: 页面ID
         
         Returns:
             创建的收集数据记录
         """
         # 提取信息
-        extracted_data = self.extract_info_from_message(message_content)
+        extracted_data = self.extract_info_from_message(message_content, page_id=page_id)
         
         # 验证数据
         validation_result = self.validator.validate_collected_data(extracted_data)
@@ -103,10 +70,26 @@ class DataCollector:
             validation_errors=validation_result["errors"] if not validation_result["is_valid"] else None
         )
         
+        # 域名可投递性：有缓存结果时直接使用，否则记录先标记为未验证，提交后交给后台检查
+        email = collected_data.data.get("email")
+        pending_email = None
+        if email and email_verifier.check_deliverability:
+            cached = email_verifier.cached_deliverability(email)
+            if cached is not None:
+                apply_deliverability(collected_data, *cached)
+            elif email_verifier.running:
+                pending_email = email
+                collected_data.is_validated = False
+        
         self.db.add(collected_data)
         self.db.commit()
         self.db.refresh(collected_data)
         
+        if pending_email and not email_verifier.submit(collected_data.id, pending_email):
+            # 队列已满：保留语法检查的结果
+            collected_data.is_validated = validation_result["is_valid"]
+            self.db.commit()
+        
         logger.info(f"Collected data for conversation {conversation_id}: {validation_result['data']}")
         
         return collected_data
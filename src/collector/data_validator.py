@@ -1,32 +1,20 @@
 """数据验证和清洗"""
 import re
-from typing import Dict, Any, List, Optional, Tuple
-try:
-    from email_validator import validate_email, EmailNotValidError
-except ImportError:
-    # 如果没有安装 email_validator，使用简单的正则验证
-    EmailNotValidError = Exception
-    def validate_email(email: str):
-        pattern = r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}$'
-        if not re.match(pattern, email):
-            raise Exception("Invalid email format")
-        return True
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from src.collector.email_verification import email_verifier
+from src.collector.phone_scanner import phone_scanner
+
+# 邮箱地址（从文本中提取）
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
 
 
 class DataValidator:
     """数据验证器"""
     
-    # 电话号码正则表达式（支持多种格式）
-    PHONE_PATTERNS = [
-        r'1[3-9]\d{9}',  # 中国手机号
-        r'\d{3}-\d{3}-\d{4}',  # 美国格式
-        r'\+?\d{1,3}[-.\s]?\(?\d{1,4}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,9}',  # 国际格式
-    ]
-    
     @staticmethod
     def validate_email(email: str) -> Tuple[bool, Optional[str]]:
         """
-        验证邮箱地址
+        验证邮箱地址（只检查语法，不访问网络；域名可投递性由 email_verifier 在后台检查）
         
         Args:
             email: 邮箱地址
@@ -37,19 +25,16 @@ class DataValidator:
         if not email:
             return False, "邮箱地址为空"
         
-        try:
-            validate_email(email)
-            return True, None
-        except EmailNotValidError as e:
-            return False, str(e)
+        return email_verifier.check_syntax(email)
     
     @staticmethod
-    def validate_phone(phone: str) -> Tuple[bool, Optional[str]]:
+    def validate_phone(phone: str, regions: Optional[Sequence[str]] = None) -> Tuple[bool, Optional[str]]:
         """
         验证电话号码
         
         Args:
             phone: 电话号码
+            regions: 没有国家码的号码所属地区（为空时使用默认地区）
         
         Returns:
             (是否有效, 错误信息)
@@ -57,32 +42,23 @@ class DataValidator:
         if not phone:
             return False, "电话号码为空"
         
-        # 移除常见分隔符
-        cleaned = re.sub(r'[-.\s()]', '', phone)
-        
-        # 检查是否符合任一模式
-        for pattern in DataValidator.PHONE_PATTERNS:
-            if re.search(pattern, phone):
-                return True, None
-        
-        return False, "电话号码格式不正确"
+        if phone_scanner.normalize(phone, regions) is None:
+            return False, "电话号码格式不正确"
+        return True, None
     
     @staticmethod
-    def extract_phone(text: str) -> Optional[str]:
+    def extract_phone(text: str, regions: Optional[Sequence[str]] = None) -> Optional[str]:
         """
         从文本中提取电话号码
         
         Args:
             text: 文本内容
+            regions: 没有国家码的号码所属地区（为空时使用默认地区）
         
         Returns:
-            提取的电话号码，如果未找到则返回 None
+            提取的电话号码（E.164 格式），如果未找到则返回 None
         """
-        for pattern in DataValidator.PHONE_PATTERNS:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(0)
-        return None
+        return phone_scanner.extract(text, regions)
     
     @staticmethod
     def extract_email(text: str) -> Optional[str]:
@@ -95,8 +71,7 @@ class DataValidator:
         Returns:
             提取的邮箱地址，如果未找到则返回 None
         """
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        match = re.search(email_pattern, text)
+        match = EMAIL_PATTERN.search(text)
         if match:
             return match.group(0)
         return None
@@ -125,11 +100,11 @@ class DataValidator:
         
         # 验证电话
         if "phone" in data and data["phone"]:
-            is_valid, error = DataValidator.validate_phone(data["phone"])
-            if is_valid:
-                validated_data["phone"] = data["phone"]
+            phone = phone_scanner.normalize(data["phone"])
+            if phone:
+                validated_data["phone"] = phone
             else:
-                errors["phone"] = error
+                errors["phone"] = "电话号码格式不正确"
         
         # 其他字段直接复制
         for key, value in data.items():
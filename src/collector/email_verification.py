@@ -0,0 +1,371 @@
+"""邮箱验证 - 同步的语法检查（按域名缓存）和后台的可投递性检查"""
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from email_validator import validate_email, EmailNotValidError, EmailUndeliverableError
+    HAS_EMAIL_VALIDATOR = True
+except ImportError:
+    # 如果没有安装 email_validator，使用简单的正则验证（不支持可投递性检查）
+    HAS_EMAIL_VALIDATOR = False
+    EmailNotValidError = ValueError
+    EmailUndeliverableError = ValueError
+
+    def validate_email(email: str, **kwargs):
+        pattern = r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}$'
+        if not re.match(pattern, email):
+            raise EmailNotValidError("Invalid email format")
+        return True
+
+# 检查域名时使用的本地部分（每个域名都应接受 postmaster）
+DOMAIN_PROBE_LOCAL_PART = "postmaster"
+
+# 等待可投递性检查的最大记录数（超出时不再排队，记录保留语法检查结果）
+MAX_PENDING_CHECKS = 1000
+
+
+@dataclass
+class _DomainStatus:
+    """域名的缓存结果"""
+    syntax_checked: bool = False
+    syntax_error: Optional[str] = None  # 域名部分的语法错误
+    deliverable: Optional[bool] = None  # None 表示尚未检查
+    deliverability_error: Optional[str] = None
+    checked_at: float = 0.0
+
+
+def email_domain(email: str) -> str:
+    """邮箱地址的域名部分（小写）"""
+    return email.rpartition("@")[2].strip().lower()
+
+
+class EmailVerifier:
+    """
+    邮箱验证器
+
+    - check_syntax() 只做语法检查（不访问网络），域名部分的结果按域名缓存，
+      同一个无效域名不会重复解析
+    - 开启可投递性检查时，submit() 把收集记录交给后台 worker：在线程中查询域名的 DNS 记录
+      （同一域名并发的检查共用一次查询），结果按域名缓存（不可投递的域名使用单独的 TTL），
+      然后更新 CollectedData.is_validated
+    """
+
+    def __init__(
+        self,
+        check_deliverability: Optional[bool] = None,
+        concurrency: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        cache_size: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        negative_ttl_seconds: Optional[float] = None
+    ):
+        """
+        初始化验证器
+
+        Args:
+            check_deliverability: 是否在后台检查域名可投递性
+            concurrency: 同时进行的 DNS 查询数（worker 数量）
+            timeout_seconds: 单次 DNS 查询超时时间（秒）
+            cache_size: 缓存的域名数量
+            ttl_seconds: 可投递域名的缓存时间（秒）
+            negative_ttl_seconds: 不可投递域名的缓存时间（秒）
+        """
+        self.check_deliverability = (
+            settings.email_check_deliverability if check_deliverability is None else check_deliverability
+        ) and HAS_EMAIL_VALIDATOR
+        self.concurrency = max(1, concurrency or settings.email_deliverability_concurrency)
+        self.timeout = timeout_seconds or settings.email_deliverability_timeout_seconds
+        self.cache_size = max(1, cache_size or settings.email_domain_cache_size)
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.email_deliverability_ttl_seconds
+        self.negative_ttl = (
+            negative_ttl_seconds
+            if negative_ttl_seconds is not None
+            else settings.email_deliverability_negative_ttl_seconds
+        )
+        self._domains: "OrderedDict[str, _DomainStatus]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._lookups: Dict[str, asyncio.Future] = {}
+        self.running = False
+
+        # 指标
+        self.syntax_checks = 0
+        self.syntax_cache_hits = 0
+        self.deliverability_lookups = 0
+        self.deliverability_cache_hits = 0
+        self.negative_cache_hits = 0
+        self.undeliverable_count = 0
+        self.dropped_count = 0
+        self.updated_count = 0
+        self.lookup_latencies: List[float] = []
+
+    def _status(self, domain: str) -> _DomainStatus:
+        """获取（或创建）域名的缓存条目（LRU）"""
+        with self._lock:
+            status = self._domains.get(domain)
+            if status is None:
+                status = self._domains[domain] = _DomainStatus()
+                if len(self._domains) > self.cache_size:
+                    self._domains.popitem(last=False)
+            else:
+                self._domains.move_to_end(domain)
+            return status
+
+    def check_syntax(self, email: str) -> Tuple[bool, Optional[str]]:
+        """
+        检查邮箱地址语法（不访问网络）
+
+        Args:
+            email: 邮箱地址
+
+        Returns:
+            (是否有效, 错误信息)
+        """
+        self.syntax_checks += 1
+        if "@" not in email:
+            return self._validate(email)
+
+        status = self._status(email_domain(email))
+        if status.syntax_error is not None:
+            self.syntax_cache_hits += 1
+            return False, status.syntax_error
+        if not status.syntax_checked:
+            # 新域名：先单独检查域名部分并缓存结果
+            is_valid, error = self._validate(f"{DOMAIN_PROBE_LOCAL_PART}@{email_domain(email)}")
+            status.syntax_checked = True
+            if not is_valid:
+                status.syntax_error = error
+                return False, error
+        else:
+            self.syntax_cache_hits += 1
+        return self._validate(email)
+
+    @staticmethod
+    def _validate(email: str) -> Tuple[bool, Optional[str]]:
+        try:
+            validate_email(email, check_deliverability=False)
+            return True, None
+        except EmailNotValidError as e:
+            return False, str(e)
+
+    def cached_deliverability(self, email: str) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        域名可投递性的缓存结果
+
+        Returns:
+            (是否可投递, 错误信息)，没有未过期的结果时返回 None
+        """
+        with self._lock:
+            status = self._domains.get(email_domain(email))
+        if status is None or status.deliverable is None:
+            return None
+        ttl = self.ttl if status.deliverable else self.negative_ttl
+        if time.monotonic() - status.checked_at > ttl:
+            return None
+        if status.deliverable:
+            self.deliverability_cache_hits += 1
+        else:
+            self.negative_cache_hits += 1
+        return status.deliverable, status.deliverability_error
+
+    async def start(self):
+        """启动后台可投递性检查 worker"""
+        if self.running or not self.check_deliverability:
+            return
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=MAX_PENDING_CHECKS)
+        self._workers = [asyncio.create_task(self._run_worker()) for _ in range(self.concurrency)]
+        logger.info(f"Email deliverability workers started ({self.concurrency} workers)")
+
+    async def stop(self):
+        """停止 worker（未完成的记录保留语法检查结果）"""
+        if not self.running:
+            return
+        self.running = False
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._lookups = {}
+        logger.info("Email deliverability workers stopped")
+
+    def submit(self, collected_data_id: int, email: str) -> bool:
+        """
+        提交一条收集记录的可投递性检查（可在任意线程中调用）
+
+        Args:
+            collected_data_id: CollectedData ID
+            email: 已通过语法检查的邮箱地址
+
+        Returns:
+            是否已排队（worker 未运行或队列已满时返回 False）
+        """
+        if not self.running or self._queue is None:
+            return False
+        if self._queue.full():
+            self.dropped_count += 1
+            return False
+        item = (collected_data_id, email)
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._queue.put_nowait(item)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, item)
+        return True
+
+    def _enqueue(self, item: Tuple[int, str]):
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped_count += 1
+
+    async def _run_worker(self):
+        while self.running:
+            collected_data_id, email = await self._queue.get()
+            try:
+                deliverable, error = await self.check_deliverability_async(email)
+                if await asyncio.to_thread(self._apply_result, collected_data_id, email, deliverable, error):
+                    self.updated_count += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Email deliverability check failed for record {collected_data_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def check_deliverability_async(self, email: str) -> Tuple[bool, Optional[str]]:
+        """
+        检查邮箱域名可投递性（DNS 查询在线程中进行，同一域名并发的检查共用一次查询）
+
+        Returns:
+            (是否可投递, 错误信息)；查询超时等无法确定的情况视为可投递（不缓存）
+        """
+        cached = self.cached_deliverability(email)
+        if cached is not None:
+            return cached
+
+        domain = email_domain(email)
+        lookup = self._lookups.get(domain)
+        if lookup is None:
+            lookup = self._lookups[domain] = asyncio.ensure_future(asyncio.to_thread(self._lookup, domain))
+            lookup.add_done_callback(lambda _: self._lookups.pop(domain, None))
+        return await asyncio.shield(lookup)
+
+    def _lookup(self, domain: str) -> Tuple[bool, Optional[str]]:
+        """查询域名的 DNS 记录（阻塞，在线程中调用）并缓存结果"""
+        self.deliverability_lookups += 1
+        started = time.perf_counter()
+        try:
+            validate_email(
+                f"{DOMAIN_PROBE_LOCAL_PART}@{domain}",
+                check_deliverability=True,
+                timeout=self.timeout
+            )
+            result = (True, None)
+        except EmailUndeliverableError as e:
+            result = (False, str(e))
+            self.undeliverable_count += 1
+        except EmailNotValidError as e:
+            result = (False, str(e))
+        except Exception as e:
+            logger.warning(f"Email deliverability lookup for {domain} failed: {str(e)}")
+            return True, None
+        finally:
+            self.lookup_latencies.append((time.perf_counter() - started) * 1000)
+            if len(self.lookup_latencies) > 1000:
+                self.lookup_latencies = self.lookup_latencies[-1000:]
+
+        status = self._status(domain)
+        status.deliverable, status.deliverability_error = result
+        status.checked_at = time.monotonic()
+        return result
+
+    @staticmethod
+    def _apply_result(collected_data_id: int, email: str, deliverable: bool, error: Optional[str]) -> bool:
+        """
+        把可投递性检查结果写回收集记录
+
+        Returns:
+            是否更新了记录（记录不存在或邮箱已变化时不更新）
+        """
+        from src.database.database import SessionLocal
+        from src.database.models import CollectedData
+
+        db = SessionLocal()
+        try:
+            record = db.query(CollectedData).filter(CollectedData.id == collected_data_id).first()
+            if record is None or (record.data or {}).get("email") != email:
+                return False
+            apply_deliverability(record, deliverable, error)
+            db.commit()
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取邮箱验证指标"""
+        if self.lookup_latencies:
+            latencies = sorted(self.lookup_latencies)
+            p95_ms = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        else:
+            p95_ms = 0
+        return {
+            "check_deliverability": self.check_deliverability,
+            "cached_domains": len(self._domains),
+            "syntax_checks": self.syntax_checks,
+            "syntax_cache_hits": self.syntax_cache_hits,
+            "pending_checks": self._queue.qsize() if self._queue is not None else 0,
+            "deliverability_lookups": self.deliverability_lookups,
+            "deliverability_cache_hits": self.deliverability_cache_hits,
+            "negative_cache_hits": self.negative_cache_hits,
+            "undeliverable_count": self.undeliverable_count,
+            "updated_count": self.updated_count,
+            "dropped_count": self.dropped_count,
+            "p95_lookup_ms": round(p95_ms, 2)
+        }
+
+    def clear(self):
+        """清空域名缓存"""
+        with self._lock:
+            self._domains.clear()
+
+
+def apply_deliverability(record, deliverable: bool, error: Optional[str]):
+    """
+    按可投递性结果更新收集记录（不可投递的邮箱移到验证错误中）
+
+    Args:
+        record: CollectedData 记录
+        deliverable: 是否可投递
+        error: 不可投递的原因
+    """
+    errors = dict(record.validation_errors or {})
+    if not deliverable:
+        data = dict(record.data or {})
+        data.pop("email", None)
+        record.data = data
+        errors["email"] = error or "邮箱域名无法接收邮件"
+    record.validation_errors = errors or None
+    record.is_validated = not errors
+
+
+# 全局邮箱验证器实例
+email_verifier = EmailVerifier()
@@ -0,0 +1,191 @@
+"""资料提取引擎 - 按配置编译一次，从消息中提取邮箱、电话、姓名和需求类型"""
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from src.config import settings
+from src.collector.data_validator import EMAIL_PATTERN
+from src.collector.phone_scanner import phone_scanner
+from src.utils.keyword_engine import (
+    KeywordMatches, keyword_engine, INQUIRY_PREFIX, INQUIRY_TYPE_KEYWORDS
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 内置姓名规则（按顺序匹配，第一个捕获组是姓名）
+NAME_PATTERNS = [
+    r'我是[：:]\s*([^\s，,。.]+)',
+    r'姓名[：:]\s*([^\s，,。.]+)',
+    r'我叫[：:]\s*([^\s，,。.]+)',
+    r'name[：:]\s*([^\s，,。.]+)',
+]
+
+# 进程池每个任务处理的消息数
+EXTRACTION_CHUNK_SIZE = 1000
+
+
+class ExtractionEngine:
+    """
+    资料提取引擎
+
+    姓名规则（内置规则和 data_collection.name_patterns）、邮箱正则在配置加载时编译一次，
+    需求类型使用共享关键词自动机（src.utils.keyword_engine）的匹配结果，
+    所有消息共用同一个引擎，不再为每条消息重新读取配置。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self._lock = threading.Lock()
+        self.reload(config)
+
+    def reload(self, config: Optional[Dict[str, Any]] = None):
+        """
+        按配置重新编译
+
+        Args:
+            config: YAML 配置，默认使用全局 yaml_config
+        """
+        if config is None:
+            from src.config import yaml_config
+            config = yaml_config
+
+        collection_config = config.get("data_collection", {}) or {}
+        name_patterns = []
+        for pattern in NAME_PATTERNS + list(collection_config.get("name_patterns", []) or []):
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.warning(f"Ignoring invalid name pattern {pattern!r}: {str(e)}")
+                continue
+            if compiled.groups < 1:
+                logger.warning(f"Ignoring name pattern without capture group: {pattern!r}")
+                continue
+            name_patterns.append(compiled)
+
+        with self._lock:
+            self._name_patterns = name_patterns
+            self.required_fields = list(collection_config.get("required_fields", []) or [])
+            self.optional_fields = list(collection_config.get("optional_fields", []) or [])
+        logger.debug(f"Extraction engine compiled {len(name_patterns)} name patterns")
+
+    def extract(
+        self,
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches] = None,
+        page_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        从消息中提取信息
+
+        Args:
+            message_content: 消息内容
+            keyword_matches: 已计算的关键词匹配结果（为空时现场扫描）
+            page_id: 页面ID（电话号码按页面配置的地区规范化）
+
+        Returns:
+            提取的信息字典
+        """
+        return self._extract(message_content, keyword_matches, phone_scanner.regions_for_page(page_id))
+
+    def _extract(
+        self,
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches],
+        regions: Sequence[str]
+    ) -> Dict[str, Any]:
+        extracted = {}
+
+        # 提取邮箱
+        match = EMAIL_PATTERN.search(message_content)
+        if match:
+            extracted["email"] = match.group(0)
+
+        # 提取电话
+        phone = phone_scanner.extract(message_content, regions)
+        if phone:
+            extracted["phone"] = phone
+
+        # 提取姓名（按顺序取第一个匹配的规则）
+        for pattern in self._name_patterns:
+            match = pattern.search(message_content)
+            if match:
+                extracted["name"] = match.group(1).strip()
+                break
+
+        # 提取需求类型（按 INQUIRY_TYPE_KEYWORDS 顺序取第一个匹配的类型）
+        if keyword_matches is None:
+            keyword_matches = keyword_engine.match(message_content)
+        inquiry_type = keyword_matches.first_category(INQUIRY_PREFIX, INQUIRY_TYPE_KEYWORDS)
+        if inquiry_type:
+            extracted["inquiry_type"] = inquiry_type
+
+        # 保存原始消息内容
+        extracted["message_content"] = message_content
+
+        return extracted
+
+    def extract_many(
+        self,
+        messages: Sequence[str],
+        page_ids: Optional[Sequence[Optional[str]]] = None,
+        processes: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量提取（重新处理历史对话）
+
+        消息数不少于 EXTRACTION_PROCESS_POOL_MIN_MESSAGES 时按 EXTRACTION_CHUNK_SIZE 分块交给进程池，
+        子进程使用各自的全局引擎（同一份配置编译）。
+
+        Args:
+            messages: 消息内容列表
+            page_ids: 每条消息的页面ID（为空时使用全局电话地区）
+            processes: 进程数（默认 EXTRACTION_PROCESSES，1 表示在当前进程中处理）
+
+        Returns:
+            与 messages 顺序一致的提取结果
+        """
+        messages = list(messages)
+        if page_ids is None:
+            regions = [phone_scanner.default_regions] * len(messages)
+        else:
+            if len(page_ids) != len(messages):
+                raise ValueError("page_ids must have the same length as messages")
+            by_page: Dict[Optional[str], Tuple[str, ...]] = {}
+            regions = []
+            for page_id in page_ids:
+                if page_id not in by_page:
+                    by_page[page_id] = phone_scanner.regions_for_page(page_id)
+                regions.append(by_page[page_id])
+
+        if processes is None:
+            processes = settings.extraction_processes or os.cpu_count() or 1
+        if processes <= 1 or len(messages) < settings.extraction_process_pool_min_messages:
+            return [self._extract(message, None, region) for message, region in zip(messages, regions)]
+
+        chunks = [
+            (messages[start:start + EXTRACTION_CHUNK_SIZE], regions[start:start + EXTRACTION_CHUNK_SIZE])
+            for start in range(0, len(messages), EXTRACTION_CHUNK_SIZE)
+        ]
+        results: List[Dict[str, Any]] = []
+        with ProcessPoolExecutor(max_workers=min(processes, len(chunks))) as executor:
+            for chunk_results in executor.map(_extract_chunk, chunks):
+                results.extend(chunk_results)
+        logger.info(f"Extracted {len(results)} messages in {len(chunks)} chunks with {processes} processes")
+        return results
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "name_patterns": len(self._name_patterns),
+            "required_fields": len(self.required_fields)
+        }
+
+
+def _extract_chunk(chunk: Tuple[List[str], List[Tuple[str, ...]]]) -> List[Dict[str, Any]]:
+    """进程池任务：用子进程的全局引擎处理一块消息"""
+    messages, regions = chunk
+    return [extraction_engine._extract(message, None, region) for message, region in zip(messages, regions)]
+
+
+# 全局资料提取引擎实例（配置加载时编译）
+extraction_engine = ExtractionEngine()
@@ -1,28 +1,259 @@
 """过滤规则引擎"""
-from typing import Dict, Any, List, Optional
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from sqlalchemy.orm import Session
 from src.database.models import Conversation, Priority
-from src.config import yaml_config
-import re
+from src.config import settings, yaml_config
+from src.config.loader import load_yaml_config, DEFAULT_CONFIG_PATH
+from src.collector.sentiment_scorer import SentimentLexicon, sentiment_scorer
+from src.utils.keyword_engine import (
+    CompiledKeywords, KeywordMatches, keyword_engine, FILTER_BLOCK, FILTER_SPAM, PRIORITY_RULE_PREFIX
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 优先级规则的条件
+CONDITION_URGENT = "包含紧急关键词"
+CONDITION_PURCHASE = "包含购买意向"
+CONDITION_DEFAULT = "默认"
+
+# 配置中的优先级名称
+PRIORITY_NAMES = {
+    "low": Priority.LOW,
+    "medium": Priority.MEDIUM,
+    "high": Priority.HIGH,
+    "urgent": Priority.URGENT
+}
+
+
+@dataclass(frozen=True)
+class PriorityRule:
+    """编译后的优先级规则：消息命中关键词分类 category 时使用 priority"""
+    category: str
+    priority: Priority
+
+
+@dataclass(frozen=True)
+class FilterRules:
+    """
+    编译后的过滤配置（不可变，配置变化时整体替换）
+
+    每条优先级规则的关键词集合编译在共享关键词自动机中（分类 priority_rule:<序号>），
+    这里只保留按顺序检查的 (分类, 优先级)；条件字符串在编译时解析，"默认" 规则之后的规则不会生效。
+    keywords / lexicon 引用与规则一起编译的关键词自动机和情感词典：分类名只在同一次编译中有意义，
+    匹配结果来自其他编译结果（扫描后配置已重新加载）时用 keywords 重新扫描，见 matches。
+    """
+    keyword_filter_enabled: bool = True
+    sentiment_filter_enabled: bool = True
+    priority_negative: bool = True
+    priority_rules: Tuple[PriorityRule, ...] = ()
+    default_priority: Priority = Priority.LOW
+    keywords: Optional[CompiledKeywords] = field(default=None, compare=False, repr=False)
+    lexicon: Optional[SentimentLexicon] = field(default=None, compare=False, repr=False)
+
+    @classmethod
+    def compile(
+        cls,
+        filter_config: Optional[Dict[str, Any]],
+        keywords: Optional[CompiledKeywords] = None,
+        lexicon: Optional[SentimentLexicon] = None
+    ) -> "FilterRules":
+        """
+        编译 filtering 配置
+
+        Args:
+            filter_config: YAML 配置中的 filtering 部分
+            keywords: 按同一配置编译的关键词（为空时直接使用调用方给出的匹配结果）
+            lexicon: 按同一配置编译的情感词典（为空时使用当前词典）
+        """
+        filter_config = filter_config or {}
+        keyword_config = filter_config.get("keyword_filter", {}) or {}
+        sentiment_config = filter_config.get("sentiment_filter", {}) or {}
+
+        rules = []
+        default_priority = Priority.LOW
+        for index, rule in enumerate(filter_config.get("priority_rules", []) or []):
+            condition = rule.get("condition", "")
+            priority_str = rule.get("priority", "low")
+            if condition == CONDITION_URGENT:
+                priority = Priority.URGENT if priority_str == "high" else Priority.HIGH
+            elif condition == CONDITION_PURCHASE:
+                priority = Priority.MEDIUM if priority_str == "medium" else Priority.LOW
+            elif condition == CONDITION_DEFAULT:
+                default_priority = PRIORITY_NAMES.get(priority_str, Priority.LOW)
+                break
+            else:
+                logger.warning(f"Ignoring priority rule {index} with unknown condition {condition!r}")
+                continue
+            rules.append(PriorityRule(f"{PRIORITY_RULE_PREFIX}{index}", priority))
+
+        return cls(
+            keyword_filter_enabled=keyword_config.get("enabled", True),
+            sentiment_filter_enabled=sentiment_config.get("enabled", True),
+            priority_negative=sentiment_config.get("priority_negative", True),
+            priority_rules=tuple(rules),
+            default_priority=default_priority,
+            keywords=keywords,
+            lexicon=lexicon
+        )
+
+    def matches(self, text: str, keyword_matches: Optional[KeywordMatches] = None) -> KeywordMatches:
+        """
+        与本快照一致的关键词匹配结果
+
+        keyword_matches 由本快照的关键词编译结果产生（或是手工构造的）时直接使用，
+        为空或来自其他编译结果时重新扫描。
+        """
+        if self.keywords is None:
+            return keyword_matches if keyword_matches is not None else keyword_engine.match(text)
+        if keyword_matches is not None and keyword_matches.source in (None, self.keywords):
+            return keyword_matches
+        return self.keywords.match(text)
+
+    def priority(self, keyword_matches: KeywordMatches) -> Priority:
+        """第一条命中的规则的优先级，都不命中时使用默认优先级"""
+        for rule in self.priority_rules:
+            if keyword_matches.has(rule.category):
+                return rule.priority
+        return self.default_priority
+
+
+class FilterRuleStore:
+    """
+    当前生效的过滤规则
+
+    配置文件修改后（后台任务按修改时间检查），重新编译关键词自动机、情感词典和过滤规则，
+    然后整体替换规则快照。快照引用一起编译的关键词自动机和情感词典，
+    正在处理的消息继续使用取到的旧快照（关键词匹配结果与快照不一致时按旧快照重新扫描）。
+    """
+
+    def __init__(self, config_path: str = DEFAULT_CONFIG_PATH):
+        self.config_path = config_path
+        self._lock = threading.Lock()
+        self._rules = FilterRules.compile(
+            yaml_config.get("filtering"), keywords=keyword_engine.compiled, lexicon=sentiment_scorer.lexicon
+        )
+        self._mtime = self._config_mtime()
+        self._task: Optional[asyncio.Task] = None
+        self.reload_count = 0
+        self.reload_error_count = 0
+
+    @property
+    def rules(self) -> FilterRules:
+        """当前规则快照"""
+        return self._rules
+
+    def _config_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self, config: Optional[Dict[str, Any]] = None) -> FilterRules:
+        """
+        重新编译过滤规则（同时重新编译关键词自动机和情感词典）
+
+        Args:
+            config: YAML 配置，默认使用全局 yaml_config
+        """
+        if config is None:
+            config = yaml_config
+        with self._lock:
+            keywords = keyword_engine.reload(config)
+            sentiment_scorer.reload(config)
+            rules = FilterRules.compile(config.get("filtering"), keywords=keywords, lexicon=sentiment_scorer.lexicon)
+            self._rules = rules
+            self.reload_count += 1
+        return rules
+
+    def reload_if_changed(self) -> bool:
+        """
+        配置文件修改后重新加载 filtering 部分
+
+        Returns:
+            是否重新加载了规则
+        """
+        mtime = self._config_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        config = load_yaml_config(self.config_path)
+        if not config:
+            # 文件为空或解析失败时保留当前规则
+            self.reload_error_count += 1
+            logger.warning(f"Failed to reload filter rules from {self.config_path}, keeping current rules")
+            return False
+
+        yaml_config["filtering"] = config.get("filtering") or {}
+        rules = self.reload()
+        logger.info(f"Filter rules reloaded from {self.config_path} ({len(rules.priority_rules)} priority rules)")
+        return True
+
+    async def start(self, interval_seconds: Optional[float] = None):
+        """启动配置文件检查任务（间隔为 0 时不检查）"""
+        interval = settings.filter_rules_reload_interval_seconds if interval_seconds is None else interval_seconds
+        if self._task is not None or interval <= 0:
+            return
+        self._mtime = self._config_mtime()
+        self._task = asyncio.create_task(self._watch(interval))
+        logger.info(f"Filter rule reload started (checking {self.config_path} every {interval}s)")
+
+    async def stop(self):
+        """停止配置文件检查任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                self.reload_error_count += 1
+                logger.warning(f"Filter rule reload failed: {str(e)}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        rules = self._rules
+        return {
+            "priority_rules": len(rules.priority_rules),
+            "default_priority": rules.default_priority.value,
+            "keyword_filter_enabled": rules.keyword_filter_enabled,
+            "reload_count": self.reload_count,
+            "reload_error_count": self.reload_error_count
+        }
+
 
 class FilterEngine:
-    """可配置的过滤规则引擎"""
+    """可配置的过滤规则引擎（使用当前的过滤规则快照）"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Optional[Session] = None, rules: Optional[FilterRules] = None):
+        """
+        初始化过滤引擎
+        
+        Args:
+            db: 数据库会话（apply_filter_to_conversation 使用）
+            rules: 固定使用的过滤规则（默认使用 filter_rules 的当前快照）
+        """
         self.db = db
-        self.filter_config = yaml_config.get("filtering", {})
-        self.keyword_config = self.filter_config.get("keyword_filter", {})
-        self.sentiment_config = self.filter_config.get("sentiment_filter", {})
-        self.priority_config = self.filter_config.get("priority_rules", [])
+        self._rules = rules
+    
+    @property
+    def rules(self) -> FilterRules:
+        return self._rules or filter_rules.rules
     
     def filter_message(
         self,
         conversation: Conversation,
-        message_content: str
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches] = None
     ) -> Dict[str, Any]:
         """
         过滤消息
@@ -30,10 +261,44 @@ class FilterEngine:
         Args:
             conversation: 对话记录
             message_content: 消息内容
+            keyword_matches: 已计算的关键词匹配结果（处理管道中由 ProcessorContext 共享；
+                与规则快照不是同一次编译时重新扫描）
         
         Returns:
             过滤结果，包含是否被过滤、原因、优先级等
         """
+        return self._filter(self.rules, message_content, keyword_matches)
+    
+    def filter_many(
+        self,
+        messages: Sequence[str],
+        keyword_matches: Optional[Sequence[KeywordMatches]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量过滤消息（整批使用同一个规则快照）
+        
+        Args:
+            messages: 消息内容列表
+            keyword_matches: 每条消息已计算的关键词匹配结果（为空时现场扫描）
+        
+        Returns:
+            与 messages 顺序一致的过滤结果
+        """
+        rules = self.rules
+        if keyword_matches is None:
+            return [self._filter(rules, message, None) for message in messages]
+        if len(keyword_matches) != len(messages):
+            raise ValueError("keyword_matches must have the same length as messages")
+        return [self._filter(rules, message, matches) for message, matches in zip(messages, keyword_matches)]
+    
+    def _filter(
+        self,
+        rules: FilterRules,
+        message_content: str,
+        keyword_matches: Optional[KeywordMatches]
+    ) -> Dict[str, Any]:
+        keyword_matches = rules.matches(message_content, keyword_matches)
+        
         result = {
             "filtered": False,
             "filter_reason": None,
@@ -42,8 +307,8 @@ class FilterEngine:
         }
         
         # 关键词过滤
-        if self.keyword_config.get("enabled", True):
-            keyword_result = self._check_keywords(message_content)
+        if rules.keyword_filter_enabled:
+            keyword_result = self._check_keywords(keyword_matches)
             if keyword_result["blocked"]:
                 result["filtered"] = True
                 result["filter_reason"] = f"包含屏蔽关键词: {keyword_result['matched_keywords']}"
@@ -56,36 +321,28 @@ class FilterEngine:
                 return result
         
         # 优先级判断
-        priority = self._determine_priority(message_content)
-        result["priority"] = priority
+        result["priority"] = rules.priority(keyword_matches)
         
         # 情感分析过滤（简化版，实际可以使用 AI）
-        if self.sentiment_config.get("enabled", True):
-            sentiment_result = self._analyze_sentiment(message_content)
-            if sentiment_result["is_negative"] and self.sentiment_config.get("priority_negative", True):
+        if rules.sentiment_filter_enabled:
+            sentiment_result = self._analyze_sentiment(keyword_matches, rules.lexicon)
+            if sentiment_result["is_negative"] and rules.priority_negative:
                 result["priority"] = Priority.HIGH
         
         return result
     
-    def _check_keywords(self, message_content: str) -> Dict[str, Any]:
+    def _check_keywords(self, keyword_matches: KeywordMatches) -> Dict[str, Any]:
         """
         检查关键词
         
         Args:
-            message_content: 消息内容
+            keyword_matches: 消息的关键词匹配结果
         
         Returns:
             关键词检查结果
         """
-        message_lower = message_content.lower()
-        
         # 检查屏蔽关键词
-        block_keywords = self.keyword_config.get("block_keywords", [])
-        matched_block = []
-        for keyword in block_keywords:
-            if keyword.lower() in message_lower:
-                matched_block.append(keyword)
-        
+        matched_block = keyword_matches.keywords(FILTER_BLOCK)
         if matched_block:
             return {
                 "blocked": True,
@@ -94,12 +351,7 @@ class FilterEngine:
             }
         
         # 检查垃圾信息关键词
-        spam_keywords = self.keyword_config.get("spam_keywords", [])
-        matched_spam = []
-        for keyword in spam_keywords:
-            if keyword.lower() in message_lower:
-                matched_spam.append(keyword)
-        
+        matched_spam = keyword_matches.keywords(FILTER_SPAM)
         if matched_spam:
             return {
                 "blocked": False,
@@ -113,77 +365,22 @@ class FilterEngine:
             "matched_keywords": []
         }
     
-    def _determine_priority(self, message_content: str) -> Priority:
-        """
-        确定消息优先级
-        
-        Args:
-            message_content: 消息内容
-        
-        Returns:
-            优先级
-        """
-        message_lower = message_content.lower()
-        
-        # 按配置的优先级规则检查
-        for rule in self.priority_config:
-            condition = rule.get("condition", "")
-            keywords = rule.get("keywords", [])
-            priority_str = rule.get("priority", "low")
-            
-            # 检查是否匹配条件
-            if condition == "包含紧急关键词":
-                if any(keyword.lower() in message_lower for keyword in keywords):
-                    return Priority.URGENT if priority_str == "high" else Priority.HIGH
-            
-            elif condition == "包含购买意向":
-                if any(keyword.lower() in message_lower for keyword in keywords):
-                    return Priority.MEDIUM if priority_str == "medium" else Priority.LOW
-            
-            elif condition == "默认":
-                priority_map = {
-                    "low": Priority.LOW,
-                    "medium": Priority.MEDIUM,
-                    "high": Priority.HIGH,
-                    "urgent": Priority.URGENT
-                }
-                return priority_map.get(priority_str, Priority.LOW)
-        
-        return Priority.LOW
-    
-    def _analyze_sentiment(self, message_content: str) -> Dict[str, Any]:
+    def _analyze_sentiment(
+        self,
+        keyword_matches: KeywordMatches,
+        lexicon: Optional[SentimentLexicon] = None
+    ) -> Dict[str, Any]:
         """
-        简单的情感分析（基于关键词）
+        情感分析（加权情感词典，见 src/collector/sentiment_scorer.py）
         
         Args:
-            message_content: 消息内容
+            keyword_matches: 消息的关键词匹配结果
+            lexicon: 规则快照的情感词典（默认使用当前词典）
         
         Returns:
             情感分析结果
         """
-        message_lower = message_content.lower()
-        
-        # 负面情感关键词
-        negative_keywords = [
-            "不满", "投诉", "问题", "错误", "失败", "糟糕",
-            "disappointed", "complaint", "problem", "error", "bad"
-        ]
-        
-        # 正面情感关键词
-        positive_keywords = [
-            "满意", "感谢", "好", "棒", "优秀",
-            "satisfied", "thanks", "good", "great", "excellent"
-        ]
-        
-        negative_count = sum(1 for keyword in negative_keywords if keyword in message_lower)
-        positive_count = sum(1 for keyword in positive_keywords if keyword in message_lower)
-        
-        return {
-            "is_negative": negative_count > positive_count,
-            "is_positive": positive_count > negative_count,
-            "negative_score": negative_count,
-            "positive_score": positive_count
-        }
+        return sentiment_scorer.score(keyword_matches, lexicon).to_dict()
     
     def apply_filter_to_conversation(
         self,
@@ -217,3 +414,5 @@ class FilterEngine:
         return conversation
 
 
+# 全局过滤规则（启动时编译，配置文件修改后自动重新加载）
+filter_rules = FilterRuleStore()
@@ -0,0 +1,424 @@
+"""电话号码扫描 - 单遍扫描文本中的数字串，识别电话号码并规范化为 E.164 格式"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+from src.config import yaml_config
+from src.config.page_settings import page_settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 未配置 phone_regions 时使用的地区
+DEFAULT_REGIONS = ("CN",)
+
+# E.164 号码（含国家码）的最大位数
+MAX_E164_DIGITS = 15
+
+# 有效号码至少的位数（新加坡、香港的 8 位号码；没有国家码规则的 + 号码同样要求）
+MIN_PHONE_DIGITS = 8
+
+# 号码中除第一段外每段至少的位数
+MIN_GROUP_DIGITS = 2
+
+# 一个号码最多的数字段数（例如 "+1 (415) 555-2671" 是 4 段）
+MAX_PHONE_GROUPS = 6
+
+# 数字串：可选的 + 或 (，数字段之间是 1-2 个分隔符（空格 - . 括号）。
+# 分隔符和数字互不重叠，匹配失败时最多退回一个分隔符，整体耗时与文本长度成线性关系
+_DIGIT_RUN = re.compile(r"[+(]?[0-9]+(?:[ \-.()\u00a0]{1,2}[0-9]+)*")
+_DIGIT_GROUP = re.compile(r"[0-9]+")
+_NON_DIGIT = re.compile(r"[^0-9]+")
+
+# 紧挨在数字前后时说明是金额的字符
+CURRENCY_SYMBOLS = frozenset("$¥￥€£₱₹₫฿")
+AMOUNT_SUFFIXES = frozenset("元块万千百亿%％")
+
+# 全角数字和加号转换为半角
+_FULLWIDTH = str.maketrans("０１２３４５６７８９＋", "0123456789+")
+_HAS_FULLWIDTH = re.compile("[０-９＋]")
+
+
+@dataclass(frozen=True)
+class PhoneRegion:
+    """地区的号码规则"""
+    country_code: str
+    trunk_prefix: Optional[str]  # 国内长途前缀（例如 0），拨打国际号码时去掉
+    national_pattern: "re.Pattern"  # 国内有效号码（不含国家码和长途前缀）
+
+
+def _region(country_code: str, trunk_prefix: Optional[str], pattern: str) -> PhoneRegion:
+    return PhoneRegion(country_code, trunk_prefix, re.compile(pattern))
+
+
+# 常用地区（其他国家码的 + 号码只检查位数）
+REGIONS: Dict[str, PhoneRegion] = {
+    "CN": _region("86", "0", r"1[3-9]\d{9}|(?:10|2\d)\d{8}|[3-9]\d{2}\d{7,8}"),
+    "US": _region("1", "1", r"[2-9]\d{2}[2-9]\d{6}"),
+    "CA": _region("1", "1", r"[2-9]\d{2}[2-9]\d{6}"),
+    "GB": _region("44", "0", r"[1-9]\d{8,9}"),
+    "PH": _region("63", "0", r"9\d{9}|[2-8]\d{7,8}"),
+    "MY": _region("60", "0", r"1\d{8,9}|[3-9]\d{7,8}"),
+    "SG": _region("65", None, r"[689]\d{7}"),
+    "HK": _region("852", None, r"[2-9]\d{7}"),
+    "TW": _region("886", "0", r"9\d{8}|[2-8]\d{7,8}"),
+    "TH": _region("66", "0", r"[689]\d{8}|[2-7]\d{7}"),
+    "VN": _region("84", "0", r"[35789]\d{8}|2\d{9}"),
+    "ID": _region("62", "0", r"8\d{8,11}|[2-7]\d{7,10}"),
+    "IN": _region("91", "0", r"[6-9]\d{9}"),
+}
+
+# 国家码 -> 地区规则（同一国家码的地区规则相同，取第一个）
+_REGIONS_BY_CODE: Dict[str, PhoneRegion] = {}
+for _rule in REGIONS.values():
+    _REGIONS_BY_CODE.setdefault(_rule.country_code, _rule)
+_MAX_CODE_LENGTH = max(len(code) for code in _REGIONS_BY_CODE)
+
+
+@dataclass(frozen=True)
+class PhoneMatch:
+    """识别出的电话号码"""
+    raw: str  # 原文中的号码
+    start: int
+    end: int
+    e164: str  # 规范化后的号码，例如 +8613812345678
+
+
+@dataclass
+class _Candidate:
+    """候选号码（一个数字串中连续的若干段）"""
+    start: int
+    end: int
+    parts: Tuple[str, ...]  # 各段数字
+    separators: Tuple[str, ...]  # 各段之间的分隔符原文
+    has_plus: bool
+
+    @classmethod
+    def build(
+        cls,
+        text: str,
+        start: int,
+        end: int,
+        parts: Sequence[str],
+        separators: Sequence[str],
+        has_plus: bool
+    ) -> "_Candidate":
+        # 以 "(" 开头且括号未闭合时，紧跟的 ")" 属于号码
+        if end < len(text) and text[end] == ")" and text[start] == "(" and ")" not in text[start:end]:
+            end += 1
+        return cls(start, end, tuple(parts), tuple(separators), has_plus)
+
+
+def _is_word_char(char: str) -> bool:
+    """字母（ASCII）、数字和下划线：与号码相连时说明不是独立的号码"""
+    return char.isascii() and (char.isalnum() or char == "_")
+
+
+def _looks_like_date(candidate: _Candidate) -> bool:
+    """2024-01-15、15.01.2024 这类日期"""
+    parts, separators = candidate.parts, candidate.separators
+    if candidate.has_plus or len(parts) != 3 or separators[0] != separators[1] or separators[0] not in ("-", "."):
+        return False
+    lengths = [len(part) for part in parts]
+    return (
+        (lengths[0] == 4 and lengths[1] <= 2 and lengths[2] <= 2)
+        or (lengths[0] <= 2 and lengths[1] <= 2 and lengths[2] in (2, 4))
+    )
+
+
+def _looks_like_phone_layout(candidate: _Candidate) -> bool:
+    """除第一段（国家码、区号）外每段至少 2 位，且不混用 "-" 和 "."（"2-3.4 (5)" 这类数字片段）"""
+    if any(len(part) < MIN_GROUP_DIGITS for part in candidate.parts[1:]):
+        return False
+    separators = "".join(candidate.separators)
+    return not ("-" in separators and "." in separators)
+
+
+def _looks_like_amount(text: str, candidate: _Candidate) -> bool:
+    """$5000、5000元、12345.50 这类金额"""
+    before = text[candidate.start - 1] if candidate.start > 0 else ""
+    if before == " " and candidate.start > 1:
+        before = text[candidate.start - 2]
+    if before in CURRENCY_SYMBOLS:
+        return True
+    after = text[candidate.end] if candidate.end < len(text) else ""
+    if after in AMOUNT_SUFFIXES or after in CURRENCY_SYMBOLS:
+        return True
+    # 小数：最后一段前是 "."，且只有 1-2 位
+    return (
+        not candidate.has_plus
+        and bool(candidate.separators)
+        and candidate.separators[-1] == "."
+        and len(candidate.parts[-1]) <= 2
+    )
+
+
+def to_e164(digits: str, has_plus: bool, regions: Sequence[str]) -> Optional[str]:
+    """
+    把号码数字规范化为 E.164
+
+    Args:
+        digits: 号码中的数字（不含分隔符）
+        has_plus: 号码是否以 + 开头
+        regions: 没有国家码时依次尝试的地区（ISO 3166 代码）
+
+    Returns:
+        E.164 号码，不是有效号码时返回 None
+    """
+    if not has_plus and digits.startswith("00"):
+        # 国际冠字 00 等同于 +
+        digits, has_plus = digits[2:], True
+
+    if has_plus:
+        if not MIN_PHONE_DIGITS <= len(digits) <= MAX_E164_DIGITS:
+            return None
+        for length in range(min(_MAX_CODE_LENGTH, len(digits)), 0, -1):
+            rule = _REGIONS_BY_CODE.get(digits[:length])
+            if rule is not None:
+                national = digits[length:]
+                if rule.national_pattern.fullmatch(national):
+                    return f"+{digits}"
+                # 部分用户在国家码后仍带长途前缀（+86 0138...）
+                if rule.trunk_prefix and national.startswith(rule.trunk_prefix):
+                    national = national[len(rule.trunk_prefix):]
+                    if rule.national_pattern.fullmatch(national):
+                        return f"+{rule.country_code}{national}"
+                return None
+        return f"+{digits}"
+
+    for region in regions:
+        rule = REGIONS.get(region)
+        if rule is None:
+            continue
+        national = digits
+        if rule.trunk_prefix and national.startswith(rule.trunk_prefix):
+            stripped = national[len(rule.trunk_prefix):]
+            if rule.national_pattern.fullmatch(stripped):
+                return f"+{rule.country_code}{stripped}"
+        if rule.national_pattern.fullmatch(national):
+            return f"+{rule.country_code}{national}"
+        # 省略了 + 的国际号码（8613812345678）
+        if national.startswith(rule.country_code):
+            national = national[len(rule.country_code):]
+            if rule.national_pattern.fullmatch(national):
+                return f"+{rule.country_code}{national}"
+    return None
+
+
+class PhoneScanner:
+    """
+    电话号码扫描器
+
+    用一个没有歧义的正则扫描一遍文本，切出 "可选 + / 数字段 / 分隔符" 组成的数字串
+    （耗时与文本长度成线性关系），位数够长的数字串再按以下规则判断：
+
+    - 与字母或数字相连、像日期或金额、分段不像号码的候选丢弃
+    - + 或 00 开头的按国家码检查，其他按页面配置的地区（phone_regions）依次检查
+    - 有效号码规范化为 E.164
+    """
+
+    def __init__(self, default_regions: Optional[Sequence[str]] = None):
+        """
+        初始化扫描器
+
+        Args:
+            default_regions: 默认地区（为空时读取 data_collection.phone_regions）
+        """
+        self._default_regions = tuple(default_regions) if default_regions else None
+
+    @property
+    def default_regions(self) -> Tuple[str, ...]:
+        """全局默认地区"""
+        if self._default_regions is not None:
+            return self._default_regions
+        configured = (yaml_config.get("data_collection", {}) or {}).get("phone_regions")
+        return _normalize_regions(configured) or DEFAULT_REGIONS
+
+    def regions_for_page(self, page_id: Optional[str] = None) -> Tuple[str, ...]:
+        """页面的地区（page_settings 中的 phone_regions 覆盖全局配置）"""
+        if page_id:
+            configured = _normalize_regions(page_settings.get_page_config(page_id).get("phone_regions"))
+            if configured:
+                return configured
+        return self.default_regions
+
+    @staticmethod
+    def _classify(text: str, candidate: _Candidate, regions: Sequence[str]) -> Optional[PhoneMatch]:
+        """候选号码有效时返回规范化结果（调用前已排除日期和金额）"""
+        if candidate.start > 0 and _is_word_char(text[candidate.start - 1]):
+            return None
+        if candidate.end < len(text) and _is_word_char(text[candidate.end]):
+            return None
+        if not _looks_like_phone_layout(candidate):
+            return None
+        e164 = to_e164("".join(candidate.parts), candidate.has_plus, regions)
+        if e164 is None:
+            return None
+        return PhoneMatch(
+            raw=text[candidate.start:candidate.end],
+            start=candidate.start,
+            end=candidate.end,
+            e164=e164
+        )
+
+    def _split(
+        self,
+        text: str,
+        start: int,
+        parts: List[str],
+        separators: List[str],
+        has_plus: bool,
+        regions: Sequence[str]
+    ) -> List[PhoneMatch]:
+        """
+        整个数字串不是号码时（例如空格分隔的两个号码），从左到右取最长的有效段组合
+
+        每段最多与后面 MAX_PHONE_GROUPS - 1 段组合，位数不够或超长的组合直接跳过，
+        每段的开销有上限。
+        """
+        prefix = 1 if text[start] in "+(" else 0
+        group_starts, offsets = [], [0]
+        position = start + prefix
+        for index, part in enumerate(parts):
+            group_starts.append(position)
+            offsets.append(offsets[-1] + len(part))
+            position += len(part) + (len(separators[index]) if index < len(separators) else 0)
+
+        matches = []
+        first = 0
+        while first < len(parts):
+            found = None
+            for last in range(min(len(parts), first + MAX_PHONE_GROUPS), first, -1):
+                digit_count = offsets[last] - offsets[first]
+                if digit_count < MIN_PHONE_DIGITS:
+                    break
+                if digit_count > MAX_E164_DIGITS + 2 or (first == 0 and last == len(parts)):
+                    continue
+                candidate = _Candidate.build(
+                    text,
+                    start if first == 0 else group_starts[first],
+                    group_starts[last - 1] + len(parts[last - 1]),
+                    parts[first:last],
+                    separators[first:last - 1],
+                    has_plus and first == 0
+                )
+                if _looks_like_date(candidate) or _looks_like_amount(text, candidate):
+                    continue
+                found = self._classify(text, candidate, regions)
+                if found is not None:
+                    matches.append(found)
+                    first = last
+                    break
+            if found is None:
+                first += 1
+        return matches
+
+    def scan(self, text: str, regions: Optional[Sequence[str]] = None) -> List[PhoneMatch]:
+        """
+        找出文本中的所有电话号码
+
+        Args:
+            text: 文本内容
+            regions: 没有国家码的号码所属地区（为空时使用默认地区）
+
+        Returns:
+            识别出的号码（按出现顺序）
+        """
+        if not text:
+            return []
+        regions = tuple(regions) if regions else self.default_regions
+        if _HAS_FULLWIDTH.search(text):
+            text = text.translate(_FULLWIDTH)
+        matches = []
+        for run in _DIGIT_RUN.finditer(text):
+            start, end = run.span()
+            if end - start < MIN_PHONE_DIGITS:
+                continue
+            raw = run.group()
+            parts = _DIGIT_GROUP.findall(raw)
+            digit_count = sum(map(len, parts))
+            if digit_count < MIN_PHONE_DIGITS:
+                continue
+            has_plus = raw[0] == "+"
+            separators = _NON_DIGIT.findall(raw, 1 if raw[0] in "+(" else 0)
+
+            if len(parts) <= MAX_PHONE_GROUPS and digit_count <= MAX_E164_DIGITS + 2:
+                candidate = _Candidate.build(text, start, end, parts, separators, has_plus)
+                # 整串是日期或金额时，其中的数字也不拆开当作号码
+                if _looks_like_date(candidate) or _looks_like_amount(text, candidate):
+                    continue
+                match = self._classify(text, candidate, regions)
+                if match is not None:
+                    matches.append(match)
+                    continue
+            if len(parts) > 1:
+                matches.extend(self._split(text, start, parts, separators, has_plus, regions))
+        return matches
+
+    def extract(self, text: str, regions: Optional[Sequence[str]] = None) -> Optional[str]:
+        """提取文本中的第一个电话号码（E.164），未找到时返回 None"""
+        matches = self.scan(text, regions)
+        return matches[0].e164 if matches else None
+
+    def normalize(self, value: str, regions: Optional[Sequence[str]] = None) -> Optional[str]:
+        """
+        把单个号码规范化为 E.164
+
+        Args:
+            value: 号码（整个字符串必须是一个号码，不能包含其他文字）
+            regions: 没有国家码的号码所属地区
+
+        Returns:
+            E.164 号码，不是有效号码时返回 None
+        """
+        value = (value or "").strip()
+        matches = self.scan(value, regions)
+        if len(matches) != 1 or matches[0].start != 0 or matches[0].end != len(value):
+            return None
+        return matches[0].e164
+
+    def extract_many(
+        self,
+        texts: Iterable[str],
+        regions: Optional[Sequence[str]] = None
+    ) -> List[List[PhoneMatch]]:
+        """
+        批量扫描（用于历史数据回填，地区规则只解析一次）
+
+        Args:
+            texts: 文本列表
+            regions: 没有国家码的号码所属地区
+
+        Returns:
+            每条文本识别出的号码
+        """
+        regions = tuple(regions) if regions else self.default_regions
+        return [self.scan(text, regions) for text in texts]
+
+    def normalize_many(
+        self,
+        values: Iterable[str],
+        regions: Optional[Sequence[str]] = None
+    ) -> List[Optional[str]]:
+        """批量规范化已收集的号码（无效号码对应 None）"""
+        regions = tuple(regions) if regions else self.default_regions
+        return [self.normalize(value, regions) for value in values]
+
+
+def _normalize_regions(configured: Any) -> Tuple[str, ...]:
+    """配置中的地区（字符串或列表），忽略不认识的地区"""
+    if not configured:
+        return ()
+    if isinstance(configured, str):
+        configured = [configured]
+    regions = []
+    for region in configured:
+        region = str(region).strip().upper()
+        if region in REGIONS:
+            regions.append(region)
+        else:
+            logger.warning(f"Unknown phone region {region}, ignored")
+    return tuple(regions)
+
+
+# 全局电话号码扫描器实例
+phone_scanner = PhoneScanner()
@@ -0,0 +1,227 @@
+"""情感评分 - 可配置的加权情感词典，单条消息复用共享关键词扫描，批量评分使用 numpy"""
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Sequence
+import numpy as np
+from src.utils.keyword_engine import (
+    KeywordAutomaton, KeywordEngine, KeywordMatches, keyword_engine,
+    NEGATIVE_SENTIMENT_KEYWORDS, POSITIVE_SENTIMENT_KEYWORDS,
+    SENTIMENT_LEXICON, SENTIMENT_NEGATIVE, SENTIMENT_POSITIVE
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 内置情感词的权重（配置中的 lexicon 可以覆盖，权重为 0 时不计分）
+DEFAULT_NEGATIVE_WEIGHT = -1.0
+DEFAULT_POSITIVE_WEIGHT = 1.0
+
+# 单条消息匹配结果中可能包含情感词的分类
+SENTIMENT_CATEGORIES = (SENTIMENT_NEGATIVE, SENTIMENT_POSITIVE, SENTIMENT_LEXICON)
+
+
+@dataclass(frozen=True)
+class SentimentScore:
+    """一条消息的情感评分（负面得分为负权重绝对值之和）"""
+    negative_score: float = 0.0
+    positive_score: float = 0.0
+
+    @property
+    def score(self) -> float:
+        return self.positive_score - self.negative_score
+
+    @property
+    def is_negative(self) -> bool:
+        return self.negative_score > self.positive_score
+
+    @property
+    def is_positive(self) -> bool:
+        return self.positive_score > self.negative_score
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "is_negative": self.is_negative,
+            "is_positive": self.is_positive,
+            "negative_score": self.negative_score,
+            "positive_score": self.positive_score,
+            "score": self.score
+        }
+
+
+@dataclass(frozen=True)
+class SentimentBatch:
+    """批量评分结果（与输入消息顺序一致的数组）"""
+    negative_scores: np.ndarray
+    positive_scores: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.negative_scores)
+
+    @property
+    def scores(self) -> np.ndarray:
+        return self.positive_scores - self.negative_scores
+
+    @property
+    def is_negative(self) -> np.ndarray:
+        return self.negative_scores > self.positive_scores
+
+    @property
+    def is_positive(self) -> np.ndarray:
+        return self.positive_scores > self.negative_scores
+
+    def __getitem__(self, index: int) -> SentimentScore:
+        return SentimentScore(float(self.negative_scores[index]), float(self.positive_scores[index]))
+
+
+class SentimentLexicon:
+    """
+    编译后的情感词典（不可变，配置变化时整体替换）
+
+    词条按 KeywordEngine.normalize 规范化；automaton 只包含词典词条，
+    negative_weights / positive_weights 与 automaton.patterns 一一对应。
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = {term: weight for term, weight in weights.items() if term and weight}
+        self.automaton = KeywordAutomaton(self.weights)
+        pattern_weights = np.array([self.weights[term] for term in self.automaton.patterns], dtype=np.float64)
+        self.negative_weights = np.clip(-pattern_weights, 0, None)
+        self.positive_weights = np.clip(pattern_weights, 0, None)
+
+    @classmethod
+    def compile(cls, sentiment_config: Optional[Dict[str, Any]]) -> "SentimentLexicon":
+        """
+        编译 filtering.sentiment_filter 配置
+
+        内置情感词（keyword_engine 中的 NEGATIVE/POSITIVE_SENTIMENT_KEYWORDS）权重为 -1/+1，
+        lexicon 中的词条（词条: 权重）覆盖或补充内置词条。
+        """
+        weights: Dict[str, float] = {}
+        for keyword in NEGATIVE_SENTIMENT_KEYWORDS:
+            weights[KeywordEngine.normalize(keyword)] = DEFAULT_NEGATIVE_WEIGHT
+        for keyword in POSITIVE_SENTIMENT_KEYWORDS:
+            weights[KeywordEngine.normalize(keyword)] = DEFAULT_POSITIVE_WEIGHT
+
+        lexicon = (sentiment_config or {}).get("lexicon", {}) or {}
+        for term, weight in lexicon.items():
+            try:
+                weights[KeywordEngine.normalize(str(term))] = float(weight)
+            except (TypeError, ValueError):
+                logger.warning(f"Ignoring sentiment lexicon term {term!r} with invalid weight {weight!r}")
+        return cls(weights)
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+
+class SentimentScorer:
+    """
+    情感评分器
+
+    单条消息使用共享关键词自动机的匹配结果（情感词典已编译进 keyword_engine，处理管道中不再额外扫描），
+    批量评分（重新评估历史对话）只用词典自动机扫描每条不同的消息一次，
+    得到 消息 × 词条 的出现矩阵，再用 numpy 与权重向量相乘求得分。
+    同一词条在一条消息中重复出现只计一次，单条和批量的得分一致。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self._lock = threading.Lock()
+        self.reload(config)
+
+    def reload(self, config: Optional[Dict[str, Any]] = None):
+        """
+        按配置重新编译情感词典（关键词自动机由 keyword_engine.reload 重新编译）
+
+        Args:
+            config: YAML 配置，默认使用全局 yaml_config
+        """
+        if config is None:
+            from src.config import yaml_config
+            config = yaml_config
+
+        filter_config = config.get("filtering", {}) or {}
+        lexicon = SentimentLexicon.compile(filter_config.get("sentiment_filter"))
+        with self._lock:
+            self._lexicon = lexicon
+        logger.debug(f"Sentiment scorer compiled {len(lexicon)} lexicon terms")
+
+    @property
+    def lexicon(self) -> SentimentLexicon:
+        return self._lexicon
+
+    def score(self, keyword_matches: KeywordMatches, lexicon: Optional[SentimentLexicon] = None) -> SentimentScore:
+        """
+        单条消息评分
+
+        Args:
+            keyword_matches: 共享关键词引擎的匹配结果
+            lexicon: 使用的情感词典（默认使用当前词典，过滤规则快照传入编译时的词典）
+
+        Returns:
+            情感评分
+        """
+        weights = (lexicon or self._lexicon).weights
+        terms = {
+            KeywordEngine.normalize(keyword)
+            for category in SENTIMENT_CATEGORIES
+            for keyword in keyword_matches.keywords(category)
+        }
+        negative = positive = 0.0
+        for term in terms:
+            weight = weights.get(term, 0.0)
+            if weight < 0:
+                negative -= weight
+            else:
+                positive += weight
+        return SentimentScore(negative, positive)
+
+    def score_text(self, text: str) -> SentimentScore:
+        """扫描并评分一条消息"""
+        return self.score(keyword_engine.match(text))
+
+    def score_many(self, texts: Sequence[Optional[str]]) -> SentimentBatch:
+        """
+        批量评分
+
+        相同的消息（规范化后）只扫描一次。匹配结果以稀疏形式（行号、词条号）保存，
+        np.bincount 按行累加权重，相当于稀疏出现矩阵与权重向量的乘积。
+
+        Args:
+            texts: 消息内容列表
+
+        Returns:
+            与 texts 顺序一致的评分数组
+        """
+        lexicon = self._lexicon
+        find = lexicon.automaton.find
+        normalize = KeywordEngine.normalize
+
+        row_of: Dict[str, int] = {}
+        inverse = np.empty(len(texts), dtype=np.int64)
+        rows: List[int] = []
+        columns: List[int] = []
+        for index, text in enumerate(texts):
+            normalized = normalize(text)
+            row = row_of.get(normalized)
+            if row is None:
+                row = row_of[normalized] = len(row_of)
+                found = find(normalized)
+                if found:
+                    rows.extend([row] * len(found))
+                    columns.extend(found)
+            inverse[index] = row
+
+        row_array = np.asarray(rows, dtype=np.int64)
+        column_array = np.asarray(columns, dtype=np.int64)
+        negative = np.bincount(row_array, weights=lexicon.negative_weights[column_array], minlength=len(row_of))
+        positive = np.bincount(row_array, weights=lexicon.positive_weights[column_array], minlength=len(row_of))
+        return SentimentBatch(negative_scores=negative[inverse], positive_scores=positive[inverse])
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "lexicon_terms": len(self._lexicon)
+        }
+
+
+# 全局情感评分器实例（配置加载时编译）
+sentiment_scorer = SentimentScorer()
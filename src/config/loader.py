@@ -3,8 +3,11 @@ import os
 from typing import Dict, Any
 import yaml
 
+# 默认的 YAML 配置文件路径
+DEFAULT_CONFIG_PATH = "config/config.yaml"
 
-def load_yaml_config(config_path: str = "config/config.yaml") -> Dict[str, Any]:
+
+def load_yaml_config(config_path: str = DEFAULT_CONFIG_PATH) -> Dict[str, Any]:
     """加载 YAML 配置文件
     
     Args:
@@ -22,14 +22,78 @@ class Settings(BaseSettings):
     instagram_verify_token: Optional[str] = Field(None, env="INSTAGRAM_VERIFY_TOKEN")
     instagram_user_id: Optional[str] = Field(None, env="INSTAGRAM_USER_ID")
     
+    # API 地址（压测时可指向本地模拟服务）
+    facebook_graph_api_url: str = Field("https://graph.facebook.com/v18.0", env="FACEBOOK_GRAPH_API_URL")
+    instagram_graph_api_url: str = Field("https://graph.instagram.com/v18.0", env="INSTAGRAM_GRAPH_API_URL")
+    
     # OpenAI
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
     openai_model: str = Field("gpt-4o-mini", env="OPENAI_MODEL")
     openai_temperature: float = Field(0.7, env="OPENAI_TEMPERATURE")
+    openai_base_url: Optional[str] = Field(None, env="OPENAI_BASE_URL")  # 为空时使用官方地址
+    openai_max_concurrency: int = Field(16, env="OPENAI_MAX_CONCURRENCY")  # 全局同时进行的补全请求数
+    openai_per_page_concurrency: int = Field(4, env="OPENAI_PER_PAGE_CONCURRENCY")  # 单页面同时进行的补全请求数
+    openai_timeout_seconds: float = Field(20.0, env="OPENAI_TIMEOUT_SECONDS")
+    openai_max_retries: int = Field(1, env="OPENAI_MAX_RETRIES")
+    # 对冲请求：补全超过对冲延迟仍未返回时再发一个相同请求，取先返回的结果
+    openai_hedge_enabled: bool = Field(True, env="OPENAI_HEDGE_ENABLED")
+    openai_hedge_delay_seconds: float = Field(0.0, env="OPENAI_HEDGE_DELAY_SECONDS")  # 0 表示使用最近补全耗时的 p90
+    openai_hedge_budget_per_minute: int = Field(30, env="OPENAI_HEDGE_BUDGET_PER_MINUTE")  # 每分钟最多发出的对冲请求数
+    
+    # AI 回复缓存（常见问题不重复调用 OpenAI）
+    reply_cache_enabled: bool = Field(True, env="REPLY_CACHE_ENABLED")
+    reply_cache_max_size: int = Field(2000, env="REPLY_CACHE_MAX_SIZE")
+    reply_cache_ttl_seconds: float = Field(3600.0, env="REPLY_CACHE_TTL_SECONDS")
+    reply_cache_max_stage: int = Field(1, env="REPLY_CACHE_MAX_STAGE")  # 只缓存AI回复数不超过该值的对话阶段
+    
+    # 客户对话状态进程内缓存的客户数
+    conversation_state_cache_size: int = Field(10000, env="CONVERSATION_STATE_CACHE_SIZE")
+    
+    # 对话历史缓冲：每个客户保留的最近对话轮数和所有客户的总内存上限（字节）
+    history_buffer_turns: int = Field(20, env="HISTORY_BUFFER_TURNS")
+    history_buffer_max_bytes: int = Field(64 * 1024 * 1024, env="HISTORY_BUFFER_MAX_BYTES")
+    
+    # 提示词 token 预算：整个输入（系统提示词 + 历史 + 最新消息）和单条历史消息的上限
+    prompt_max_input_tokens: int = Field(1500, env="PROMPT_MAX_INPUT_TOKENS")
+    prompt_max_message_tokens: int = Field(200, env="PROMPT_MAX_MESSAGE_TOKENS")
+    
+    # 本地检索兜底：OpenAI 超过时限或出错时，用最相似历史问题的AI回复作答
+    local_answers_enabled: bool = Field(True, env="LOCAL_ANSWERS_ENABLED")
+    local_answers_deadline_seconds: float = Field(8.0, env="LOCAL_ANSWERS_DEADLINE_SECONDS")
+    local_answers_min_score: float = Field(0.7, env="LOCAL_ANSWERS_MIN_SCORE")  # 最低余弦相似度
+    local_answers_max_pairs: int = Field(100000, env="LOCAL_ANSWERS_MAX_PAIRS")
+    
+    # LLM 调用记录：每次补全的 token、耗时、模型、提示词版本和结果（批量写入 llm_calls 表）
+    llm_telemetry_enabled: bool = Field(True, env="LLM_TELEMETRY_ENABLED")
+    llm_telemetry_persist: bool = Field(True, env="LLM_TELEMETRY_PERSIST")  # 关闭时只保留内存指标
+    llm_telemetry_flush_interval_seconds: float = Field(5.0, env="LLM_TELEMETRY_FLUSH_INTERVAL_SECONDS")
+    llm_telemetry_batch_size: int = Field(200, env="LLM_TELEMETRY_BATCH_SIZE")  # 缓冲达到该数量时立即写入
+    llm_telemetry_max_buffer: int = Field(10000, env="LLM_TELEMETRY_MAX_BUFFER")  # 写入失败时最多缓冲的记录数
+    
+    # 自动回复补扫：同时生成回复的客户数，以及每个页面发送回复的速率（条/秒）和突发上限
+    auto_reply_generation_concurrency: int = Field(8, env="AUTO_REPLY_GENERATION_CONCURRENCY")
+    auto_reply_send_rate_per_second: float = Field(2.0, env="AUTO_REPLY_SEND_RATE_PER_SECOND")
+    auto_reply_send_burst: int = Field(3, env="AUTO_REPLY_SEND_BURST")
+    
+    # 邮箱验证：收集资料时只做语法检查（按域名缓存），可投递性（DNS）检查在后台 worker 中进行
+    email_check_deliverability: bool = Field(False, env="EMAIL_CHECK_DELIVERABILITY")
+    email_deliverability_concurrency: int = Field(4, env="EMAIL_DELIVERABILITY_CONCURRENCY")  # 同时进行的 DNS 查询数
+    email_deliverability_timeout_seconds: float = Field(5.0, env="EMAIL_DELIVERABILITY_TIMEOUT_SECONDS")
+    email_domain_cache_size: int = Field(10000, env="EMAIL_DOMAIN_CACHE_SIZE")
+    email_deliverability_ttl_seconds: float = Field(86400.0, env="EMAIL_DELIVERABILITY_TTL_SECONDS")  # 可投递域名的缓存时间
+    email_deliverability_negative_ttl_seconds: float = Field(3600.0, env="EMAIL_DELIVERABILITY_NEGATIVE_TTL_SECONDS")  # 不可投递域名的缓存时间
+    
+    # 资料提取：批量重新处理历史消息时，消息数不少于该值才使用多进程
+    extraction_process_pool_min_messages: int = Field(5000, env="EXTRACTION_PROCESS_POOL_MIN_MESSAGES")
+    extraction_processes: int = Field(0, env="EXTRACTION_PROCESSES")  # 0 表示 CPU 核数
+    
+    # 过滤规则：检查 config.yaml 修改时间的间隔（秒），修改后重新编译 filtering 配置；0 表示不检查
+    filter_rules_reload_interval_seconds: float = Field(5.0, env="FILTER_RULES_RELOAD_INTERVAL_SECONDS")
     
     # Telegram
     telegram_bot_token: str = Field(..., env="TELEGRAM_BOT_TOKEN")
     telegram_chat_id: str = Field(..., env="TELEGRAM_CHAT_ID")
+    telegram_api_url: str = Field("https://api.telegram.org", env="TELEGRAM_API_URL")
     
     # ManyChat
     manychat_api_key: Optional[str] = Field(None, env="MANYCHAT_API_KEY")
@@ -48,7 +112,40 @@ class Settings(BaseSettings):
     secret_key: str = Field(..., env="SECRET_KEY")
     algorithm: str = Field("HS256", env="ALGORITHM")
     cors_origins: Optional[str] = Field(None, env="CORS_ORIGINS")  # 逗号分隔的允许来源列表
-    
+    ip_rate_limit_per_minute: int = Field(100, env="IP_RATE_LIMIT_PER_MINUTE")  # 每个IP每分钟的请求上限
+
+    # Ingest queue（Webhook 持久化消息队列）
+    ingest_workers: int = Field(16, env="INGEST_WORKERS")  # 消费队列的异步 worker 数量
+    ingest_visibility_timeout_seconds: int = Field(120, env="INGEST_VISIBILITY_TIMEOUT_SECONDS")
+    ingest_max_attempts: int = Field(5, env="INGEST_MAX_ATTEMPTS")
+    ingest_retry_backoff_seconds: float = Field(5.0, env="INGEST_RETRY_BACKOFF_SECONDS")
+    ingest_poll_interval_seconds: float = Field(1.0, env="INGEST_POLL_INTERVAL_SECONDS")
+    ingest_retention_hours: int = Field(24, env="INGEST_RETENTION_HOURS")  # 已完成任务保留时长
+    webhook_dedupe_cache_size: int = Field(50000, env="WEBHOOK_DEDUPE_CACHE_SIZE")  # 进程内记住的最近消息ID数量
+    ingest_max_in_flight: int = Field(128, env="INGEST_MAX_IN_FLIGHT")  # 已领取未完成的最大任务数（含合并窗口中等待的消息）
+
+    # Pipeline lanes（同一客户顺序处理，不同客户并行处理）
+    pipeline_lanes: int = Field(16, env="PIPELINE_LANES")  # 车道数量（按 sender_id 哈希）
+    pipeline_max_concurrency: int = Field(8, env="PIPELINE_MAX_CONCURRENCY")  # 同时处理的最大消息数
+    pipeline_reply_deadline_seconds: float = Field(15.0, env="PIPELINE_REPLY_DEADLINE_SECONDS")  # 从开始处理到生成AI回复的时限，0 表示不限
+
+    # Pipeline tracing（处理器耗时直方图和单条消息处理链路）
+    pipeline_trace_slowest_limit: int = Field(20, env="PIPELINE_TRACE_SLOWEST_LIMIT")  # 内存中保留的最慢消息数
+    pipeline_trace_persist: bool = Field(False, env="PIPELINE_TRACE_PERSIST")  # 是否写入 pipeline_traces 表
+    pipeline_trace_persist_min_ms: float = Field(2000.0, env="PIPELINE_TRACE_PERSIST_MIN_MS")  # 只保存总耗时超过该值的消息
+
+    # Platform clients（平台 API 长连接客户端池）
+    platform_http2: bool = Field(False, env="PLATFORM_HTTP2")  # 需要安装 h2
+    platform_max_connections: int = Field(100, env="PLATFORM_MAX_CONNECTIONS")
+    platform_max_keepalive_connections: int = Field(20, env="PLATFORM_MAX_KEEPALIVE_CONNECTIONS")
+    platform_keepalive_expiry_seconds: float = Field(60.0, env="PLATFORM_KEEPALIVE_EXPIRY_SECONDS")
+    platform_request_timeout_seconds: float = Field(30.0, env="PLATFORM_REQUEST_TIMEOUT_SECONDS")
+
+    # Message coalescing（合并同一客户连续发送的多条私信）
+    message_coalesce_window_seconds: float = Field(3.0, env="MESSAGE_COALESCE_WINDOW_SECONDS")  # 0 表示关闭
+    message_coalesce_max_wait_seconds: float = Field(8.0, env="MESSAGE_COALESCE_MAX_WAIT_SECONDS")
+    message_coalesce_max_messages: int = Field(10, env="MESSAGE_COALESCE_MAX_MESSAGES")
+
     @field_validator('facebook_access_token', 'facebook_app_id', 'facebook_app_secret')
     @classmethod
     def validate_facebook_config(cls, v: str) -> str:
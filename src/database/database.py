@@ -1,7 +1,9 @@
 """数据库连接和会话管理"""
-from sqlalchemy import create_engine, event
+from typing import Any, Dict, List
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import NullPool
 from src.config import settings
 
@@ -59,3 +61,55 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def insert_or_ignore(
+    db: Session,
+    model: Any,
+    rows: List[Dict[str, Any]],
+    conflict_columns: List[str]
+) -> List[int]:
+    """
+    批量插入，违反唯一约束的行直接忽略（INSERT ... ON CONFLICT DO NOTHING）
+
+    PostgreSQL 和 SQLite 使用单条语句完成；其他数据库逐行插入并忽略 IntegrityError。
+    不提交事务，由调用方提交。
+
+    Args:
+        db: 数据库会话
+        model: ORM 模型类（需有单列主键）
+        rows: 待插入的行（各行字段需一致）
+        conflict_columns: 唯一约束对应的列
+
+    Returns:
+        实际插入的行的主键列表
+    """
+    if not rows:
+        return []
+
+    primary_key = inspect(model).primary_key[0]
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        inserted = []
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    instance = model(**row)
+                    db.add(instance)
+                inserted.append(getattr(instance, primary_key.key))
+            except IntegrityError:
+                continue
+        return inserted
+
+    stmt = (
+        insert(model)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=conflict_columns)
+        .returning(primary_key)
+    )
+    return [row[0] for row in db.execute(stmt)]
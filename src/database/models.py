@@ -1,5 +1,5 @@
 """数据库模型定义"""
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Enum, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Enum, ForeignKey, JSON, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.sql.expression import text
@@ -30,6 +30,21 @@ class Priority(str, enum.Enum):
     URGENT = "urgent"
 
 
+class IngestStatus(str, enum.Enum):
+    """消息队列任务状态枚举"""
+    PENDING = "pending"  # 等待处理
+    PROCESSING = "processing"  # 处理中（已被 worker 领取）
+    DONE = "done"  # 已完成
+    FAILED = "failed"  # 超过最大重试次数
+
+
+class ConversationStage(str, enum.Enum):
+    """对话阶段（按客户已收到的AI回复数划分）"""
+    NEW = "new"  # 还没有收到过AI回复
+    EARLY = "early"  # 前几轮，仍使用预设回复
+    ONGOING = "ongoing"
+
+
 class Platform(str, enum.Enum):
     """平台枚举"""
     FACEBOOK = "facebook"
@@ -68,6 +83,20 @@ class Customer(Base):
     reviews = relationship("Review", back_populates="customer")
 
 
+class CustomerConversationState(Base):
+    """客户对话状态表（由 ConversationManager 增量维护，生成回复时无需扫描对话历史）"""
+    __tablename__ = "customer_conversation_states"
+
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    ai_reply_count = Column(Integer, default=0, nullable=False)
+    telegram_link_sent = Column(Boolean, default=False, nullable=False)
+    stage = Column(Enum(ConversationStage), default=ConversationStage.NEW, nullable=False)
+    last_inbound_at = Column(DateTime(timezone=True))
+    last_outbound_at = Column(DateTime(timezone=True))
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Conversation(Base):
     """对话记录表"""
     __tablename__ = "conversations"
@@ -109,6 +138,11 @@ class Conversation(Base):
     collected_data = relationship(
         "CollectedData", back_populates="conversation")
 
+    __table_args__ = (
+        # 同一平台消息只保存一次（Webhook 重投/扫描同步时 INSERT ... ON CONFLICT DO NOTHING）
+        Index('uq_conversations_platform_message', 'platform', 'platform_message_id', unique=True),
+    )
+
 
 class CollectedData(Base):
     """收集的资料表"""
@@ -173,3 +207,72 @@ class IntegrationLog(Base):
     error_message = Column(Text)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class IngestJob(Base):
+    """Webhook 消息队列表（持久化待处理消息，重启/重新部署后不丢失）"""
+    __tablename__ = "ingest_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    platform = Column(String(20), nullable=False)  # facebook, instagram
+    message_id = Column(String(200), index=True)  # 平台消息ID
+    sender_id = Column(String(100))
+    payload = Column(JSON, nullable=False)  # 解析后的消息数据
+
+    # 队列状态
+    status = Column(Enum(IngestStatus), default=IngestStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)  # 已领取次数
+    available_at = Column(DateTime(timezone=True), nullable=False)  # 可被领取的时间（可见性超时/重试退避）
+    locked_by = Column(String(100))  # 领取该任务的 worker
+    last_error = Column(Text)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index('idx_ingest_jobs_status_available', 'status', 'available_at'),
+        # Webhook 重投的同一消息只入队一次
+        Index('uq_ingest_jobs_platform_message', 'platform', 'message_id', unique=True),
+    )
+
+
+class PipelineTrace(Base):
+    """消息处理链路记录表（各处理器的开始/结束时间，用于排查慢消息）"""
+    __tablename__ = "pipeline_traces"
+
+    id = Column(Integer, primary_key=True, index=True)
+    platform = Column(String(20), nullable=False)
+    message_id = Column(String(200), index=True)  # 平台消息ID
+    customer_id = Column(Integer)
+    total_ms = Column(Float, nullable=False)  # 管道总耗时（毫秒）
+    stages = Column(JSON, nullable=False)  # [{processor, status, start_ms, end_ms}]
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_pipeline_traces_total_ms', 'total_ms'),
+    )
+
+
+class LLMCall(Base):
+    """LLM 调用记录表（每次补全一行，只追加，用于容量规划和排查提示词膨胀）"""
+    __tablename__ = "llm_calls"
+
+    id = Column(Integer, primary_key=True, index=True)
+    page_id = Column(String(100))
+    model = Column(String(100), nullable=False)
+    prompt_version = Column(String(32))  # 系统提示词内容哈希（见 src/ai/prompt_templates.py）
+    tier = Column(String(50))  # 模型路由档位（见 src/ai/model_router.py）
+    outcome = Column(String(20), nullable=False)  # success/timeout/error/cancelled/hedge_lost
+    prompt_tokens = Column(Integer)  # 响应 usage（失败的请求为空；被取消的对冲请求按相同提示词估算）
+    completion_tokens = Column(Integer)
+    latency_ms = Column(Float, nullable=False)
+    cost_usd = Column(Float)  # 按记录时的价格估算，未知模型为空
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_llm_calls_created_at', 'created_at'),
+        Index('idx_llm_calls_page_created_at', 'page_id', 'created_at'),
+    )
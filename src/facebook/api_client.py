@@ -11,12 +11,17 @@ logger = logging.getLogger(__name__)
 class FacebookAPIClient:
     """Facebook Graph API 客户端封装"""
 
-    def __init__(self, access_token: Optional[str] = None):
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
         """
         初始化Facebook API客户端
 
         Args:
             access_token: 访问令牌，如果为None则从settings或Token管理器获取
+            http_client: 共享的 HTTP 客户端（连接池），为None时创建独立的客户端
         """
         if access_token:
             self.access_token = access_token
@@ -24,8 +29,9 @@ class FacebookAPIClient:
             # 尝试从Token管理器获取，如果没有则使用默认Token
             from src.config.page_token_manager import page_token_manager
             self.access_token = page_token_manager.get_token() or settings.facebook_access_token
-        self.base_url = "https://graph.facebook.com/v18.0"
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.base_url = settings.facebook_graph_api_url
+        self._owns_client = http_client is None
+        self.client = http_client or httpx.AsyncClient(timeout=30.0)
 
     async def send_message(
         self,
@@ -44,27 +50,22 @@ class FacebookAPIClient:
             from src.config.page_token_manager import page_token_manager
             page_token = page_token_manager.get_token(page_id)
             if page_token:
-                # 临时使用页面Token
-                original_token = self.access_token
-                self.access_token = page_token
+                # 本次请求使用页面Token（不修改 self.access_token，客户端可被并发共享）
                 logger.info(
                     f"使用页面 {page_id} 的专用Token发送消息 (Token前10位: {page_token[:10]}...)")
-                try:
-                    result = await self._do_send_message(recipient_id, message, message_type, page_id)
-                    # 检查是否是24小时窗口限制错误
-                    if isinstance(result, dict) and result.get("24h_window_limit"):
-                        # 抛出特殊异常，让调用方知道这是24小时窗口限制
-                        from src.utils.exceptions import APIError
-                        raise APIError(
-                            message="24小时消息发送窗口限制",
-                            api_name="Facebook",
-                            status_code=400,
-                            details={"error_subcode": result.get("error", {}).get("error_subcode")}
-                        )
-                    return result
-                finally:
-                    # 恢复原始Token
-                    self.access_token = original_token
+                result = await self._do_send_message(
+                    recipient_id, message, message_type, page_id, access_token=page_token)
+                # 检查是否是24小时窗口限制错误
+                if isinstance(result, dict) and result.get("24h_window_limit"):
+                    # 抛出特殊异常，让调用方知道这是24小时窗口限制
+                    from src.utils.exceptions import APIError
+                    raise APIError(
+                        message="24小时消息发送窗口限制",
+                        api_name="Facebook",
+                        status_code=400,
+                        details={"error_subcode": result.get("error", {}).get("error_subcode")}
+                    )
+                return result
             else:
                 logger.warning(
                     f"未找到页面 {page_id} 的Token，使用默认Token (当前Token前10位: {self.access_token[:10]}...)")
@@ -77,7 +78,8 @@ class FacebookAPIClient:
         recipient_id: str,
         message: str,
         message_type: str = "RESPONSE",
-        page_id: Optional[str] = None
+        page_id: Optional[str] = None,
+        access_token: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         发送消息到 Facebook
@@ -87,6 +89,7 @@ class FacebookAPIClient:
             message: 消息内容
             message_type: 消息类型 (RESPONSE, UPDATE, MESSAGE_TAG)
             page_id: 页面ID，如果提供则使用页面ID，否则使用 'me'
+            access_token: 本次请求使用的Token，默认使用客户端Token
 
         Returns:
             API 响应
@@ -111,7 +114,7 @@ class FacebookAPIClient:
         logger.debug(
             f"Facebook send_message - page_id={page_id}, endpoint={endpoint}, recipient_id={recipient_id[:10]}...")
 
-        params = {"access_token": self.access_token}
+        params = {"access_token": access_token or self.access_token}
         data = {
             "recipient": {"id": recipient_id},
             "message": {"text": message},
@@ -468,5 +471,6 @@ class FacebookAPIClient:
             return []
 
     async def close(self):
-        """关闭 HTTP 客户端"""
-        await self.client.aclose()
+        """关闭 HTTP 客户端（共享的连接池由客户端池负责关闭）"""
+        if self._owns_client:
+            await self.client.aclose()
@@ -0,0 +1,14 @@
+"""Webhook 消息持久化队列模块"""
+from .queue import IngestQueue, ClaimedJob, ingest_queue
+from .worker_pool import IngestWorkerPool, ingest_worker_pool
+from .dedupe import RecentMessageCache, recent_messages
+
+__all__ = [
+    'IngestQueue',
+    'ClaimedJob',
+    'ingest_queue',
+    'IngestWorkerPool',
+    'ingest_worker_pool',
+    'RecentMessageCache',
+    'recent_messages',
+]
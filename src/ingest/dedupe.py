@@ -0,0 +1,87 @@
+"""Webhook 消息去重 - 进程内最近消息ID的 LRU 缓存"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RecentMessageCache:
+    """
+    最近处理过的平台消息ID（LRU）
+
+    Webhook 重投的消息在写入队列前即被丢弃，不产生任何数据库或 API 请求。
+    多进程部署时每个进程各自缓存，跨进程的重复由数据库唯一约束兜底。
+    """
+
+    def __init__(self, capacity: Optional[int] = None):
+        """
+        初始化缓存
+
+        Args:
+            capacity: 最多记住的消息ID数量
+        """
+        self.capacity = max(1, capacity or settings.webhook_dedupe_cache_size)
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 指标
+        self.checked_count = 0
+        self.duplicate_count = 0
+
+    def filter_new(self, platform: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        过滤掉最近已见过的消息，并把新消息记为已见
+
+        没有 message_id 的消息无法去重，原样保留。
+
+        Args:
+            platform: 平台名称
+            messages: 解析后的消息数据列表
+
+        Returns:
+            未见过的消息列表（保持原顺序）
+        """
+        new_messages = []
+        with self._lock:
+            for message_data in messages:
+                self.checked_count += 1
+                message_id = message_data.get("message_id")
+                if not message_id:
+                    new_messages.append(message_data)
+                    continue
+
+                key = f"{platform}:{message_id}"
+                if key in self._seen:
+                    self._seen.move_to_end(key)
+                    self.duplicate_count += 1
+                    continue
+
+                self._seen[key] = None
+                if len(self._seen) > self.capacity:
+                    self._seen.popitem(last=False)
+                new_messages.append(message_data)
+
+        if len(new_messages) < len(messages):
+            logger.info(f"Dropped {len(messages) - len(new_messages)} redelivered {platform} webhook messages")
+        return new_messages
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._seen.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取去重指标"""
+        return {
+            "capacity": self.capacity,
+            "size": len(self._seen),
+            "checked_count": self.checked_count,
+            "duplicate_count": self.duplicate_count
+        }
+
+
+# 全局最近消息缓存实例
+recent_messages = RecentMessageCache()
@@ -0,0 +1,351 @@
+"""持久化消息队列 - 基于数据库表（支持 PostgreSQL 和本地 SQLite）"""
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional, Callable
+from sqlalchemy import func
+from src.database.database import SessionLocal, insert_or_ignore
+from src.database.models import IngestJob, IngestStatus, MessageType
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClaimedJob:
+    """已被 worker 领取的队列任务（与数据库会话解耦的快照）"""
+    id: int
+    platform: str
+    payload: Dict[str, Any]
+    attempts: int
+    worker_id: str
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _encode_payload(message_data: Dict[str, Any]) -> Dict[str, Any]:
+    """将消息数据转换为可 JSON 序列化的字典"""
+    payload = dict(message_data)
+    message_type = payload.get("message_type")
+    if isinstance(message_type, MessageType):
+        payload["message_type"] = message_type.value
+    return payload
+
+
+def _decode_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """还原消息数据（恢复 MessageType 枚举）"""
+    message_data = dict(payload or {})
+    message_type = message_data.get("message_type")
+    if message_type is not None and not isinstance(message_type, MessageType):
+        try:
+            message_data["message_type"] = MessageType(message_type)
+        except ValueError:
+            message_data["message_type"] = MessageType.MESSAGE
+    return message_data
+
+
+class IngestQueue:
+    """
+    数据库表实现的工作队列
+
+    - enqueue: Webhook 只负责写入队列
+    - claim: worker 领取任务，领取后在可见性超时内对其他 worker 不可见
+    - ack / fail: 完成或失败（失败按指数退避重试，超过最大次数标记为 failed）；
+      只有仍持有任务的 worker（locked_by）可以确认，可见性超时后被其他 worker 重新领取的任务不受影响
+
+    领取使用条件 UPDATE（乐观锁），不依赖 SELECT ... FOR UPDATE SKIP LOCKED，
+    因此同样适用于 SQLite。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        visibility_timeout_seconds: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        retry_backoff_seconds: Optional[float] = None,
+        retention_hours: Optional[int] = None
+    ):
+        """
+        初始化队列
+
+        Args:
+            session_factory: 数据库会话工厂
+            visibility_timeout_seconds: 可见性超时（秒），超时未确认的任务会被重新领取
+            max_attempts: 最大领取次数
+            retry_backoff_seconds: 失败重试的基础退避时间（秒）
+            retention_hours: 已完成任务的保留时长（小时）
+        """
+        self.session_factory = session_factory
+        self.visibility_timeout = timedelta(seconds=(
+            visibility_timeout_seconds
+            if visibility_timeout_seconds is not None
+            else settings.ingest_visibility_timeout_seconds
+        ))
+        self.max_attempts = max_attempts or settings.ingest_max_attempts
+        self.retry_backoff_seconds = (
+            retry_backoff_seconds
+            if retry_backoff_seconds is not None
+            else settings.ingest_retry_backoff_seconds
+        )
+        self.retention = timedelta(hours=retention_hours or settings.ingest_retention_hours)
+
+    def enqueue(self, platform: str, message_data: Dict[str, Any]) -> Optional[int]:
+        """
+        写入一条消息
+
+        Args:
+            platform: 平台名称
+            message_data: 解析后的消息数据
+
+        Returns:
+            任务ID，消息已在队列中时返回 None
+        """
+        job_ids = self.enqueue_many(platform, [message_data])
+        return job_ids[0] if job_ids else None
+
+    def enqueue_many(self, platform: str, messages: List[Dict[str, Any]]) -> List[int]:
+        """
+        批量写入消息（单个事务）
+
+        (platform, message_id) 唯一，Webhook 重投的消息被直接忽略（INSERT ... ON CONFLICT DO NOTHING）。
+
+        Args:
+            platform: 平台名称
+            messages: 解析后的消息数据列表
+
+        Returns:
+            新写入的任务ID列表（不含重复消息）
+        """
+        if not messages:
+            return []
+
+        db = self.session_factory()
+        try:
+            now = _utcnow()
+            rows = [
+                {
+                    "platform": platform,
+                    "message_id": message_data.get("message_id"),
+                    "sender_id": message_data.get("sender_id"),
+                    "payload": _encode_payload(message_data),
+                    "status": IngestStatus.PENDING,
+                    "attempts": 0,
+                    "available_at": now
+                }
+                for message_data in messages
+            ]
+            job_ids = insert_or_ignore(db, IngestJob, rows, ["platform", "message_id"])
+            db.commit()
+
+            duplicates = len(rows) - len(job_ids)
+            if duplicates:
+                logger.info(f"Ignored {duplicates} duplicate {platform} messages already in ingest queue")
+            return job_ids
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def claim(self, worker_id: str, scan_limit: int = 10) -> Optional[ClaimedJob]:
+        """
+        领取一条可处理的任务
+
+        可处理的任务包括：待处理的任务，以及可见性超时后仍未确认的任务。
+
+        Args:
+            worker_id: worker 标识
+            scan_limit: 每次扫描的候选任务数
+
+        Returns:
+            领取到的任务，队列为空时返回 None
+        """
+        db = self.session_factory()
+        try:
+            now = _utcnow()
+            claimable = (IngestStatus.PENDING, IngestStatus.PROCESSING)
+            candidates = db.query(IngestJob.id)\
+                .filter(
+                    IngestJob.status.in_(claimable),
+                    IngestJob.available_at <= now
+                )\
+                .order_by(IngestJob.id)\
+                .limit(scan_limit)\
+                .all()
+
+            for (job_id,) in candidates:
+                claimed = db.query(IngestJob)\
+                    .filter(
+                        IngestJob.id == job_id,
+                        IngestJob.status.in_(claimable),
+                        IngestJob.available_at <= now
+                    )\
+                    .update({
+                        IngestJob.status: IngestStatus.PROCESSING,
+                        IngestJob.available_at: now + self.visibility_timeout,
+                        IngestJob.attempts: IngestJob.attempts + 1,
+                        IngestJob.locked_by: worker_id
+                    }, synchronize_session=False)
+                db.commit()
+
+                if claimed != 1:
+                    # 已被其他 worker 领取
+                    continue
+
+                job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+                if job.attempts > self.max_attempts:
+                    # 多次可见性超时（worker 崩溃/重启），不再重试
+                    job.status = IngestStatus.FAILED
+                    job.last_error = job.last_error or "visibility timeout exceeded max attempts"
+                    db.commit()
+                    logger.error(f"Ingest job {job_id} exceeded max attempts, marked as failed")
+                    continue
+
+                return ClaimedJob(
+                    id=job.id,
+                    platform=job.platform,
+                    payload=_decode_payload(job.payload),
+                    attempts=job.attempts,
+                    worker_id=worker_id
+                )
+
+            return None
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _held_by(job_id: int, worker_id: str):
+        """任务仍由该 worker 持有的条件"""
+        return (
+            IngestJob.id == job_id,
+            IngestJob.status == IngestStatus.PROCESSING,
+            IngestJob.locked_by == worker_id
+        )
+
+    def ack(self, job_id: int, worker_id: str) -> bool:
+        """
+        确认任务已完成
+
+        Args:
+            job_id: 任务ID
+            worker_id: 领取任务的 worker 标识
+
+        Returns:
+            是否确认成功（任务已被其他 worker 重新领取时返回 False）
+        """
+        db = self.session_factory()
+        try:
+            updated = db.query(IngestJob)\
+                .filter(*self._held_by(job_id, worker_id))\
+                .update({
+                    IngestJob.status: IngestStatus.DONE,
+                    IngestJob.completed_at: _utcnow(),
+                    IngestJob.last_error: None
+                }, synchronize_session=False)
+            db.commit()
+            return updated == 1
+        finally:
+            db.close()
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> Optional[bool]:
+        """
+        记录任务失败，按指数退避重新排队
+
+        Args:
+            job_id: 任务ID
+            worker_id: 领取任务的 worker 标识
+            error: 错误信息
+
+        Returns:
+            是否会重试；任务已不由该 worker 持有（被其他 worker 重新领取）时返回 None
+        """
+        db = self.session_factory()
+        try:
+            job = db.query(IngestJob).filter(*self._held_by(job_id, worker_id)).first()
+            if not job:
+                return None
+
+            values = {IngestJob.last_error: (error or "")[:2000]}
+            will_retry = job.attempts < self.max_attempts
+            if will_retry:
+                backoff = self.retry_backoff_seconds * (2 ** max(job.attempts - 1, 0))
+                values.update({
+                    IngestJob.status: IngestStatus.PENDING,
+                    IngestJob.available_at: _utcnow() + timedelta(seconds=backoff),
+                    IngestJob.locked_by: None
+                })
+            else:
+                values[IngestJob.status] = IngestStatus.FAILED
+
+            # 条件 UPDATE：读取之后被其他 worker 重新领取的任务不会被覆盖
+            updated = db.query(IngestJob)\
+                .filter(*self._held_by(job_id, worker_id), IngestJob.attempts == job.attempts)\
+                .update(values, synchronize_session=False)
+            db.commit()
+            return will_retry if updated == 1 else None
+        finally:
+            db.close()
+
+    def purge_completed(self) -> int:
+        """
+        删除超过保留时长的已完成任务
+
+        Returns:
+            删除的任务数
+        """
+        db = self.session_factory()
+        try:
+            cutoff = _utcnow() - self.retention
+            deleted = db.query(IngestJob)\
+                .filter(
+                    IngestJob.status == IngestStatus.DONE,
+                    IngestJob.completed_at < cutoff
+                )\
+                .delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def get_depth(self) -> Dict[str, Any]:
+        """
+        获取队列深度
+
+        Returns:
+            各状态的任务数以及最早待处理任务的等待时间
+        """
+        db = self.session_factory()
+        try:
+            counts = {status.value: 0 for status in IngestStatus}
+            for status, count in db.query(IngestJob.status, func.count(IngestJob.id))\
+                    .group_by(IngestJob.status).all():
+                key = status.value if isinstance(status, IngestStatus) else str(status)
+                counts[key] = count
+
+            oldest_pending = db.query(func.min(IngestJob.created_at))\
+                .filter(IngestJob.status == IngestStatus.PENDING)\
+                .scalar()
+            oldest_age = 0.0
+            if oldest_pending:
+                if oldest_pending.tzinfo is None:
+                    oldest_pending = oldest_pending.replace(tzinfo=timezone.utc)
+                oldest_age = max((_utcnow() - oldest_pending).total_seconds(), 0.0)
+
+            return {
+                "pending": counts[IngestStatus.PENDING.value],
+                "processing": counts[IngestStatus.PROCESSING.value],
+                "done": counts[IngestStatus.DONE.value],
+                "failed": counts[IngestStatus.FAILED.value],
+                "oldest_pending_age_seconds": round(oldest_age, 2)
+            }
+        finally:
+            db.close()
+
+
+# 全局队列实例
+ingest_queue = IngestQueue()
@@ -0,0 +1,245 @@
+"""消息队列 worker 池 - 从持久化队列中领取消息并交给处理管道"""
+import asyncio
+import os
+import time
+from typing import Dict, Any, List, Optional, Set, Callable, Awaitable
+from src.ingest.queue import IngestQueue, ClaimedJob, ingest_queue
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 已完成任务的清理间隔（秒）
+PURGE_INTERVAL_SECONDS = 600
+
+# 队列深度的刷新间隔（秒）：/metrics 读取缓存的深度，不在事件循环中查询数据库
+DEPTH_REFRESH_INTERVAL_SECONDS = 5
+
+
+class IngestWorkerPool:
+    """固定数量的异步 worker，持续消费持久化队列"""
+
+    def __init__(
+        self,
+        queue: IngestQueue,
+        handler: Optional[Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None,
+        workers: Optional[int] = None,
+        poll_interval_seconds: Optional[float] = None,
+        max_in_flight: Optional[int] = None
+    ):
+        """
+        初始化 worker 池
+
+        Args:
+            queue: 持久化队列
+            handler: 消息处理函数，默认经消息合并器交给 process_platform_message
+            workers: worker 数量
+            poll_interval_seconds: 队列为空时的轮询间隔（秒）
+            max_in_flight: 已领取未完成的最大任务数
+        """
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers or settings.ingest_workers
+        self.max_in_flight = max(1, max_in_flight or settings.ingest_max_in_flight)
+        self.poll_interval = (
+            poll_interval_seconds
+            if poll_interval_seconds is not None
+            else settings.ingest_poll_interval_seconds
+        )
+        self.running = False
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+        self._depth: Dict[str, Any] = {}
+        self._depth_updated_at: Optional[float] = None
+
+        # 指标
+        self.processed_count = 0
+        self.failed_count = 0
+        self.retried_count = 0
+        self.lost_lease_count = 0  # 处理完成前已被其他 worker 重新领取的任务数
+        self.in_flight = 0
+        self.processing_times: List[float] = []
+
+    async def start(self):
+        """启动 worker 池"""
+        if self.running:
+            logger.warning("Ingest worker pool is already running")
+            return
+
+        self.running = True
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        worker_prefix = f"{os.getpid()}"
+        self._tasks = [
+            asyncio.create_task(self._run_worker(f"{worker_prefix}-{index}"))
+            for index in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._refresh_depth()))
+        logger.info(f"Ingest worker pool started with {self.workers} workers")
+
+    async def stop(self):
+        """停止 worker 池（正在处理的任务未确认，会在可见性超时后被重新领取）"""
+        if not self.running:
+            return
+
+        self.running = False
+        for task in [*self._tasks, *self._jobs]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._jobs, return_exceptions=True)
+        self._tasks = []
+        self._jobs = set()
+        logger.info("Ingest worker pool stopped")
+
+    def notify(self):
+        """通知 worker 有新消息入队（同进程内免去轮询等待）"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_worker(self, worker_id: str):
+        """
+        单个 worker 的主循环
+
+        worker 只负责领取任务，任务处理在独立的 task 中进行（受 max_in_flight 限制），
+        这样在合并窗口中等待的消息不会占住 worker
+        """
+        while self.running:
+            await self._slots.acquire()
+            dispatched = False
+            try:
+                job = await asyncio.to_thread(self.queue.claim, worker_id)
+                if job is None:
+                    self._slots.release()
+                    dispatched = True
+                    await self._idle()
+                    continue
+
+                task = asyncio.create_task(self._process_job(job))
+                self._jobs.add(task)
+                task.add_done_callback(self._job_done)
+                dispatched = True
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ingest worker {worker_id} error: {str(e)}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                if not dispatched:
+                    self._slots.release()
+
+    def _job_done(self, task: asyncio.Task):
+        """任务处理结束后释放名额"""
+        self._jobs.discard(task)
+        self._slots.release()
+
+    async def _idle(self):
+        """队列为空时等待新消息通知或轮询间隔"""
+        now = time.monotonic()
+        if now - self._last_purge > PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            try:
+                purged = await asyncio.to_thread(self.queue.purge_completed)
+                if purged:
+                    logger.info(f"Purged {purged} completed ingest jobs")
+            except Exception as e:
+                logger.warning(f"Failed to purge completed ingest jobs: {str(e)}")
+
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _process_job(self, job: ClaimedJob):
+        """处理单个任务并确认/重试"""
+        handler = self.handler
+        if handler is None:
+            from src.processors.coalescer import message_coalescer
+            handler = message_coalescer.submit
+
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            result = await handler(job.platform, job.payload)
+            error = None
+            if isinstance(result, dict) and not result.get("success", True):
+                error = result.get("error") or "pipeline returned success=False"
+        except Exception as e:
+            logger.error(f"Error processing ingest job {job.id}: {str(e)}", exc_info=True)
+            error = str(e)
+        finally:
+            self.in_flight -= 1
+
+        self._record_time((time.monotonic() - start) * 1000)
+
+        if error is None:
+            if await asyncio.to_thread(self.queue.ack, job.id, job.worker_id):
+                self.processed_count += 1
+            else:
+                self.lost_lease_count += 1
+                logger.warning(f"Ingest job {job.id} was reclaimed by another worker before it was acked")
+            return
+
+        will_retry = await asyncio.to_thread(self.queue.fail, job.id, job.worker_id, error)
+        if will_retry is None:
+            self.lost_lease_count += 1
+            logger.warning(f"Ingest job {job.id} was reclaimed by another worker, not recording failure: {error}")
+        elif will_retry:
+            self.retried_count += 1
+            logger.warning(f"Ingest job {job.id} failed (attempt {job.attempts}), will retry: {error}")
+        else:
+            self.failed_count += 1
+            logger.error(f"Ingest job {job.id} failed permanently after {job.attempts} attempts: {error}")
+
+    async def _refresh_depth(self):
+        """定期在线程中读取队列深度并缓存"""
+        while self.running:
+            try:
+                self._depth = await asyncio.to_thread(self.queue.get_depth)
+                self._depth_updated_at = time.monotonic()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.warning(f"Failed to read ingest queue depth: {str(e)}")
+                self._depth = {"error": str(e)}
+            await asyncio.sleep(DEPTH_REFRESH_INTERVAL_SECONDS)
+
+    def _record_time(self, elapsed_ms: float):
+        """记录处理耗时（只保留最近1000条）"""
+        self.processing_times.append(elapsed_ms)
+        if len(self.processing_times) > 1000:
+            self.processing_times = self.processing_times[-1000:]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取队列和 worker 池指标（队列深度为后台任务缓存的值，不查询数据库）"""
+        depth = dict(self._depth)
+        if self._depth_updated_at is not None:
+            depth["age_seconds"] = round(time.monotonic() - self._depth_updated_at, 2)
+
+        if self.processing_times:
+            sorted_times = sorted(self.processing_times)
+            avg_ms = sum(sorted_times) / len(sorted_times)
+            p95_ms = sorted_times[min(int(len(sorted_times) * 0.95), len(sorted_times) - 1)]
+        else:
+            avg_ms = 0
+            p95_ms = 0
+
+        return {
+            "workers": self.workers,
+            "max_in_flight": self.max_in_flight,
+            "running": self.running,
+            "in_flight": self.in_flight,
+            "processed_count": self.processed_count,
+            "retried_count": self.retried_count,
+            "failed_count": self.failed_count,
+            "lost_lease_count": self.lost_lease_count,
+            "avg_processing_time_ms": round(avg_ms, 2),
+            "p95_processing_time_ms": round(p95_ms, 2),
+            "depth": depth
+        }
+
+
+# 全局 worker 池实例
+ingest_worker_pool = IngestWorkerPool(ingest_queue)
@@ -7,10 +7,26 @@ from src.config import settings
 class InstagramAPIClient:
     """Instagram Graph API 客户端封装"""
     
-    def __init__(self):
-        self.access_token = getattr(settings, 'instagram_access_token', None) or settings.facebook_access_token
-        self.base_url = "https://graph.instagram.com/v18.0"
-        self.client = httpx.AsyncClient(timeout=30.0)
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
+        """
+        初始化Instagram API客户端
+        
+        Args:
+            access_token: 访问令牌，如果为None则从settings获取
+            http_client: 共享的 HTTP 客户端（连接池），为None时创建独立的客户端
+        """
+        self.access_token = (
+            access_token
+            or getattr(settings, 'instagram_access_token', None)
+            or settings.facebook_access_token
+        )
+        self.base_url = settings.instagram_graph_api_url
+        self._owns_client = http_client is None
+        self.client = http_client or httpx.AsyncClient(timeout=30.0)
     
     async def send_message(
         self,
@@ -104,6 +120,7 @@ class InstagramAPIClient:
         return None
     
     async def close(self):
-        """关闭 HTTP 客户端"""
-        await self.client.aclose()
+        """关闭 HTTP 客户端（共享的连接池由客户端池负责关闭）"""
+        if self._owns_client:
+            await self.client.aclose()
 
@@ -1,6 +1,7 @@
 """Instagram Webhook 处理器（FastAPI路由）"""
 from fastapi import APIRouter, Request, Response, HTTPException, Query, BackgroundTasks
 from typing import Dict, Any
+import asyncio
 import logging
 from src.instagram.api_client import InstagramAPIClient
 from src.instagram.message_parser import InstagramMessageParser
@@ -74,12 +75,27 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
             logger.info("No Instagram messages to process")
             return {"status": "ok"}
         
-        # 在后台处理消息（使用统一处理器）
-        from src.main_processor import process_platform_message
+        # 丢弃最近已收到过的重投消息（不产生任何数据库或 API 请求）
+        from src.ingest import recent_messages
+        parsed_messages = recent_messages.filter_new("instagram", parsed_messages)
+        if not parsed_messages:
+            return {"status": "ok", "processed_count": 0}
+        
         for message_data in parsed_messages:
             # 添加平台标识
             message_data["platform"] = "instagram"
-            background_tasks.add_task(process_platform_message, "instagram", message_data)
+        
+        # 写入持久化队列，由 worker 池异步处理（重启/重新部署不丢失）
+        try:
+            from src.ingest import ingest_queue, ingest_worker_pool
+            await asyncio.to_thread(ingest_queue.enqueue_many, "instagram", parsed_messages)
+            ingest_worker_pool.notify()
+        except Exception as e:
+            # 队列不可用时退回到进程内后台任务，避免丢消息
+            logger.error(f"Failed to enqueue instagram messages, falling back to background tasks: {str(e)}", exc_info=True)
+            from src.main_processor import process_platform_message
+            for message_data in parsed_messages:
+                background_tasks.add_task(process_platform_message, "instagram", message_data)
         
         return {
             "status": "ok",
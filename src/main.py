@@ -9,6 +9,7 @@ from src.database.database import get_db, engine, Base
 from src.facebook.webhook_handler import router as facebook_router
 from src.telegram.bot_handler import router as telegram_router
 from src.config import settings
+import importlib
 import logging
 import os
 from pathlib import Path
@@ -255,6 +256,82 @@ async def startup_event():
         logger.warning(
             f"Database table creation skipped (may already exist): {str(e)}")
 
+    # 启动消息队列 worker 池（消费 Webhook 写入的持久化队列）
+    try:
+        from src.ingest import ingest_worker_pool
+        from src.monitoring.health import health_checker
+        await ingest_worker_pool.start()
+        # Store worker pool in app state for shutdown
+        app.state.ingest_worker_pool = ingest_worker_pool
+        health_checker.register_metrics_source("ingest_queue", ingest_worker_pool.get_metrics)
+
+        logger.info(f"Ingest worker pool started ({settings.ingest_workers} workers)")
+    except Exception as e:
+        logger.error(
+            f"Failed to start ingest worker pool: {str(e)}", exc_info=True)
+
+    # 各组件的监控指标（单个组件失败不影响其他组件）
+    for name, module, attribute in (
+        ("webhook_dedupe", "src.ingest", "recent_messages"),
+        ("pipeline_lanes", "src.processors.pipeline", "lane_scheduler"),
+        ("message_coalescer", "src.processors.coalescer", "message_coalescer"),
+        ("platform_clients", "src.platforms.client_pool", "client_pool"),
+        ("openai", "src.ai.openai_client", "openai_client"),
+        ("reply_cache", "src.ai.reply_cache", "reply_cache"),
+        ("conversation_state", "src.ai.conversation_state", "conversation_states"),
+        ("history_buffer", "src.ai.history_buffer", "history_buffer"),
+        ("prompt_builder", "src.ai.prompt_builder", "prompt_builder"),
+        ("keyword_engine", "src.utils.keyword_engine", "keyword_engine"),
+        ("sentiment_scorer", "src.collector.sentiment_scorer", "sentiment_scorer"),
+        ("extraction", "src.collector.extraction_engine", "extraction_engine"),
+        ("pipeline_latency", "src.monitoring.pipeline_metrics", "pipeline_metrics"),
+    ):
+        try:
+            from src.monitoring.health import health_checker
+            component = getattr(importlib.import_module(module), attribute)
+            health_checker.register_metrics_source(name, component.get_metrics)
+        except Exception as e:
+            logger.warning(f"Failed to register {name} metrics: {str(e)}", exc_info=True)
+
+    # 启动 LLM 调用记录写入任务
+    try:
+        from src.monitoring.llm_telemetry import llm_telemetry
+        from src.monitoring.health import health_checker
+        await llm_telemetry.start()
+        app.state.llm_telemetry = llm_telemetry
+        health_checker.register_metrics_source("llm", llm_telemetry.get_metrics)
+    except Exception as e:
+        logger.warning(f"Failed to start LLM telemetry writer: {str(e)}", exc_info=True)
+
+    # 启动邮箱可投递性检查 worker
+    try:
+        from src.collector.email_verification import email_verifier
+        from src.monitoring.health import health_checker
+        await email_verifier.start()
+        app.state.email_verifier = email_verifier
+        health_checker.register_metrics_source("email_verification", email_verifier.get_metrics)
+    except Exception as e:
+        logger.warning(f"Failed to start email verification workers: {str(e)}", exc_info=True)
+
+    # 启动过滤规则的配置文件检查
+    try:
+        from src.collector.filter_engine import filter_rules
+        from src.monitoring.health import health_checker
+        await filter_rules.start()
+        app.state.filter_rules = filter_rules
+        health_checker.register_metrics_source("filter_rules", filter_rules.get_metrics)
+    except Exception as e:
+        logger.warning(f"Failed to start filter rule reload: {str(e)}", exc_info=True)
+
+    # 统计数据库查询
+    try:
+        from src.monitoring.db_metrics import db_query_counter
+        from src.monitoring.health import health_checker
+        db_query_counter.attach(engine)
+        health_checker.register_metrics_source("database", db_query_counter.get_metrics)
+    except Exception as e:
+        logger.warning(f"Failed to attach database query counter: {str(e)}", exc_info=True)
+
     # 列出已注册的平台（如果可用）
     try:
         from src.platforms.registry import registry
@@ -280,10 +357,31 @@ async def startup_event():
             f"Failed to start summary notification scheduler: {str(e)}")
         # Does not affect application startup
 
+    # 后台加载本地检索兜底索引（历史问答对，加载期间新回复照常增量加入）
+    if settings.local_answers_enabled:
+        import asyncio
+        from src.database.database import SessionLocal
+        from src.ai.local_answers import local_answers
+        from src.monitoring.health import health_checker
+
+        def _load_local_answers():
+            db = SessionLocal()
+            try:
+                local_answers.load_from_db(db)
+            except Exception as e:
+                logger.warning(f"Failed to load local answer index: {str(e)}")
+            finally:
+                db.close()
+
+        app.state.local_answers_task = asyncio.create_task(asyncio.to_thread(_load_local_answers))
+        health_checker.register_metrics_source("local_answers", local_answers.get_metrics)
+
     # Start auto-reply scheduler (scanning for unreplied product messages every 5 minutes)
     try:
         from src.auto_reply.auto_reply_scheduler import auto_reply_scheduler
         await auto_reply_scheduler.start()
+        from src.monitoring.health import health_checker
+        health_checker.register_metrics_source("auto_reply", auto_reply_scheduler.get_metrics)
 
         # Store scheduler in app state for shutdown
         app.state.auto_reply_scheduler = auto_reply_scheduler
@@ -301,6 +399,14 @@ async def shutdown_event():
     """应用关闭时执行"""
     logger.info("Shutting down...")
 
+    # Stop ingest worker pool (unacknowledged jobs are re-claimed after the visibility timeout)
+    if hasattr(app.state, 'ingest_worker_pool'):
+        try:
+            await app.state.ingest_worker_pool.stop()
+            logger.info("Ingest worker pool stopped")
+        except Exception as e:
+            logger.warning(f"Failed to stop ingest worker pool: {str(e)}")
+
     # Stop summary notification scheduler
     if hasattr(app.state, 'summary_scheduler'):
         try:
@@ -320,6 +426,51 @@ async def shutdown_event():
         except Exception as e:
             logger.warning(f"Failed to stop auto-reply scheduler: {str(e)}")
 
+    # Write buffered LLM call records
+    if hasattr(app.state, 'llm_telemetry'):
+        try:
+            await app.state.llm_telemetry.stop()
+            logger.info("LLM telemetry writer stopped")
+        except Exception as e:
+            logger.warning(f"Failed to stop LLM telemetry writer: {str(e)}")
+
+    # Wait for pending pipeline trace writes
+    try:
+        from src.monitoring.pipeline_metrics import pipeline_metrics
+        await pipeline_metrics.drain()
+    except Exception as e:
+        logger.warning(f"Failed to flush pipeline traces: {str(e)}")
+
+    # Stop filter rule reload
+    if hasattr(app.state, 'filter_rules'):
+        try:
+            await app.state.filter_rules.stop()
+        except Exception as e:
+            logger.warning(f"Failed to stop filter rule reload: {str(e)}")
+
+    # Stop email deliverability workers
+    if hasattr(app.state, 'email_verifier'):
+        try:
+            await app.state.email_verifier.stop()
+        except Exception as e:
+            logger.warning(f"Failed to stop email deliverability workers: {str(e)}")
+
+    # Close pooled platform API connections
+    try:
+        from src.platforms.client_pool import client_pool
+        await client_pool.close()
+        logger.info("Platform client pool closed")
+    except Exception as e:
+        logger.warning(f"Failed to close platform client pool: {str(e)}")
+
+    # Close shared OpenAI client
+    try:
+        from src.ai.openai_client import openai_client
+        await openai_client.close()
+        logger.info("OpenAI client closed")
+    except Exception as e:
+        logger.warning(f"Failed to close OpenAI client: {str(e)}")
+
 
 @app.get("/")
 async def root() -> Dict[str, Any]:
@@ -1,5 +1,5 @@
 """主消息处理流程 - 使用模块化管道"""
-from src.processors.pipeline import default_pipeline
+from src.processors.pipeline import lane_scheduler
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,13 +12,15 @@ async def process_platform_message(platform_name: str, message_data: dict):
     流程通过管道模式执行，每个步骤都是独立的处理器：
     1. 消息接收 → 2. 用户信息处理 → 3. 过滤处理 → 4. AI回复 → 5. 数据收集 → 6. 统计记录 → 7. 通知发送
     
+    消息按 sender_id 分配到车道：同一客户的消息按顺序处理，不同客户的消息并行处理
+    
     Args:
         platform_name: 平台名称（如 'facebook', 'instagram'）
         message_data: 消息数据字典
     """
     try:
-        # 使用默认管道处理消息
-        result = await default_pipeline.process(platform_name, message_data)
+        # 在客户所属车道中使用默认管道处理消息
+        result = await lane_scheduler.submit(platform_name, message_data)
         
         if result.get("success"):
             logger.info(f"Successfully processed {platform_name} message for customer {result.get('customer_id')}")
@@ -6,6 +6,7 @@ from typing import Callable
 import time
 import logging
 from src.utils.rate_limiter import rate_limiter
+from src.config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
             if request.url.path not in ["/health", "/metrics", "/docs", "/openapi.json", "/redoc", "/test/webhook-config"]:
                 try:
                     # 使用正确的参数名：default_max 和 default_window
-                    if not rate_limiter.is_allowed(f"ip:{client_ip}", default_max=100, default_window=60):
+                    if not rate_limiter.is_allowed(f"ip:{client_ip}", default_max=settings.ip_rate_limit_per_minute, default_window=60):
                         logger.warning(f"Rate limit exceeded for IP: {client_ip}")
                         return JSONResponse(
                             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
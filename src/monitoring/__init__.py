@@ -3,6 +3,8 @@ from .api import router
 from .alerts import alert_manager, AlertLevel, Alert
 from .health import health_checker, HealthChecker
 from .realtime import realtime_monitor
+from .pipeline_metrics import pipeline_metrics, PipelineMetrics, LatencyHistogram
+from .llm_telemetry import llm_telemetry, LLMTelemetry
 
 __all__ = [
     'router',
@@ -11,5 +13,10 @@ __all__ = [
     'Alert',
     'health_checker',
     'HealthChecker',
-    'realtime_monitor'
+    'realtime_monitor',
+    'pipeline_metrics',
+    'PipelineMetrics',
+    'LatencyHistogram',
+    'llm_telemetry',
+    'LLMTelemetry'
 ]
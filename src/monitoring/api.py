@@ -102,3 +102,124 @@ async def get_recent_replies(limit: int = 20):
         logger.error(f"Error getting recent replies: {str(e)}", exc_info=True)
         return {"success": False, "error": str(e)}
 
+
+
+@router.get("/traces/slowest")
+async def get_slowest_traces(
+    limit: int = 20,
+    source: str = "memory",
+    db: Session = Depends(get_db)
+):
+    """
+    获取处理最慢的消息链路（各处理器的开始/结束偏移）
+    
+    Args:
+        limit: 返回的记录数，默认20
+        source: memory（本进程启动以来）或 database（PIPELINE_TRACE_PERSIST 开启后保存的记录）
+    """
+    try:
+        if source == "database":
+            from src.database.models import PipelineTrace
+            rows = db.query(PipelineTrace)\
+                .order_by(PipelineTrace.total_ms.desc())\
+                .limit(limit)\
+                .all()
+            traces = [
+                {
+                    "platform": row.platform,
+                    "message_id": row.message_id,
+                    "customer_id": row.customer_id,
+                    "total_ms": row.total_ms,
+                    "stages": row.stages,
+                    "created_at": row.created_at.isoformat() if row.created_at else None
+                }
+                for row in rows
+            ]
+        else:
+            from src.monitoring.pipeline_metrics import pipeline_metrics
+            traces = pipeline_metrics.get_slowest(limit)
+        
+        return {
+            "success": True,
+            "data": traces,
+            "count": len(traces)
+        }
+    except Exception as e:
+        logger.error(f"Error getting slowest traces: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+@router.get("/llm/summary")
+async def get_llm_summary(
+    hours: float = 24,
+    group_by: str = "page_id",
+    db: Session = Depends(get_db)
+):
+    """
+    LLM 调用汇总（调用数、失败数、耗时 p50/p95、token 数和估算费用）
+    
+    Args:
+        hours: 统计最近多少小时，默认24
+        group_by: 分组字段 page_id / model / tier / prompt_version / outcome
+    """
+    try:
+        from src.monitoring.llm_telemetry import llm_telemetry, summarize_calls, window_start
+        await llm_telemetry.flush()
+        groups = summarize_calls(db, window_start(hours), group_by)
+        return {
+            "success": True,
+            "group_by": group_by,
+            "hours": hours,
+            "data": groups,
+            "count": len(groups)
+        }
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.error(f"Error getting LLM summary: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+@router.get("/llm/timeseries")
+async def get_llm_timeseries(
+    hours: float = 1,
+    bucket_minutes: int = 1,
+    db: Session = Depends(get_db)
+):
+    """
+    按时间桶统计 LLM 调用数和 token 数（容量规划用）
+    
+    Args:
+        hours: 统计最近多少小时，默认1
+        bucket_minutes: 时间桶长度（分钟），默认1
+    """
+    try:
+        from src.monitoring.llm_telemetry import llm_telemetry, token_timeseries, window_start
+        await llm_telemetry.flush()
+        series = token_timeseries(db, window_start(hours), bucket_minutes)
+        return {
+            "success": True,
+            "bucket_minutes": bucket_minutes,
+            "data": series,
+            "count": len(series)
+        }
+    except Exception as e:
+        logger.error(f"Error getting LLM timeseries: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+
+@router.post("/reply-cache/flush")
+async def flush_reply_cache():
+    """
+    清空AI回复缓存
+    
+    修改 ai_templates 或提示词后调用，避免继续返回旧提示词生成的回复
+    （新加载的 ai_templates 版本变化时也会自动清空）。
+    """
+    try:
+        from src.ai.reply_cache import reply_cache
+        cleared = reply_cache.clear(reason="api")
+        return {"success": True, "cleared": cleared}
+    except Exception as e:
+        logger.error(f"Error flushing reply cache: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
@@ -0,0 +1,61 @@
+"""数据库查询统计 - 按语句类型统计 SQL 执行次数和耗时"""
+import threading
+import time
+from typing import Dict, Any
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_TYPES = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+class DatabaseQueryCounter:
+    """
+    SQL 执行计数器（挂在 SQLAlchemy 引擎事件上）
+
+    计数是累计值，压测脚本在压测前后各读取一次 /metrics，差值除以消息数即为每条消息的查询数。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.total_time_ms = 0.0
+        self._attached = set()
+
+    def attach(self, engine: Engine):
+        """挂载到数据库引擎（重复挂载会被忽略）"""
+        if id(engine) in self._attached:
+            return
+        self._attached.add(id(engine))
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started_at")
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000 if started else 0.0
+
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        statement_type = verb if verb in STATEMENT_TYPES else "OTHER"
+        with self._lock:
+            self.counts[statement_type] = self.counts.get(statement_type, 0) + 1
+            self.total_time_ms += elapsed_ms
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取查询统计"""
+        with self._lock:
+            counts = dict(self.counts)
+            total_time_ms = self.total_time_ms
+        return {
+            "queries": sum(counts.values()),
+            "by_type": counts,
+            "total_time_ms": round(total_time_ms, 2)
+        }
+
+
+# 全局查询计数器实例
+db_query_counter = DatabaseQueryCounter()
@@ -1,6 +1,6 @@
 """健康检查和性能监控"""
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -20,6 +20,7 @@ class HealthChecker:
         self.request_count = 0
         self.error_count = 0
         self.response_times: list = []
+        self.metrics_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
     
     async def check_health(self, db: Optional[Session] = None) -> Dict[str, Any]:
         """
@@ -200,6 +201,19 @@ class HealthChecker:
         if len(self.response_times) > 1000:
             self.response_times = self.response_times[-1000:]
     
+    def register_metrics_source(self, name: str, source: Callable[[], Dict[str, Any]]) -> None:
+        """
+        注册额外的指标来源（在 /metrics 中以 name 为键输出）
+        
+        /metrics 在事件循环中同步调用各来源，来源只能读取内存中的指标；
+        需要查询数据库的指标（如队列深度）由后台任务定期刷新并缓存。
+        
+        Args:
+            name: 指标分组名称
+            source: 返回指标字典的函数
+        """
+        self.metrics_sources[name] = source
+    
     def get_metrics(self) -> Dict[str, Any]:
         """获取性能指标"""
         if not self.response_times:
@@ -213,7 +227,7 @@ class HealthChecker:
         
         error_rate = (self.error_count / self.request_count * 100) if self.request_count > 0 else 0
         
-        return {
+        metrics = {
             "request_count": self.request_count,
             "error_count": self.error_count,
             "error_rate_percent": round(error_rate, 2),
@@ -221,6 +235,15 @@ class HealthChecker:
             "p95_response_time_ms": round(p95_response_time, 2),
             "uptime_seconds": (datetime.utcnow() - self.start_time).total_seconds()
         }
+        
+        for name, source in self.metrics_sources.items():
+            try:
+                metrics[name] = source()
+            except Exception as e:
+                logger.warning(f"Metrics source {name} failed: {e}")
+                metrics[name] = {"error": str(e)}
+        
+        return metrics
 
 
 # 全局健康检查器实例
@@ -0,0 +1,427 @@
+"""LLM 调用记录 - 每次补全的 token、耗时、模型、提示词版本和结果"""
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from src.config import settings
+from src.monitoring.pipeline_metrics import LatencyHistogram
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 补全请求结果
+OUTCOME_SUCCESS = "success"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+OUTCOME_CANCELLED = "cancelled"
+OUTCOME_HEDGE_LOST = "hedge_lost"  # 对冲中未被采用的重复请求（仍然计费）
+
+# 估算费用用的价格（美元 / 百万 token：输入, 输出），按模型名前缀匹配（最长前缀优先）
+MODEL_PRICES_PER_MILLION: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# 每分钟 token 数按最近若干分钟的平均值计算
+TOKENS_PER_MINUTE_WINDOW = 5
+
+# 聚合接口支持的分组字段
+GROUP_BY_FIELDS = ("page_id", "model", "tier", "prompt_version", "outcome")
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> Optional[float]:
+    """
+    估算一次补全的费用（美元）
+
+    Returns:
+        费用，未知模型或没有 usage 时返回 None
+    """
+    if not model or (prompt_tokens is None and completion_tokens is None):
+        return None
+    for prefix in sorted(MODEL_PRICES_PER_MILLION, key=len, reverse=True):
+        if model.startswith(prefix):
+            input_price, output_price = MODEL_PRICES_PER_MILLION[prefix]
+            return ((prompt_tokens or 0) * input_price + (completion_tokens or 0) * output_price) / 1_000_000
+    return None
+
+
+class LLMTelemetry:
+    """
+    LLM 调用记录器
+
+    - record() 只更新内存指标并把记录追加到缓冲区，不访问数据库（在补全请求的路径上调用）
+    - 后台任务定时或缓冲区攒满一批时，在线程中批量写入 llm_calls 表
+    - 内存中按模型、路由档位、页面维护耗时直方图，按分钟累计 token 数（/metrics）
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        persist: Optional[bool] = None,
+        flush_interval_seconds: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_buffer: Optional[int] = None
+    ):
+        """
+        初始化记录器
+
+        Args:
+            enabled: 是否记录
+            persist: 是否写入数据库（关闭时只保留内存指标）
+            flush_interval_seconds: 后台写入间隔（秒）
+            batch_size: 缓冲区达到该数量时立即写入
+            max_buffer: 缓冲区上限（数据库不可用时丢弃最早的记录）
+        """
+        self.enabled = settings.llm_telemetry_enabled if enabled is None else enabled
+        self.persist = settings.llm_telemetry_persist if persist is None else persist
+        self.flush_interval = flush_interval_seconds or settings.llm_telemetry_flush_interval_seconds
+        self.batch_size = max(1, batch_size or settings.llm_telemetry_batch_size)
+        self.max_buffer = max(self.batch_size, max_buffer or settings.llm_telemetry_max_buffer)
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._running = False
+
+        # 指标
+        self.model_histograms: Dict[str, LatencyHistogram] = {}
+        self.tier_histograms: Dict[str, LatencyHistogram] = {}
+        self.tier_cost_usd: Dict[str, float] = {}
+        self.page_histograms: Dict[str, LatencyHistogram] = {}
+        self.outcome_counts: Dict[str, int] = {}
+        self.prompt_tokens_total = 0
+        self.completion_tokens_total = 0
+        self.cost_usd_total = 0.0
+        self._minutes: deque = deque(maxlen=TOKENS_PER_MINUTE_WINDOW)  # [分钟, 调用数, 输入 token, 输出 token]
+        self.written_count = 0
+        self.dropped_count = 0
+        self.write_error_count = 0
+
+    def record(
+        self,
+        model: Optional[str],
+        outcome: str,
+        latency_ms: float,
+        page_id: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        tier: Optional[str] = None
+    ):
+        """
+        记录一次补全请求
+
+        Args:
+            model: 模型名称
+            outcome: 结果（success/timeout/error/cancelled）
+            latency_ms: 请求耗时（毫秒，不含排队等待）
+            page_id: 页面ID
+            prompt_version: 系统提示词版本（内容哈希）
+            prompt_tokens: 响应 usage.prompt_tokens
+            completion_tokens: 响应 usage.completion_tokens
+            tier: 模型路由档位
+        """
+        if not self.enabled:
+            return
+        model = model or "unknown"
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+
+        self._observe(self.model_histograms, model, latency_ms)
+        self._observe(self.page_histograms, page_id or "", latency_ms)
+        if tier:
+            self._observe(self.tier_histograms, tier, latency_ms)
+            self.tier_cost_usd[tier] = self.tier_cost_usd.get(tier, 0.0) + (cost or 0.0)
+        self.outcome_counts[outcome] = self.outcome_counts.get(outcome, 0) + 1
+        self.prompt_tokens_total += prompt_tokens or 0
+        self.completion_tokens_total += completion_tokens or 0
+        self.cost_usd_total += cost or 0.0
+        self._count_minute(prompt_tokens or 0, completion_tokens or 0)
+
+        if not self.persist:
+            return
+        self._buffer.append({
+            "page_id": page_id,
+            "model": model,
+            "prompt_version": prompt_version,
+            "tier": tier,
+            "outcome": outcome,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency_ms, 2),
+            "cost_usd": cost,
+            "created_at": datetime.now(timezone.utc)
+        })
+        if len(self._buffer) > self.max_buffer:
+            overflow = len(self._buffer) - self.max_buffer
+            del self._buffer[:overflow]
+            self.dropped_count += overflow
+        if self._running and len(self._buffer) >= self.batch_size:
+            asyncio.ensure_future(self.flush())
+
+    @staticmethod
+    def _observe(histograms: Dict[str, LatencyHistogram], key: str, latency_ms: float):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LatencyHistogram()
+        histogram.observe(latency_ms)
+
+    def _count_minute(self, prompt_tokens: int, completion_tokens: int):
+        """累加到当前分钟的计数（只保留最近 TOKENS_PER_MINUTE_WINDOW 分钟）"""
+        minute = int(time.time() // 60)
+        if not self._minutes or self._minutes[-1][0] != minute:
+            self._minutes.append([minute, 0, 0, 0])
+        bucket = self._minutes[-1]
+        bucket[1] += 1
+        bucket[2] += prompt_tokens
+        bucket[3] += completion_tokens
+
+    async def start(self):
+        """启动后台写入任务"""
+        if self._running or not (self.enabled and self.persist):
+            return
+        self._running = True
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"LLM telemetry writer started (every {self.flush_interval}s or {self.batch_size} records)")
+
+    async def stop(self):
+        """停止后台写入任务并写入剩余记录"""
+        self._running = False
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while self._running:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        将缓冲区中的记录批量写入数据库（在线程中执行，不阻塞事件循环）
+
+        Returns:
+            写入的记录数
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self._write_rows, rows)
+            except Exception as e:
+                # 写入失败的记录放回缓冲区，下次重试（超出上限时丢弃最早的记录）
+                self.write_error_count += 1
+                self._buffer = rows + self._buffer
+                if len(self._buffer) > self.max_buffer:
+                    overflow = len(self._buffer) - self.max_buffer
+                    del self._buffer[:overflow]
+                    self.dropped_count += overflow
+                logger.warning(f"Failed to persist {len(rows)} LLM call records: {str(e)}")
+                return 0
+            self.written_count += len(rows)
+            return len(rows)
+
+    @staticmethod
+    def _write_rows(rows: List[Dict[str, Any]]):
+        from src.database.database import SessionLocal
+        from src.database.models import LLMCall
+
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(LLMCall, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def tokens_per_minute(self) -> Dict[str, float]:
+        """最近 TOKENS_PER_MINUTE_WINDOW 分钟（含当前分钟）平均每分钟的调用数和 token 数"""
+        first_minute = int(time.time() // 60) - TOKENS_PER_MINUTE_WINDOW + 1
+        recent = [bucket for bucket in self._minutes if bucket[0] >= first_minute]
+        return {
+            "calls_per_minute": round(sum(b[1] for b in recent) / TOKENS_PER_MINUTE_WINDOW, 2),
+            "prompt_tokens_per_minute": round(sum(b[2] for b in recent) / TOKENS_PER_MINUTE_WINDOW, 1),
+            "completion_tokens_per_minute": round(sum(b[3] for b in recent) / TOKENS_PER_MINUTE_WINDOW, 1)
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取 /metrics 使用的指标"""
+        return {
+            "enabled": self.enabled,
+            "outcomes": dict(self.outcome_counts),
+            "prompt_tokens_total": self.prompt_tokens_total,
+            "completion_tokens_total": self.completion_tokens_total,
+            "estimated_cost_usd_total": round(self.cost_usd_total, 4),
+            **self.tokens_per_minute(),
+            "latency_by_model": {
+                model: _latency_summary(histogram)
+                for model, histogram in sorted(self.model_histograms.items())
+            },
+            "by_tier": {
+                tier: {
+                    **_latency_summary(histogram),
+                    "estimated_cost_usd": round(self.tier_cost_usd.get(tier, 0.0), 4)
+                }
+                for tier, histogram in sorted(self.tier_histograms.items())
+            },
+            "latency_by_page": {
+                page_id or "default": _latency_summary(histogram)
+                for page_id, histogram in sorted(self.page_histograms.items())
+            },
+            "buffered": len(self._buffer),
+            "written_count": self.written_count,
+            "dropped_count": self.dropped_count,
+            "write_error_count": self.write_error_count
+        }
+
+    def reset(self):
+        """清空内存指标和缓冲区"""
+        self._buffer = []
+        self.model_histograms = {}
+        self.tier_histograms = {}
+        self.tier_cost_usd = {}
+        self.page_histograms = {}
+        self.outcome_counts = {}
+        self.prompt_tokens_total = 0
+        self.completion_tokens_total = 0
+        self.cost_usd_total = 0.0
+        self._minutes.clear()
+
+
+def _latency_summary(histogram: LatencyHistogram) -> Dict[str, Any]:
+    return {
+        "count": histogram.count,
+        "p50_ms": round(histogram.quantile(0.5), 2),
+        "p95_ms": round(histogram.quantile(0.95), 2)
+    }
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def summarize_calls(db, since: datetime, group_by: str = "page_id") -> List[Dict[str, Any]]:
+    """
+    按分组汇总 llm_calls 表中的调用记录
+
+    Args:
+        db: 数据库会话
+        since: 起始时间
+        group_by: 分组字段（page_id/model/tier/prompt_version/outcome）
+
+    Returns:
+        每组的调用数、失败数、耗时分位数、token 数和估算费用（按调用数降序）
+    """
+    from src.database.models import LLMCall
+
+    if group_by not in GROUP_BY_FIELDS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}")
+
+    column = getattr(LLMCall, group_by)
+    rows = db.query(
+        column, LLMCall.outcome, LLMCall.latency_ms,
+        LLMCall.prompt_tokens, LLMCall.completion_tokens, LLMCall.cost_usd
+    ).filter(LLMCall.created_at >= since).all()
+
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for key, outcome, latency_ms, prompt_tokens, completion_tokens, cost in rows:
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                group_by: key, "calls": 0, "failures": 0, "latencies": [],
+                "prompt_tokens": 0, "completion_tokens": 0, "usage_calls": 0, "cost_usd": 0.0
+            }
+        group["calls"] += 1
+        if outcome != OUTCOME_SUCCESS:
+            group["failures"] += 1
+        group["latencies"].append(latency_ms)
+        if prompt_tokens is not None:
+            group["usage_calls"] += 1
+            group["prompt_tokens"] += prompt_tokens
+            group["completion_tokens"] += completion_tokens or 0
+        group["cost_usd"] += cost or 0.0
+
+    summaries = []
+    for group in groups.values():
+        latencies = sorted(group.pop("latencies"))
+        usage_calls = group.pop("usage_calls")
+        group.update({
+            "p50_latency_ms": round(_percentile(latencies, 0.5), 2),
+            "p95_latency_ms": round(_percentile(latencies, 0.95), 2),
+            "avg_prompt_tokens": round(group["prompt_tokens"] / usage_calls, 1) if usage_calls else 0,
+            "avg_completion_tokens": round(group["completion_tokens"] / usage_calls, 1) if usage_calls else 0,
+            "cost_usd": round(group["cost_usd"], 4)
+        })
+        summaries.append(group)
+    summaries.sort(key=lambda item: item["calls"], reverse=True)
+    return summaries
+
+
+def token_timeseries(db, since: datetime, bucket_minutes: int = 1) -> List[Dict[str, Any]]:
+    """
+    按时间桶统计调用数和 token 数（容量规划用）
+
+    Args:
+        db: 数据库会话
+        since: 起始时间
+        bucket_minutes: 时间桶长度（分钟）
+
+    Returns:
+        [{bucket_start, calls, prompt_tokens, completion_tokens, p95_latency_ms}]（按时间正序）
+    """
+    from src.database.models import LLMCall
+
+    bucket_seconds = max(1, bucket_minutes) * 60
+    rows = db.query(
+        LLMCall.created_at, LLMCall.latency_ms, LLMCall.prompt_tokens, LLMCall.completion_tokens
+    ).filter(LLMCall.created_at >= since).all()
+
+    buckets: Dict[int, Dict[str, Any]] = {}
+    for created_at, latency_ms, prompt_tokens, completion_tokens in rows:
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        start = int(created_at.timestamp() // bucket_seconds * bucket_seconds)
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latencies": []}
+        bucket["calls"] += 1
+        bucket["prompt_tokens"] += prompt_tokens or 0
+        bucket["completion_tokens"] += completion_tokens or 0
+        bucket["latencies"].append(latency_ms)
+
+    series = []
+    for start in sorted(buckets):
+        bucket = buckets[start]
+        latencies = sorted(bucket.pop("latencies"))
+        series.append({
+            "bucket_start": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+            **bucket,
+            "p95_latency_ms": round(_percentile(latencies, 0.95), 2)
+        })
+    return series
+
+
+def window_start(hours: float) -> datetime:
+    """聚合接口的起始时间（当前时间往前 hours 小时）"""
+    return datetime.now(timezone.utc) - timedelta(hours=hours)
+
+
+# 全局 LLM 调用记录器实例
+llm_telemetry = LLMTelemetry()
@@ -0,0 +1,219 @@
+"""管道性能指标 - 各处理器耗时直方图与单条消息处理链路"""
+import asyncio
+import heapq
+import itertools
+from typing import Dict, Any, List, Optional, Set, Tuple
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 直方图桶上界（毫秒），最后一个桶为 +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """固定桶的耗时直方图（内存占用恒定，分位数按桶上界估算）"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float):
+        """记录一次耗时"""
+        index = len(self.buckets)
+        for i, upper in enumerate(self.buckets):
+            if elapsed_ms <= upper:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def quantile(self, q: float) -> float:
+        """估算分位数（返回所在桶的上界，落在 +Inf 桶时返回最大值）"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return float(self.buckets[i]) if i < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为 /metrics 使用的字典（桶为累计计数）"""
+        cumulative = 0
+        buckets = {}
+        for upper, bucket_count in zip([*self.buckets, "+Inf"], self.counts):
+            cumulative += bucket_count
+            buckets[str(upper)] = cumulative
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum_ms, 2),
+            "avg_ms": round(self.sum_ms / self.count, 2) if self.count else 0,
+            "p50_ms": round(self.quantile(0.5), 2),
+            "p95_ms": round(self.quantile(0.95), 2),
+            "p99_ms": round(self.quantile(0.99), 2),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": buckets
+        }
+
+
+class PipelineMetrics:
+    """
+    管道指标收集器
+
+    - 每个处理器按 (处理器, 平台, 状态) 维护耗时直方图
+    - 每个平台维护整条管道的耗时直方图
+    - 内存中保留最慢的若干条消息链路；开启持久化时超过阈值的链路写入 pipeline_traces 表
+    """
+
+    def __init__(
+        self,
+        slowest_limit: Optional[int] = None,
+        persist: Optional[bool] = None,
+        persist_min_ms: Optional[float] = None
+    ):
+        """
+        初始化指标收集器
+
+        Args:
+            slowest_limit: 内存中保留的最慢消息链路数量
+            persist: 是否将链路写入数据库
+            persist_min_ms: 写入数据库的最小总耗时（毫秒）
+        """
+        self.slowest_limit = slowest_limit or settings.pipeline_trace_slowest_limit
+        self.persist = settings.pipeline_trace_persist if persist is None else persist
+        self.persist_min_ms = (
+            persist_min_ms
+            if persist_min_ms is not None
+            else settings.pipeline_trace_persist_min_ms
+        )
+        self.processor_histograms: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self.pipeline_histograms: Dict[str, LatencyHistogram] = {}
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []  # 最小堆
+        self._sequence = itertools.count()
+        # 正在写入数据库的任务（保留引用，避免任务在完成前被垃圾回收）
+        self._persist_tasks: Set[asyncio.Task] = set()
+        self.persist_error_count = 0
+
+    def record_processor(self, processor_name: str, platform_name: str, status: str, elapsed_ms: float):
+        """
+        记录单个处理器的耗时
+
+        Args:
+            processor_name: 处理器名称
+            platform_name: 平台名称
+            status: 处理状态（success/skip/error/invalid）
+            elapsed_ms: 耗时（毫秒）
+        """
+        key = (processor_name, platform_name, status)
+        histogram = self.processor_histograms.get(key)
+        if histogram is None:
+            histogram = self.processor_histograms[key] = LatencyHistogram()
+        histogram.observe(elapsed_ms)
+
+    def record_trace(self, platform_name: str, trace: Dict[str, Any]):
+        """
+        记录一条消息的完整处理链路
+
+        Args:
+            platform_name: 平台名称
+            trace: 链路数据（message_id、customer_id、total_ms、stages）
+        """
+        total_ms = trace["total_ms"]
+        histogram = self.pipeline_histograms.get(platform_name)
+        if histogram is None:
+            histogram = self.pipeline_histograms[platform_name] = LatencyHistogram()
+        histogram.observe(total_ms)
+
+        record = {"platform": platform_name, **trace}
+        entry = (total_ms, next(self._sequence), record)
+        if len(self._slowest) < self.slowest_limit:
+            heapq.heappush(self._slowest, entry)
+        elif total_ms > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+        if self.persist and total_ms >= self.persist_min_ms:
+            task = asyncio.ensure_future(self._persist(record))
+            self._persist_tasks.add(task)
+            task.add_done_callback(self._persist_tasks.discard)
+
+    async def _persist(self, record: Dict[str, Any]):
+        """将链路写入数据库（在线程中执行，不阻塞事件循环）"""
+        try:
+            await asyncio.to_thread(self._write_trace, record)
+        except Exception as e:
+            self.persist_error_count += 1
+            logger.warning(f"Failed to persist pipeline trace: {str(e)}")
+
+    async def drain(self):
+        """等待正在写入数据库的链路完成（应用关闭时调用）"""
+        if self._persist_tasks:
+            await asyncio.gather(*list(self._persist_tasks), return_exceptions=True)
+
+    @staticmethod
+    def _write_trace(record: Dict[str, Any]):
+        from src.database.database import SessionLocal
+        from src.database.models import PipelineTrace
+
+        db = SessionLocal()
+        try:
+            db.add(PipelineTrace(
+                platform=record["platform"],
+                message_id=record.get("message_id"),
+                customer_id=record.get("customer_id"),
+                total_ms=record["total_ms"],
+                stages=record["stages"]
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_slowest(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取内存中最慢的消息链路（按总耗时降序）"""
+        slowest = [record for _, _, record in sorted(self._slowest, reverse=True)]
+        return slowest[:limit] if limit else slowest
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取 /metrics 使用的指标"""
+        processors: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (processor_name, platform_name, status), histogram in sorted(self.processor_histograms.items()):
+            processors.setdefault(processor_name, {}).setdefault(platform_name, {})[status] = histogram.to_dict()
+
+        return {
+            "processors": processors,
+            "pipeline": {
+                platform_name: histogram.to_dict()
+                for platform_name, histogram in sorted(self.pipeline_histograms.items())
+            },
+            "slowest_messages": [
+                {
+                    "platform": record["platform"],
+                    "message_id": record.get("message_id"),
+                    "total_ms": record["total_ms"]
+                }
+                for record in self.get_slowest(5)
+            ],
+            "pending_trace_writes": len(self._persist_tasks),
+            "trace_write_errors": self.persist_error_count
+        }
+
+    def reset(self):
+        """清空所有指标"""
+        self.processor_histograms = {}
+        self.pipeline_histograms = {}
+        self._slowest = []
+
+
+# 全局管道指标实例
+pipeline_metrics = PipelineMetrics()
@@ -0,0 +1,171 @@
+"""平台客户端池 - 复用长连接的平台 API 客户端"""
+import asyncio
+from typing import Dict, Any, Optional, Set, Tuple
+import httpx
+from src.config import settings
+from src.platforms.registry import PlatformRegistry, registry
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PlatformClientPool:
+    """
+    平台客户端池
+
+    - 每个平台共用一个 httpx.AsyncClient（keep-alive 连接池，可选 HTTP/2），
+      避免每条消息重新建立 TLS 连接
+    - 客户端实例按 (平台, 缓存键) 缓存（缓存键通常为页面 ID），不同页面各自持有客户端，但共享连接
+    - 同一缓存键的 Token 变化时（页面 Token 轮换）创建新客户端，并关闭被替换的客户端
+    - 池中的客户端由池统一关闭，调用方不应调用 close()
+    """
+
+    def __init__(
+        self,
+        platform_registry: Optional[PlatformRegistry] = None,
+        http2: Optional[bool] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        timeout: Optional[float] = None
+    ):
+        """
+        初始化客户端池
+
+        Args:
+            platform_registry: 平台注册表
+            http2: 是否启用 HTTP/2（需要安装 h2）
+            max_connections: 每个平台的最大连接数
+            max_keepalive_connections: 每个平台保持的空闲连接数
+            keepalive_expiry: 空闲连接保持时间（秒）
+            timeout: 请求超时时间（秒）
+        """
+        self.registry = platform_registry or registry
+        self.http2 = settings.platform_http2 if http2 is None else http2
+        self.max_connections = max_connections or settings.platform_max_connections
+        self.max_keepalive_connections = (
+            max_keepalive_connections or settings.platform_max_keepalive_connections
+        )
+        self.keepalive_expiry = keepalive_expiry or settings.platform_keepalive_expiry_seconds
+        self.timeout = timeout or settings.platform_request_timeout_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http_clients: Dict[str, httpx.AsyncClient] = {}
+        # (平台, 缓存键) -> (Token, 客户端)
+        self._clients: Dict[Tuple[str, Optional[str]], Tuple[Optional[str], Any]] = {}
+        self._close_tasks: Set[asyncio.Task] = set()
+
+        # 指标
+        self.created_count = 0
+        self.reused_count = 0
+        self.replaced_count = 0
+
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("PLATFORM_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+                self.http2 = False
+
+    def _ensure_loop_state(self):
+        """连接绑定事件循环，事件循环变化时丢弃旧连接"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._http_clients = {}
+            self._clients = {}
+
+    def _get_http_client(self, platform_name: str) -> httpx.AsyncClient:
+        """获取平台共享的 HTTP 客户端"""
+        http_client = self._http_clients.get(platform_name)
+        if http_client is None or http_client.is_closed:
+            http_client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+            self._http_clients[platform_name] = http_client
+        return http_client
+
+    def get(
+        self,
+        platform_name: str,
+        access_token: Optional[str] = None,
+        key: Optional[str] = None,
+        **kwargs
+    ) -> Optional[Any]:
+        """
+        获取平台客户端（不存在或 Token 已变化时创建）
+
+        Args:
+            platform_name: 平台名称
+            access_token: 访问令牌（调用方每次按当前配置解析），为None时使用客户端默认Token
+            key: 缓存键（通常为页面 ID），为None时按 Token 缓存
+            **kwargs: 其他客户端初始化参数
+
+        Returns:
+            客户端实例，如果平台未注册或创建失败则返回 None
+        """
+        self._ensure_loop_state()
+        cache_key = (platform_name, key if key is not None else access_token)
+        cached = self._clients.get(cache_key)
+        if cached is not None:
+            token, client = cached
+            if token == access_token:
+                self.reused_count += 1
+                return client
+            # Token 已轮换：丢弃旧客户端（正在使用它的请求不受影响）
+            del self._clients[cache_key]
+            self.replaced_count += 1
+            self._close_client(client)
+
+        client = self.registry.create_client(
+            platform_name,
+            access_token=access_token,
+            http_client=self._get_http_client(platform_name),
+            **kwargs
+        )
+        if client is not None:
+            self._clients[cache_key] = (access_token, client)
+            self.created_count += 1
+        return client
+
+    def _close_client(self, client: Any):
+        """后台关闭被替换的客户端（共享连接池不受影响）"""
+        close = getattr(client, "close", None)
+        if close is None:
+            return
+        task = asyncio.ensure_future(close())
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    async def close(self):
+        """关闭所有连接（应用关闭时调用）"""
+        http_clients = list(self._http_clients.values())
+        self._http_clients = {}
+        self._clients = {}
+        if self._close_tasks:
+            await asyncio.gather(*self._close_tasks, return_exceptions=True)
+        for http_client in http_clients:
+            try:
+                await http_client.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close platform HTTP client: {str(e)}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取客户端池指标"""
+        return {
+            "http2": self.http2,
+            "platforms": sorted(self._http_clients.keys()),
+            "clients": len(self._clients),
+            "created_count": self.created_count,
+            "reused_count": self.reused_count,
+            "replaced_count": self.replaced_count
+        }
+
+
+# 全局客户端池实例
+client_pool = PlatformClientPool()
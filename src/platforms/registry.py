@@ -1,5 +1,6 @@
 """平台注册表 - 管理平台客户端、解析器和处理器的注册"""
-from typing import Dict, Type, Optional, Any
+import inspect
+from typing import Dict, Type, Optional, Any, FrozenSet
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,6 +12,7 @@ class PlatformRegistry:
     def __init__(self):
         """初始化注册表"""
         self._clients: Dict[str, Type] = {}
+        self._client_params: Dict[str, FrozenSet[str]] = {}
         self._parsers: Dict[str, Type] = {}
         self._webhook_handlers: Dict[str, Any] = {}
     
@@ -32,6 +34,7 @@ class PlatformRegistry:
         """
         if client_class:
             self._clients[platform_name] = client_class
+            self._client_params[platform_name] = self._init_params(client_class)
         if parser_class:
             self._parsers[platform_name] = parser_class
         if webhook_handler:
@@ -43,13 +46,23 @@ class PlatformRegistry:
         """获取平台客户端类"""
         return self._clients.get(platform_name)
     
+    @staticmethod
+    def _init_params(client_class: Type) -> FrozenSet[str]:
+        """读取客户端类初始化方法接受的参数名（注册时解析一次）"""
+        try:
+            params = inspect.signature(client_class.__init__).parameters
+        except (TypeError, ValueError):
+            return frozenset()
+        return frozenset(name for name in params if name != 'self')
+    
     def create_client(self, platform_name: str, **kwargs) -> Optional[Any]:
         """
         创建平台客户端实例
         
         Args:
             platform_name: 平台名称
-            **kwargs: 客户端初始化参数（会被忽略，因为客户端从 settings 读取配置）
+            **kwargs: 客户端初始化参数（如 access_token、http_client、db），
+                客户端不接受的参数会被忽略
             
         Returns:
             客户端实例，如果平台未注册则返回 None
@@ -60,21 +73,11 @@ class PlatformRegistry:
             return None
         
         try:
-            # 检查客户端类的初始化签名
-            import inspect
-            sig = inspect.signature(client_class.__init__)
-            params = sig.parameters
-            
-            # 构建初始化参数
-            init_kwargs = {}
-            
-            # 如果客户端需要 db 参数
-            if 'db' in params:
-                init_kwargs['db'] = kwargs.get('db', None)
-            
-            # FacebookAPIClient 和 InstagramAPIClient 不接受 access_token 参数
-            # 它们直接从 settings 读取配置，所以忽略 kwargs 中的 access_token
-            
+            params = self._client_params.get(platform_name, frozenset())
+            init_kwargs = {
+                name: value for name, value in kwargs.items()
+                if name in params and value is not None
+            }
             return client_class(**init_kwargs)
         except Exception as e:
             logger.error(f"Failed to create client for platform {platform_name}: {str(e)}", exc_info=True)
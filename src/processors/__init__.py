@@ -1,6 +1,8 @@
 """消息处理器模块"""
 from .base import BaseProcessor, ProcessorResult, ProcessorContext
 from .pipeline import MessagePipeline
+from .lanes import LaneScheduler
+from .coalescer import MessageCoalescer
 from .handlers import (
     MessageReceiver,
     UserInfoHandler,
@@ -16,6 +18,8 @@ __all__ = [
     'ProcessorResult',
     'ProcessorContext',
     'MessagePipeline',
+    'LaneScheduler',
+    'MessageCoalescer',
     'MessageReceiver',
     'UserInfoHandler',
     'FilterHandler',
@@ -55,11 +55,36 @@ class ProcessorContext:
     # 数据库和客户端
     db: Any = None
     platform_client: Any = None
+    
+    # 关键词匹配结果（首次访问 keywords 时计算，各处理器共享）
+    keyword_matches: Any = None
+    
+    # AI回复时限（time.monotonic() 时间点，由管道按 PIPELINE_REPLY_DEADLINE_SECONDS 设置）
+    deadline: Optional[float] = None
+    
+    @property
+    def keywords(self):
+        """消息内容的关键词匹配结果（src.utils.keyword_engine.KeywordMatches）"""
+        if self.keyword_matches is None:
+            from src.utils.keyword_engine import keyword_engine
+            self.keyword_matches = keyword_engine.match(self.message_data.get("content", ""))
+        return self.keyword_matches
 
 
 class BaseProcessor(ABC):
     """处理器基类 - 所有处理器都应继承此类"""
     
+    # 是否使用共享的 context.db 会话。同层处理器并发执行，而会话不能在 await 之间被多个协程交替
+    # flush/commit：管道保证每组并发执行的处理器中最多只有一个使用共享会话。
+    # 不访问 context.db（包括其中加载的 ORM 对象的延迟加载）的处理器设为 False，可与其他处理器并发；
+    # 需要数据库时使用独立的 SessionLocal()。
+    uses_db: bool = True
+    
+    # 是否可能返回 SKIP 或 should_continue=False（停止整个管道的后续处理）。
+    # 管道保证之后添加的处理器都在它之后的层执行，停止时不会已经执行；
+    # 从不停止管道的处理器设为 False，之后添加的处理器可以与它或在它之前并发执行。
+    may_stop: bool = True
+    
     def __init__(self, name: str, description: str = ""):
         """
         初始化处理器
@@ -0,0 +1,220 @@
+"""消息合并窗口 - 将同一客户短时间内连续发送的多条私信合并为一轮对话"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Set, Tuple, Callable, Awaitable
+from src.config import settings
+from src.database.models import MessageType
+import logging
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+@dataclass
+class _Batch:
+    """同一客户等待合并的消息"""
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    futures: List[asyncio.Future] = field(default_factory=list)
+    first_at: float = 0.0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class MessageCoalescer:
+    """
+    消息合并器（按发送者防抖）
+
+    同一客户（platform + page_id + sender_id）的私信在窗口内到达时进入同一批次：
+    - 每条新消息把刷新时间推迟到 window 秒之后，但自第一条起最多等待 max_wait 秒
+    - 批次消息数达到 max_messages 时立即刷新
+    - 刷新时合并为一条消息交给处理函数，所有等待者拿到同一个处理结果
+
+    评论、广告消息以及窗口为 0 时直接交给处理函数，不做合并。
+    """
+
+    def __init__(
+        self,
+        handler: Optional[MessageHandler] = None,
+        window_seconds: Optional[float] = None,
+        max_wait_seconds: Optional[float] = None,
+        max_messages: Optional[int] = None
+    ):
+        """
+        初始化消息合并器
+
+        Args:
+            handler: 合并后消息的处理函数，默认使用 process_platform_message
+            window_seconds: 合并窗口（秒），为 0 时关闭合并
+            max_wait_seconds: 自批次第一条消息起的最长等待时间（秒）
+            max_messages: 单个批次的最大消息数
+        """
+        self.handler = handler
+        self.window = (
+            window_seconds
+            if window_seconds is not None
+            else settings.message_coalesce_window_seconds
+        )
+        self.max_wait = (
+            max_wait_seconds
+            if max_wait_seconds is not None
+            else settings.message_coalesce_max_wait_seconds
+        )
+        self.max_messages = max(1, max_messages or settings.message_coalesce_max_messages)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batches: Dict[Tuple[str, str, str], _Batch] = {}
+        # 正在处理的批次（事件循环只保留任务的弱引用，需要持有引用直到完成）
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+        # 指标
+        self.received_count = 0
+        self.flushed_batches = 0
+        self.merged_messages = 0  # 被合并掉（省去单独处理）的消息数
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _ensure_loop_state(self):
+        """定时器和 Future 绑定事件循环，事件循环变化时丢弃旧批次"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._batches = {}
+
+    def _get_handler(self) -> MessageHandler:
+        if self.handler is None:
+            from src.main_processor import process_platform_message
+            return process_platform_message
+        return self.handler
+
+    @staticmethod
+    def _batch_key(platform_name: str, message_data: Dict[str, Any]) -> Tuple[str, str, str]:
+        return (
+            platform_name,
+            str(message_data.get("page_id") or ""),
+            str(message_data.get("sender_id") or "")
+        )
+
+    @staticmethod
+    def _should_coalesce(message_data: Dict[str, Any]) -> bool:
+        """只合并有发送者的私信"""
+        message_type = message_data.get("message_type", MessageType.MESSAGE)
+        return message_type == MessageType.MESSAGE and bool(message_data.get("sender_id"))
+
+    async def submit(self, platform_name: str, message_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        提交消息，等待所在批次处理完成后返回处理结果
+
+        Args:
+            platform_name: 平台名称
+            message_data: 消息数据
+
+        Returns:
+            批次合并后的处理结果
+        """
+        self.received_count += 1
+        if not self.enabled or not self._should_coalesce(message_data):
+            return await self._get_handler()(platform_name, message_data)
+
+        self._ensure_loop_state()
+        key = self._batch_key(platform_name, message_data)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = _Batch(first_at=time.monotonic())
+            self._batches[key] = batch
+
+        future = self._loop.create_future()
+        batch.messages.append(message_data)
+        batch.futures.append(future)
+
+        if batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+
+        if len(batch.messages) >= self.max_messages:
+            self._start_flush(key)
+        else:
+            elapsed = time.monotonic() - batch.first_at
+            delay = max(0.0, min(self.window, self.max_wait - elapsed))
+            batch.timer = self._loop.call_later(delay, self._start_flush, key)
+
+        return await future
+
+    def _start_flush(self, key: Tuple[str, str, str]):
+        """从缓冲区取出批次并异步处理（刷新后同一客户的新消息进入新批次）"""
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._flush(key[0], batch))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, platform_name: str, batch: _Batch):
+        """处理合并后的消息，并把结果分发给批次内所有等待者"""
+        merged = self.merge_messages(batch.messages)
+        self.flushed_batches += 1
+        self.merged_messages += len(batch.messages) - 1
+        if len(batch.messages) > 1:
+            logger.info(
+                f"Coalesced {len(batch.messages)} {platform_name} messages from sender "
+                f"{merged.get('sender_id')} into one turn"
+            )
+
+        try:
+            result = await self._get_handler()(platform_name, merged)
+        except Exception as e:
+            logger.error(f"Error processing coalesced messages: {str(e)}", exc_info=True)
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future in batch.futures:
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def merge_messages(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        合并同一客户的多条消息
+
+        合并结果以最后一条消息为基础（消息ID、原始数据等），content 为各条消息内容按顺序换行拼接，
+        coalesced_messages 保留全部原始消息，供过滤处理器逐条保存。
+
+        Args:
+            messages: 按到达顺序排列的消息列表
+
+        Returns:
+            合并后的消息数据
+        """
+        if len(messages) == 1:
+            return messages[0]
+
+        merged = dict(messages[-1])
+        merged["content"] = "\n".join(
+            message.get("content") for message in messages if message.get("content")
+        )
+        merged["coalesced_messages"] = list(messages)
+        return merged
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取合并窗口指标"""
+        return {
+            "enabled": self.enabled,
+            "window_seconds": self.window,
+            "max_wait_seconds": self.max_wait,
+            "max_messages": self.max_messages,
+            "pending_senders": len(self._batches),
+            "pending_messages": sum(len(batch.messages) for batch in self._batches.values()),
+            "flushing_batches": len(self._flush_tasks),
+            "received_count": self.received_count,
+            "flushed_batches": self.flushed_batches,
+            "merged_messages": self.merged_messages
+        }
+
+
+# 全局消息合并器实例
+message_coalescer = MessageCoalescer()
@@ -10,6 +10,9 @@ logger = logging.getLogger(__name__)
 class MessageReceiver(BaseProcessor):
     """消息接收处理器 - 准备消息摘要和提取信息"""
 
+    uses_db = False
+    may_stop = False
+
     def __init__(self):
         super().__init__("message_receiver", "消息接收和预处理")
 
@@ -25,10 +28,10 @@ class MessageReceiver(BaseProcessor):
                 context.message_summary = message_content
 
             # 提取关键信息
-            from src.collector.data_collector import DataCollector
-            collector = DataCollector(context.db)
-            context.extracted_info = collector.extract_info_from_message(
-                message_content)
+            from src.collector.extraction_engine import extraction_engine
+            context.extracted_info = extraction_engine.extract(
+                message_content, keyword_matches=context.keywords,
+                page_id=context.message_data.get("page_id"))
 
             return ProcessorResult(
                 status=ProcessorStatus.SUCCESS,
@@ -47,6 +50,8 @@ class MessageReceiver(BaseProcessor):
 class UserInfoHandler(BaseProcessor):
     """用户信息处理 - 获取或创建客户"""
 
+    may_stop = False
+
     def __init__(self):
         super().__init__("user_info_handler", "用户信息处理")
 
@@ -125,15 +130,28 @@ class FilterHandler(BaseProcessor):
             message_type = context.message_data.get(
                 "message_type", MessageType.MESSAGE)
             
-            # 保存对话记录
-            conversation = conversation_manager.save_conversation(
-                customer_id=context.customer_id,
-                platform_message_id=context.message_data.get("message_id"),
-                platform=context.platform_name,
-                message_type=message_type,
-                content=message_content,
-                raw_data=context.message_data.get("raw_data")
-            )
+            # 保存对话记录（合并窗口合并的多条消息逐条保存，过滤和回复基于最后一条）
+            raw_messages = context.message_data.get("coalesced_messages") or [context.message_data]
+            saved_count = 0
+            for raw_message in raw_messages:
+                conversation, created = conversation_manager.save_conversation_if_new(
+                    customer_id=context.customer_id,
+                    platform_message_id=raw_message.get("message_id"),
+                    platform=context.platform_name,
+                    message_type=raw_message.get("message_type", message_type),
+                    content=raw_message.get("content", ""),
+                    raw_data=raw_message.get("raw_data")
+                )
+                saved_count += int(created)
+            
+            # 全部是已保存过的消息（Webhook 重投），不再重复回复
+            if saved_count == 0:
+                logger.info(f"Duplicate {context.platform_name} message {context.message_data.get('message_id')}, skipping")
+                return ProcessorResult(
+                    status=ProcessorStatus.SKIP,
+                    message="重复消息，跳过处理",
+                    should_continue=False
+                )
             
             # 保存对话ID到上下文，供后续处理器使用
             context.conversation_id = conversation.id
@@ -142,21 +160,13 @@ class FilterHandler(BaseProcessor):
             # 应用过滤规则
             filter_engine = FilterEngine(context.db)
             filter_result = filter_engine.filter_message(
-                conversation, message_content)
+                conversation, message_content, keyword_matches=context.keywords)
             context.filter_result = filter_result
             context.should_review = filter_result.get("should_review", False)
 
             # 检查是否包含产品关键词（如果包含，即使被过滤也要回复）
-            message_lower = message_content.lower()
-            product_keywords = [
-                "iphone", "ip", "苹果", "apple", "loan", "borrow", "lend", "贷款", "借款", 
-                "借", "贷", "price", "cost", "费用", "价格", "多少钱", "interest", "利息",
-                "model", "型号", "容量", "storage", "apple id", "id card", "身份证",
-                "咨询", "了解", "询问", "办理", "申请", "apply", "怎么", "如何", "how",
-                "服务", "service", "客服", "customer service", "legit", "legitimate", 
-                "真实", "真的", "可靠", "reliable", "可信", "?", "？"
-            ]
-            has_product_keyword = any(keyword in message_lower for keyword in product_keywords)
+            from src.utils.keyword_engine import PRODUCT
+            has_product_keyword = context.keywords.has(PRODUCT)
             
             # 应用过滤结果到对话记录
             conversation.filtered = filter_result.get("filtered", False)
@@ -226,7 +236,9 @@ class AIReplyHandler(BaseProcessor):
                 "platform_client": context.platform_client,
                 "message_summary": context.message_summary,
                 "platform_name": context.platform_name,
-                "conversation_id": getattr(context, "conversation_id", None)
+                "conversation_id": getattr(context, "conversation_id", None),
+                "keyword_matches": context.keywords,
+                "deadline": context.deadline
             }
             
             # 调用业务服务执行业务逻辑
@@ -271,6 +283,9 @@ class AIReplyHandler(BaseProcessor):
 class DataCollectionHandler(BaseProcessor):
     """数据收集处理器"""
 
+    uses_db = False
+    may_stop = False
+
     def __init__(self):
         super().__init__("data_collection_handler", "数据收集")
 
@@ -290,6 +305,8 @@ class DataCollectionHandler(BaseProcessor):
 class StatisticsHandler(BaseProcessor):
     """统计处理器 - 记录交互统计"""
 
+    may_stop = False
+
     def __init__(self):
         super().__init__("statistics_handler", "统计记录")
 
@@ -336,6 +353,9 @@ class StatisticsHandler(BaseProcessor):
 class NotificationHandler(BaseProcessor):
     """通知处理器 - 发送Telegram通知"""
 
+    # 与 AI 回复处理器并发执行：客户信息使用独立的会话读取，不访问共享的 context.db
+    uses_db = False
+
     def __init__(self):
         super().__init__("notification_handler", "Telegram通知")
 
@@ -352,9 +372,11 @@ class NotificationHandler(BaseProcessor):
                 )
 
             from src.telegram.notification_sender import NotificationSender
-            from src.database.models import Conversation
+            from src.database.database import SessionLocal
+            from src.database.models import Conversation, Customer
 
             notification_sender = NotificationSender()
+            db = SessionLocal()
 
             # 创建临时对话对象用于通知
             temp_conversation = Conversation(
@@ -365,13 +387,15 @@ class NotificationHandler(BaseProcessor):
                 content=context.message_summary
             )
 
-            await notification_sender.send_review_notification(
-                conversation=temp_conversation,
-                customer=context.customer,
-                collected_data=None
-            )
-
-            await notification_sender.close()
+            try:
+                await notification_sender.send_review_notification(
+                    conversation=temp_conversation,
+                    customer=db.get(Customer, context.customer_id),
+                    collected_data=None
+                )
+            finally:
+                db.close()
+                await notification_sender.close()
 
             return ProcessorResult(
                 status=ProcessorStatus.SUCCESS,
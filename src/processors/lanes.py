@@ -0,0 +1,142 @@
+"""管道车道调度 - 同一客户的消息按顺序处理，不同客户的消息并行处理"""
+import asyncio
+import time
+import zlib
+from typing import Dict, Any, List, Optional
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Lane:
+    """单个车道：一把 FIFO 锁加上深度和等待时间统计"""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0  # 排队中 + 处理中的消息数
+        self.max_depth = 0
+        self.processed = 0
+
+
+class LaneScheduler:
+    """
+    车道调度器
+
+    按 sender_id 哈希到 N 个车道之一：
+    - 同一车道内按到达顺序串行执行（保证同一客户的消息顺序）
+    - 不同车道并行执行，同时运行的车道数受 max_concurrency 限制
+    """
+
+    def __init__(
+        self,
+        pipeline: Any,
+        lanes: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ):
+        """
+        初始化车道调度器
+
+        Args:
+            pipeline: 消息处理管道（需提供 async process(platform_name, message_data)）
+            lanes: 车道数量
+            max_concurrency: 同时处理的最大消息数
+        """
+        self.pipeline = pipeline
+        self.lane_count = max(1, lanes or settings.pipeline_lanes)
+        self.max_concurrency = max(1, max_concurrency or settings.pipeline_max_concurrency)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lanes: List[_Lane] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.wait_times: List[float] = []
+
+    def _ensure_loop_state(self):
+        """锁和信号量绑定事件循环，事件循环变化时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lanes = [_Lane() for _ in range(self.lane_count)]
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.running = 0
+
+    def lane_for(self, platform_name: str, sender_id: Optional[str]) -> int:
+        """
+        计算消息所属车道（稳定哈希，与进程无关）
+
+        Args:
+            platform_name: 平台名称
+            sender_id: 发送者ID
+
+        Returns:
+            车道编号
+        """
+        key = f"{platform_name}:{sender_id or ''}".encode("utf-8")
+        return zlib.crc32(key) % self.lane_count
+
+    async def submit(self, platform_name: str, message_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        在对应车道中处理消息，返回管道处理结果
+
+        Args:
+            platform_name: 平台名称
+            message_data: 消息数据
+
+        Returns:
+            管道处理结果
+        """
+        self._ensure_loop_state()
+        lane_index = self.lane_for(platform_name, message_data.get("sender_id"))
+        lane = self._lanes[lane_index]
+
+        lane.depth += 1
+        lane.max_depth = max(lane.max_depth, lane.depth)
+        enqueued_at = time.monotonic()
+        try:
+            async with lane.lock:
+                async with self._semaphore:
+                    wait_ms = (time.monotonic() - enqueued_at) * 1000
+                    self._record_wait(wait_ms)
+                    self.running += 1
+                    try:
+                        result = await self.pipeline.process(platform_name, message_data)
+                    finally:
+                        self.running -= 1
+                        lane.processed += 1
+
+            if isinstance(result, dict):
+                result.setdefault("lane", lane_index)
+                result.setdefault("lane_wait_ms", round(wait_ms, 2))
+            return result
+        finally:
+            lane.depth -= 1
+
+    def _record_wait(self, wait_ms: float):
+        """记录等待时间（只保留最近1000条）"""
+        self.wait_times.append(wait_ms)
+        if len(self.wait_times) > 1000:
+            self.wait_times = self.wait_times[-1000:]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取车道深度和等待时间指标，用于确定车道数量"""
+        depths = [lane.depth for lane in self._lanes]
+        if self.wait_times:
+            sorted_waits = sorted(self.wait_times)
+            avg_wait = sum(sorted_waits) / len(sorted_waits)
+            p95_wait = sorted_waits[min(int(len(sorted_waits) * 0.95), len(sorted_waits) - 1)]
+            max_wait = sorted_waits[-1]
+        else:
+            avg_wait = p95_wait = max_wait = 0
+
+        return {
+            "lanes": self.lane_count,
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "queued": sum(depths) - self.running,
+            "busy_lanes": sum(1 for depth in depths if depth > 0),
+            "lane_depths": depths,
+            "max_lane_depth": max((lane.max_depth for lane in self._lanes), default=0),
+            "avg_wait_ms": round(avg_wait, 2),
+            "p95_wait_ms": round(p95_wait, 2),
+            "max_wait_ms": round(max_wait, 2)
+        }
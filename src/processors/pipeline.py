@@ -1,20 +1,37 @@
-"""消息处理管道 - 按顺序执行处理器"""
-from typing import List, Dict, Any, Optional
+"""消息处理管道 - 按依赖关系分层执行处理器"""
+from typing import List, Dict, Any, Optional, Set, Tuple
 from .base import BaseProcessor, ProcessorResult, ProcessorContext, ProcessorStatus
+from .lanes import LaneScheduler
 from src.database.database import SessionLocal
-from src.platforms.registry import registry
+from src.platforms.client_pool import client_pool
+from src.monitoring.pipeline_metrics import pipeline_metrics
 from src.config import settings
+from src.config.page_token_manager import page_token_manager
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
 class MessagePipeline:
-    """消息处理管道 - 管理处理器的执行顺序"""
+    """
+    消息处理管道 - 管理处理器的执行顺序
+    
+    添加处理器时将依赖关系编译为分层的有向无环图（DAG）：
+    同一层内的处理器互不依赖，使用 asyncio.gather 并发执行，
+    单条消息的耗时取决于关键路径而不是所有处理器耗时之和。
+    所有处理器共用一个数据库会话（context.db），同层中有多个使用共享会话的处理器（uses_db）时
+    拆分为顺序执行的组，保证并发执行的处理器中最多一个访问共享会话。
+    
+    处理器返回 SKIP（或 should_continue=False）时，之后的层都不再执行（与顺序执行时相同）。
+    为此可能停止管道的处理器（may_stop）之后添加的处理器，只会排在它之后的层。
+    """
     
     def __init__(self):
         self.processors: List[BaseProcessor] = []
         self.processor_map: Dict[str, BaseProcessor] = {}
+        self._levels: List[List[BaseProcessor]] = []
     
     def add_processor(self, processor: BaseProcessor):
         """
@@ -25,42 +42,132 @@ class MessagePipeline:
         """
         self.processors.append(processor)
         self.processor_map[processor.name] = processor
+        self._compile()
     
     def add_processors(self, processors: List[BaseProcessor]):
         """批量添加处理器"""
         for processor in processors:
-            self.add_processor(processor)
+            self.processors.append(processor)
+            self.processor_map[processor.name] = processor
+        self._compile()
+    
+    def _compile(self):
+        """将处理器依赖关系编译为执行层级"""
+        levels: List[List[BaseProcessor]] = []
+        remaining = self.processors.copy()
+        added: Set[str] = set()
+        
+        # 每个处理器之前添加的、可能停止管道的处理器
+        barriers: Dict[str, List[str]] = {}
+        stoppers: List[str] = []
+        for processor in self.processors:
+            barriers[processor.name] = list(stoppers)
+            if processor.may_stop:
+                stoppers.append(processor.name)
+        
+        # 按层拓扑排序：每层包含依赖已全部满足、且之前添加的可能停止管道的处理器都已在前面的层中的处理器
+        # （保持添加顺序）
+        while remaining:
+            ready = [
+                processor for processor in remaining
+                if all(dep in added for dep in processor.get_dependencies())
+                and all(name in added for name in barriers[processor.name])
+            ]
+            if not ready:
+                break
+            levels.extend(self._split_shared_session(ready))
+            added.update(processor.name for processor in ready)
+            remaining = [processor for processor in remaining if processor.name not in added]
+        
+        if remaining:
+            # 循环依赖或依赖未注册的处理器：按当前顺序逐个追加到最后
+            logger.warning(
+                f"Unresolved processor dependencies, running sequentially at the end: "
+                f"{[processor.name for processor in remaining]}"
+            )
+            levels.extend([processor] for processor in remaining)
+        
+        self._levels = levels
+    
+    @staticmethod
+    def _split_shared_session(ready: List[BaseProcessor]) -> List[List[BaseProcessor]]:
+        """
+        拆分同一依赖层：每组最多一个使用共享会话（uses_db）的处理器
+        
+        第一组包含所有不使用共享会话的处理器和第一个使用共享会话的处理器，
+        其余使用共享会话的处理器各自一组，按添加顺序依次执行。
+        """
+        db_processors = [processor for processor in ready if processor.uses_db]
+        if len(db_processors) <= 1:
+            return [ready]
+        first = [processor for processor in ready if not processor.uses_db or processor is db_processors[0]]
+        return [first] + [[processor] for processor in db_processors[1:]]
     
     def _resolve_dependencies(self) -> List[BaseProcessor]:
         """
-        根据依赖关系排序处理器
+        根据依赖关系排序处理器（使用编译好的层级）
         
         Returns:
             排序后的处理器列表
         """
-        # 简单的拓扑排序
-        sorted_processors = []
-        remaining = self.processors.copy()
-        added = set()
+        return [processor for level in self._levels for processor in level]
+    
+    async def _run_processor(
+        self,
+        processor: BaseProcessor,
+        context: ProcessorContext,
+        origin: float
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[ProcessorResult]]:
+        """
+        执行单个处理器并记录耗时
         
-        while remaining:
-            progress = False
-            for processor in remaining[:]:
-                deps = processor.get_dependencies()
-                if all(dep in added for dep in deps):
-                    sorted_processors.append(processor)
-                    added.add(processor.name)
-                    remaining.remove(processor)
-                    progress = True
+        Args:
+            processor: 处理器
+            context: 处理器上下文
+            origin: 管道开始时间（time.perf_counter），用于计算链路偏移
+        
+        Returns:
+            (结果摘要, 处理器结果)；验证失败时结果摘要为 None
+        """
+        started = time.perf_counter()
+        entry: Optional[Dict[str, Any]] = None
+        result: Optional[ProcessorResult] = None
+        status = "invalid"
+        try:
+            # 验证
+            validation_error = processor.validate(context)
+            if validation_error:
+                logger.warning(f"Processor {processor.name} validation failed: {validation_error}")
+                return None, None
             
-            if not progress:
-                # 如果有循环依赖，按当前顺序添加
-                for processor in remaining:
-                    sorted_processors.append(processor)
-                    added.add(processor.name)
-                break
+            # 执行
+            result = await processor.process(context)
+            status = result.status.value
+            entry = {
+                "processor": processor.name,
+                "status": status,
+                "message": result.message
+            }
         
-        return sorted_processors
+        except Exception as e:
+            logger.error(f"Error in processor {processor.name}: {str(e)}", exc_info=True)
+            status = "error"
+            entry = {
+                "processor": processor.name,
+                "status": status,
+                "message": f"Exception: {str(e)}"
+            }
+        
+        finally:
+            finished = time.perf_counter()
+            pipeline_metrics.record_processor(
+                processor.name, context.platform_name, status, (finished - started) * 1000
+            )
+            if entry is not None:
+                entry["start_ms"] = round((started - origin) * 1000, 2)
+                entry["end_ms"] = round((finished - origin) * 1000, 2)
+        
+        return entry, result
     
     async def process(self, platform_name: str, message_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -74,19 +181,26 @@ class MessagePipeline:
             处理结果摘要
         """
         db = SessionLocal()
-        platform_client = None
+        origin = time.perf_counter()
         
         try:
             # 创建处理器上下文
             context = ProcessorContext(
                 platform_name=platform_name,
                 message_data=message_data,
-                db=db
+                db=db,
+                deadline=(
+                    time.monotonic() + settings.pipeline_reply_deadline_seconds
+                    if settings.pipeline_reply_deadline_seconds > 0
+                    else None
+                )
             )
             
             # 创建平台客户端
+            page_id = message_data.get("page_id")
             if platform_name == "facebook":
-                access_token = settings.facebook_access_token
+                # 每条消息按当前配置解析 Token（页面 Token 可能已通过管理接口轮换）
+                access_token = page_token_manager.get_token(page_id) or settings.facebook_access_token
             elif platform_name == "instagram":
                 access_token = getattr(settings, 'instagram_access_token', None) or settings.facebook_access_token
             else:
@@ -99,57 +213,61 @@ class MessagePipeline:
                 if ig_user_id:
                     client_kwargs["ig_user_id"] = ig_user_id
             
-            platform_client = registry.create_client(platform_name, **client_kwargs)
+            # 从客户端池获取长连接客户端（由客户端池在应用关闭时统一关闭）
+            platform_client = client_pool.get(platform_name, key=page_id, **client_kwargs)
             if not platform_client:
                 logger.error(f"Failed to create client for platform: {platform_name}")
                 return {"success": False, "error": "Failed to create platform client"}
             
             context.platform_client = platform_client
             
-            # 按依赖关系排序处理器
-            sorted_processors = self._resolve_dependencies()
-            
-            # 执行处理器
+            # 按层执行处理器：同层并发，层与层之间顺序执行
             results = []
-            for processor in sorted_processors:
-                try:
-                    # 验证
-                    validation_error = processor.validate(context)
-                    if validation_error:
-                        logger.warning(f"Processor {processor.name} validation failed: {validation_error}")
+            for level in self._levels:
+                outcomes = await asyncio.gather(
+                    *(self._run_processor(processor, context, origin) for processor in level)
+                )
+                
+                stopped = False
+                for processor, (entry, result) in zip(level, outcomes):
+                    if entry is not None:
+                        results.append(entry)
+                    if result is None:
                         continue
                     
-                    # 执行
-                    result = await processor.process(context)
-                    results.append({
-                        "processor": processor.name,
-                        "status": result.status.value,
-                        "message": result.message
-                    })
-                    
                     # 如果处理器要求跳过后续处理
                     if result.should_skip():
-                        logger.info(f"Processor {processor.name} requested to skip remaining processors")
-                        break
-                    
-                    # 如果处理器失败且不应该继续
-                    if result.status == ProcessorStatus.ERROR and not result.should_continue:
-                        logger.error(f"Processor {processor.name} failed and stopped pipeline")
-                        break
-                        
-                except Exception as e:
-                    logger.error(f"Error in processor {processor.name}: {str(e)}", exc_info=True)
-                    results.append({
-                        "processor": processor.name,
-                        "status": "error",
-                        "message": f"Exception: {str(e)}"
-                    })
+                        if result.status == ProcessorStatus.ERROR:
+                            logger.error(f"Processor {processor.name} failed and stopped pipeline")
+                        else:
+                            logger.info(f"Processor {processor.name} requested to skip remaining processors")
+                        stopped = True
+                if stopped:
+                    break
+            
+            # 单条消息的处理链路（各处理器相对管道开始时间的偏移）
+            trace = {
+                "message_id": message_data.get("message_id"),
+                "customer_id": context.customer_id,
+                "total_ms": round((time.perf_counter() - origin) * 1000, 2),
+                "stages": [
+                    {
+                        "processor": entry["processor"],
+                        "status": entry["status"],
+                        "start_ms": entry["start_ms"],
+                        "end_ms": entry["end_ms"]
+                    }
+                    for entry in results
+                ]
+            }
+            pipeline_metrics.record_trace(platform_name, trace)
             
             # 返回处理结果
             return {
                 "success": True,
                 "customer_id": context.customer_id,
                 "results": results,
+                "trace": trace,
                 "summary": {
                     "ai_replied": context.ai_replied,
                     "group_invitation_sent": context.group_invitation_sent,
@@ -164,8 +282,6 @@ class MessagePipeline:
         
         finally:
             db.close()
-            if platform_client:
-                await platform_client.close()
 
 
 # 创建默认管道实例
@@ -197,6 +313,9 @@ def create_default_pipeline() -> MessagePipeline:
 # 全局默认管道
 default_pipeline = create_default_pipeline()
 
+# 全局车道调度器（同一客户的消息按顺序执行默认管道）
+lane_scheduler = LaneScheduler(default_pipeline)
+
 
 
 
@@ -14,7 +14,7 @@ class NotificationSender:
     def __init__(self):
         self.bot_token = settings.telegram_bot_token
         self.chat_id = settings.telegram_chat_id
-        self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        self.base_url = f"{settings.telegram_api_url}/bot{self.bot_token}"
         self.client = httpx.AsyncClient(timeout=30.0)
         self.notification_config = yaml_config.get("telegram", {})
 
@@ -0,0 +1,335 @@
+"""关键词引擎 - 所有关键词分类共用一个 Aho-Corasick 自动机，一次扫描得到全部匹配"""
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 产品/业务相关关键词（包含时即使被过滤也要回复）
+PRODUCT_KEYWORDS = [
+    "iphone", "ip", "苹果", "apple", "loan", "borrow", "lend", "贷款", "借款",
+    "借", "贷", "price", "cost", "费用", "价格", "多少钱", "interest", "利息",
+    "model", "型号", "容量", "storage", "apple id", "id card", "身份证",
+    "咨询", "了解", "询问", "办理", "申请", "apply", "怎么", "如何", "how",
+    "服务", "service", "客服", "customer service", "legit", "legitimate",
+    "真实", "真的", "可靠", "reliable", "可信", "?", "？"
+]
+
+# 买卖手机意图（判定为垃圾信息，即使包含产品关键词）
+BUYING_SELLING_KEYWORDS = [
+    # Chinese
+    "买手机", "卖手机", "购买手机", "出售手机", "我要买", "我想买",
+    "我要卖", "我想卖", "收购", "回收", "买iphone", "卖iphone",
+    # English
+    "buy phone", "sell phone", "purchase phone", "want to buy",
+    "want to sell", "looking to buy", "looking to sell", "buy iphone", "sell iphone"
+]
+
+# 咨询贷款意图（必须回复）
+BUSINESS_INTENT_KEYWORDS = [
+    # Loan related
+    "贷款", "借款", "借钱", "借", "贷", "loan", "borrow", "lend",
+    # Inquiry related
+    "咨询", "了解", "询问", "问", "help", "inquiry", "question", "想了解", "想咨询",
+    # Application related
+    "办理", "申请", "apply", "application", "怎么", "如何", "how",
+    # Price related
+    "价格", "费用", "价钱", "多少钱", "price", "cost", "interest", "利息", "利率",
+    # Legitimacy related
+    "legit", "legitimate", "真实", "真的", "可靠", "reliable", "可信",
+    # Question mark (indicates inquiry)
+    "?", "？"
+]
+
+# 情感关键词（过滤引擎的简化情感分析）
+NEGATIVE_SENTIMENT_KEYWORDS = [
+    "不满", "投诉", "问题", "错误", "失败", "糟糕",
+    "disappointed", "complaint", "problem", "error", "bad"
+]
+POSITIVE_SENTIMENT_KEYWORDS = [
+    "满意", "感谢", "好", "棒", "优秀",
+    "satisfied", "thanks", "good", "great", "excellent"
+]
+
+# 问题分类（按顺序匹配，统计高频问题用）
+QUESTION_CATEGORY_KEYWORDS = {
+    "价格咨询": ["价格", "price", "cost", "费用", "收费"],
+    "使用指导": ["如何", "怎么", "how", "how to", "方法", "步骤"],
+    "问题反馈": ["问题", "错误", "problem", "error", "bug", "故障"],
+    "功能介绍": ["功能", "feature", "特性"],
+}
+
+# 客户需求类型（按顺序匹配，资料收集用）
+INQUIRY_TYPE_KEYWORDS = {
+    "咨询": ["咨询", "了解", "询问"],
+    "购买": ["购买", "买", "价格", "多少钱"],
+    "投诉": ["投诉", "不满", "问题"],
+    "合作": ["合作", "代理", "加盟"],
+}
+
+# 分类名称
+PRODUCT = "product"
+BUYING_SELLING = "buying_selling"
+BUSINESS_INTENT = "business_intent"
+FILTER_BLOCK = "filter_block"
+FILTER_SPAM = "filter_spam"
+SENTIMENT_NEGATIVE = "sentiment_negative"
+SENTIMENT_POSITIVE = "sentiment_positive"
+SENTIMENT_LEXICON = "sentiment_lexicon"
+QUESTION_PREFIX = "question:"
+INQUIRY_PREFIX = "inquiry:"
+PRIORITY_RULE_PREFIX = "priority_rule:"
+PRESET_REPLY_PREFIX = "preset_reply:"
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick 多模式匹配自动机
+
+    构建后一次扫描文本即可找出所有出现的模式（包括互相重叠、互为子串的模式），
+    耗时与文本长度成正比，与模式数量无关。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        构建自动机
+
+        Args:
+            patterns: 模式列表（调用方负责规范化，如转小写）
+        """
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+
+        index_of: Dict[str, int] = {}
+        for pattern in patterns:
+            if not pattern or pattern in index_of:
+                continue
+            index_of[pattern] = len(self.patterns)
+            self.patterns.append(pattern)
+            self._insert(pattern, index_of[pattern])
+        self._build_failure_links()
+
+    def _insert(self, pattern: str, pattern_index: int):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node] = self._output[node] + (pattern_index,)
+
+    def _build_failure_links(self):
+        """广度优先计算失配指针，并把失配节点的输出合并到当前节点"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str) -> set:
+        """
+        扫描文本
+
+        Returns:
+            出现过的模式编号集合（对应 self.patterns 的下标）
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
+@dataclass
+class KeywordMatches:
+    """一条消息的关键词匹配结果（按分类）"""
+    text: str
+    by_category: Dict[str, List[str]] = field(default_factory=dict)
+    # 产生该结果的关键词编译结果（手工构造时为空）
+    source: Optional["CompiledKeywords"] = field(default=None, compare=False, repr=False)
+
+    def has(self, category: str) -> bool:
+        """是否匹配了该分类的任一关键词"""
+        return category in self.by_category
+
+    def keywords(self, category: str) -> List[str]:
+        """该分类中匹配到的关键词（按配置顺序）"""
+        return self.by_category.get(category, [])
+
+    def first_category(self, prefix: str, order: Iterable[str]) -> Optional[str]:
+        """按给定顺序返回第一个匹配的分类名（去掉前缀），都不匹配时返回 None"""
+        for name in order:
+            if f"{prefix}{name}" in self.by_category:
+                return name
+        return None
+
+    @property
+    def categories(self) -> List[str]:
+        return list(self.by_category)
+
+
+class CompiledKeywords:
+    """
+    编译后的关键词分类（不可变，配置变化时整体替换）
+
+    automaton 的每个模式对应 targets 中的 [(分类, 原始关键词, 在分类中的顺序)]。
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        # 规范化后的模式 -> [(分类, 原始关键词, 在分类中的顺序)]
+        entries: Dict[str, List[Tuple[str, str, int]]] = {}
+        for category, keywords in categories.items():
+            for order, keyword in enumerate(keywords):
+                pattern = KeywordEngine.normalize(str(keyword))
+                if pattern:
+                    entries.setdefault(pattern, []).append((category, keyword, order))
+
+        self.automaton = KeywordAutomaton(entries)
+        self.targets = [entries[pattern] for pattern in self.automaton.patterns]
+        self.category_count = len(categories)
+
+    def match(self, text: str) -> KeywordMatches:
+        """
+        扫描一条消息
+
+        Args:
+            text: 消息内容
+
+        Returns:
+            各分类的匹配结果
+        """
+        targets = self.targets
+        matched: Dict[str, List[Tuple[int, str]]] = {}
+        for pattern_index in self.automaton.find(KeywordEngine.normalize(text)):
+            for category, keyword, order in targets[pattern_index]:
+                matched.setdefault(category, []).append((order, keyword))
+
+        return KeywordMatches(
+            text=text or "",
+            by_category={
+                category: [keyword for _, keyword in sorted(items)]
+                for category, items in matched.items()
+            },
+            source=self
+        )
+
+
+class KeywordEngine:
+    """
+    关键词分类引擎
+
+    内置关键词集合和 YAML 配置中的关键词（过滤规则、优先级规则、预设回复）
+    在配置加载时编译成一个自动机。消息只需规范化（转小写）并扫描一次，
+    即可得到所有分类的匹配结果，由 ProcessorContext 在各处理器之间共享。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self._lock = threading.Lock()
+        self.reload(config)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化消息文本（所有关键词匹配都不区分大小写）"""
+        return (text or "").lower()
+
+    def reload(self, config: Optional[Dict[str, Any]] = None) -> CompiledKeywords:
+        """
+        按配置重新编译关键词
+
+        Args:
+            config: YAML 配置，默认使用全局 yaml_config
+
+        Returns:
+            新的编译结果
+        """
+        if config is None:
+            from src.config import yaml_config
+            config = yaml_config
+
+        compiled = CompiledKeywords(self._collect_categories(config))
+        with self._lock:
+            self._compiled = compiled
+        logger.debug(
+            f"Keyword engine compiled {len(compiled.automaton.patterns)} patterns "
+            f"in {compiled.category_count} categories"
+        )
+        return compiled
+
+    @property
+    def compiled(self) -> CompiledKeywords:
+        """当前的编译结果"""
+        with self._lock:
+            return self._compiled
+
+    @staticmethod
+    def _collect_categories(config: Dict[str, Any]) -> Dict[str, List[str]]:
+        """汇总内置和配置中的关键词分类"""
+        categories: Dict[str, List[str]] = {
+            PRODUCT: PRODUCT_KEYWORDS,
+            BUYING_SELLING: BUYING_SELLING_KEYWORDS,
+            BUSINESS_INTENT: BUSINESS_INTENT_KEYWORDS,
+            SENTIMENT_NEGATIVE: NEGATIVE_SENTIMENT_KEYWORDS,
+            SENTIMENT_POSITIVE: POSITIVE_SENTIMENT_KEYWORDS,
+        }
+        for name, keywords in QUESTION_CATEGORY_KEYWORDS.items():
+            categories[f"{QUESTION_PREFIX}{name}"] = keywords
+        for name, keywords in INQUIRY_TYPE_KEYWORDS.items():
+            categories[f"{INQUIRY_PREFIX}{name}"] = keywords
+
+        filter_config = config.get("filtering", {}) or {}
+        keyword_config = filter_config.get("keyword_filter", {}) or {}
+        categories[FILTER_BLOCK] = keyword_config.get("block_keywords", []) or []
+        categories[FILTER_SPAM] = keyword_config.get("spam_keywords", []) or []
+        sentiment_config = filter_config.get("sentiment_filter", {}) or {}
+        categories[SENTIMENT_LEXICON] = [str(term) for term in (sentiment_config.get("lexicon", {}) or {})]
+        for index, rule in enumerate(filter_config.get("priority_rules", []) or []):
+            categories[f"{PRIORITY_RULE_PREFIX}{index}"] = rule.get("keywords", []) or []
+
+        preset_replies = (config.get("ai_templates", {}) or {}).get("preset_replies", {}) or {}
+        for key, preset in preset_replies.items():
+            categories[f"{PRESET_REPLY_PREFIX}{key}"] = preset.get("keywords", []) or []
+
+        return categories
+
+    def match(self, text: str) -> KeywordMatches:
+        """
+        扫描一条消息
+
+        Args:
+            text: 消息内容
+
+        Returns:
+            各分类的匹配结果（source 为扫描时的编译结果）
+        """
+        return self.compiled.match(text)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        compiled = self.compiled
+        return {
+            "patterns": len(compiled.automaton.patterns),
+            "categories": compiled.category_count
+        }
+
+
+# 全局关键词引擎实例（配置加载时编译）
+keyword_engine = KeywordEngine()
@@ -1,4 +1,5 @@
 """请求限流器"""
+import asyncio
 import time
 from typing import Dict, Optional
 from collections import defaultdict
@@ -113,6 +114,69 @@ class RateLimiter:
             self.requests.clear()
 
 
+class AsyncRateLimiter:
+    """
+    按键的异步令牌桶限流器（等待令牌而不是拒绝请求）
+
+    每个键（如页面ID）每秒补充 rate_per_second 个令牌，最多积累 burst 个。
+    acquire 预约下一个令牌后只等待必要的时间，并发调用按预约顺序依次放行。
+    """
+
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        """
+        初始化限流器
+
+        Args:
+            rate_per_second: 每个键每秒允许的请求数
+            burst: 每个键允许的突发请求数
+        """
+        self.rate = max(rate_per_second, 0.001)
+        self.burst = max(1, burst)
+        self._buckets: Dict[str, tuple] = {}  # key -> (令牌数, 更新时间)
+
+        # 指标
+        self.acquired_count = 0
+        self.waited_count = 0
+        self.total_wait_seconds = 0.0
+
+    def reserve(self, key: str) -> float:
+        """
+        预约一个令牌
+
+        Returns:
+            需要等待的秒数（0 表示立即可用）
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate) - 1
+        self._buckets[key] = (tokens, now)
+        return -tokens / self.rate if tokens < 0 else 0.0
+
+    async def acquire(self, key: str) -> float:
+        """
+        等待直到该键有可用令牌
+
+        Returns:
+            实际等待的秒数
+        """
+        wait = self.reserve(key)
+        self.acquired_count += 1
+        if wait > 0:
+            self.waited_count += 1
+            self.total_wait_seconds += wait
+            await asyncio.sleep(wait)
+        return wait
+
+    def get_metrics(self) -> Dict[str, float]:
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "acquired_count": self.acquired_count,
+            "waited_count": self.waited_count,
+            "total_wait_seconds": round(self.total_wait_seconds, 3)
+        }
+
+
 # 全局限流器实例
 rate_limiter = RateLimiter()
 
@@ -6,6 +6,10 @@ from sqlalchemy.orm import sessionmaker
 from src.database.database import Base
 from src.ai.reply_generator import ReplyGenerator
 from src.ai.conversation_manager import ConversationManager
+from src.ai.reply_cache import reply_cache
+from src.ai.conversation_state import conversation_states
+from src.ai.history_buffer import history_buffer
+from src.ai.local_answers import local_answers
 
 
 @pytest.fixture
@@ -15,6 +19,9 @@ def db_session():
     Base.metadata.create_all(engine)
     SessionLocal = sessionmaker(bind=engine)
     session = SessionLocal()
+    # 每个测试使用新的数据库，清除进程内的客户状态和历史缓冲
+    conversation_states.invalidate()
+    history_buffer.invalidate()
     
     yield session
     
@@ -25,6 +32,8 @@ def db_session():
 @pytest.fixture
 def reply_generator(db_session):
     """创建回复生成器实例"""
+    reply_cache.clear(reason="test")
+    local_answers.clear()
     with patch('openai.OpenAI'):
         return ReplyGenerator(db_session)
 
@@ -51,7 +60,7 @@ async def test_generate_reply_basic(reply_generator, db_session):
     db_session.add(customer)
     db_session.commit()
     
-    with patch.object(reply_generator.client.chat.completions, 'create') as mock_create:
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
         mock_response = Mock()
         mock_response.choices = [Mock(message=Mock(content="这是一个测试回复"))]
         mock_create.return_value = mock_response
@@ -98,7 +107,7 @@ async def test_generate_reply_with_context(reply_generator, db_session):
     db_session.add_all([conv1, conv2])
     db_session.commit()
     
-    with patch.object(reply_generator.client.chat.completions, 'create') as mock_create:
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
         mock_response = Mock()
         mock_response.choices = [Mock(message=Mock(content="我明白了，让我帮您处理"))]
         mock_create.return_value = mock_response
@@ -116,6 +125,62 @@ async def test_generate_reply_with_context(reply_generator, db_session):
         mock_create.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_generate_reply_uses_cache_for_repeated_question(reply_generator, db_session):
+    """测试新客户的重复问题命中缓存，不再调用 OpenAI"""
+    from src.database.models import Customer, Platform
+    
+    customers = [
+        Customer(platform=Platform.FACEBOOK, platform_user_id=f"cache_user_{i}", name=f"用户{i}")
+        for i in range(2)
+    ]
+    db_session.add_all(customers)
+    db_session.commit()
+    
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_response = Mock()
+        mock_response.choices = [Mock(message=Mock(content="月供最低只要几百元"))]
+        mock_create.return_value = mock_response
+        
+        first = await reply_generator.generate_reply(customers[0].id, "How much per month?")
+        second = await reply_generator.generate_reply(customers[1].id, "how much per month")
+        
+        assert first == second
+        mock_create.assert_called_once()
+    
+    assert reply_cache.hit_count >= 1
+
+
+@pytest.mark.asyncio
+async def test_reply_cache_is_separated_by_route(reply_generator, db_session):
+    """测试不同模型档位生成的回复不共用缓存"""
+    from src.database.models import Customer, Platform
+    from src.ai.model_router import RouteDecision
+    
+    customers = [
+        Customer(platform=Platform.FACEBOOK, platform_user_id=f"route_user_{i}", name=f"用户{i}")
+        for i in range(3)
+    ]
+    db_session.add_all(customers)
+    db_session.commit()
+    
+    fast = RouteDecision(tier="fast", model="gpt-4o-mini", max_tokens=45, temperature=0.7)
+    large = RouteDecision(tier="large", model="gpt-4o", max_tokens=120, temperature=0.7)
+    
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create, \
+            patch.object(reply_generator, "_route", side_effect=[fast, large, large]):
+        mock_response = Mock()
+        mock_response.choices = [Mock(message=Mock(content="月供最低只要几百元"))]
+        mock_create.return_value = mock_response
+        
+        for customer in customers:
+            await reply_generator.generate_reply(customer.id, "How much per month?")
+    
+    # fast 和 large 各调用一次，第二个 large 命中缓存
+    assert mock_create.call_count == 2
+    assert [call.kwargs["model"] for call in mock_create.call_args_list] == ["gpt-4o-mini", "gpt-4o"]
+
+
 @pytest.mark.asyncio
 async def test_generate_reply_error_handling(reply_generator, db_session):
     """测试错误处理"""
@@ -130,7 +195,7 @@ async def test_generate_reply_error_handling(reply_generator, db_session):
     db_session.add(customer)
     db_session.commit()
     
-    with patch.object(reply_generator.client.chat.completions, 'create') as mock_create:
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
         mock_create.side_effect = Exception("API错误")
         
         # 应该抛出异常
@@ -147,6 +212,68 @@ async def test_generate_reply_error_handling(reply_generator, db_session):
             pass
 
 
+@pytest.mark.asyncio
+async def test_generate_reply_falls_back_to_local_answer(reply_generator, db_session):
+    """测试 OpenAI 超时时使用最相似历史问题的回复"""
+    import asyncio
+    from src.database.models import Customer, Platform
+    
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="test_user", name="测试用户")
+    db_session.add(customer)
+    db_session.commit()
+    
+    local_answers.add("利息是多少？", "每月利息5%")
+    
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.side_effect = asyncio.TimeoutError()
+        reply = await reply_generator.generate_reply(
+            customer_id=customer.id,
+            message_content="请问利息多少",
+            customer_name="测试用户"
+        )
+    
+    assert "每月利息5%" in reply
+    
+    # 没有足够相似的历史问题时仍然报错
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.side_effect = asyncio.TimeoutError()
+        with pytest.raises(Exception):
+            await reply_generator.generate_reply(
+                customer_id=customer.id,
+                message_content="需要什么证件",
+                customer_name="测试用户"
+            )
+
+
+@pytest.mark.asyncio
+async def test_slow_completion_without_similar_local_answer(reply_generator, db_session):
+    """测试本地索引非空但没有相似问题时，不缩短 OpenAI 的等待时限"""
+    import asyncio
+    from src.database.models import Customer, Platform
+    
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="test_user", name="测试用户")
+    db_session.add(customer)
+    db_session.commit()
+    
+    local_answers.add("利息是多少？", "每月利息5%")
+    
+    async def slow_completion(**kwargs):
+        await asyncio.sleep(0.2)
+        response = Mock()
+        response.choices = [Mock(message=Mock(content="需要身份证和银行卡"))]
+        return response
+    
+    with patch("src.ai.reply_generator.settings.local_answers_deadline_seconds", 0.05), \
+            patch.object(reply_generator.client.chat.completions, 'create', side_effect=slow_completion):
+        reply = await reply_generator.generate_reply(
+            customer_id=customer.id,
+            message_content="需要什么证件",
+            customer_name="测试用户"
+        )
+    
+    assert "需要身份证和银行卡" in reply
+
+
 def test_conversation_manager_add_message(conversation_manager, db_session):
     """测试添加消息到对话历史"""
     from src.database.models import Customer, Conversation, MessageType, Platform
@@ -236,3 +363,83 @@ def test_conversation_manager_get_context(conversation_manager, db_session):
     context = conversation_manager.get_conversation_history(customer.id, limit=10)
     assert len(context) >= 3
 
+
+
+@pytest.mark.asyncio
+async def test_generate_reply_uses_routed_model(reply_generator, db_session):
+    """测试按路由档位选择模型和 max_tokens"""
+    from src.database.models import Customer, Platform
+    
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="test_user", name="测试用户")
+    db_session.add(customer)
+    db_session.commit()
+    
+    routing = {
+        "default_tier": "standard",
+        "tiers": {
+            "fast": {"model": "fast-model", "max_tokens": 30},
+            "standard": {"model": "large-model", "max_tokens": 60}
+        },
+        "rules": [{"tier": "fast", "max_message_tokens": 10, "max_sentences": 1}]
+    }
+    mock_response = Mock()
+    mock_response.choices = [Mock(message=Mock(content="ok"))]
+    
+    with patch.dict("src.ai.model_router.yaml_config", {"ai_routing": routing}):
+        with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+            mock_create.return_value = mock_response
+            await reply_generator.generate_reply(customer_id=customer.id, message_content="利息多少")
+            assert mock_create.call_args.kwargs["model"] == "fast-model"
+            assert mock_create.call_args.kwargs["max_tokens"] == 30
+            
+            await reply_generator.generate_reply(
+                customer_id=customer.id,
+                message_content="I have an iPhone 13 with 128GB. My friend said the rate is lower elsewhere. Can you match it?"
+            )
+            assert mock_create.call_args.kwargs["model"] == "large-model"
+            assert mock_create.call_args.kwargs["max_tokens"] == 60
+            assert "tier" not in mock_create.call_args.kwargs
+
+
+@pytest.mark.asyncio
+async def test_generate_reply_uses_preset_reply_after_deadline(reply_generator, db_session):
+    """测试超过管道回复时限时取消 OpenAI 请求并使用预设回复"""
+    import asyncio
+    import time
+    from src.database.models import Customer, Platform
+    
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="test_user", name="测试用户")
+    db_session.add(customer)
+    db_session.commit()
+    
+    cancelled = []
+    
+    async def slow_create(**kwargs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+    
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.side_effect = slow_create
+        started = time.monotonic()
+        reply = await reply_generator.generate_reply(
+            customer_id=customer.id,
+            message_content="请问需要什么证件",
+            deadline=time.monotonic() + 0.1
+        )
+        assert time.monotonic() - started < 1
+    
+    assert reply.startswith(reply_generator.templates.get_timeout_reply())
+    assert cancelled == [True]
+    
+    # 时限已过时不再调用 OpenAI
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        reply = await reply_generator.generate_reply(
+            customer_id=customer.id,
+            message_content="请问需要什么证件",
+            deadline=time.monotonic() - 1
+        )
+        mock_create.assert_not_called()
+    assert reply.startswith(reply_generator.templates.get_timeout_reply())
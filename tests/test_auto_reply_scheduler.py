@@ -0,0 +1,107 @@
+"""自动回复补扫单元测试"""
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from src.auto_reply.auto_reply_scheduler import AutoReplyScheduler
+from src.utils.rate_limiter import AsyncRateLimiter
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_paces_per_key():
+    """测试令牌桶按键限速，突发额度用完后等待"""
+    limiter = AsyncRateLimiter(rate_per_second=20, burst=2)
+
+    started = time.monotonic()
+    for _ in range(4):
+        await limiter.acquire("page_1")
+    elapsed = time.monotonic() - started
+
+    # 2 个突发令牌立即可用，其余 2 个各等待 1/20 秒
+    assert elapsed >= 0.09
+    assert limiter.get_metrics()["waited_count"] == 2
+    # 其他键不受影响
+    assert await limiter.acquire("page_2") == 0
+
+
+def _unreplied(sender_id: str, index: int) -> dict:
+    return {
+        "conversation_id": f"t_{sender_id}",
+        "message": {
+            "id": f"m_{sender_id}_{index}",
+            "message": f"loan question {index}",
+            "from": {"id": sender_id, "name": sender_id}
+        }
+    }
+
+
+@pytest.mark.asyncio
+async def test_backlog_generates_concurrently_and_keeps_customer_order():
+    """测试积压消息并发生成回复，同一客户的消息按顺序处理"""
+    messages = [_unreplied(sender, i) for i in range(2) for sender in ("a", "b", "c")]
+    page_client = SimpleNamespace(
+        check_unreplied_messages=AsyncMock(return_value=messages),
+        send_message=AsyncMock()
+    )
+
+    active = {"now": 0, "max": 0}
+    generated = []
+
+    async def generate_reply(customer_id, message_content, customer_name=None, page_id=None):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.05)
+        active["now"] -= 1
+        generated.append((customer_name, message_content))
+        return f"reply to {message_content}"
+
+    generator = MagicMock()
+    generator._is_spam_or_invalid.return_value = False
+    generator.generate_reply = generate_reply
+
+    manager = MagicMock()
+    manager.get_or_create_customer.side_effect = lambda platform, platform_user_id, name: SimpleNamespace(
+        id=ord(platform_user_id), name=name
+    )
+
+    conversation_ids = iter(range(1, 100))
+    scheduler = AutoReplyScheduler()
+    scheduler.send_limiter = AsyncRateLimiter(rate_per_second=1000, burst=100)
+    scheduler._sync_message_to_database = AsyncMock(
+        side_effect=lambda *args: SimpleNamespace(id=next(conversation_ids), ai_replied=False)
+    )
+
+    sessions = []
+
+    def session_local():
+        sessions.append(MagicMock())
+        return sessions[-1]
+
+    with patch("src.auto_reply.auto_reply_scheduler.client_pool.get", return_value=page_client), \
+            patch("src.auto_reply.auto_reply_scheduler.SessionLocal", side_effect=session_local), \
+            patch("src.auto_reply.auto_reply_scheduler.ReplyGenerator", return_value=generator) as generator_class, \
+            patch("src.auto_reply.auto_reply_scheduler.ConversationManager", return_value=manager):
+        started = time.monotonic()
+        stats = await scheduler._scan_and_reply_page(MagicMock(), "page_1", "token")
+        elapsed = time.monotonic() - started
+
+    assert stats["unreplied_count"] == 6
+    assert stats["replied_count"] == 6
+    assert stats["error_count"] == 0
+    assert page_client.send_message.await_count == 6
+    assert manager.update_ai_reply.call_count == 6
+
+    # 三个客户并发生成，每个客户两条消息依次生成
+    assert active["max"] == 3
+    assert elapsed < 0.25
+    for sender in ("a", "b", "c"):
+        assert [content for name, content in generated if name == sender] == [
+            "loan question 0", "loan question 1"
+        ]
+    assert stats["replies_per_minute"] > 0
+
+    # 并发的客户各用独立的数据库会话，不使用扫描用的会话
+    assert len(sessions) == 3
+    assert all(session.close.called for session in sessions)
+    assert {call.args[0] for call in generator_class.call_args_list[1:]} == set(sessions)
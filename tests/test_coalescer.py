@@ -0,0 +1,115 @@
+"""消息合并窗口单元测试"""
+import asyncio
+import pytest
+from src.database.models import MessageType
+from src.processors.coalescer import MessageCoalescer
+
+
+def _message(message_id: str, content: str, sender_id: str = "user_1", **extra) -> dict:
+    message = {
+        "message_id": message_id,
+        "sender_id": sender_id,
+        "page_id": "page_1",
+        "message_type": MessageType.MESSAGE,
+        "content": content,
+        "raw_data": {"mid": message_id}
+    }
+    message.update(extra)
+    return message
+
+
+class RecordingHandler:
+    """记录每次调用的处理函数"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, platform_name, message_data):
+        self.calls.append((platform_name, message_data))
+        return {"success": True, "message_id": message_data["message_id"]}
+
+
+@pytest.mark.asyncio
+async def test_burst_is_merged_into_one_turn():
+    """测试同一客户连续发送的消息合并为一次处理"""
+    handler = RecordingHandler()
+    coalescer = MessageCoalescer(handler, window_seconds=0.05, max_wait_seconds=1)
+
+    results = await asyncio.gather(
+        coalescer.submit("facebook", _message("m1", "hi")),
+        coalescer.submit("facebook", _message("m2", "iphone 13")),
+        coalescer.submit("facebook", _message("m3", "how much?"))
+    )
+
+    assert len(handler.calls) == 1
+    merged = handler.calls[0][1]
+    assert merged["content"] == "hi\niphone 13\nhow much?"
+    assert merged["message_id"] == "m3"
+    assert [m["message_id"] for m in merged["coalesced_messages"]] == ["m1", "m2", "m3"]
+    # 所有等待者拿到同一个处理结果
+    assert all(result["message_id"] == "m3" for result in results)
+    assert coalescer.get_metrics()["merged_messages"] == 2
+
+
+@pytest.mark.asyncio
+async def test_different_senders_and_comments_are_not_merged():
+    """测试不同客户分别处理，评论不进入合并窗口"""
+    handler = RecordingHandler()
+    coalescer = MessageCoalescer(handler, window_seconds=0.05, max_wait_seconds=1)
+
+    await asyncio.gather(
+        coalescer.submit("facebook", _message("m1", "hi", sender_id="user_1")),
+        coalescer.submit("facebook", _message("m2", "hello", sender_id="user_2")),
+        coalescer.submit("facebook", _message("c1", "nice", message_type=MessageType.COMMENT))
+    )
+
+    handled = sorted(call[1]["message_id"] for call in handler.calls)
+    assert handled == ["c1", "m1", "m2"]
+    assert all("coalesced_messages" not in call[1] for call in handler.calls)
+
+
+@pytest.mark.asyncio
+async def test_max_messages_flushes_immediately():
+    """测试批次达到最大消息数时立即处理，后续消息进入新批次"""
+    handler = RecordingHandler()
+    coalescer = MessageCoalescer(handler, window_seconds=10, max_wait_seconds=10, max_messages=2)
+
+    first = asyncio.ensure_future(coalescer.submit("facebook", _message("m1", "a")))
+    second = asyncio.ensure_future(coalescer.submit("facebook", _message("m2", "b")))
+    await asyncio.wait_for(asyncio.gather(first, second), timeout=1)
+
+    assert len(handler.calls) == 1
+    assert handler.calls[0][1]["content"] == "a\nb"
+    assert coalescer.get_metrics()["pending_messages"] == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_tasks_are_tracked_until_done():
+    """测试处理中的批次任务保留引用，完成后移除"""
+    release = asyncio.Event()
+
+    async def handler(platform_name, message_data):
+        await release.wait()
+        return {"success": True}
+
+    coalescer = MessageCoalescer(handler, window_seconds=10, max_wait_seconds=10, max_messages=1)
+    pending = asyncio.ensure_future(coalescer.submit("facebook", _message("m1", "a")))
+    await asyncio.sleep(0)
+
+    assert coalescer.get_metrics()["flushing_batches"] == 1
+    release.set()
+    assert (await asyncio.wait_for(pending, timeout=1))["success"] is True
+    await asyncio.sleep(0)
+    assert coalescer.get_metrics()["flushing_batches"] == 0
+
+
+@pytest.mark.asyncio
+async def test_disabled_window_passes_through():
+    """测试窗口为 0 时不合并"""
+    handler = RecordingHandler()
+    coalescer = MessageCoalescer(handler, window_seconds=0)
+
+    await coalescer.submit("facebook", _message("m1", "hi"))
+    await coalescer.submit("facebook", _message("m2", "there"))
+
+    assert [call[1]["content"] for call in handler.calls] == ["hi", "there"]
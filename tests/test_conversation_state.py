@@ -0,0 +1,105 @@
+"""客户对话状态测试"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database.database import Base
+from src.database.models import Customer, Conversation, ConversationStage, CustomerConversationState, MessageType, Platform
+from src.ai.conversation_manager import ConversationManager
+from src.ai.conversation_state import conversation_states
+from src.ai.history_buffer import history_buffer
+
+
+@pytest.fixture
+def db_session():
+    """创建测试数据库会话"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+    conversation_states.invalidate()
+    history_buffer.invalidate()
+
+    yield session
+
+    session.close()
+    Base.metadata.drop_all(engine)
+    conversation_states.invalidate()
+    history_buffer.invalidate()
+
+
+@pytest.fixture
+def customer(db_session):
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="state_user", name="测试用户")
+    db_session.add(customer)
+    db_session.commit()
+    return customer
+
+
+def test_state_maintained_incrementally(db_session, customer):
+    """测试保存消息和AI回复时增量更新状态"""
+    manager = ConversationManager(db_session)
+
+    state = manager.get_conversation_state(customer.id)
+    assert state.ai_reply_count == 0
+    assert state.stage == ConversationStage.NEW
+
+    for i in range(3):
+        conversation, created = manager.save_conversation_if_new(
+            customer_id=customer.id,
+            platform_message_id=f"m_{i}",
+            message_type=MessageType.MESSAGE,
+            content=f"消息{i}"
+        )
+        reply = "Join our Telegram group: @loan_group" if i == 1 else "好的"
+        manager.update_ai_reply(conversation.id, reply)
+        # 同一条消息重复更新回复不重复计数
+        manager.update_ai_reply(conversation.id, reply)
+
+        state = manager.get_conversation_state(customer.id)
+        assert state.ai_reply_count == i + 1
+        assert state.last_inbound_at is not None
+        assert state.last_outbound_at is not None
+
+    assert state.stage == ConversationStage.ONGOING
+    assert state.telegram_link_sent is True
+
+    # 数据库中的记录与缓存一致
+    conversation_states.invalidate()
+    row = db_session.get(CustomerConversationState, customer.id)
+    assert row.ai_reply_count == 3
+    assert row.telegram_link_sent is True
+    assert manager.get_conversation_state(customer.id) == state
+
+
+def test_state_rebuilt_from_history(db_session, customer):
+    """测试没有状态记录的老客户由对话历史重建一次"""
+    db_session.add_all([
+        Conversation(
+            customer_id=customer.id,
+            platform=Platform.FACEBOOK,
+            message_type=MessageType.MESSAGE,
+            content="你好",
+            ai_replied=True,
+            ai_reply_content="您好！欢迎加入 t.me/loan_group"
+        ),
+        Conversation(
+            customer_id=customer.id,
+            platform=Platform.FACEBOOK,
+            message_type=MessageType.MESSAGE,
+            content="多少钱"
+        )
+    ])
+    db_session.commit()
+
+    rebuilds = conversation_states.rebuild_count
+    state = ConversationManager(db_session).get_conversation_state(customer.id)
+
+    assert state.ai_reply_count == 1
+    assert state.telegram_link_sent is True
+    assert state.stage == ConversationStage.EARLY
+    assert conversation_states.rebuild_count == rebuilds + 1
+    assert db_session.get(CustomerConversationState, customer.id) is not None
+
+    # 再次读取命中缓存，不再重建
+    ConversationManager(db_session).get_conversation_state(customer.id)
+    assert conversation_states.rebuild_count == rebuilds + 1
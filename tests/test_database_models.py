@@ -185,3 +185,34 @@ def test_model_relationships(db_session):
     assert len(conversation.reviews) == 1
     assert customer.conversations[0] == conversation
 
+
+
+def test_save_conversation_if_new_ignores_duplicates(db_session):
+    """测试同一平台消息只保存一次"""
+    from src.ai.conversation_manager import ConversationManager
+    from src.database.models import Platform
+    
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="123456789")
+    db_session.add(customer)
+    db_session.commit()
+    
+    manager = ConversationManager(db_session)
+    first, created = manager.save_conversation_if_new(
+        customer_id=customer.id,
+        platform_message_id="mid_1",
+        platform="facebook",
+        message_type=MessageType.MESSAGE,
+        content="hi"
+    )
+    assert created is True
+    
+    again, created = manager.save_conversation_if_new(
+        customer_id=customer.id,
+        platform_message_id="mid_1",
+        platform="facebook",
+        message_type=MessageType.MESSAGE,
+        content="hi"
+    )
+    assert created is False
+    assert again.id == first.id
+    assert db_session.query(Conversation).count() == 1
@@ -0,0 +1,145 @@
+"""邮箱验证测试"""
+import asyncio
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database.database import Base
+from src.database.models import CollectedData, Conversation, Customer, MessageType, Platform
+from src.collector import email_verification
+from src.collector.data_collector import DataCollector
+from src.collector.email_verification import EmailVerifier, EmailUndeliverableError
+
+
+@pytest.fixture
+def session_factory():
+    """创建测试数据库（worker 线程和测试共用同一个内存数据库）"""
+    from sqlalchemy.pool import StaticPool
+    engine = create_engine(
+        "sqlite:///:memory:", echo=False,
+        connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+
+    yield factory
+
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def conversation_id(session_factory):
+    """创建一条对话"""
+    db = session_factory()
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="email_user", name="测试用户")
+    db.add(customer)
+    db.commit()
+    conversation = Conversation(
+        customer_id=customer.id, platform=Platform.FACEBOOK, message_type=MessageType.MESSAGE, content="你好"
+    )
+    db.add(conversation)
+    db.commit()
+    conversation_id = conversation.id
+    db.close()
+    return conversation_id
+
+
+def test_check_syntax_caches_invalid_domains():
+    """测试语法检查不访问网络，无效域名按域名缓存"""
+    verifier = EmailVerifier(check_deliverability=False)
+    with patch.object(email_verification, "validate_email", wraps=email_verification.validate_email) as validate:
+        assert verifier.check_syntax("a@example.com") == (True, None)
+        assert verifier.check_syntax("b@example.com") == (True, None)
+        ok, error = verifier.check_syntax("a@bad_domain")
+        assert not ok and error
+        assert verifier.check_syntax("b@bad_domain") == (False, error)
+
+    assert all(call.kwargs["check_deliverability"] is False for call in validate.call_args_list)
+    # example.com: 域名一次 + 两个地址；bad_domain: 只检查一次域名
+    assert validate.call_count == 4
+    assert verifier.get_metrics()["syntax_cache_hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_deliverability_lookup_is_shared_and_negative_cached():
+    """测试同一域名并发的检查共用一次查询，不可投递的结果被缓存"""
+    verifier = EmailVerifier(check_deliverability=True, negative_ttl_seconds=60)
+    calls = []
+
+    def fake_validate(email, **kwargs):
+        calls.append(email)
+        if kwargs.get("check_deliverability"):
+            import time
+            time.sleep(0.05)
+            raise EmailUndeliverableError("The domain name nomail.test does not accept email.")
+
+    with patch.object(email_verification, "validate_email", side_effect=fake_validate):
+        results = await asyncio.gather(*(
+            verifier.check_deliverability_async(f"user{i}@nomail.test") for i in range(5)
+        ))
+        assert verifier.cached_deliverability("other@NoMail.test")[0] is False
+
+    assert all(deliverable is False for deliverable, _ in results)
+    assert calls == ["postmaster@nomail.test"]
+    metrics = verifier.get_metrics()
+    assert metrics["deliverability_lookups"] == 1
+    assert metrics["undeliverable_count"] == 1
+    assert metrics["negative_cache_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_lookup_is_not_cached():
+    """测试查询超时等无法确定的情况视为可投递，且不缓存"""
+    verifier = EmailVerifier(check_deliverability=True)
+    with patch.object(email_verification, "validate_email", side_effect=TimeoutError("dns timeout")):
+        assert await verifier.check_deliverability_async("a@slow.test") == (True, None)
+    assert verifier.cached_deliverability("a@slow.test") is None
+
+
+@pytest.mark.asyncio
+async def test_worker_updates_collected_data(session_factory, conversation_id):
+    """测试收集记录先保存为未验证，后台检查完成后更新验证结果"""
+    # 单个 worker：测试用的内存数据库只有一个共享连接
+    verifier = EmailVerifier(check_deliverability=True, concurrency=1)
+
+    def fake_validate(email, **kwargs):
+        if kwargs.get("check_deliverability") and email.endswith("@nomail.test"):
+            raise EmailUndeliverableError("The domain name nomail.test does not accept email.")
+
+    with patch.object(email_verification, "validate_email", side_effect=fake_validate), \
+            patch.object(email_verification, "email_verifier", verifier), \
+            patch("src.collector.data_collector.email_verifier", verifier), \
+            patch("src.collector.data_validator.email_verifier", verifier), \
+            patch("src.database.database.SessionLocal", session_factory):
+        await verifier.start()
+        try:
+            db = session_factory()
+            collector = DataCollector(db)
+            good = collector.collect_from_conversation(conversation_id, "邮箱 good@example.com")
+            bad = collector.collect_from_conversation(conversation_id, "邮箱 bad@nomail.test")
+            assert good.is_validated is False
+            assert bad.is_validated is False
+            good_id, bad_id = good.id, bad.id
+            db.close()
+
+            await asyncio.wait_for(verifier._queue.join(), timeout=2)
+        finally:
+            await verifier.stop()
+
+        db = session_factory()
+        good = db.query(CollectedData).get(good_id)
+        bad = db.query(CollectedData).get(bad_id)
+        assert good.is_validated is True
+        assert good.data["email"] == "good@example.com"
+        assert bad.is_validated is False
+        assert "email" not in bad.data
+        assert "does not accept email" in bad.validation_errors["email"]
+
+        # 域名结果已缓存：新记录直接使用缓存结果，不再排队
+        collector = DataCollector(db)
+        cached = collector.collect_from_conversation(conversation_id, "邮箱 other@nomail.test")
+        assert cached.is_validated is False
+        assert "email" in cached.validation_errors
+        db.close()
+
+    assert verifier.get_metrics()["updated_count"] == 2
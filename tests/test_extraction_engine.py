@@ -0,0 +1,66 @@
+"""资料提取引擎测试"""
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+from src.collector.extraction_engine import ExtractionEngine, extraction_engine
+
+
+MESSAGES = [
+    "我叫：张三，邮箱 zhangsan@example.com，电话 13812345678，想咨询一下",
+    "name: Alice, call +1 (415) 555-2671, 我想购买",
+    "hello",
+    "我是：李四。有投诉",
+]
+
+
+def test_extract_fields():
+    """测试提取邮箱、电话、姓名和需求类型"""
+    extracted = extraction_engine.extract(MESSAGES[0])
+    assert extracted["email"] == "zhangsan@example.com"
+    assert extracted["phone"] == "+8613812345678"
+    assert extracted["name"] == "张三"
+    assert extracted["inquiry_type"] == "咨询"
+    assert extracted["message_content"] == MESSAGES[0]
+
+    assert extraction_engine.extract(MESSAGES[2]) == {"message_content": "hello"}
+
+
+def test_reload_compiles_configured_name_patterns():
+    """测试配置中的姓名规则和字段在编译时读取，无效规则被忽略"""
+    engine = ExtractionEngine({
+        "data_collection": {
+            "required_fields": ["name", "phone"],
+            "name_patterns": [r"称呼[：:]\s*(\S+)", r"([", r"no group"]
+        }
+    })
+    assert engine.required_fields == ["name", "phone"]
+    assert engine.get_metrics()["name_patterns"] == 5
+    assert engine.extract("称呼：王五")["name"] == "王五"
+
+
+def test_extract_many_matches_single_extraction():
+    """测试批量提取与逐条提取结果一致（按页面的电话地区）"""
+    page_configs = {"page_ph": {"phone_regions": ["PH"]}}
+    messages = MESSAGES + ["call 0917 123 4567"]
+    with patch("src.collector.phone_scanner.page_settings.get_page_config",
+               side_effect=lambda page_id: page_configs.get(page_id, {})):
+        results = extraction_engine.extract_many(messages, page_ids=[None] * 4 + ["page_ph"], processes=1)
+        expected = [extraction_engine.extract(message, page_id=page_id)
+                    for message, page_id in zip(messages, [None] * 4 + ["page_ph"])]
+    assert results == expected
+    assert results[4]["phone"] == "+639171234567"
+
+    with pytest.raises(ValueError):
+        extraction_engine.extract_many(messages, page_ids=["page_ph"])
+
+
+def test_extract_many_uses_process_pool_for_large_batches():
+    """测试大批量消息分块交给进程池处理，结果顺序不变"""
+    messages = MESSAGES * 30
+    with patch("src.collector.extraction_engine.EXTRACTION_CHUNK_SIZE", 25), \
+            patch("src.collector.extraction_engine.settings.extraction_process_pool_min_messages", 50), \
+            patch("src.collector.extraction_engine.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as pool:
+        results = extraction_engine.extract_many(messages, processes=2)
+
+    assert pool.call_count == 1
+    assert results == [extraction_engine.extract(message) for message in messages]
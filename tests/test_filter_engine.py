@@ -199,3 +199,126 @@ def test_filter_disabled(filter_engine, db_session):
     assert "filtered" in result
     assert "priority" in result
 
+
+
+PRIORITY_CONFIG = {
+    "keyword_filter": {"enabled": True, "block_keywords": ["诈骗"], "spam_keywords": ["加微信"]},
+    "priority_rules": [
+        {"condition": "包含紧急关键词", "keywords": ["紧急", "URGENT"], "priority": "high"},
+        {"condition": "未知条件", "keywords": ["价格"], "priority": "high"},
+        {"condition": "包含购买意向", "keywords": ["购买", "price"], "priority": "medium"},
+        {"condition": "默认", "priority": "medium"},
+        {"condition": "包含紧急关键词", "keywords": ["你好"], "priority": "high"},
+    ],
+}
+
+
+@pytest.fixture
+def restore_filter_rules():
+    """测试后恢复全局 filtering 配置、关键词自动机和过滤规则"""
+    from src.config import yaml_config
+    from src.collector.filter_engine import filter_rules
+    original = yaml_config.get("filtering")
+    yield
+    yaml_config["filtering"] = original
+    filter_rules.reload()
+
+
+def test_compile_priority_rules():
+    """测试条件字符串在编译时解析为优先级，"默认" 之后的规则不生效"""
+    from src.collector.filter_engine import FilterRules
+    from src.database.models import Priority
+
+    rules = FilterRules.compile(PRIORITY_CONFIG)
+    assert [(rule.category, rule.priority) for rule in rules.priority_rules] == [
+        ("priority_rule:0", Priority.URGENT),
+        ("priority_rule:2", Priority.MEDIUM),
+    ]
+    assert rules.default_priority == Priority.MEDIUM
+    assert FilterRules.compile(None).default_priority == Priority.LOW
+
+
+def test_filter_many_matches_filter_message(restore_filter_rules):
+    """测试批量过滤与逐条过滤结果一致"""
+    from src.config import yaml_config
+    from src.collector.filter_engine import FilterEngine, filter_rules
+    from src.database.models import Priority
+    from src.utils.keyword_engine import keyword_engine
+
+    filter_rules.reload({**yaml_config, "filtering": PRIORITY_CONFIG})
+    engine = FilterEngine()
+    messages = ["urgent 请回复", "我想购买", "你好", "加微信领红包", "这是诈骗吗"]
+    results = engine.filter_many(messages)
+    assert results == [engine.filter_message(None, message) for message in messages]
+    assert [result["priority"] for result in results[:3]] == [Priority.URGENT, Priority.MEDIUM, Priority.MEDIUM]
+    assert results[3]["filtered"] and results[4]["filtered"]
+
+    matches = [keyword_engine.match(message) for message in messages]
+    assert engine.filter_many(messages, keyword_matches=matches) == results
+    with pytest.raises(ValueError):
+        engine.filter_many(messages, keyword_matches=matches[:1])
+
+
+def test_reload_when_config_file_changes(tmp_path, restore_filter_rules):
+    """测试配置文件修改后重新编译并整体替换规则，解析失败时保留当前规则"""
+    import os
+    import yaml
+    from src.collector.filter_engine import FilterEngine, FilterRuleStore
+    from src.database.models import Priority
+
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump({"filtering": {"priority_rules": [
+        {"condition": "默认", "priority": "low"}
+    ]}}, allow_unicode=True), encoding="utf-8")
+    store = FilterRuleStore(str(config_path))
+    assert store.reload_if_changed() is False
+
+    config_path.write_text(yaml.safe_dump({"filtering": PRIORITY_CONFIG}, allow_unicode=True), encoding="utf-8")
+    stat = config_path.stat()
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    old_rules = store.rules
+    assert store.reload_if_changed() is True
+    assert store.rules is not old_rules
+    engine = FilterEngine(rules=store.rules)
+    assert engine.filter_message(None, "URGENT")["priority"] == Priority.URGENT
+    assert engine.filter_message(None, "诈骗")["filtered"] is True
+
+    config_path.write_text("filtering: [", encoding="utf-8")
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+    current = store.rules
+    assert store.reload_if_changed() is False
+    assert store.rules is current
+    assert store.get_metrics()["reload_error_count"] == 1
+
+
+def test_snapshot_keeps_its_keywords_after_reload(restore_filter_rules):
+    """测试重新加载调换规则顺序后，旧快照仍按自己的关键词判断（不使用新自动机的同名分类）"""
+    from src.collector.filter_engine import filter_rules
+    from src.utils.keyword_engine import keyword_engine
+    from src.database.models import Priority
+
+    def config(rules, block):
+        return {"filtering": {
+            "keyword_filter": {"enabled": True, "block_keywords": block},
+            "priority_rules": rules + [{"condition": "默认", "priority": "low"}]
+        }}
+
+    urgent = {"condition": "包含紧急关键词", "keywords": ["紧急"], "priority": "high"}
+    purchase = {"condition": "包含购买意向", "keywords": ["购买"], "priority": "medium"}
+    filter_rules.reload(config([urgent, purchase], ["诈骗"]))
+    old_rules = filter_rules.rules
+    old_engine = FilterEngine(rules=old_rules)
+
+    # 消息处理中途配置被重新加载：priority_rule:0 现在是购买意向，屏蔽词换了
+    filter_rules.reload(config([purchase, urgent], ["垃圾"]))
+    new_matches = keyword_engine.match("我想购买")
+    assert new_matches.source is not old_rules.keywords
+
+    assert old_engine.filter_message(None, "我想购买", new_matches)["priority"] == Priority.MEDIUM
+    assert old_engine.filter_message(None, "紧急", keyword_engine.match("紧急"))["priority"] == Priority.URGENT
+    assert old_engine.filter_message(None, "诈骗", keyword_engine.match("诈骗"))["filtered"] is True
+    assert old_engine.filter_message(None, "垃圾", keyword_engine.match("垃圾"))["filtered"] is False
+
+    new_engine = FilterEngine(rules=filter_rules.rules)
+    assert new_engine.filter_message(None, "我想购买", new_matches)["priority"] == Priority.MEDIUM
+    assert new_engine.filter_message(None, "垃圾", keyword_engine.match("垃圾"))["filtered"] is True
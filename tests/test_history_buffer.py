@@ -0,0 +1,99 @@
+"""对话历史缓冲测试"""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from src.database.database import Base
+from src.database.models import Customer, MessageType, Platform
+from src.ai.conversation_manager import ConversationManager
+from src.ai.conversation_state import conversation_states
+from src.ai.history_buffer import BufferedTurn, ConversationHistoryBuffer, history_buffer
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    conversation_states.invalidate()
+    history_buffer.invalidate()
+
+    yield engine
+
+    Base.metadata.drop_all(engine)
+    conversation_states.invalidate()
+    history_buffer.invalidate()
+
+
+def _turn(conversation_id: int, content: str = "消息") -> BufferedTurn:
+    return BufferedTurn(conversation_id=conversation_id, content=content, received_at=None)
+
+
+def test_ring_buffer_keeps_last_turns():
+    """测试每个客户只保留最近的对话轮数"""
+    buffer = ConversationHistoryBuffer(turns_per_customer=3, max_bytes=10**6)
+    buffer.load(1, [_turn(1, "a")])
+    for i, content in enumerate(["b", "c", "d"], start=2):
+        buffer.append(1, _turn(i, content))
+
+    history = buffer.get(1, limit=3)
+    assert [msg["content"] for msg in history] == ["b", "c", "d"]
+
+    buffer.set_reply(1, 4, "回复d", None)
+    assert buffer.get(1, limit=1)[-1] == {"role": "assistant", "content": "回复d", "timestamp": None}
+
+    # 超过缓冲容量的请求需要查询数据库
+    assert buffer.get(1, limit=4) is None
+    # 未加载的客户不缓冲追加的消息
+    buffer.append(2, _turn(10))
+    assert buffer.get(2, limit=1) is None
+
+
+def test_memory_cap_evicts_least_recently_used():
+    """测试超出内存上限时淘汰最久未使用的客户"""
+    turn_size = _turn(1, "x" * 100).size
+    buffer = ConversationHistoryBuffer(turns_per_customer=5, max_bytes=turn_size * 2)
+
+    buffer.load(1, [_turn(1, "x" * 100)])
+    buffer.load(2, [_turn(2, "x" * 100)])
+    buffer.get(1, limit=1)  # 客户1变为最近使用
+    buffer.load(3, [_turn(3, "x" * 100)])
+
+    assert buffer.get(2, limit=1) is None
+    assert buffer.get(1, limit=1) is not None
+    assert buffer.get(3, limit=1) is not None
+    assert buffer.get_metrics()["eviction_count"] == 1
+    assert buffer.get_metrics()["bytes"] == turn_size * 2
+
+
+def test_history_served_from_buffer_after_first_access(engine):
+    """测试首次读取后，保存的消息和回复写入缓冲，读取历史不再查询数据库"""
+    db = sessionmaker(bind=engine)()
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="buffer_user", name="测试用户")
+    db.add(customer)
+    db.commit()
+    customer_id = customer.id
+
+    manager = ConversationManager(db)
+    conversation, _ = manager.save_conversation_if_new(
+        customer_id=customer_id, platform_message_id="m_1", message_type=MessageType.MESSAGE, content="你好"
+    )
+    assert [msg["content"] for msg in manager.get_conversation_history(customer_id)] == ["你好"]
+
+    manager.update_ai_reply(conversation.id, "您好！")
+    manager.save_conversation_if_new(
+        customer_id=customer_id, platform_message_id="m_2", message_type=MessageType.MESSAGE, content="多少钱"
+    )
+
+    selects = []
+    listener = lambda conn, cursor, statement, *args: selects.append(statement) \
+        if statement.lstrip().upper().startswith("SELECT") else None
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        history = manager.get_conversation_history(customer_id, limit=10)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert selects == []
+    assert [(msg["role"], msg["content"]) for msg in history] == [
+        ("user", "你好"), ("assistant", "您好！"), ("user", "多少钱")
+    ]
+    db.close()
@@ -0,0 +1,184 @@
+"""持久化消息队列单元测试"""
+import asyncio
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database.database import Base
+from src.database.models import IngestJob, IngestStatus, MessageType
+from src.ingest.dedupe import RecentMessageCache
+from src.ingest.queue import IngestQueue
+from src.ingest.worker_pool import IngestWorkerPool
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    创建测试数据库会话工厂
+
+    使用临时文件数据库：worker 在线程中领取任务，每个线程需要独立的连接
+    （共享同一个内存数据库连接时，并发事务会相互提交/回滚）
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'ingest.db'}",
+        connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+
+    yield factory
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def queue(session_factory):
+    """创建队列实例"""
+    return IngestQueue(
+        session_factory=session_factory,
+        visibility_timeout_seconds=60,
+        max_attempts=2,
+        retry_backoff_seconds=0,
+        retention_hours=1
+    )
+
+
+def _message(message_id: str, sender_id: str = "user_1") -> dict:
+    return {
+        "message_id": message_id,
+        "sender_id": sender_id,
+        "page_id": "page_1",
+        "message_type": MessageType.MESSAGE,
+        "content": "iphone 13 how much?",
+        "raw_data": {"mid": message_id}
+    }
+
+
+def test_enqueue_and_claim(queue):
+    """测试入队与领取（恢复消息类型枚举）"""
+    queue.enqueue_many("facebook", [_message("m1"), _message("m2")])
+
+    job = queue.claim("worker-1")
+    assert job is not None
+    assert job.platform == "facebook"
+    assert job.payload["message_id"] == "m1"
+    assert job.payload["message_type"] == MessageType.MESSAGE
+    assert job.attempts == 1
+
+    # 已领取的任务在可见性超时内不会被再次领取
+    second = queue.claim("worker-2")
+    assert second.payload["message_id"] == "m2"
+    assert queue.claim("worker-3") is None
+
+
+def test_ack_and_depth(queue):
+    """测试确认任务与队列深度"""
+    queue.enqueue("facebook", _message("m1"))
+    queue.enqueue("facebook", _message("m2"))
+
+    job = queue.claim("worker-1")
+    assert queue.ack(job.id, "worker-1") is True
+
+    depth = queue.get_depth()
+    assert depth["pending"] == 1
+    assert depth["processing"] == 0
+    assert depth["done"] == 1
+
+
+def test_fail_retries_then_marks_failed(queue, session_factory):
+    """测试失败重试与最大重试次数"""
+    queue.enqueue("facebook", _message("m1"))
+
+    job = queue.claim("worker-1")
+    assert queue.fail(job.id, "worker-1", "boom") is True
+
+    job = queue.claim("worker-1")
+    assert job.attempts == 2
+    assert queue.fail(job.id, "worker-1", "boom again") is False
+
+    db = session_factory()
+    stored = db.query(IngestJob).first()
+    assert stored.status == IngestStatus.FAILED
+    assert stored.last_error == "boom again"
+    db.close()
+
+
+def test_visibility_timeout_reclaims_job(session_factory):
+    """测试可见性超时后任务可被重新领取"""
+    queue = IngestQueue(
+        session_factory=session_factory,
+        visibility_timeout_seconds=0,
+        max_attempts=3,
+        retry_backoff_seconds=0
+    )
+    queue.enqueue("facebook", _message("m1"))
+
+    first = queue.claim("worker-1")
+    reclaimed = queue.claim("worker-2")
+    assert reclaimed is not None
+    assert reclaimed.id == first.id
+    assert reclaimed.attempts == 2
+
+    # 原 worker 超时后的确认/失败不会覆盖新的领取
+    assert queue.ack(first.id, "worker-1") is False
+    assert queue.fail(first.id, "worker-1", "late failure") is None
+    assert queue.get_depth()["processing"] == 1
+    assert queue.ack(reclaimed.id, "worker-2") is True
+    assert queue.get_depth()["done"] == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_drains_queue(queue):
+    """测试 worker 池消费队列并确认任务"""
+    handled = []
+
+    async def handler(platform, message_data):
+        handled.append(message_data["message_id"])
+        return {"success": True}
+
+    queue.enqueue_many("facebook", [_message(f"m{i}") for i in range(5)])
+
+    pool = IngestWorkerPool(queue, handler=handler, workers=2, poll_interval_seconds=0.01)
+    with patch("src.ingest.worker_pool.DEPTH_REFRESH_INTERVAL_SECONDS", 0.01):
+        await pool.start()
+        for _ in range(200):
+            if pool.processed_count == 5 and pool.get_metrics()["depth"].get("done") == 5:
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+
+    assert sorted(handled) == [f"m{i}" for i in range(5)]
+    # 指标读取缓存的队列深度，不查询数据库
+    with patch.object(queue, "get_depth", side_effect=AssertionError("queried on scrape")):
+        metrics = pool.get_metrics()
+    assert metrics["processed_count"] == 5
+    assert metrics["depth"]["done"] == 5
+    assert metrics["depth"]["pending"] == 0
+
+
+def test_enqueue_ignores_redelivered_messages(queue):
+    """测试 Webhook 重投的消息只入队一次"""
+    first = queue.enqueue_many("facebook", [_message("m1"), _message("m2")])
+    assert len(first) == 2
+
+    redelivered = queue.enqueue_many("facebook", [_message("m2"), _message("m3")])
+    assert len(redelivered) == 1
+    assert queue.enqueue("facebook", _message("m1")) is None
+
+    # 不同平台的相同消息ID互不影响
+    assert queue.enqueue("instagram", _message("m1")) is not None
+    assert queue.get_depth()["pending"] == 4
+
+
+def test_recent_message_cache_drops_duplicates():
+    """测试进程内 LRU 丢弃最近见过的消息"""
+    cache = RecentMessageCache(capacity=2)
+
+    assert len(cache.filter_new("facebook", [_message("m1"), _message("m1"), _message("m2")])) == 2
+    assert cache.filter_new("facebook", [_message("m1")]) == []
+
+    # 超出容量后最久未见的消息被淘汰
+    cache.filter_new("facebook", [_message("m3")])
+    assert cache.filter_new("facebook", [_message("m2")]) != []
+    assert cache.get_metrics()["duplicate_count"] == 2
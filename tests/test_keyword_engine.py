@@ -0,0 +1,79 @@
+"""关键词引擎单元测试"""
+from src.utils.keyword_engine import (
+    KeywordAutomaton, KeywordEngine, PRODUCT, BUYING_SELLING, BUSINESS_INTENT,
+    FILTER_BLOCK, FILTER_SPAM, PRIORITY_RULE_PREFIX, PRESET_REPLY_PREFIX,
+    QUESTION_PREFIX, QUESTION_CATEGORY_KEYWORDS, INQUIRY_PREFIX, INQUIRY_TYPE_KEYWORDS
+)
+
+CONFIG = {
+    "filtering": {
+        "keyword_filter": {
+            "block_keywords": ["诈骗", "Scam"],
+            "spam_keywords": ["加微信", "free money"]
+        },
+        "priority_rules": [
+            {"condition": "包含紧急关键词", "keywords": ["紧急", "urgent"], "priority": "high"},
+            {"condition": "默认", "priority": "low"}
+        ]
+    },
+    "ai_templates": {
+        "preset_replies": {
+            "question_model": {"keywords": ["型号", "model"], "reply": "model"},
+            "greeting_first": {"keywords": ["hi", "hello"], "reply": "hello"}
+        }
+    }
+}
+
+
+def test_automaton_finds_overlapping_patterns():
+    """测试重叠和互为子串的模式都能找到"""
+    automaton = KeywordAutomaton(["he", "she", "his", "hers", "借", "借款"])
+
+    found = {automaton.patterns[i] for i in automaton.find("ushers 想借款")}
+    assert found == {"he", "she", "hers", "借", "借款"}
+    assert automaton.find("nothing") == set()
+
+
+def test_automaton_ignores_empty_and_duplicate_patterns():
+    """测试空模式和重复模式只编译一次"""
+    automaton = KeywordAutomaton(["", "ab", "ab", "b"])
+
+    assert automaton.patterns == ["ab", "b"]
+    assert {automaton.patterns[i] for i in automaton.find("cab")} == {"ab", "b"}
+
+
+def test_match_is_case_insensitive_and_keeps_config_order():
+    """测试匹配不区分大小写，结果按配置顺序返回原始关键词"""
+    engine = KeywordEngine(CONFIG)
+
+    matches = engine.match("URGENT: this is a SCAM, free money 诈骗")
+    assert matches.keywords(FILTER_BLOCK) == ["诈骗", "Scam"]
+    assert matches.keywords(FILTER_SPAM) == ["free money"]
+    assert matches.has(f"{PRIORITY_RULE_PREFIX}0")
+    assert not matches.has(f"{PRIORITY_RULE_PREFIX}1")
+
+
+def test_one_scan_covers_all_categories():
+    """测试一次扫描得到所有分类的结果"""
+    engine = KeywordEngine(CONFIG)
+
+    matches = engine.match("Hi, iPhone model 价格多少钱?")
+    assert matches.has(PRODUCT)
+    assert matches.has(BUSINESS_INTENT)
+    assert not matches.has(BUYING_SELLING)
+    assert matches.first_category(QUESTION_PREFIX, QUESTION_CATEGORY_KEYWORDS) == "价格咨询"
+    assert matches.first_category(INQUIRY_PREFIX, INQUIRY_TYPE_KEYWORDS) == "购买"
+    assert matches.first_category(PRESET_REPLY_PREFIX, ["question_model", "greeting_first"]) == "question_model"
+
+    assert engine.match("我想买手机").has(BUYING_SELLING)
+    assert engine.match("").categories == []
+
+
+def test_reload_recompiles_config_keywords():
+    """测试重新加载配置后使用新的关键词"""
+    engine = KeywordEngine(CONFIG)
+    assert not engine.match("spam text").has(FILTER_SPAM)
+
+    engine.reload({"filtering": {"keyword_filter": {"spam_keywords": ["spam"]}}})
+    assert engine.match("spam text").keywords(FILTER_SPAM) == ["spam"]
+    assert not engine.match("诈骗").has(FILTER_BLOCK)
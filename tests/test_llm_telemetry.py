@@ -0,0 +1,175 @@
+"""LLM 调用记录测试"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database.database import Base
+from src.database.models import LLMCall
+from src.ai.openai_client import SharedOpenAIClient
+from src.monitoring.llm_telemetry import (
+    LLMTelemetry, estimate_cost, summarize_calls, token_timeseries, llm_telemetry
+)
+
+
+@pytest.fixture
+def session_factory():
+    """创建测试数据库（写入线程和测试共用同一个内存数据库）"""
+    from sqlalchemy.pool import StaticPool
+    engine = create_engine(
+        "sqlite:///:memory:", echo=False,
+        connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+
+    yield factory
+
+    Base.metadata.drop_all(engine)
+
+
+def test_estimate_cost_matches_longest_model_prefix():
+    """测试按最长模型名前缀匹配价格"""
+    assert estimate_cost("gpt-4o-mini-2024-07-18", 1_000_000, 0) == pytest.approx(0.15)
+    assert estimate_cost("gpt-4o", 0, 1_000_000) == pytest.approx(10.0)
+    assert estimate_cost("gpt-4", 1000, 1000) == pytest.approx(0.09)
+    assert estimate_cost("local-model", 1000, 1000) is None
+    assert estimate_cost("gpt-4o", None, None) is None
+
+
+def test_record_updates_memory_metrics():
+    """测试记录后更新耗时分位数、token 数和结果计数"""
+    telemetry = LLMTelemetry(enabled=True, persist=False)
+    for latency in (100, 200, 300, 4000):
+        telemetry.record("gpt-4o-mini", "success", latency, page_id="page_a",
+                         prompt_version="abc", prompt_tokens=500, completion_tokens=40)
+    telemetry.record("gpt-4o-mini", "timeout", 8000, page_id="page_b", tier="fast")
+
+    metrics = telemetry.get_metrics()
+    assert metrics["outcomes"] == {"success": 4, "timeout": 1}
+    assert metrics["prompt_tokens_total"] == 2000
+    assert metrics["completion_tokens_total"] == 160
+    assert metrics["prompt_tokens_per_minute"] == 2000 / 5
+    assert metrics["latency_by_model"]["gpt-4o-mini"]["count"] == 5
+    assert metrics["latency_by_page"]["page_a"]["p50_ms"] == 250
+    assert metrics["latency_by_page"]["page_b"]["p95_ms"] == 10000
+    assert metrics["by_tier"]["fast"]["count"] == 1
+    # 不持久化时不缓冲记录
+    assert metrics["buffered"] == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batch(session_factory):
+    """测试缓冲的记录批量写入数据库"""
+    telemetry = LLMTelemetry(enabled=True, persist=True, batch_size=100)
+    for i in range(3):
+        telemetry.record("gpt-4o-mini", "success", 120 + i, page_id="page_a",
+                         prompt_version="v1", prompt_tokens=300, completion_tokens=30)
+    assert telemetry.get_metrics()["buffered"] == 3
+
+    with patch("src.database.database.SessionLocal", session_factory):
+        assert await telemetry.flush() == 3
+
+    db = session_factory()
+    rows = db.query(LLMCall).all()
+    assert len(rows) == 3
+    assert {row.prompt_version for row in rows} == {"v1"}
+    assert rows[0].cost_usd == pytest.approx(estimate_cost("gpt-4o-mini", 300, 30))
+    db.close()
+    assert telemetry.get_metrics()["written_count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_bounded_buffer():
+    """测试写入失败时记录留在缓冲区，超出上限时丢弃最早的记录"""
+    telemetry = LLMTelemetry(enabled=True, persist=True, batch_size=2, max_buffer=4)
+    for i in range(3):
+        telemetry.record("gpt-4o-mini", "success", 100, page_id=f"page_{i}")
+
+    with patch.object(LLMTelemetry, "_write_rows", side_effect=RuntimeError("db down")):
+        assert await telemetry.flush() == 0
+    for i in range(3, 6):
+        telemetry.record("gpt-4o-mini", "success", 100, page_id=f"page_{i}")
+
+    metrics = telemetry.get_metrics()
+    assert metrics["buffered"] == 4
+    assert metrics["dropped_count"] == 2
+    assert metrics["write_error_count"] == 1
+    assert [row["page_id"] for row in telemetry._buffer] == ["page_2", "page_3", "page_4", "page_5"]
+
+
+def test_summaries_group_by_page_and_prompt_version(session_factory):
+    """测试按页面、提示词版本汇总及按分钟统计 token 数"""
+    db = session_factory()
+    now = datetime.now(timezone.utc)
+    for i, (page_id, version, outcome) in enumerate([
+        ("page_a", "v1", "success"),
+        ("page_a", "v1", "success"),
+        ("page_a", "v2", "timeout"),
+        ("page_b", "v2", "success"),
+    ]):
+        usage = (400, 20) if outcome == "success" else (None, None)
+        db.add(LLMCall(
+            page_id=page_id, model="gpt-4o-mini", prompt_version=version, outcome=outcome,
+            prompt_tokens=usage[0], completion_tokens=usage[1], latency_ms=100.0 * (i + 1),
+            created_at=now - timedelta(minutes=i)
+        ))
+    db.add(LLMCall(page_id="page_a", model="gpt-4o-mini", outcome="success", latency_ms=1,
+                   created_at=now - timedelta(days=2)))
+    db.commit()
+
+    since = now - timedelta(hours=1)
+    by_page = {group["page_id"]: group for group in summarize_calls(db, since, "page_id")}
+    assert by_page["page_a"]["calls"] == 3
+    assert by_page["page_a"]["failures"] == 1
+    assert by_page["page_a"]["prompt_tokens"] == 800
+    assert by_page["page_a"]["avg_prompt_tokens"] == 400
+    assert by_page["page_a"]["p95_latency_ms"] == 300
+    assert by_page["page_b"]["calls"] == 1
+
+    by_version = {group["prompt_version"]: group for group in summarize_calls(db, since, "prompt_version")}
+    assert by_version["v1"]["calls"] == 2
+    assert by_version["v2"]["failures"] == 1
+
+    with pytest.raises(ValueError):
+        summarize_calls(db, since, "customer_id")
+
+    series = token_timeseries(db, since, bucket_minutes=60)
+    assert sum(bucket["calls"] for bucket in series) == 4
+    assert sum(bucket["prompt_tokens"] for bucket in series) == 1200
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_openai_client_records_every_completion():
+    """测试共享客户端为成功和超时的补全请求都写入调用记录"""
+    client = SharedOpenAIClient(max_concurrency=2, per_page_concurrency=2, timeout_seconds=5)
+    response = Mock(
+        choices=[Mock(message=Mock(content="ok"))],
+        usage=Mock(prompt_tokens=321, completion_tokens=12)
+    )
+
+    async def slow_create(**kwargs):
+        await asyncio.sleep(1)
+
+    with patch.object(llm_telemetry, "record") as record:
+        with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock, return_value=response) as create:
+            await client.chat_completion(page_id="page_a", prompt_version="v1", tier="fast", model="gpt-4o-mini", messages=[])
+        # prompt_version 和 tier 不传给 OpenAI
+        assert "prompt_version" not in create.call_args.kwargs
+        assert "tier" not in create.call_args.kwargs
+
+        with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock, side_effect=slow_create):
+            with pytest.raises(asyncio.TimeoutError):
+                await client.chat_completion(page_id="page_a", timeout=0.05, model="gpt-4o-mini", messages=[])
+
+    success, timeout = [call.kwargs for call in record.call_args_list]
+    assert success["outcome"] == "success"
+    assert success["prompt_version"] == "v1"
+    assert success["tier"] == "fast"
+    assert success["prompt_tokens"] == 321
+    assert success["completion_tokens"] == 12
+    assert timeout["outcome"] == "timeout"
+    assert timeout["prompt_tokens"] is None
+    assert timeout["latency_ms"] >= 50
@@ -0,0 +1,90 @@
+"""本地检索回复单元测试"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database.database import Base
+from src.database.models import Customer, Conversation, MessageType, Platform
+from src.database.statistics_models import FrequentQuestion
+from src.ai.local_answers import LocalAnswerIndex, char_ngrams
+
+PAIRS = [
+    ("How much is the interest?", "5% per month"),
+    ("利息多少？", "每月利息5%"),
+    ("What documents do I need?", "Only a valid ID card"),
+    ("iPhone 13 can loan how much", "Up to 15000 pesos"),
+]
+
+
+def _index(min_score: float = 0.5) -> LocalAnswerIndex:
+    index = LocalAnswerIndex(max_pairs=100, min_score=min_score)
+    for question, answer in PAIRS:
+        index.add(question, answer)
+    return index
+
+
+def test_char_ngrams_normalizes_text():
+    """测试 n-gram 提取前规范化文本"""
+    assert char_ngrams("HOW MUCH??") == char_ngrams("how much")
+    assert char_ngrams("!!!") == {}
+    assert "利息" in char_ngrams("利息多少")
+
+
+def test_nearest_neighbour_answers():
+    """测试返回最相似历史问题的回复"""
+    index = _index()
+
+    assert index.answer("how much interest").answer == "5% per month"
+    assert index.answer("利息是多少").answer == "每月利息5%"
+    assert index.answer("documents needed?").answer == "Only a valid ID card"
+    # 相似度不足时不作答
+    assert index.answer("hello") is None
+    assert index.search("hello").score < 0.5
+
+
+def test_incremental_updates():
+    """测试增量加入新问答，同一问题保留最新回复"""
+    index = _index()
+    assert index.answer("where are you located") is None
+
+    assert index.add("Where are you located?", "Manila")
+    assert index.answer("where are you located").answer == "Manila"
+
+    index.add("where are you located", "Makati, Manila")
+    assert len(index) == len(PAIRS) + 1
+    assert index.answer("Where are you located?").answer == "Makati, Manila"
+
+    # 超出容量后不再加入新问题
+    full = LocalAnswerIndex(max_pairs=1, min_score=0.5)
+    assert full.add("a question", "answer")
+    assert not full.add("another question", "answer")
+
+
+def test_load_from_db():
+    """测试从已回复对话和高频问题加载问答对"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    customer = Customer(platform=Platform.FACEBOOK, platform_user_id="u1")
+    db.add(customer)
+    db.flush()
+    db.add_all([
+        Conversation(customer_id=customer.id, message_type=MessageType.MESSAGE,
+                     content="利息多少", ai_replied=True, ai_reply_content="旧回复"),
+        Conversation(customer_id=customer.id, message_type=MessageType.MESSAGE,
+                     content="利息多少？", ai_replied=True, ai_reply_content="每月5%"),
+        Conversation(customer_id=customer.id, message_type=MessageType.MESSAGE,
+                     content="未回复的问题", ai_replied=False),
+        FrequentQuestion(question_text="需要什么证件", sample_responses=[{"response": "身份证即可"}]),
+    ])
+    db.commit()
+
+    index = LocalAnswerIndex(max_pairs=100, min_score=0.5)
+    index.load_from_db(db)
+
+    assert len(index) == 2
+    assert index.answer("利息多少").answer == "每月5%"
+    assert index.answer("需要什么证件？").answer == "身份证即可"
+    assert index.get_metrics()["loaded"] is True
+
+    db.close()
+    engine.dispose()
@@ -0,0 +1,86 @@
+"""模型路由测试"""
+from unittest.mock import patch
+from src.ai.model_router import ModelRouter, count_sentences, DEFAULT_TIER
+from src.config import settings
+from src.config.page_settings import page_settings
+from src.database.models import ConversationStage
+from src.utils.keyword_engine import KeywordMatches
+
+ROUTING = {
+    "default_tier": "standard",
+    "tiers": {
+        "fast": {"model": "gpt-4o-mini", "max_tokens": 40},
+        "standard": {"model": "gpt-4o", "max_tokens": 60, "temperature": 0.3}
+    },
+    "rules": [
+        {"tier": "standard", "categories_any": ["buying_selling"]},
+        {"tier": "fast", "max_message_tokens": 20, "max_sentences": 1, "max_history": 4},
+        {"tier": "fast", "stages": ["new"], "categories_none": ["question:问题反馈"]},
+    ]
+}
+
+
+def _route(router, message, page_id=None, categories=(), stage=ConversationStage.ONGOING, history_length=0):
+    matches = KeywordMatches(text=message, by_category={category: [category] for category in categories})
+    features = router.features(message, matches, stage, history_length)
+    return router.route(page_id, features)
+
+
+def test_count_sentences():
+    """测试中英文句子计数"""
+    assert count_sentences("") == 0
+    assert count_sentences("hi") == 1
+    assert count_sentences("Rate is 3.5% ok? Yes. Thanks") == 3
+    assert count_sentences("你好。利息多少？") == 2
+
+
+def test_without_config_uses_openai_model():
+    """测试未配置 ai_routing 时使用 OPENAI_MODEL"""
+    router = ModelRouter()
+    with patch.dict("src.ai.model_router.yaml_config", {"ai_routing": {}}):
+        decision = _route(router, "hello")
+    assert decision.tier == DEFAULT_TIER
+    assert decision.model == settings.openai_model
+    assert decision.max_tokens == 45
+
+
+def test_rules_match_in_order():
+    """测试按规则顺序匹配消息长度、历史长度、阶段和关键词分类"""
+    router = ModelRouter()
+    with patch.dict("src.ai.model_router.yaml_config", {"ai_routing": ROUTING}):
+        short = _route(router, "how much?")
+        assert (short.tier, short.model, short.max_tokens, short.rule) == ("fast", "gpt-4o-mini", 40, 1)
+
+        # 买卖意图优先走大模型
+        assert _route(router, "buy phone", categories=["buying_selling"]).tier == "standard"
+
+        long_message = "I have an iPhone 13. My friend got a better rate. Can you match it? I need the money today."
+        standard = _route(router, long_message)
+        assert (standard.tier, standard.temperature, standard.rule) == ("standard", 0.3, None)
+
+        # 历史太长不走小模型
+        assert _route(router, "how much?", history_length=10).tier == "standard"
+
+        # 新客户的长消息走小模型，反馈问题除外
+        assert _route(router, long_message, stage=ConversationStage.NEW).tier == "fast"
+        assert _route(router, long_message, stage=ConversationStage.NEW, categories=["question:问题反馈"]).tier == "standard"
+
+
+def test_page_overrides_tiers_and_rules():
+    """测试页面配置覆盖档位模型和规则"""
+    router = ModelRouter()
+    page_config = {"page_a": {"ai_routing": {"tiers": {"standard": {"model": "gpt-4.1"}}, "rules": []}}}
+    with patch.dict("src.ai.model_router.yaml_config", {"ai_routing": ROUTING}):
+        with patch.object(page_settings, "get_page_config", side_effect=lambda page_id: page_config.get(page_id, {})):
+            page_decision = _route(router, "how much?", page_id="page_a")
+            assert (page_decision.tier, page_decision.model, page_decision.max_tokens) == ("standard", "gpt-4.1", 60)
+            assert _route(router, "how much?", page_id="page_b").tier == "fast"
+
+
+def test_unknown_tier_rules_are_ignored():
+    """测试引用未定义档位的规则被忽略"""
+    router = ModelRouter()
+    routing = {"tiers": {"fast": {"model": "gpt-4o-mini"}}, "rules": [{"tier": "missing"}], "default_tier": "missing"}
+    with patch.dict("src.ai.model_router.yaml_config", {"ai_routing": routing}):
+        decision = _route(router, "hello")
+    assert decision.tier == DEFAULT_TIER
@@ -0,0 +1,172 @@
+"""共享 OpenAI 客户端测试"""
+import asyncio
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+from src.ai.openai_client import SharedOpenAIClient
+
+
+def _slow_create(tracker, delay=0.05):
+    """模拟耗时的补全请求，记录最大并发数"""
+    async def create(**kwargs):
+        page = kwargs.get("user")
+        tracker["active"][page] = tracker["active"].get(page, 0) + 1
+        tracker["total"] += 1
+        tracker["max_total"] = max(tracker["max_total"], tracker["total"])
+        tracker["max_page"][page] = max(tracker["max_page"].get(page, 0), tracker["active"][page])
+        try:
+            await asyncio.sleep(delay)
+            return Mock(choices=[Mock(message=Mock(content="ok"))])
+        finally:
+            tracker["active"][page] -= 1
+            tracker["total"] -= 1
+    return create
+
+
+@pytest.mark.asyncio
+async def test_chat_completion_respects_global_and_page_limits():
+    """测试全局和单页面并发上限"""
+    client = SharedOpenAIClient(max_concurrency=3, per_page_concurrency=2, timeout_seconds=5)
+    tracker = {"active": {}, "max_page": {}, "total": 0, "max_total": 0}
+
+    with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock, side_effect=_slow_create(tracker)):
+        await asyncio.gather(*[
+            client.chat_completion(page_id=page, user=page, model="m", messages=[])
+            for page in ["page_a"] * 5 + ["page_b"] * 5
+        ])
+
+    assert tracker["max_total"] == 3
+    assert tracker["max_page"]["page_a"] <= 2
+    assert tracker["max_page"]["page_b"] <= 2
+
+    metrics = client.get_metrics()
+    assert metrics["completed_count"] == 10
+    assert metrics["in_flight"] == 0
+    assert metrics["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_completion_timeout_releases_slot():
+    """测试超时的请求被取消并释放名额"""
+    client = SharedOpenAIClient(max_concurrency=1, per_page_concurrency=1, timeout_seconds=5)
+    tracker = {"active": {}, "max_page": {}, "total": 0, "max_total": 0}
+
+    with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock, side_effect=_slow_create(tracker, delay=1)):
+        with pytest.raises(asyncio.TimeoutError):
+            await client.chat_completion(page_id="page_a", timeout=0.05, model="m", messages=[])
+
+    # 底层请求已被取消，名额已释放
+    assert tracker["total"] == 0
+    with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock, side_effect=_slow_create(tracker, delay=0)):
+        await client.chat_completion(page_id="page_a", model="m", messages=[])
+
+    metrics = client.get_metrics()
+    assert metrics["timeout_count"] == 1
+    assert metrics["completed_count"] == 1
+    assert metrics["in_flight"] == 0
+
+
+def _sequenced_create(delays, tracker):
+    """第 n 次调用耗时 delays[n] 秒后返回第 n 个响应（记录被取消的调用）"""
+    async def create(**kwargs):
+        index = tracker["calls"]
+        tracker["calls"] += 1
+        try:
+            await asyncio.sleep(delays[index])
+        except asyncio.CancelledError:
+            tracker["cancelled"].append(index)
+            raise
+        return Mock(choices=[Mock(message=Mock(content=f"reply {index}"))])
+    return create
+
+
+@pytest.mark.asyncio
+async def test_slow_completion_is_hedged():
+    """测试超过对冲延迟时发出对冲请求，先返回的结果胜出，另一个请求被取消"""
+    client = SharedOpenAIClient(timeout_seconds=5, hedge_enabled=True, hedge_delay_seconds=0.05, hedge_budget_per_minute=10)
+    tracker = {"calls": 0, "cancelled": []}
+
+    with patch("src.ai.openai_client.HEDGE_MIN_DELAY_SECONDS", 0.01):
+        with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock,
+                          side_effect=_sequenced_create([1, 0.01], tracker)):
+            response = await client.chat_completion(page_id="page_a", model="m", messages=[])
+
+    assert response.choices[0].message.content == "reply 1"
+    await asyncio.sleep(0)
+    assert tracker["cancelled"] == [0]
+    metrics = client.get_metrics()
+    assert metrics["hedge_count"] == 1
+    assert metrics["hedge_win_count"] == 1
+    assert metrics["hedge_rate"] == 1
+    assert metrics["hedge_win_rate"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_completion_and_exhausted_budget_are_not_hedged():
+    """测试对冲延迟内返回的请求和预算用完后的慢请求都不发对冲请求"""
+    client = SharedOpenAIClient(timeout_seconds=5, hedge_enabled=True, hedge_delay_seconds=0.05, hedge_budget_per_minute=1)
+    tracker = {"calls": 0, "cancelled": []}
+
+    with patch("src.ai.openai_client.HEDGE_MIN_DELAY_SECONDS", 0.01):
+        with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock,
+                          side_effect=_sequenced_create([0, 0.08, 0.1, 0.1], tracker)):
+            # 快速返回：不对冲
+            await client.chat_completion(page_id="page_a", model="m", messages=[])
+            # 慢请求：对冲（用掉预算），原请求先返回
+            assert (await client.chat_completion(page_id="page_a", model="m", messages=[])).choices[0].message.content == "reply 1"
+            # 预算用完：不再对冲
+            assert (await client.chat_completion(page_id="page_a", model="m", messages=[])).choices[0].message.content == "reply 3"
+
+    assert tracker["calls"] == 4
+    metrics = client.get_metrics()
+    assert metrics["hedge_count"] == 1
+    assert metrics["hedge_win_count"] == 0
+    assert metrics["hedge_budget_exhausted_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_survives_primary_failure():
+    """测试对冲后原请求失败时使用对冲请求的结果"""
+    client = SharedOpenAIClient(timeout_seconds=5, hedge_enabled=True, hedge_delay_seconds=0.02, hedge_budget_per_minute=10)
+    tracker = {"calls": 0, "cancelled": []}
+
+    async def create(**kwargs):
+        index = tracker["calls"]
+        tracker["calls"] += 1
+        await asyncio.sleep(0.05)
+        if index == 0:
+            raise RuntimeError("failed")
+        return Mock(choices=[Mock(message=Mock(content="hedged"))])
+
+    with patch("src.ai.openai_client.HEDGE_MIN_DELAY_SECONDS", 0.01):
+        with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock, side_effect=create):
+            response = await client.chat_completion(page_id="page_a", model="m", messages=[])
+
+    assert response.choices[0].message.content == "hedged"
+    assert client.get_metrics()["hedge_win_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_loser_is_recorded():
+    """测试被取消的对冲请求也记录调用（按胜出请求的输入 token 数计费）"""
+    client = SharedOpenAIClient(timeout_seconds=5, hedge_enabled=True, hedge_delay_seconds=0.05, hedge_budget_per_minute=10)
+    tracker = {"calls": 0, "cancelled": []}
+    sequenced = _sequenced_create([1, 0.01], tracker)
+
+    async def create(**kwargs):
+        response = await sequenced(**kwargs)
+        response.usage = Mock(prompt_tokens=120, completion_tokens=30)
+        return response
+
+    with patch("src.ai.openai_client.HEDGE_MIN_DELAY_SECONDS", 0.01), \
+            patch("src.ai.openai_client.llm_telemetry") as telemetry:
+        with patch.object(client.client.chat.completions, "create", new_callable=AsyncMock, side_effect=create):
+            await client.chat_completion(page_id="page_a", model="m", messages=[], tier="fast")
+
+    records = {call.kwargs["outcome"]: call.kwargs for call in telemetry.record.call_args_list}
+    assert set(records) == {"success", "hedge_lost"}
+    assert records["success"]["prompt_tokens"] == 120
+    assert records["success"]["completion_tokens"] == 30
+    assert records["hedge_lost"]["prompt_tokens"] == 120
+    assert records["hedge_lost"]["completion_tokens"] is None
+    assert records["hedge_lost"]["tier"] == "fast"
+    assert client.get_metrics()["hedge_lost_prompt_tokens"] == 120
@@ -0,0 +1,103 @@
+"""电话号码扫描测试"""
+import time
+import pytest
+from unittest.mock import patch
+from src.collector.phone_scanner import PhoneScanner, to_e164, phone_scanner
+from src.collector.data_collector import DataCollector
+
+
+@pytest.fixture
+def scanner():
+    """默认地区为中国的扫描器"""
+    return PhoneScanner(default_regions=["CN"])
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("我的电话是 13812345678", "+8613812345678"),
+    ("联系我：+86 138-1234-5678", "+8613812345678"),
+    ("电话：010-12345678", "+861012345678"),
+    ("0086 138 1234 5678", "+8613812345678"),
+    ("8613812345678", "+8613812345678"),
+    ("电话１３８１２３４５６７８", "+8613812345678"),
+    ("call me at +1 (415) 555-2671 after 6pm", "+14155552671"),
+])
+def test_extract_normalizes_to_e164(scanner, text, expected):
+    """测试各种写法的号码规范化为 E.164"""
+    assert scanner.extract(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "会议时间 2024-01-15",
+    "借款 $50000000",
+    "额度 12345678元",
+    "金额 12345678.50",
+    "订单号 abc12345678",
+    "123456789012345",
+    "iphone 15 pro max 256gb",
+])
+def test_rejects_dates_amounts_and_codes(scanner, text):
+    """测试日期、金额、编号和超长数字不被当作号码"""
+    assert scanner.scan(text) == []
+
+
+def test_scan_finds_every_number(scanner):
+    """测试空格分隔的多个号码分别识别"""
+    matches = scanner.scan("13812345678 13912345678，或 +86 (139) 1234 5678")
+    assert [match.e164 for match in matches] == ["+8613812345678", "+8613912345678", "+8613912345678"]
+    assert matches[2].raw == "+86 (139) 1234 5678"
+
+
+def test_regions_decide_national_numbers():
+    """测试没有国家码的号码按地区依次识别"""
+    assert to_e164("4155552671", False, ["US"]) == "+14155552671"
+    assert to_e164("09171234567", False, ["PH"]) == "+639171234567"
+    assert to_e164("09171234567", False, ["US"]) is None
+    assert to_e164("09171234567", False, ["US", "PH"]) == "+639171234567"
+    # 多个地区都符合时按配置顺序取第一个
+    assert to_e164("09171234567", False, ["CN", "PH"]) == "+869171234567"
+    # + 号码按国家码检查，未收录的国家码只检查位数
+    assert to_e164("8612345", True, ["US"]) is None
+    assert to_e164("4915123456789", True, ["CN"]) == "+4915123456789"
+
+
+def test_page_regions_override_global():
+    """测试页面配置的 phone_regions 覆盖全局配置"""
+    page_config = {"phone_regions": ["ph", "unknown"]}
+    with patch("src.collector.phone_scanner.page_settings.get_page_config", return_value=page_config):
+        assert phone_scanner.regions_for_page("page_1") == ("PH",)
+    with patch("src.collector.phone_scanner.page_settings.get_page_config", return_value={}):
+        assert phone_scanner.regions_for_page("page_2") == phone_scanner.default_regions
+
+    collector = DataCollector(db=None)
+    with patch("src.collector.phone_scanner.page_settings.get_page_config", return_value=page_config):
+        extracted = collector.extract_info_from_message("call 0917 123 4567", page_id="page_1")
+    assert extracted["phone"] == "+639171234567"
+
+
+def test_batch_api(scanner):
+    """测试批量接口（回填历史数据）"""
+    results = scanner.extract_many(["电话 13812345678", "没有号码", "+1 415 555 2671"])
+    assert [[match.e164 for match in found] for found in results] == [
+        ["+8613812345678"], [], ["+14155552671"]
+    ]
+    assert scanner.normalize_many(["138-1234-5678", "电话 13812345678", "+8613812345678"]) == [
+        "+8613812345678", None, "+8613812345678"
+    ]
+
+
+def test_scan_time_is_linear_in_message_length(scanner):
+    """测试对抗性输入上耗时随长度线性增长"""
+    unit = "1 2-3.4 (5) 2024-01-15 $5000 12.50元 1234567890123456789012345 "
+
+    def elapsed(size: int) -> float:
+        text = unit * size
+        best = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            assert scanner.scan(text) == []
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    small, large = elapsed(50), elapsed(400)
+    # 长度 8 倍，耗时应远小于平方增长（64 倍）
+    assert large < small * 20
@@ -0,0 +1,283 @@
+"""消息处理管道单元测试"""
+import asyncio
+import pytest
+from unittest.mock import patch
+from src.processors.base import BaseProcessor, ProcessorResult, ProcessorStatus
+from src.processors.lanes import LaneScheduler
+from src.processors.pipeline import MessagePipeline, create_default_pipeline
+
+
+class RecordingPipeline:
+    """记录执行顺序的假管道"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.events = []
+        self.active = 0
+        self.max_active = 0
+
+    async def process(self, platform_name, message_data):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.events.append(("start", message_data["sender_id"], message_data["message_id"]))
+        await asyncio.sleep(self.delay)
+        self.events.append(("end", message_data["sender_id"], message_data["message_id"]))
+        self.active -= 1
+        return {"success": True, "message_id": message_data["message_id"]}
+
+
+@pytest.mark.asyncio
+async def test_lane_scheduler_keeps_per_customer_order():
+    """测试同一客户的消息按顺序处理"""
+    pipeline = RecordingPipeline()
+    scheduler = LaneScheduler(pipeline, lanes=4, max_concurrency=4)
+
+    messages = [{"sender_id": "user_1", "message_id": f"m{i}"} for i in range(5)]
+    results = await asyncio.gather(*(scheduler.submit("facebook", m) for m in messages))
+
+    assert [r["message_id"] for r in results] == [f"m{i}" for i in range(5)]
+    # 同一客户的处理不重叠，且按提交顺序执行
+    starts = [e[2] for e in pipeline.events if e[0] == "start"]
+    assert starts == [f"m{i}" for i in range(5)]
+    assert pipeline.max_active == 1
+
+
+@pytest.mark.asyncio
+async def test_lane_scheduler_runs_customers_in_parallel_up_to_limit():
+    """测试不同客户并行处理且受并发上限限制"""
+    pipeline = RecordingPipeline(delay=0.02)
+    scheduler = LaneScheduler(pipeline, lanes=64, max_concurrency=3)
+
+    senders = [f"user_{i}" for i in range(12)]
+    assert len({scheduler.lane_for("facebook", s) for s in senders}) > 3
+
+    await asyncio.gather(*(
+        scheduler.submit("facebook", {"sender_id": s, "message_id": s}) for s in senders
+    ))
+
+    assert 1 < pipeline.max_active <= 3
+    metrics = scheduler.get_metrics()
+    assert metrics["running"] == 0
+    assert metrics["queued"] == 0
+    assert metrics["max_wait_ms"] > 0
+
+
+class StubProcessor(BaseProcessor):
+    """可配置依赖、耗时和返回状态的测试处理器"""
+
+    def __init__(self, name, deps=None, delay=0.0, status=ProcessorStatus.SUCCESS, log=None, uses_db=False,
+                 may_stop=False):
+        super().__init__(name)
+        self.uses_db = uses_db
+        self.may_stop = may_stop
+        self.deps = deps or []
+        self.delay = delay
+        self.status = status
+        self.log = log if log is not None else []
+
+    def get_dependencies(self) -> list:
+        return self.deps
+
+    async def process(self, context):
+        self.log.append(("start", self.name))
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", self.name))
+        return ProcessorResult(status=self.status, message=self.name)
+
+
+class FakeClient:
+    """假平台客户端"""
+
+    async def close(self):
+        pass
+
+
+def _build_pipeline(processors):
+    pipeline = MessagePipeline()
+    pipeline.add_processors(processors)
+    return pipeline
+
+
+def test_pipeline_compiles_levels_once():
+    """测试依赖关系在添加处理器时编译为层级"""
+    pipeline = create_default_pipeline()
+    levels = [[p.name for p in level] for level in pipeline._levels]
+
+    assert levels == [
+        ["message_receiver"],
+        ["user_info_handler"],
+        ["filter_handler"],
+        ["ai_reply_handler"],
+        ["data_collection_handler", "statistics_handler", "notification_handler"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_independent_processors_concurrently():
+    """测试同层处理器并发执行，耗时取决于关键路径"""
+    log = []
+    pipeline = _build_pipeline([
+        StubProcessor("root", log=log),
+        StubProcessor("a", deps=["root"], delay=0.1, log=log),
+        StubProcessor("b", deps=["root"], delay=0.1, log=log),
+        StubProcessor("c", deps=["root"], delay=0.1, log=log),
+    ])
+
+    with patch("src.processors.pipeline.client_pool.get", return_value=FakeClient()):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await pipeline.process("facebook", {"sender_id": "u1"})
+        elapsed = loop.time() - started
+
+    assert result["success"] is True
+    assert [r["processor"] for r in result["results"]] == ["root", "a", "b", "c"]
+    assert elapsed < 0.25
+    # 三个处理器都在任意一个结束之前开始
+    first_end = next(i for i, e in enumerate(log) if e[0] == "end" and e[1] != "root")
+    assert {e[1] for e in log[:first_end] if e[0] == "start"} >= {"a", "b", "c"}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_serializes_processors_sharing_session():
+    """测试同层中使用共享会话的处理器依次执行，其他处理器仍并发"""
+    log = []
+    pipeline = _build_pipeline([
+        StubProcessor("root", log=log),
+        StubProcessor("db_a", deps=["root"], delay=0.05, log=log, uses_db=True),
+        StubProcessor("db_b", deps=["root"], delay=0.05, log=log, uses_db=True),
+        StubProcessor("free", deps=["root"], delay=0.05, log=log),
+        StubProcessor("after", deps=["db_b"], log=log),
+    ])
+
+    levels = [[p.name for p in level] for level in pipeline._levels]
+    assert levels == [["root"], ["db_a", "free"], ["db_b"], ["after"]]
+
+    with patch("src.processors.pipeline.client_pool.get", return_value=FakeClient()):
+        result = await pipeline.process("facebook", {"sender_id": "u1"})
+
+    assert [r["processor"] for r in result["results"]] == ["root", "db_a", "free", "db_b", "after"]
+    assert log.index(("end", "db_a")) < log.index(("start", "db_b"))
+
+
+@pytest.mark.asyncio
+async def test_pipeline_skip_stops_later_processors():
+    """测试 SKIP 停止之后的所有处理器（包括不依赖它的），之后添加的处理器不会提前执行"""
+    pipeline = _build_pipeline([
+        StubProcessor("root"),
+        StubProcessor("filter", deps=["root"], status=ProcessorStatus.SKIP, may_stop=True),
+        StubProcessor("reply", deps=["filter"]),
+        StubProcessor("collect", deps=["root"]),
+    ])
+
+    levels = [[p.name for p in level] for level in pipeline._levels]
+    assert levels == [["root"], ["filter"], ["reply", "collect"]]
+
+    with patch("src.processors.pipeline.client_pool.get", return_value=FakeClient()):
+        result = await pipeline.process("facebook", {"sender_id": "u1"})
+
+    executed = [r["processor"] for r in result["results"]]
+    assert executed == ["root", "filter"]
+
+
+def _patch_handlers(pipeline, skip_at, message):
+    """把默认管道的处理器替换为记录执行的假实现，skip_at 返回 SKIP"""
+    executed = []
+
+    def fake(name):
+        async def process(context):
+            executed.append(name)
+            if name == skip_at:
+                return ProcessorResult(status=ProcessorStatus.SKIP, message=message, should_continue=False)
+            return ProcessorResult(status=ProcessorStatus.SUCCESS, message=name)
+        return process
+
+    patches = [
+        patch.object(processor, "process", side_effect=fake(processor.name))
+        for processor in pipeline.processors
+    ]
+    return executed, patches
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("skip_at, message, expected", [
+    ("filter_handler", "消息已被过滤，跳过处理",
+     ["message_receiver", "user_info_handler", "filter_handler"]),
+    ("filter_handler", "重复消息，跳过处理",
+     ["message_receiver", "user_info_handler", "filter_handler"]),
+    ("ai_reply_handler", "AI回复已禁用",
+     ["message_receiver", "user_info_handler", "filter_handler", "ai_reply_handler"]),
+])
+async def test_default_pipeline_skip_collects_nothing(skip_at, message, expected):
+    """测试被过滤、重复或跳过回复的消息不再收集资料、统计和通知"""
+    pipeline = create_default_pipeline()
+    executed, patches = _patch_handlers(pipeline, skip_at, message)
+    for handler_patch in patches:
+        handler_patch.start()
+    try:
+        with patch("src.processors.pipeline.client_pool.get", return_value=FakeClient()):
+            await pipeline.process("facebook", {"sender_id": "u1", "message_id": "m1"})
+    finally:
+        for handler_patch in patches:
+            handler_patch.stop()
+
+    assert executed == expected
+
+
+@pytest.mark.asyncio
+async def test_pipeline_records_trace_and_histograms():
+    """测试管道记录单条消息链路和各处理器耗时直方图"""
+    from src.monitoring.pipeline_metrics import pipeline_metrics
+
+    pipeline_metrics.reset()
+    pipeline = _build_pipeline([
+        StubProcessor("root"),
+        StubProcessor("slow", deps=["root"], delay=0.05),
+        StubProcessor("filter", deps=["root"], status=ProcessorStatus.SKIP),
+    ])
+
+    with patch("src.processors.pipeline.client_pool.get", return_value=FakeClient()):
+        result = await pipeline.process("facebook", {"sender_id": "u1", "message_id": "m1"})
+
+    trace = result["trace"]
+    assert trace["message_id"] == "m1"
+    stages = {stage["processor"]: stage for stage in trace["stages"]}
+    assert stages["slow"]["start_ms"] >= stages["root"]["end_ms"]
+    assert stages["slow"]["end_ms"] - stages["slow"]["start_ms"] >= 40
+    assert trace["total_ms"] >= stages["slow"]["end_ms"]
+
+    metrics = pipeline_metrics.get_metrics()
+    assert metrics["processors"]["slow"]["facebook"]["success"]["count"] == 1
+    assert metrics["processors"]["filter"]["facebook"]["skip"]["count"] == 1
+    assert metrics["pipeline"]["facebook"]["count"] == 1
+    assert pipeline_metrics.get_slowest(1)[0]["message_id"] == "m1"
+
+
+@pytest.mark.asyncio
+async def test_trace_persist_tasks_are_tracked():
+    """测试链路写入任务保留引用直到完成，失败计入指标"""
+    from src.monitoring.pipeline_metrics import PipelineMetrics
+
+    metrics = PipelineMetrics(slowest_limit=5, persist=True, persist_min_ms=0)
+    trace = {"message_id": "m1", "customer_id": 1, "total_ms": 10.0, "stages": []}
+
+    with patch.object(PipelineMetrics, "_write_trace", side_effect=RuntimeError("db down")):
+        metrics.record_trace("facebook", trace)
+        assert metrics.get_metrics()["pending_trace_writes"] == 1
+        await metrics.drain()
+
+    result = metrics.get_metrics()
+    assert result["pending_trace_writes"] == 0
+    assert result["trace_write_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline_resolves_page_token_per_message():
+    """测试每条消息按页面解析当前 Token，并以页面 ID 作为客户端池的缓存键"""
+    pipeline = _build_pipeline([StubProcessor("root")])
+
+    with patch("src.processors.pipeline.page_token_manager.get_token", return_value="page_token") as get_token, \
+            patch("src.processors.pipeline.client_pool.get", return_value=FakeClient()) as get_client:
+        await pipeline.process("facebook", {"sender_id": "u1", "page_id": "page_1"})
+
+    get_token.assert_called_once_with("page_1")
+    get_client.assert_called_once_with("facebook", key="page_1", access_token="page_token")
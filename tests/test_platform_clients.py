@@ -0,0 +1,80 @@
+"""平台客户端池单元测试"""
+import pytest
+from src.platforms.client_pool import PlatformClientPool
+from src.platforms.registry import PlatformRegistry
+
+
+class DummyClient:
+    """记录初始化参数的假客户端"""
+
+    def __init__(self, access_token=None, http_client=None):
+        self.access_token = access_token
+        self.client = http_client
+
+
+@pytest.fixture
+def platform_registry():
+    """只注册假客户端的注册表"""
+    platform_registry = PlatformRegistry()
+    platform_registry.register_platform("facebook", client_class=DummyClient)
+    return platform_registry
+
+
+def test_registry_passes_supported_kwargs(platform_registry):
+    """测试注册表传递客户端支持的参数（包括 access_token），忽略不支持的参数"""
+    client = platform_registry.create_client("facebook", access_token="token_a", ig_user_id="ig_1")
+
+    assert client.access_token == "token_a"
+    assert platform_registry.create_client("unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_clients_and_connections(platform_registry):
+    """测试同一 Token 复用客户端，不同 Token 共享同一个连接池"""
+    pool = PlatformClientPool(platform_registry, http2=False)
+
+    first = pool.get("facebook", access_token="token_a")
+    again = pool.get("facebook", access_token="token_a")
+    other = pool.get("facebook", access_token="token_b")
+
+    assert first is again
+    assert other is not first
+    assert other.access_token == "token_b"
+    assert other.client is first.client
+
+    metrics = pool.get_metrics()
+    assert metrics["clients"] == 2
+    assert metrics["reused_count"] == 1
+
+    await pool.close()
+    assert first.client.is_closed
+    assert pool.get_metrics()["clients"] == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_replaces_client_when_token_rotates(platform_registry):
+    """测试同一页面的 Token 轮换后创建新客户端并关闭旧客户端"""
+    closed = []
+
+    class ClosableClient(DummyClient):
+        async def close(self):
+            closed.append(self.access_token)
+
+    platform_registry.register_platform("facebook", client_class=ClosableClient)
+    pool = PlatformClientPool(platform_registry, http2=False)
+
+    first = pool.get("facebook", access_token="token_a", key="page_1")
+    assert pool.get("facebook", access_token="token_a", key="page_1") is first
+    rotated = pool.get("facebook", access_token="token_b", key="page_1")
+    other_page = pool.get("facebook", access_token="token_a", key="page_2")
+
+    assert rotated is not first
+    assert rotated.access_token == "token_b"
+    assert other_page is not first
+
+    metrics = pool.get_metrics()
+    assert metrics["clients"] == 2
+    assert metrics["replaced_count"] == 1
+
+    await pool.close()
+    assert closed == ["token_a"]
@@ -0,0 +1,86 @@
+"""提示词构建器单元测试"""
+from src.ai.prompt_builder import (
+    PromptBuilder, estimate_tokens, truncate_to_tokens, TRUNCATION_MARK
+)
+
+
+def _history(*contents):
+    roles = ["user", "assistant"]
+    return [{"role": roles[i % 2], "content": content, "timestamp": None} for i, content in enumerate(contents)]
+
+
+def test_estimate_tokens():
+    """测试本地 token 估算"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("你好吗") == 3
+    assert estimate_tokens("how much") == 2
+    assert estimate_tokens("iphone 256gb?") == 5
+    # 长文本的估算与长度成正比
+    assert estimate_tokens("贷款" * 500) == 1000
+
+
+def test_truncate_to_tokens_keeps_head():
+    """测试截断保留开头并加截断标记"""
+    text = "第一句话。" + "很长的粘贴内容" * 100
+    truncated = truncate_to_tokens(text, 20)
+
+    assert truncated.startswith("第一句话。")
+    assert truncated.endswith(TRUNCATION_MARK)
+    assert estimate_tokens(truncated) <= 20
+    assert truncate_to_tokens("short", 20) == "short"
+
+
+def test_build_keeps_everything_within_budget():
+    """测试预算充足时保留全部历史"""
+    builder = PromptBuilder(max_input_tokens=1000, max_message_tokens=200)
+    built = builder.build("system", _history("hi", "hello", "price?", "100"), "ok")
+
+    assert [m["content"] for m in built.messages] == ["system", "hi", "hello", "price?", "100", "ok"]
+    assert built.history_dropped == 0
+    assert built.truncated == 0
+    assert built.prompt_tokens <= 1000
+
+
+def test_build_drops_oldest_history_first():
+    """测试超出预算时先丢弃最早的历史，系统提示词和最新消息始终保留"""
+    builder = PromptBuilder(max_input_tokens=60, max_message_tokens=200)
+    history = _history("最早的消息" * 4, "较早的回复" * 4, "最近的问题", "最近的回复")
+    built = builder.build("系统提示词", history, "最新消息")
+
+    contents = [m["content"] for m in built.messages]
+    assert contents[0] == "系统提示词"
+    assert contents[-1] == "最新消息"
+    assert "最近的问题" in contents and "最近的回复" in contents
+    assert history[0]["content"] not in contents
+    assert built.history_dropped >= 1
+    assert built.prompt_tokens <= 60
+
+
+def test_build_truncates_long_pastes():
+    """测试单条历史长文本被截断，单独超出预算的最新消息也被截断"""
+    builder = PromptBuilder(max_input_tokens=200, max_message_tokens=30)
+    built = builder.build("system", _history("粘贴" * 200, "ok"), "hi")
+
+    pasted = built.messages[1]["content"]
+    assert pasted.endswith(TRUNCATION_MARK)
+    assert estimate_tokens(pasted) <= 30
+
+    built = builder.build("system", [], "粘贴" * 500)
+    assert built.messages[-1]["content"].endswith(TRUNCATION_MARK)
+    assert built.prompt_tokens <= 200
+
+
+def test_metrics_record_estimated_and_actual_tokens():
+    """测试指标记录估算和实际的提示词 token 数"""
+    builder = PromptBuilder(max_input_tokens=100, max_message_tokens=50)
+    built = builder.build("system", _history("a" * 400), "hi")
+    builder.record_usage(built.prompt_tokens, built.prompt_tokens * 2)
+    builder.record_usage(built.prompt_tokens, None)
+
+    metrics = builder.get_metrics()
+    assert metrics["build_count"] == 1
+    assert metrics["truncated_count"] == 1
+    assert metrics["p95_estimated_tokens"] == built.prompt_tokens
+    assert metrics["p95_prompt_tokens"] == built.prompt_tokens * 2
+    assert metrics["actual_to_estimated_ratio"] == 2.0
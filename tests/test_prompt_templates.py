@@ -0,0 +1,69 @@
+"""系统提示词编译单元测试"""
+from unittest.mock import patch
+from src.ai.prompt_templates import PromptTemplates, DEFAULT_SYSTEM_PROMPT, IPHONE_LOAN_TELEGRAM_PROMPT
+
+YAML_CONFIG = {
+    "ai_templates": {"prompt_type": "iphone_loan_telegram"},
+    "telegram_groups": {"main_group": "@global_group", "main_channel": "@global_channel"}
+}
+
+PAGE_CONFIG = {
+    "page_a": {"telegram_groups": {"main_group": "@page_a_group"}},
+    "page_b": {"prompt_type": "default"}
+}
+
+
+def _templates():
+    with patch("src.ai.prompt_templates.yaml_config", YAML_CONFIG):
+        templates = PromptTemplates()
+    return templates
+
+
+def _compile(templates, page_id=None):
+    with patch("src.ai.prompt_templates.yaml_config", YAML_CONFIG), \
+            patch("src.ai.prompt_templates.page_settings.get_page_config",
+                  side_effect=lambda page: PAGE_CONFIG.get(page, {})):
+        return templates.compile_system_prompt(page_id=page_id)
+
+
+def test_compiled_prompt_is_reused():
+    """测试同一配置返回同一个编译结果（静态前缀逐字节相同）"""
+    templates = _templates()
+
+    first = _compile(templates)
+    second = _compile(templates)
+    assert first is second
+    assert "@global_group" in first.text and "@your_group" not in first.text
+    assert first.prompt_type == "iphone_loan_telegram"
+    assert len(first.version) == 12
+
+
+def test_page_overrides_produce_separate_versions():
+    """测试页面配置覆盖Telegram群组和提示词类型"""
+    templates = _templates()
+
+    default = _compile(templates)
+    page_a = _compile(templates, "page_a")
+    page_b = _compile(templates, "page_b")
+
+    assert "@page_a_group" in page_a.text and "@global_group" not in page_a.text
+    assert page_a.version != default.version
+    assert page_b.text == DEFAULT_SYSTEM_PROMPT
+    # 未单独配置的页面与全局配置共用同一个提示词
+    assert _compile(templates, "page_c").version == default.version
+
+
+def test_config_change_recompiles():
+    """测试配置变化后重新编译"""
+    templates = _templates()
+    before = _compile(templates)
+
+    YAML_CONFIG["telegram_groups"]["main_group"] = "@new_group"
+    try:
+        after = _compile(templates)
+    finally:
+        YAML_CONFIG["telegram_groups"]["main_group"] = "@global_group"
+
+    assert "@new_group" in after.text
+    assert after.version != before.version
+    assert IPHONE_LOAN_TELEGRAM_PROMPT is not None
@@ -0,0 +1,62 @@
+"""AI回复缓存测试"""
+from unittest.mock import patch
+from src.ai.reply_cache import ReplyCache, normalize_question
+
+
+def test_normalize_question():
+    """测试问题文本规范化"""
+    assert normalize_question("How much??") == "how much"
+    assert normalize_question("  HOW   much ！") == "how much"
+    assert normalize_question("多少钱？") == "多少钱"
+    assert normalize_question("😀😀") == ""
+
+
+def test_lru_eviction():
+    """测试超出容量时淘汰最久未使用的回复"""
+    cache = ReplyCache(max_size=2, ttl_seconds=60)
+    key_a = cache.make_key("v1", "ai_replies:0", "a")
+    key_b = cache.make_key("v1", "ai_replies:0", "b")
+    key_c = cache.make_key("v1", "ai_replies:0", "c")
+
+    cache.set(key_a, "reply a")
+    cache.set(key_b, "reply b")
+    assert cache.get(key_a) == "reply a"  # a 变为最近使用
+    cache.set(key_c, "reply c")
+
+    assert cache.get(key_b) is None
+    assert cache.get(key_a) == "reply a"
+    assert cache.get(key_c) == "reply c"
+    assert cache.get_metrics()["eviction_count"] == 1
+
+
+def test_ttl_expiry():
+    """测试过期的回复不再返回"""
+    cache = ReplyCache(max_size=10, ttl_seconds=30)
+    key = cache.make_key("v1", "ai_replies:0", "how much")
+
+    with patch("src.ai.reply_cache.time.monotonic", return_value=1000.0):
+        cache.set(key, "reply")
+    with patch("src.ai.reply_cache.time.monotonic", return_value=1020.0):
+        assert cache.get(key) == "reply"
+    with patch("src.ai.reply_cache.time.monotonic", return_value=1031.0):
+        assert cache.get(key) is None
+
+    metrics = cache.get_metrics()
+    assert metrics["hit_count"] == 1
+    assert metrics["miss_count"] == 1
+    assert metrics["expired_count"] == 1
+
+
+def test_templates_change_flushes_cache():
+    """测试 ai_templates 变化时清空缓存"""
+    cache = ReplyCache(max_size=10, ttl_seconds=60)
+    version = cache.sync_templates({"greeting": "hi"})
+    key = cache.make_key(version, "ai_replies:0", "hello")
+    cache.set(key, "reply")
+
+    assert cache.sync_templates({"greeting": "hi"}) == version
+    assert cache.get(key) == "reply"
+
+    assert cache.sync_templates({"greeting": "hello"}) != version
+    assert cache.get(key) is None
+    assert cache.get_metrics()["size"] == 0
@@ -0,0 +1,82 @@
+"""情感评分测试"""
+import pytest
+from src.collector.sentiment_scorer import SentimentScorer, SentimentLexicon
+from src.utils.keyword_engine import KeywordEngine
+
+LEXICON_CONFIG = {
+    "filtering": {
+        "sentiment_filter": {
+            "lexicon": {"退款": -2, "Refund": -2, "推荐": 1.5, "好": 0, "bad_weight": "x"}
+        }
+    }
+}
+
+MESSAGES = [
+    "我要投诉，太糟糕了",
+    "谢谢，服务很好",
+    "我要退款！退款！",
+    "I want a REFUND, this is bad",
+    "推荐给朋友了，满意",
+    "好",
+    "",
+    None,
+    "我要退款！退款！",
+]
+
+
+@pytest.fixture
+def scorer():
+    """使用测试词典的评分器和关键词引擎"""
+    return SentimentScorer(LEXICON_CONFIG), KeywordEngine(LEXICON_CONFIG)
+
+
+def test_default_lexicon_matches_keyword_counts():
+    """测试默认词典与原来的情感关键词计数一致"""
+    config = {"filtering": {}}
+    scorer, engine = SentimentScorer(config), KeywordEngine(config)
+
+    result = scorer.score(engine.match("投诉！问题一直没解决，但客服很好"))
+    assert result.negative_score == 2
+    assert result.positive_score == 1
+    assert result.is_negative and not result.is_positive
+    assert result.to_dict()["score"] == -1
+
+
+def test_configured_weights(scorer):
+    """测试配置的权重覆盖和补充内置词条，无效权重被忽略"""
+    scorer, engine = scorer
+    assert "bad_weight" not in scorer.lexicon.weights
+    assert "好" not in scorer.lexicon.weights
+
+    refund = scorer.score(engine.match("我要退款！退款！"))
+    assert refund.negative_score == 2  # 重复出现只计一次
+    assert scorer.score(engine.match("I want a REFUND, this is bad")).negative_score == 3
+    assert scorer.score(engine.match("好")).score == 0
+    recommended = scorer.score(engine.match("推荐给朋友了，满意"))
+    assert recommended.positive_score == 2.5
+    assert recommended.is_positive
+
+
+def test_score_many_matches_single_scores(scorer):
+    """测试批量评分与逐条评分一致"""
+    scorer, engine = scorer
+    batch = scorer.score_many(MESSAGES)
+
+    assert len(batch) == len(MESSAGES)
+    for index, message in enumerate(MESSAGES):
+        assert batch[index] == scorer.score(engine.match(message))
+    assert batch.is_negative.tolist() == [True, False, True, True, False, False, False, False, True]
+    assert batch.scores.tolist()[:3] == [-2, 0, -2]  # "好" 的权重配置为 0
+
+
+def test_score_many_empty():
+    """测试空批量"""
+    batch = SentimentScorer({"filtering": {}}).score_many([])
+    assert len(batch) == 0
+
+
+def test_lexicon_drops_zero_weights():
+    """测试权重为 0 的词条不进入自动机"""
+    lexicon = SentimentLexicon({"好": 0.0, "差": -1.0})
+    assert lexicon.automaton.patterns == ["差"]
+    assert lexicon.negative_weights.tolist() == [1.0]